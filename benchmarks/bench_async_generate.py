@@ -0,0 +1,79 @@
+"""
+Concurrency benchmark for the async /generate path.
+
+Provider calls and the trends fetch are replaced by stubs that sleep for a
+fixed latency, so the numbers reflect how many in-flight requests a single
+worker can hold rather than real provider performance.
+
+Usage:
+    python benchmarks/bench_async_generate.py [--latency 0.5] [--levels 1,10,100,500]
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+for key in ("OPENAI_API_KEY", "ANTHROPIC_API_KEY", "GOOGLE_API_KEY"):
+    os.environ.setdefault(key, "benchmark")
+
+import httpx
+import main
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+REQUEST = {
+    "newsletter_text": "This week we look at AI productivity tools and remote work.",
+    "audience_profile": "Startup founders",
+    "goal": "Increase open rates",
+    "tone": "Professional but friendly",
+    "past_headlines": [],
+    "constraints": {"max_length": 60, "avoid_clickbait": True, "require_numbers": False}
+}
+
+def install_stubs(latency: float):
+    """Replace the provider call and trends fetch with fixed-latency stubs."""
+    async def fake_openai(prompt, model):
+        await asyncio.sleep(latency)
+        return [{"title": "Stub headline", "keywords": ["stub"], "reason": "Stubbed provider."}]
+
+    def fake_trends(keywords, timeframe='now 7-d'):
+        time.sleep(latency / 10)
+        return []
+
+    main.headline_generator._generate_with_openai = fake_openai
+    main.headline_generator.trends_fetcher.get_trending_topics = fake_trends
+    main.limiter.enabled = False
+
+async def run_level(client: httpx.AsyncClient, concurrency: int) -> float:
+    start = time.perf_counter()
+    responses = await asyncio.gather(*[
+        # Distinct payloads, so requests are neither coalesced nor served from the cache
+        client.post("/generate", json=dict(
+            REQUEST, newsletter_text=f"{REQUEST['newsletter_text']} Issue {concurrency}-{index}.", cache="bypass"
+        ))
+        for index in range(concurrency)
+    ])
+    elapsed = time.perf_counter() - start
+    failed = [r.status_code for r in responses if r.status_code != 200]
+    if failed:
+        raise RuntimeError(f"{len(failed)} requests failed: {failed[:5]}")
+    return elapsed
+
+async def run(latency: float, levels):
+    install_stubs(latency)
+    async with httpx.AsyncClient(app=main.app, base_url="http://bench") as client:
+        print(f"{'concurrency':>12} {'elapsed (s)':>12} {'req/s':>10}")
+        for concurrency in levels:
+            elapsed = await run_level(client, concurrency)
+            print(f"{concurrency:>12} {elapsed:>12.3f} {concurrency / elapsed:>10.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.5, help="Stubbed provider latency in seconds")
+    parser.add_argument("--levels", default="1,10,100,500", help="Comma-separated concurrency levels")
+    args = parser.parse_args()
+    asyncio.run(run(args.latency, [int(level) for level in args.levels.split(",")]))
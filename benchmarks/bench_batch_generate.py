@@ -0,0 +1,125 @@
+"""
+Compare one POST /generate/batch call against N single /generate calls.
+
+Providers and Google Trends are replaced by fixed-latency stubs, and the
+newsletters share a small vocabulary so keyword lookups overlap the way real
+newsletter segments do. Caches are reset between runs and the per-client
+rate limit is disabled; with the default 10/minute limit, N single calls
+would additionally take N/10 minutes.
+
+Usage:
+    python benchmarks/bench_batch_generate.py [--items 200] [--client-concurrency 10]
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+for key in ("OPENAI_API_KEY", "ANTHROPIC_API_KEY", "GOOGLE_API_KEY"):
+    os.environ.setdefault(key, "benchmark")
+os.environ["TRENDS_CACHE_PATH"] = ""
+
+import httpx
+import pandas as pd
+import main
+from trends_cache import TrendsCache
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+VOCABULARY = [
+    "productivity", "automation", "founders", "funding", "marketing", "remote",
+    "hiring", "pricing", "growth", "analytics", "security", "platform"
+]
+
+class StubTrendReq:
+    """Counts upstream payloads and sleeps like a pytrends round-trip."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.requests = 0
+
+    def build_payload(self, kw_list, **kwargs):
+        self.requests += 1
+        self._kw_list = list(kw_list)
+
+    def related_queries(self):
+        time.sleep(self.latency)
+        return {
+            keyword: {"top": pd.DataFrame({"query": [f"{keyword} news"]}), "rising": None}
+            for keyword in self._kw_list
+        }
+
+def make_items(count: int):
+    rng = random.Random(42)
+    return [
+        {
+            "newsletter_text": " ".join(rng.sample(VOCABULARY, 5)) + f" segment {index}",
+            "audience_profile": "Startup founders",
+            "goal": "Increase open rates",
+            "tone": "Professional but friendly"
+        }
+        for index in range(count)
+    ]
+
+def reset(trends_latency: float, provider_latency: float) -> StubTrendReq:
+    async def fake_openai(prompt, model):
+        await asyncio.sleep(provider_latency)
+        return [{"title": "Stub headline", "keywords": ["stub"], "reason": "Stubbed provider."}]
+
+    generator = main.headline_generator
+    stub = StubTrendReq(trends_latency)
+    generator.trends_fetcher.pytrends = stub
+    generator.trends_fetcher.cache = TrendsCache()
+    generator.response_cache.backend.clear()
+    generator._generate_with_openai = fake_openai
+    main.limiter.enabled = False
+    return stub
+
+async def run_single(client, items, client_concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(client_concurrency)
+
+    async def post(item):
+        async with semaphore:
+            response = await client.post("/generate", json=item)
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[post(item) for item in items])
+    return time.perf_counter() - start
+
+async def run_batch(client, items) -> float:
+    start = time.perf_counter()
+    response = await client.post("/generate/batch", json={"items": items})
+    response.raise_for_status()
+    errors = [result["error"] for result in response.json()["results"] if result["error"]]
+    if errors:
+        raise RuntimeError(f"{len(errors)} batch items failed: {errors[:3]}")
+    return time.perf_counter() - start
+
+async def run(args):
+    items = make_items(args.items)
+    main.BATCH_PROVIDER_CONCURRENCY = args.provider_concurrency
+    async with httpx.AsyncClient(app=main.app, base_url="http://bench", timeout=None) as client:
+        print(f"{'mode':>24} {'elapsed (s)':>12} {'trends calls':>13}")
+
+        stub = reset(args.trends_latency, args.provider_latency)
+        elapsed = await run_single(client, items, args.client_concurrency)
+        print(f"{f'{args.items} single calls':>24} {elapsed:>12.3f} {stub.requests:>13}")
+
+        stub = reset(args.trends_latency, args.provider_latency)
+        elapsed = await run_batch(client, items)
+        print(f"{'1 batch call':>24} {elapsed:>12.3f} {stub.requests:>13}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--client-concurrency", type=int, default=10, help="Parallel single calls")
+    parser.add_argument("--provider-concurrency", type=int, default=32, help="Batch LLM calls in flight per provider")
+    parser.add_argument("--provider-latency", type=float, default=0.5, help="Seconds per LLM call")
+    parser.add_argument("--trends-latency", type=float, default=0.3, help="Seconds per trends request")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,110 @@
+"""
+Benchmark the per-tenant headline history at scale.
+
+Fills a history with synthetic subject lines (50k by default), then times
+near-duplicate checks for edited past sends (one word swapped) and for new
+subject lines, and compares them with a brute-force Jaccard scan of the
+plain list for recall. Also reports bulk insert rate, relevance lookups
+and, with --path, the file size and the time to reopen the history.
+
+Usage:
+    python benchmarks/bench_headline_history.py [--entries 50000] [--queries 1000] [--path history.hist]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from headline_history import HeadlineHistory
+from keyword_extractor import tokenize
+
+VOCABULARY = [f"{stem}{suffix}" for stem in (
+    "founder", "remote", "team", "habit", "budget", "launch", "growth", "design", "hiring", "pricing",
+    "market", "product", "garden", "travel", "health", "coffee", "writer", "invest", "startup", "review"
+) for suffix in ("", "s", "ing", "er", "ly", "ed", "ful", "ism", "ize", "ship")]
+
+def synthetic_headline(rng: random.Random) -> str:
+    words = rng.sample(VOCABULARY, rng.randint(6, 10))
+    if rng.random() < 0.5:
+        words.insert(0, str(rng.randint(2, 20)))
+    return " ".join(words).capitalize()
+
+def edit(headline: str, rng: random.Random) -> str:
+    words = headline.split()
+    words[rng.randrange(len(words))] = rng.choice(VOCABULARY)
+    return " ".join(words)
+
+def jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+def percentile(samples: List[float], q: float) -> float:
+    return sorted(samples)[min(len(samples) - 1, int(q * len(samples)))]
+
+def main(args):
+    rng = random.Random(0)
+    if args.path and os.path.exists(args.path):
+        os.remove(args.path)
+    history = HeadlineHistory(max_entries=args.entries, threshold=args.threshold, path=args.path)
+
+    headlines = [synthetic_headline(rng) for _ in range(args.entries)]
+    start = time.perf_counter()
+    added = history.add_many(headlines)
+    elapsed = time.perf_counter() - start
+    print(f"inserted {added} of {len(headlines)} headlines in {elapsed:.1f}s ({added / elapsed:,.0f}/s)")
+
+    edited = [edit(rng.choice(headlines), rng) for _ in range(args.queries)]
+    novel = [synthetic_headline(rng) for _ in range(args.queries)]
+    past_sets = [set(tokenize(headline)) for headline in headlines]
+
+    for name, queries in (("edited past sends", edited), ("new subject lines", novel)):
+        latencies, found = [], []
+        for query in queries:
+            start = time.perf_counter()
+            found.append(history.near_duplicate(query) is not None)
+            latencies.append((time.perf_counter() - start) * 1e6)
+        # Brute force over the plain list: what every check cost before
+        sample = queries[:args.exact_queries]
+        start = time.perf_counter()
+        exact = [
+            max(jaccard(set(tokenize(query)), past) for past in past_sets) >= args.threshold for query in sample
+        ]
+        exact_us = (time.perf_counter() - start) / len(sample) * 1e6
+        true_duplicates = sum(exact)
+        recall = sum(f and e for f, e in zip(found, exact)) / true_duplicates if true_duplicates else 1.0
+        print(
+            f"{name:<18} p50 {statistics.median(latencies):6.1f}us  p99 {percentile(latencies, 0.99):6.1f}us  "
+            f"flagged {sum(found) / len(found):6.1%}  recall {recall:6.1%} "
+            f"(brute force {exact_us / 1000:.1f}ms per check)"
+        )
+
+    terms = [{word: rng.uniform(0.5, 3.0) for word in rng.sample(VOCABULARY, 30)} for _ in range(args.queries)]
+    latencies = []
+    for weights in terms:
+        start = time.perf_counter()
+        history.relevant(weights, 10)
+        latencies.append((time.perf_counter() - start) * 1e6)
+    print(f"relevant top 10    p50 {statistics.median(latencies):6.1f}us  p99 {percentile(latencies, 0.99):6.1f}us")
+
+    if args.path:
+        history.close()
+        start = time.perf_counter()
+        reopened = HeadlineHistory(max_entries=args.entries, threshold=args.threshold, path=args.path)
+        reopened.near_duplicate(novel[0])
+        print(
+            f"file {os.path.getsize(args.path) / 2**20:.1f} MB, reopened and indexed in "
+            f"{(time.perf_counter() - start) * 1000:.0f}ms"
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--exact-queries", type=int, default=50, help="queries checked by brute force for recall")
+    parser.add_argument("--threshold", type=float, default=0.7)
+    parser.add_argument("--path", help="memory-map the history from this file")
+    main(parser.parse_args())
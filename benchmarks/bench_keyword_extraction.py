@@ -0,0 +1,78 @@
+"""
+Micro-benchmark for keyword extraction on large newsletters.
+
+Builds corpus statistics from a synthetic archive, memory-maps them from
+disk, and times KeywordExtractor.extract on a ~100 KB newsletter against the
+original split-and-filter implementation.
+
+Usage:
+    python benchmarks/bench_keyword_extraction.py [--size-kb 100] [--iterations 200]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from keyword_extractor import CorpusStats, KeywordExtractor
+
+def make_vocabulary(rng: random.Random, size: int):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(3, 11))) for _ in range(size)]
+
+def make_document(rng: random.Random, vocabulary, size_bytes: int) -> str:
+    words = []
+    length = 0
+    while length < size_bytes:
+        # Zipf-like draw so a few terms dominate, as in real text
+        word = vocabulary[min(int(rng.paretovariate(1.1)) - 1, len(vocabulary) - 1)]
+        words.append(word + rng.choice(["", "", "", ",", "."]))
+        length += len(words[-1]) + 1
+    return " ".join(words)
+
+def naive_extract(text: str):
+    """The original TrendsFetcher.extract_keywords_from_text."""
+    words = text.lower().split()
+    keywords = [word for word in words if len(word) > 4]
+    common_words = {'about', 'their', 'there', 'would', 'could', 'should', 'which', 'where', 'when'}
+    keywords = [word for word in keywords if word not in common_words]
+    return keywords[:5]
+
+def time_it(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1000
+
+def main(args):
+    rng = random.Random(7)
+    vocabulary = make_vocabulary(rng, 50000)
+    archive = [make_document(rng, vocabulary, 4000) for _ in range(args.archive_docs)]
+    newsletter = make_document(rng, vocabulary, args.size_kb * 1024)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "keyword_stats.bin")
+        start = time.perf_counter()
+        CorpusStats.build(archive).save(path)
+        build_seconds = time.perf_counter() - start
+        stats = CorpusStats.load(path)
+        print(f"corpus stats: {len(stats)} terms, {os.path.getsize(path) / 1024:.0f} KB, built in {build_seconds:.2f}s")
+
+        tfidf = KeywordExtractor(stats)
+        tf_only = KeywordExtractor()
+        print(f"newsletter: {len(newsletter) / 1024:.0f} KB")
+        print(f"{'implementation':>16} {'ms/call':>10}")
+        print(f"{'naive split':>16} {time_it(lambda: naive_extract(newsletter), args.iterations):>10.2f}")
+        print(f"{'tf only':>16} {time_it(lambda: tf_only.extract(newsletter), args.iterations):>10.2f}")
+        print(f"{'tf-idf (mmap)':>16} {time_it(lambda: tfidf.extract(newsletter), args.iterations):>10.2f}")
+        print(f"top keywords: {tfidf.extract(newsletter)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-kb", type=int, default=100)
+    parser.add_argument("--archive-docs", type=int, default=2000)
+    parser.add_argument("--iterations", type=int, default=200)
+    main(parser.parse_args())
@@ -0,0 +1,78 @@
+"""
+Benchmark LLM output parsing on the corpus of real-world malformed outputs.
+
+Compares the previous strategies (bare json.loads for OpenAI, the
+find('[') / rfind(']') slice for Anthropic and Gemini) with the tolerant
+single-pass parser: how many corpus outputs each recovers correctly, and
+parsing throughput on a large well-formed response.
+
+Usage:
+    python benchmarks/bench_llm_json.py [--corpus tests/data/llm_outputs.jsonl] [--repeat 2000]
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from llm_json import parse_headlines
+
+logging.getLogger("llm_json").setLevel(logging.ERROR)
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "..", "tests", "data", "llm_outputs.jsonl")
+
+def parse_bare(text):
+    headlines = json.loads(text)
+    if not isinstance(headlines, list):
+        raise ValueError("Response is not a list of headlines")
+    return headlines
+
+def parse_slice(text):
+    start_idx = text.find('[')
+    end_idx = text.rfind(']') + 1
+    if start_idx == -1 or end_idx == 0:
+        raise ValueError("No JSON array found in response")
+    headlines = json.loads(text[start_idx:end_idx])
+    if not isinstance(headlines, list):
+        raise ValueError("Response is not a list")
+    return headlines
+
+PARSERS = {"json.loads": parse_bare, "find/rfind slice": parse_slice, "parse_headlines": parse_headlines}
+
+def titles(parser, text):
+    try:
+        return [headline["title"] for headline in parser(text)]
+    except Exception:
+        return None
+
+def main(args):
+    with open(args.corpus, encoding="utf-8") as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+
+    print(f"{'parser':>18} {'correct':>8} {'recovered':>10}")
+    for name, parser in PARSERS.items():
+        correct = sum(titles(parser, case["text"]) == case["titles"] for case in corpus)
+        recovered = sum(case["titles"] is not None and titles(parser, case["text"]) == case["titles"] for case in corpus)
+        usable = sum(case["titles"] is not None for case in corpus)
+        print(f"{name:>18} {correct:>5}/{len(corpus):<2} {recovered:>7}/{usable:<2}")
+
+    large = "```json\n" + json.dumps([
+        {"title": f"Headline {index} about [AI] tools", "keywords": ["ai", "tools"], "reason": "Specific."}
+        for index in range(20)
+    ], indent=2) + "\n```"
+    print(f"\nthroughput on a {len(large)} byte response:")
+    for name, parser in (("find/rfind slice", parse_slice), ("parse_headlines", parse_headlines)):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            parser(large)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>18} {elapsed / args.repeat * 1e6:>8.1f} us/response")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--repeat", type=int, default=2000)
+    main(parser.parse_args())
@@ -0,0 +1,340 @@
+"""
+Offline load test of the real API.
+
+Starts the stub provider servers (stub_providers.py) and the app under
+uvicorn (loadtest_app.py, with a fake pytrends backend), points the
+OpenAI/Anthropic/Gemini SDKs at the stubs, then drives concurrent load and
+reports throughput, latency percentiles, errors and resident memory per
+worker. Nothing leaves the machine and no API keys are needed.
+
+Examples:
+    python benchmarks/bench_load.py --concurrency 64 --duration 30
+    python benchmarks/bench_load.py --endpoint stream --providers anthropic --latency 1.5
+    python benchmarks/bench_load.py --workers 4 --error-rate 0.05 --json results.json
+    python benchmarks/bench_load.py --env REQUEST_COALESCING=false --env PROMPT_TOKEN_BUDGET=2000
+"""
+import os
+import sys
+import json
+import time
+import random
+import signal
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+import httpx
+import numpy as np
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from stub_providers import add_arguments, write_certificate
+
+MODELS = {"openai": "gpt-4", "anthropic": "claude-3-sonnet-20240229", "google": "gemini-pro"}
+API_KEY = "loadtest"
+
+WORDS = (
+    "ai agents startups funding founders developer tools remote work productivity privacy chips cloud "
+    "pricing growth hiring security open source models benchmarks launch teams customers revenue data "
+    "design marketing retention onboarding analytics automation infrastructure latency costs"
+).split()
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def newsletter(rng: random.Random, words: int = 300) -> str:
+    sentences = []
+    while sum(len(sentence.split()) for sentence in sentences) < words:
+        sentences.append(" ".join(rng.choice(WORDS) for _ in range(12)).capitalize() + ".")
+    return " ".join(sentences)
+
+def rss_kb(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    try:
+        return int(subprocess.run(["ps", "-o", "rss=", "-p", str(pid)], capture_output=True, text=True).stdout)
+    except ValueError:
+        return None
+
+def worker_pids(pid: int, workers: int) -> List[int]:
+    """uvicorn's worker processes, or the server itself when it runs a single worker in-process."""
+    if workers == 1:
+        return [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            children = [int(child) for child in f.read().split()]
+    except OSError:
+        output = subprocess.run(["pgrep", "-P", str(pid)], capture_output=True, text=True).stdout
+        children = [int(child) for child in output.split()]
+    # Skip helpers such as multiprocessing's resource tracker
+    return [child for child in children if "resource_tracker" not in command_line(child)]
+
+def command_line(pid: int) -> str:
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            return f.read().replace(b"\0", b" ").decode(errors="replace")
+    except OSError:
+        return subprocess.run(["ps", "-o", "command=", "-p", str(pid)], capture_output=True, text=True).stdout
+
+class LoadRecorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.first_event: Dict[str, List[float]] = {}
+        self.statuses: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.peak_rss: Dict[int, int] = {}
+
+    def record(self, label: str, status: int, latency: float, first_event: Optional[float] = None):
+        self.statuses[status] += 1
+        if status != 200:
+            self.errors[label] += 1
+            return
+        self.latencies.setdefault(label, []).append(latency)
+        if first_event is not None:
+            self.first_event.setdefault(label, []).append(first_event)
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {"p50": float(p50) * 1000, "p95": float(p95) * 1000, "p99": float(p99) * 1000}
+
+def build_payload(args: argparse.Namespace, rng: random.Random, provider: str, index: int) -> dict:
+    seed = index % args.unique_payloads if args.unique_payloads else index
+    return {
+        "newsletter_text": newsletter(random.Random(seed), args.newsletter_words),
+        "audience_profile": "Startup founders and engineering leads",
+        "goal": "Increase open rates",
+        "tone": "Professional but friendly",
+        "past_headlines": ["The week in AI tooling", "What founders are building now"],
+        "constraints": {"max_length": 60, "avoid_clickbait": True, "require_numbers": False},
+        "provider": provider,
+        "model": MODELS[provider],
+        "cache": args.cache
+    }
+
+async def send(client: httpx.AsyncClient, args: argparse.Namespace, rng: random.Random, index: int, recorder: LoadRecorder):
+    provider = args.providers[index % len(args.providers)]
+    label = f"{args.endpoint}:{provider}"
+    payload = build_payload(args, rng, provider, index)
+    start = time.perf_counter()
+    first_event = None
+    try:
+        if args.endpoint == "generate":
+            response = await client.post("/generate", json=payload)
+            status = response.status_code
+        elif args.endpoint == "batch":
+            items = [build_payload(args, rng, provider, index * args.batch_size + item) for item in range(args.batch_size)]
+            response = await client.post("/generate/batch", json={"items": items})
+            status = response.status_code
+            if status == 200 and any(result["error"] for result in response.json()["results"]):
+                status = 207
+        else:
+            async with client.stream("POST", "/generate/stream", json=payload) as response:
+                status = response.status_code
+                async for line in response.aiter_lines():
+                    if line == "event: headline" and first_event is None:
+                        first_event = time.perf_counter() - start
+                    elif line == "event: error":
+                        status = 599
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    recorder.record(label, status, time.perf_counter() - start, first_event)
+
+async def drive(args: argparse.Namespace, base_url: str, server_pid: int) -> Dict:
+    recorder = LoadRecorder()
+    warmup = LoadRecorder()
+    counter = iter(range(10 ** 9))
+    rng = random.Random(0)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    headers = {"X-API-Key": API_KEY}
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120, headers=headers) as client:
+        start = time.perf_counter()
+        measure_from = start + args.warmup
+        deadline = measure_from + args.duration
+
+        async def user():
+            while time.perf_counter() < deadline:
+                target = recorder if time.perf_counter() >= measure_from else warmup
+                await send(client, args, rng, next(counter), target)
+
+        async def sample_memory():
+            while time.perf_counter() < deadline:
+                for pid in worker_pids(server_pid, args.workers):
+                    rss = rss_kb(pid)
+                    if rss:
+                        recorder.peak_rss[pid] = max(recorder.peak_rss.get(pid, 0), rss)
+                await asyncio.sleep(0.5)
+
+        await asyncio.gather(sample_memory(), *[user() for _ in range(args.concurrency)])
+        # Requests that started during measurement may finish after the deadline
+        elapsed = time.perf_counter() - measure_from
+        app_stats = (await client.get("/stats")).json()
+
+    completed = sum(recorder.statuses.values())
+    all_latencies = [latency for samples in recorder.latencies.values() for latency in samples]
+    return {
+        "config": {key: value for key, value in vars(args).items() if key != "json"},
+        "requests": completed,
+        "rps": completed / elapsed,
+        "ok_rps": len(all_latencies) / elapsed,
+        "latency_ms": percentiles(all_latencies),
+        "by_label": {
+            label: {
+                "requests": len(recorder.latencies.get(label, [])) + recorder.errors[label],
+                "errors": recorder.errors[label],
+                "latency_ms": percentiles(recorder.latencies.get(label, [])),
+                **({"first_headline_ms": percentiles(recorder.first_event[label])} if label in recorder.first_event else {})
+            }
+            for label in sorted(set(recorder.latencies) | set(recorder.errors))
+        },
+        "statuses": {str(status): count for status, count in recorder.statuses.items()},
+        "peak_rss_mb": {str(pid): rss / 1024 for pid, rss in recorder.peak_rss.items()},
+        "provider_clients": app_stats.get("provider_clients")
+    }
+
+def print_report(result: Dict, idle_rss: Dict[int, int]):
+    latency = result["latency_ms"]
+    print(f"\nrequests {result['requests']}  rps {result['rps']:.1f}  (successful {result['ok_rps']:.1f}/s)")
+    print(f"latency ms  p50 {latency['p50']:.0f}  p95 {latency['p95']:.0f}  p99 {latency['p99']:.0f}")
+    print(f"statuses    {result['statuses']}")
+    print(f"\n{'endpoint:provider':<22} {'requests':>9} {'errors':>7} {'p50':>7} {'p95':>7} {'p99':>7} {'first p50':>10}")
+    for label, stats in result["by_label"].items():
+        first = stats.get("first_headline_ms", {}).get("p50")
+        print(
+            f"{label:<22} {stats['requests']:>9} {stats['errors']:>7} {stats['latency_ms']['p50']:>7.0f}"
+            f" {stats['latency_ms']['p95']:>7.0f} {stats['latency_ms']['p99']:>7.0f}"
+            f" {'-' if first is None else f'{first:.0f}':>10}"
+        )
+    print("\nworker RSS (MB): " + ", ".join(
+        f"pid {pid} idle {idle_rss.get(int(pid), 0) / 1024:.0f} -> peak {peak:.0f}"
+        for pid, peak in result["peak_rss_mb"].items()
+    ))
+
+def wait_for(url: str, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{process.args[1]} exited with status {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1, headers={"X-API-Key": API_KEY}).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+def stop(process: subprocess.Popen):
+    if process.poll() is None:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def start_stubs(args: argparse.Namespace, workdir: str) -> Tuple[subprocess.Popen, Dict[str, str]]:
+    """Start the stub provider servers; returns the process and the app environment pointing at them."""
+    cert_path, _ = write_certificate(workdir)
+    http_port, grpc_port = free_port(), free_port()
+    stub = subprocess.Popen([
+        sys.executable, os.path.join(BENCHMARKS_DIR, "stub_providers.py"),
+        "--http-port", str(http_port), "--grpc-port", str(grpc_port), "--cert-dir", workdir,
+        "--latency", str(args.latency), "--sigma", str(args.sigma),
+        "--error-rate", str(args.error_rate), "--error-status", str(args.error_status)
+    ])
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])),
+        "OPENAI_API_KEY": "loadtest", "ANTHROPIC_API_KEY": "loadtest", "GOOGLE_API_KEY": "loadtest",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{http_port}/v1",
+        "ANTHROPIC_BASE_URL": f"http://127.0.0.1:{http_port}",
+        "GOOGLE_API_ENDPOINT": f"localhost:{grpc_port}",
+        "GRPC_DEFAULT_SSL_ROOTS_FILE_PATH": cert_path,
+        "CLIENT_API_KEYS": json.dumps({API_KEY: {"name": "loadtest", "limit": "1000000/minute"}}),
+        "LOG_LEVEL": "WARNING",
+        "JOB_WORKERS": "0",
+        "JOB_QUEUE_PATH": os.path.join(workdir, "jobs.sqlite3"),
+        "TRENDS_CACHE_PATH": "",
+        "KEYWORD_STATS_PATH": "",
+        "LOADTEST_TRENDS_LATENCY": str(args.trends_latency),
+        "LOADTEST_TRENDS_ERROR_RATE": str(args.trends_error_rate),
+        **dict(setting.split("=", 1) for setting in args.env)
+    }
+    try:
+        wait_for(f"http://127.0.0.1:{http_port}/v1/models", stub)
+    except RuntimeError:
+        stop(stub)
+        raise
+    return stub, env
+
+def main(args: argparse.Namespace):
+    workdir = tempfile.mkdtemp(prefix="headline-loadtest-")
+    stub, env = start_stubs(args, workdir)
+    app_port = free_port()
+    app = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "loadtest_app:app", "--app-dir", BENCHMARKS_DIR,
+        "--host", "127.0.0.1", "--port", str(app_port), "--workers", str(args.workers),
+        "--log-level", "warning", "--no-access-log"
+    ], env=env, cwd=workdir)
+
+    try:
+        base_url = f"http://127.0.0.1:{app_port}"
+        wait_for(f"{base_url}/health", app)
+        # Give every worker time to finish startup (model discovery, trends prefetcher)
+        time.sleep(1 + args.workers * 0.5)
+        idle_rss = {pid: rss_kb(pid) or 0 for pid in worker_pids(app.pid, args.workers)}
+        print(
+            f"{args.workers} worker(s), {args.concurrency} concurrent clients, {args.endpoint} on "
+            f"{','.join(args.providers)}, provider latency {args.latency}s (sigma {args.sigma}), "
+            f"error rate {args.error_rate:.1%}; warmup {args.warmup}s, measuring {args.duration}s"
+        )
+        result = asyncio.run(drive(args, base_url, app.pid))
+        upstream = httpx.get(f"{env['ANTHROPIC_BASE_URL']}/stub/stats").json()
+        result["stub_http"] = upstream
+    finally:
+        stop(app)
+        stop(stub)
+
+    print_report(result, idle_rss)
+    print(f"upstream HTTP stub requests: {result['stub_http']['requests']}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"wrote {args.json}")
+
+def add_load_arguments(parser: argparse.ArgumentParser):
+    """Load shape, stub provider and app environment options, shared with bench_serve.py."""
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent simulated clients")
+    parser.add_argument("--duration", type=float, default=20, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=3, help="unmeasured seconds before measuring")
+    parser.add_argument("--endpoint", choices=["generate", "stream", "batch"], default="generate")
+    parser.add_argument("--providers", type=lambda value: value.split(","), default=["openai", "anthropic", "google"])
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--cache", choices=["prefer", "bypass"], default="bypass")
+    parser.add_argument("--unique-payloads", type=int, default=0,
+                        help="cycle through this many distinct newsletters (0: every request is distinct)")
+    parser.add_argument("--newsletter-words", type=int, default=300)
+    add_arguments(parser)
+    parser.add_argument("--trends-latency", type=float, default=0.3, help="median fake pytrends latency in seconds")
+    parser.add_argument("--trends-error-rate", type=float, default=0.0)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the app (repeatable)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    add_load_arguments(parser)
+    parser.add_argument("--json", help="write the results to this file")
+    main(parser.parse_args())
@@ -0,0 +1,63 @@
+"""
+Benchmark the cost of metrics instrumentation on the request path.
+
+Times stage() with and without a request timing list (one /generate
+request enters about seven stages), counter increments and histogram
+observations, and rendering /metrics with many label series.
+
+Usage:
+    python benchmarks/bench_metrics.py [--iterations 200000] [--series 500]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from metrics import MetricsRegistry, stage, start_request_timings
+
+def per_call_us(function, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+def empty_stage():
+    with stage("bench"):
+        pass
+
+def main(args):
+    registry = MetricsRegistry()
+    counter = registry.counter("bench_total", "Benchmark counter", ("provider", "model"))
+    histogram = registry.histogram("bench_seconds", "Benchmark histogram", ("stage",))
+
+    baseline = per_call_us(lambda: None, args.iterations)
+    print(f"empty call:                    {baseline:.2f} us")
+    print(f"stage(), no request timings:   {per_call_us(empty_stage, args.iterations) - baseline:.2f} us")
+
+    async def in_request():
+        start_request_timings()
+        # Keep the per-request list short, as it is within one real request
+        return per_call_us(lambda: (start_request_timings(), empty_stage()), args.iterations)
+
+    print(f"stage(), inside a request:     {asyncio.run(in_request()) - baseline:.2f} us")
+    print(f"counter.inc():                 {per_call_us(lambda: counter.inc(('openai', 'gpt-4')), args.iterations) - baseline:.2f} us")
+    print(f"histogram.observe():           {per_call_us(lambda: histogram.observe(0.42, ('llm',)), args.iterations) - baseline:.2f} us")
+
+    for index in range(args.series):
+        counter.inc((f"provider{index % 3}", f"model{index}"))
+        histogram.observe(index / 100, (f"stage{index}",))
+    start = time.perf_counter()
+    text = registry.render()
+    print(
+        f"render {2 * args.series} series:          {(time.perf_counter() - start) * 1000:.2f} ms"
+        f" ({len(text) / 1000:.0f} KB)"
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--series", type=int, default=500)
+    main(parser.parse_args())
@@ -0,0 +1,80 @@
+"""
+Benchmark prompt compaction over a corpus of long newsletters.
+
+Reports original vs. compacted input tokens and the time spent compacting,
+per newsletter size. Pass --corpus with .txt/.md files or a .jsonl archive
+(a "text" field per line) to run on real newsletters instead of synthetic ones.
+
+Usage:
+    python benchmarks/bench_prompt_compaction.py [--budget 4000] [--model gpt-4] [--corpus archive/]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from keyword_extractor import KeywordExtractor, create_keyword_extractor, _read_documents
+from prompt_builder import PromptContext, compact_context
+
+TOPICS = [
+    "AI agents", "remote work", "startup funding", "developer tools", "product pricing",
+    "hiring markets", "cloud costs", "security incidents", "open source", "growth marketing"
+]
+TEMPLATES = [
+    "This week {topic} dominated conversations among founders we spoke with.",
+    "We dug into how {topic} is changing the way small teams operate.",
+    "Several readers asked about {topic}, so we collected the best resources.",
+    "Here is a practical checklist for anyone evaluating {topic} this quarter.",
+    "Our data shows {topic} adoption grew steadily over the last six months.",
+    "One surprising finding: {topic} matters most to teams under twenty people.",
+]
+
+def make_newsletter(rng: random.Random, size_kb: int) -> str:
+    sentences = []
+    length = 0
+    while length < size_kb * 1024:
+        sentence = rng.choice(TEMPLATES).format(topic=rng.choice(TOPICS))
+        sentences.append(sentence)
+        length += len(sentence) + 1
+    return " ".join(sentences)
+
+def main(args):
+    rng = random.Random(3)
+    if args.corpus:
+        newsletters = list(_read_documents(args.corpus))
+    else:
+        newsletters = [make_newsletter(rng, size) for size in (5, 20, 50, 100, 200) for _ in range(4)]
+    past_headlines = [f"{rng.choice(TOPICS).title()}: issue #{index}" for index in range(500)]
+    extractor = create_keyword_extractor() if os.getenv("KEYWORD_STATS_PATH") else KeywordExtractor()
+
+    print(f"{'size (KB)':>10} {'original tok':>13} {'compacted tok':>14} {'saved':>7} {'ms':>8}")
+    ratios = []
+    for newsletter in newsletters:
+        context = PromptContext(
+            newsletter_text=newsletter,
+            audience_profile="Startup founders",
+            goal="Increase open rates",
+            tone="Professional but friendly",
+            past_headlines=past_headlines,
+            constraints={"max_length": 60, "avoid_clickbait": True, "require_numbers": False},
+            trending_topics=["ai agents", "remote jobs"]
+        )
+        start = time.perf_counter()
+        _, usage = compact_context(context, args.model, args.budget, extractor)
+        elapsed = (time.perf_counter() - start) * 1000
+        saved = 1 - usage.compacted_input_tokens / usage.original_input_tokens
+        ratios.append(saved)
+        print(f"{len(newsletter) / 1024:>10.0f} {usage.original_input_tokens:>13} "
+              f"{usage.compacted_input_tokens:>14} {saved:>7.0%} {elapsed:>8.1f}")
+    print(f"mean input tokens saved: {statistics.mean(ratios):.0%}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=int, default=4000)
+    parser.add_argument("--model", default="gpt-4")
+    parser.add_argument("--corpus", nargs="*", help="Newsletter files or directories")
+    main(parser.parse_args())
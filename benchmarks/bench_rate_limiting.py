@@ -0,0 +1,83 @@
+"""
+Benchmark adaptive provider rate limiting against a simulated provider.
+
+The simulated provider serves at most --capacity concurrent requests and
+answers 429 beyond that. The same burst is sent through the client registry
+with and without the per-model limiter, reporting throttled responses,
+failures and elapsed time.
+
+Usage:
+    python benchmarks/bench_rate_limiting.py [--requests 300] [--capacity 10] [--latency 0.2]
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from provider_clients import ProviderClientRegistry
+from rate_limiter import ProviderRateLimiter
+
+logging.getLogger().setLevel(logging.ERROR)
+
+class ThrottledError(Exception):
+    status_code = 429
+
+class SimulatedProvider:
+    def __init__(self, capacity: int, latency: float):
+        self.capacity = capacity
+        self.latency = latency
+        self.in_flight = 0
+        self.throttled = 0
+
+    async def complete(self):
+        if self.in_flight >= self.capacity:
+            self.throttled += 1
+            await asyncio.sleep(0.01)
+            raise ThrottledError("429 Too Many Requests")
+        self.in_flight += 1
+        try:
+            await asyncio.sleep(self.latency)
+            return "ok"
+        finally:
+            self.in_flight -= 1
+
+async def run_burst(args, limited: bool):
+    provider = SimulatedProvider(args.capacity, args.latency)
+    registry = ProviderClientRegistry(
+        max_retries=args.retries,
+        backoff_base=0.1,
+        backoff_max=2.0,
+        rate_limiter=ProviderRateLimiter(max_concurrency=64, max_wait=60)
+    )
+    model = "gpt-4" if limited else None
+
+    async def one():
+        try:
+            await registry.call("openai", provider.complete, model=model)
+            return True
+        except Exception:
+            return False
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one() for _ in range(args.requests)))
+    elapsed = time.perf_counter() - start
+    final_limit = registry.rate_limiter.stats().get("openai/gpt-4", {}).get("concurrency_limit", "-")
+    print(f"{'on' if limited else 'off':>8} {provider.throttled:>10} {results.count(False):>8} "
+          f"{elapsed:>12.2f} {final_limit:>14}")
+
+async def main(args):
+    print(f"{'limiter':>8} {'429s':>10} {'failed':>8} {'elapsed (s)':>12} {'final limit':>14}")
+    await run_burst(args, limited=False)
+    await run_burst(args, limited=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--capacity", type=int, default=10, help="Concurrent requests the provider accepts")
+    parser.add_argument("--latency", type=float, default=0.2, help="Simulated provider latency in seconds")
+    parser.add_argument("--retries", type=int, default=4)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,81 @@
+"""
+Benchmark request coalescing for bursts of identical /generate calls.
+
+Fires a burst of identical requests (as internal tools do when a newsletter
+is published) against stubbed providers, with coalescing on and off, and
+reports upstream LLM and trends calls and the burst latency.
+
+Usage:
+    python benchmarks/bench_request_coalescing.py [--latency 0.5] [--burst 50]
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+for key in ("OPENAI_API_KEY", "ANTHROPIC_API_KEY", "GOOGLE_API_KEY"):
+    os.environ.setdefault(key, "benchmark")
+
+import httpx
+import main
+
+logging.getLogger().setLevel(logging.WARNING)
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+REQUEST = {
+    "newsletter_text": "This week we look at AI productivity tools and remote work.",
+    "audience_profile": "Startup founders",
+    "goal": "Increase open rates",
+    "tone": "Professional but friendly",
+    "past_headlines": [],
+    "constraints": {"max_length": 60, "avoid_clickbait": True, "require_numbers": False},
+    # Bypass the response cache so only coalescing can deduplicate work
+    "cache": "bypass"
+}
+
+def install_stubs(latency: float, counts: dict):
+    async def fake_openai(prompt, model):
+        counts["llm"] += 1
+        await asyncio.sleep(latency)
+        return [{"title": "Stub headline", "keywords": ["stub"], "reason": "Stubbed provider."}]
+
+    def fake_trends(keywords, timeframe='now 7-d'):
+        counts["trends"] += 1
+        time.sleep(latency / 10)
+        return []
+
+    main.headline_generator._generate_with_openai = fake_openai
+    main.headline_generator.trends_fetcher.get_trending_topics = fake_trends
+    main.limiter.enabled = False
+
+async def run_burst(client: httpx.AsyncClient, burst: int, round_index: int) -> float:
+    payload = dict(REQUEST, newsletter_text=f"{REQUEST['newsletter_text']} Round {round_index}.")
+    start = time.perf_counter()
+    responses = await asyncio.gather(*[client.post("/generate", json=payload) for _ in range(burst)])
+    elapsed = time.perf_counter() - start
+    failed = [r.status_code for r in responses if r.status_code != 200]
+    if failed:
+        raise RuntimeError(f"{len(failed)} requests failed: {failed[:5]}")
+    return elapsed
+
+async def run(latency: float, burst: int):
+    print(f"{'coalescing':>10} {'llm calls':>10} {'trends calls':>13} {'elapsed (s)':>12}")
+    async with httpx.AsyncClient(app=main.app, base_url="http://bench") as client:
+        for round_index, enabled in enumerate((False, True)):
+            counts = {"llm": 0, "trends": 0}
+            install_stubs(latency, counts)
+            main.headline_generator.request_coalescing = enabled
+            elapsed = await run_burst(client, burst, round_index)
+            print(f"{'on' if enabled else 'off':>10} {counts['llm']:>10} {counts['trends']:>13} {elapsed:>12.3f}")
+    print(f"coalescer: {main.headline_generator.coalescer.stats()}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.5, help="Stubbed provider latency in seconds")
+    parser.add_argument("--burst", type=int, default=50, help="Identical requests per burst")
+    args = parser.parse_args()
+    asyncio.run(run(args.latency, args.burst))
@@ -0,0 +1,138 @@
+"""
+Simulate cost- and latency-aware routing against always using one model.
+
+Replays newsletters of mixed size (most short, some very long) through the
+ModelRouter with a latency SLO. Each simulated model has its own latency
+per prompt token, output quality and error rate, and an outage window in
+which one model fails every call. The router learns all of it from the
+calls it routes, on a simulated clock with requests arriving at --rate per
+second. Reports the share of requests within the SLO, p50/p90
+latency, total estimated cost, mean quality and failed requests per
+strategy, plus the router's own time per decision.
+
+Usage:
+    python benchmarks/bench_routing.py [--requests 5000] [--slo-ms 4000] [--outage openai/gpt-3.5-turbo]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from model_router import ModelRouter
+from provider_clients import DEFAULT_MODEL_PRICES
+
+# provider/model -> (base seconds, seconds per 1k prompt tokens, quality, error rate)
+MODELS: Dict[Tuple[str, str], Tuple[float, float, float, float]] = {
+    ("openai", "gpt-3.5-turbo"): (0.8, 0.35, 0.86, 0.01),
+    ("openai", "gpt-4"): (3.5, 0.9, 0.95, 0.01),
+    ("anthropic", "claude-3-sonnet-20240229"): (1.6, 0.25, 0.93, 0.02),
+    ("anthropic", "claude-3-opus-20240229"): (5.0, 0.6, 0.97, 0.01),
+    ("google", "gemini-pro"): (1.2, 0.3, 0.8, 0.03)
+}
+OUTPUT_TOKENS = 320
+VARIANTS = 8
+
+def prompt_tokens(rng: random.Random) -> int:
+    # Mostly short newsletters, with a long tail up to the prompt budget
+    return min(int(rng.lognormvariate(6.8, 0.8)), 16000)
+
+def call(rng: random.Random, model: Tuple[str, str], tokens: int, failing: bool) -> Optional[float]:
+    """Simulated latency of one call, or None when it fails."""
+    base, per_1k, _, error_rate = MODELS[model]
+    if failing or rng.random() < error_rate:
+        return None
+    return (base + per_1k * tokens / 1000) * rng.lognormvariate(0, 0.25)
+
+def cost(model: Tuple[str, str], tokens: int) -> float:
+    input_price, output_price = DEFAULT_MODEL_PRICES[next(
+        prefix for prefix in sorted(DEFAULT_MODEL_PRICES, key=len, reverse=True) if model[1].startswith(prefix)
+    )]
+    return (tokens * input_price + OUTPUT_TOKENS * output_price) / 1e6
+
+def percentile(samples: List[float], q: float) -> float:
+    return sorted(samples)[min(len(samples) - 1, int(q * len(samples)))]
+
+def simulate(args, strategy: str, sizes: List[int]) -> Dict:
+    rng = random.Random(1)
+    now = 0.0
+    router = ModelRouter(dict(DEFAULT_MODEL_PRICES), window=args.window, clock=lambda: now)
+    outage = tuple(args.outage.split("/", 1)) if args.outage else None
+    latencies, spent, qualities, failed, within_slo, decide_us = [], 0.0, [], 0, 0, []
+    for index, tokens in enumerate(sizes):
+        now = index / args.rate
+        failing_now = args.outage_start <= index / len(sizes) < args.outage_end
+        if strategy == "route":
+            start = time.perf_counter()
+            decision = router.route(list(MODELS), tokens, latency_slo=args.slo_ms / 1000)
+            decide_us.append((time.perf_counter() - start) * 1e6)
+            # Fall back along the ranking, like HeadlineGenerator._generate_routed
+            attempts = [(candidate.provider, candidate.model) for candidate in decision.candidates][:args.max_attempts]
+        else:
+            attempts = [tuple(strategy.split("/", 1))]
+        elapsed, served = 0.0, None
+        for model in attempts:
+            seconds = call(rng, model, tokens, failing_now and model == outage)
+            spent += cost(model, tokens) if seconds is not None else 0.0
+            router.record_call(model[0], model[1], tokens, seconds, OUTPUT_TOKENS)
+            # A failed call still costs the time to the error
+            elapsed += seconds if seconds is not None else 0.5
+            if seconds is not None:
+                served = model
+                break
+        if served is None:
+            failed += 1
+            continue
+        passed = sum(rng.random() < MODELS[served][2] for _ in range(VARIANTS))
+        router.record_quality(served[0], served[1], passed, VARIANTS)
+        qualities.append(passed / VARIANTS)
+        latencies.append(elapsed)
+        within_slo += elapsed <= args.slo_ms / 1000
+    return {
+        "within_slo": within_slo / len(sizes),
+        "p50": percentile(latencies, 0.5),
+        "p90": percentile(latencies, 0.9),
+        "cost": spent,
+        "quality": statistics.mean(qualities),
+        "failed": failed,
+        "decide_us": statistics.median(decide_us) if decide_us else None
+    }
+
+def main(args):
+    rng = random.Random(0)
+    sizes = [prompt_tokens(rng) for _ in range(args.requests)]
+    print(
+        f"{args.requests} requests, prompt tokens p50 {percentile(sizes, 0.5)} p90 {percentile(sizes, 0.9)}, "
+        f"SLO {args.slo_ms} ms"
+        + (f", {args.outage} failing from {args.outage_start:.0%} to {args.outage_end:.0%} of the run"
+           if args.outage else "")
+        + "\n"
+    )
+    print(f"{'strategy':<36} {'in SLO':>7} {'p50 s':>6} {'p90 s':>6} {'cost $':>8} {'quality':>8} {'failed':>7}")
+    strategies = ["route"] + [f"{provider}/{model}" for provider, model in MODELS]
+    for strategy in strategies:
+        result = simulate(args, strategy, sizes)
+        print(
+            f"{strategy:<36} {result['within_slo']:>7.1%} {result['p50']:>6.2f} {result['p90']:>6.2f}"
+            f" {result['cost']:>8.2f} {result['quality']:>8.1%} {result['failed']:>7}"
+        )
+        if result["decide_us"] is not None:
+            routing_us = result["decide_us"]
+    print(f"\nrouting decision p50 {routing_us:.0f}us")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--slo-ms", type=float, default=4000)
+    parser.add_argument("--rate", type=float, default=2.0, help="requests per second")
+    parser.add_argument("--window", type=float, default=300.0, help="seconds of latency and errors the router keeps")
+    parser.add_argument("--max-attempts", type=int, default=3)
+    parser.add_argument("--outage", default="anthropic/claude-3-sonnet-20240229",
+                        help="provider/model that fails every call during the outage ('' for none)")
+    parser.add_argument("--outage-start", type=float, default=0.4, help="fraction of the run")
+    parser.add_argument("--outage-end", type=float, default=0.5, help="fraction of the run")
+    main(parser.parse_args())
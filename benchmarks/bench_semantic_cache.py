@@ -0,0 +1,112 @@
+"""
+Benchmark semantic cache lookups at scale.
+
+Fills an index with synthetic embeddings (1M entries by default), then
+times LSH lookups for perturbed copies of stored vectors (cosine ~0.95, as
+for a lightly edited draft) against an exact brute-force scan, and reports
+recall, insert latency, index memory and the cost of embedding a
+newsletter.
+
+Usage:
+    python benchmarks/bench_semantic_cache.py [--entries 1000000] [--queries 1000] [--path index.bin]
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from semantic_cache import SemanticCache, context_hash, embed_text
+
+CONTEXT = {"audience_profile": "Startup founders", "goal": "Increase open rates", "tone": "Friendly"}
+
+def fill(cache: SemanticCache, entries: int, rng: np.random.Generator, chunk: int = 65536):
+    """Bulk-load random entries, bypassing add() so a 1M-entry index builds in seconds."""
+    for start in range(0, entries, chunk):
+        end = min(start + chunk, entries)
+        block = rng.integers(-127, 128, (end - start, cache.dim), dtype=np.int8)
+        cache.vectors[start:end] = block
+        cache.signatures[start:end] = cache.signature(block)
+    cache.contexts[:entries] = context_hash(CONTEXT)
+    cache.keys[:entries] = rng.integers(0, 256, (entries, 32), dtype=np.uint8)
+    cache.accessed_at[:entries] = time.time()
+    cache.count = entries
+    cache._rebuild()
+
+def perturb(vector: np.ndarray, rng: np.random.Generator, similarity: float) -> np.ndarray:
+    base = vector.astype(np.float32)
+    noise = rng.standard_normal(len(base)).astype(np.float32)
+    noise -= noise @ base / (base @ base) * base
+    noise *= np.linalg.norm(base) / np.linalg.norm(noise) * np.tan(np.arccos(similarity))
+    query = base + noise
+    return np.round(query * (127 / np.abs(query).max())).astype(np.int8)
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q) * 1000)
+
+def main(args):
+    rng = np.random.default_rng(0)
+    cache = SemanticCache(
+        max_entries=args.entries, tables=args.tables, bits=args.bits, probe_bits=args.probe_bits, path=args.path
+    )
+
+    start = time.perf_counter()
+    fill(cache, args.entries, rng)
+    print(f"filled {args.entries} entries in {time.perf_counter() - start:.1f}s")
+    index_bytes = sum(
+        array.nbytes for array in (cache.vectors, cache.contexts, cache.keys, cache.signatures, cache.accessed_at)
+    ) + sum(array.nbytes for array in cache._sorted_slots + cache._sorted_signatures)
+    print(f"index size: {index_bytes / 1e6:.0f} MB ({index_bytes / args.entries:.0f} bytes/entry)")
+
+    targets = rng.integers(0, args.entries, args.queries)
+    queries = [perturb(cache.vectors[target], rng, args.similarity) for target in targets]
+
+    lsh_seconds, found = [], 0
+    for target, query in zip(targets, queries):
+        start = time.perf_counter()
+        slot, _ = cache.search(query, CONTEXT)
+        lsh_seconds.append(time.perf_counter() - start)
+        found += slot == target
+    print(
+        f"LSH lookup:        p50 {percentile_ms(lsh_seconds, 50):.2f} ms  p99 {percentile_ms(lsh_seconds, 99):.2f} ms"
+        f"  recall {found / args.queries:.1%}"
+    )
+
+    stored = np.asarray(cache.vectors[:args.entries])
+    norms = np.linalg.norm(stored.astype(np.float32), axis=1)
+    scan_seconds = []
+    for query in queries[:args.scan_queries]:
+        start = time.perf_counter()
+        similarities = (stored @ query.astype(np.float32)) / norms
+        int(np.argmax(similarities))
+        scan_seconds.append(time.perf_counter() - start)
+    print(f"brute-force scan:  p50 {percentile_ms(scan_seconds, 50):.2f} ms  ({len(scan_seconds)} queries)")
+
+    insert_seconds = []
+    for index in range(args.inserts):
+        text = f"Newsletter draft {index} about founders, funding rounds and developer tooling."
+        start = time.perf_counter()
+        cache.add(text, CONTEXT, f"{index:064x}")
+        insert_seconds.append(time.perf_counter() - start)
+    print(f"insert (full, LRU eviction): p50 {percentile_ms(insert_seconds, 50):.2f} ms  p99 {percentile_ms(insert_seconds, 99):.2f} ms")
+
+    newsletter = " ".join(f"Sentence {index} about startup tooling and topic{index % 50}." for index in range(300))
+    start = time.perf_counter()
+    for index in range(50):
+        embed_text.__wrapped__(newsletter + str(index), cache.dim)
+    print(f"embedding a {len(newsletter.split())}-word newsletter: {(time.perf_counter() - start) / 50 * 1000:.2f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--scan-queries", type=int, default=20)
+    parser.add_argument("--inserts", type=int, default=200)
+    parser.add_argument("--similarity", type=float, default=0.95)
+    parser.add_argument("--tables", type=int, default=16)
+    parser.add_argument("--bits", type=int, default=16)
+    parser.add_argument("--probe-bits", type=int, default=2)
+    parser.add_argument("--path", default=None, help="memory-map the index from this file")
+    main(parser.parse_args())
@@ -0,0 +1,103 @@
+"""
+Throughput scaling of the pre-forking server (serve.py) from 1 to N workers.
+
+Starts the stub providers once, then for each worker count runs serve.py
+with the load-test app (fake pytrends backend) and drives the same load as
+bench_load.py, reporting throughput, latency percentiles and speedup over
+one worker. Provider latency defaults to 50 ms, so the app's own CPU work
+rather than waiting on providers bounds throughput. The stubs and the load
+driver run on the same machine, so scaling flattens before the core count.
+
+With --server uvicorn the same counts run under `uvicorn --workers`, where
+every worker imports and warms up on its own and keeps caches and rate
+limits per process.
+
+Usage:
+    python benchmarks/bench_serve.py [--workers 1 2 4 8] [--concurrency 128] [--duration 15]
+    python benchmarks/bench_serve.py --server uvicorn --providers openai
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from typing import Dict, List
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from bench_load import add_load_arguments, drive, free_port, start_stubs, stop, wait_for
+
+def server_command(server: str, workers: int, port: int) -> List[str]:
+    if server == "serve":
+        return [
+            sys.executable, os.path.join(ROOT, "serve.py"), "--app", "loadtest_app:app", "--app-dir", BENCHMARKS_DIR,
+            "--workers", str(workers), "--host", "127.0.0.1", "--port", str(port),
+            "--log-level", "warning", "--no-access-log"
+        ]
+    return [
+        sys.executable, "-m", "uvicorn", "loadtest_app:app", "--app-dir", BENCHMARKS_DIR,
+        "--workers", str(workers), "--host", "127.0.0.1", "--port", str(port),
+        "--log-level", "warning", "--no-access-log"
+    ]
+
+def measure(args: argparse.Namespace, env: Dict[str, str], workers: int) -> Dict:
+    # A fresh directory per run, so SQLite caches and rate limit counters start empty
+    workdir = tempfile.mkdtemp(prefix=f"headline-serve-{workers}-")
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(server_command(args.server, workers, port), env=env, cwd=workdir)
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        wait_for(f"{base_url}/health", server)
+        ready = time.perf_counter() - start
+        # Let every worker finish startup (model discovery, trends prefetcher)
+        time.sleep(1 + workers * 0.5)
+        run_args = argparse.Namespace(**{**vars(args), "workers": workers})
+        result = asyncio.run(drive(run_args, base_url, server.pid))
+    finally:
+        stop(server)
+    result["ready_s"] = ready
+    return result
+
+def main(args: argparse.Namespace):
+    workdir = tempfile.mkdtemp(prefix="headline-serve-")
+    stub, env = start_stubs(args, workdir)
+    results = []
+    try:
+        print(
+            f"{args.server}: {args.concurrency} concurrent clients, {args.endpoint} on {','.join(args.providers)}, "
+            f"provider latency {args.latency}s; warmup {args.warmup}s, measuring {args.duration}s per worker count\n"
+        )
+        print(f"{'workers':>7} {'ready':>7} {'rps':>8} {'ok rps':>8} {'p50 ms':>7} {'p99 ms':>7} {'speedup':>8} {'errors':>7}")
+        for workers in args.workers:
+            result = measure(args, env, workers)
+            results.append(result)
+            errors = sum(count for status, count in result["statuses"].items() if status != "200")
+            speedup = result["ok_rps"] / results[0]["ok_rps"] if results[0]["ok_rps"] else 0.0
+            print(
+                f"{workers:>7} {result['ready_s']:>6.1f}s {result['rps']:>8.1f} {result['ok_rps']:>8.1f}"
+                f" {result['latency_ms']['p50']:>7.0f} {result['latency_ms']['p99']:>7.0f}"
+                f" {speedup:>7.2f}x {errors:>7}"
+            )
+    finally:
+        stop(stub)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"wrote {args.json}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}), help="worker counts to measure")
+    parser.add_argument("--server", choices=["serve", "uvicorn"], default="serve")
+    add_load_arguments(parser)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.set_defaults(latency=0.05, concurrency=128, duration=15)
+    main(parser.parse_args())
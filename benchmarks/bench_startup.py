@@ -0,0 +1,133 @@
+"""
+Benchmark startup cost per ENABLED_PROVIDERS configuration.
+
+Every measurement runs in a fresh interpreter:
+  import   - `import main` (time and RSS)
+  preload  - importing the enabled provider SDKs afterwards, i.e. what the
+             first request would pay without PRELOAD_ON_STARTUP
+  boot     - a uvicorn worker serving the load-test app (fake trends backend),
+             timed until /health answers, with its RSS once background
+             preloading has settled
+
+Usage:
+    python benchmarks/bench_startup.py [--configs openai anthropic google openai,anthropic,google] [--repeat 3] [--no-boot]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from typing import Dict, List
+import httpx
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCHMARKS_DIR)
+
+from bench_load import free_port, rss_kb, stop
+
+PROBE = """
+import time
+start = time.perf_counter()
+import sys, json, asyncio
+import main
+imported = time.perf_counter()
+def rss_mb():
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith("VmRSS:")) / 1024
+import_rss = rss_mb()
+asyncio.run(main.headline_generator.clients.preload())
+print(json.dumps({
+    "import_s": imported - start,
+    "import_rss_mb": import_rss,
+    "preload_s": time.perf_counter() - imported,
+    "preload_rss_mb": rss_mb()
+}))
+"""
+
+def app_env(providers: str, preload: bool) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "ENABLED_PROVIDERS": providers,
+        "PRELOAD_ON_STARTUP": "true" if preload else "false",
+        "OPENAI_API_KEY": env.get("OPENAI_API_KEY", "bench"),
+        "ANTHROPIC_API_KEY": env.get("ANTHROPIC_API_KEY", "bench"),
+        "GOOGLE_API_KEY": env.get("GOOGLE_API_KEY", "bench"),
+        "TRENDS_CACHE_PATH": "",
+        "JOB_WORKERS": "0",
+        "LOG_LEVEL": "WARNING",
+        "LOADTEST_TRENDS_LATENCY": "0"
+    })
+    return env
+
+def measure_import(providers: str) -> Dict[str, float]:
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=ROOT, env=app_env(providers, False),
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def measure_boot(providers: str, preload: bool, settle: float = 1.0, timeout: float = 60) -> Dict[str, float]:
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "loadtest_app:app", "--app-dir", BENCHMARKS_DIR,
+         "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=app_env(providers, preload), stderr=subprocess.DEVNULL
+    )
+    try:
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with status {process.returncode}")
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.perf_counter() - start > timeout:
+                raise RuntimeError("worker did not come up")
+            time.sleep(0.02)
+        boot = time.perf_counter() - start
+        ready_rss = rss_kb(process.pid) / 1024
+
+        # Background preloading keeps allocating; wait until RSS stops growing
+        last, stable_since = ready_rss, time.perf_counter()
+        while time.perf_counter() - stable_since < settle and time.perf_counter() - start < timeout:
+            time.sleep(0.1)
+            current = rss_kb(process.pid) / 1024
+            if abs(current - last) > 1:
+                last, stable_since = current, time.perf_counter()
+        return {"boot_s": boot, "ready_rss_mb": ready_rss, "settled_rss_mb": last}
+    finally:
+        stop(process)
+
+def median(results: List[Dict[str, float]]) -> Dict[str, float]:
+    return {key: statistics.median(result[key] for result in results) for key in results[0]}
+
+def main(args):
+    print(f"{'providers':<28} {'import':>8} {'RSS':>7} {'preload':>8} {'RSS':>7}")
+    for providers in args.configs:
+        result = median([measure_import(providers) for _ in range(args.repeat)])
+        print(
+            f"{providers:<28} {result['import_s']:>7.2f}s {result['import_rss_mb']:>5.0f}MB"
+            f" {result['preload_s']:>7.2f}s {result['preload_rss_mb']:>5.0f}MB"
+        )
+    if args.no_boot:
+        return
+
+    print(f"\n{'providers':<28} {'preload':>8} {'boot':>8} {'ready RSS':>10} {'settled RSS':>12}")
+    for providers in args.configs:
+        for preload in (False, True):
+            result = median([measure_boot(providers, preload) for _ in range(args.repeat)])
+            print(
+                f"{providers:<28} {'on' if preload else 'off':>8} {result['boot_s']:>7.2f}s"
+                f" {result['ready_rss_mb']:>8.0f}MB {result['settled_rss_mb']:>10.0f}MB"
+            )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--configs", nargs="+", default=["openai", "anthropic", "google", "openai,anthropic,google"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-boot", action="store_true", help="only measure imports")
+    main(parser.parse_args())
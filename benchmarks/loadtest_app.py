@@ -0,0 +1,55 @@
+"""
+ASGI entry point for load tests: the real app, with the pytrends session
+replaced by an in-process fake so no request reaches Google Trends.
+
+The fake's behaviour is read from the environment:
+LOADTEST_TRENDS_LATENCY (median seconds per payload), LOADTEST_TRENDS_SIGMA
+(lognormal shape) and LOADTEST_TRENDS_ERROR_RATE.
+
+Usage (normally started by bench_load.py):
+    uvicorn loadtest_app:app --app-dir benchmarks --workers 2
+"""
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import trends_fetcher
+
+TRENDS_LATENCY = float(os.getenv("LOADTEST_TRENDS_LATENCY", "0.3"))
+TRENDS_SIGMA = float(os.getenv("LOADTEST_TRENDS_SIGMA", "0.3"))
+TRENDS_ERROR_RATE = float(os.getenv("LOADTEST_TRENDS_ERROR_RATE", "0"))
+
+class FakeTrendReq:
+    """Stands in for pytrends' TrendReq: blocking calls with sampled latency and errors."""
+
+    def __init__(self, *args, **kwargs):
+        self.kw_list = []
+
+    def build_payload(self, kw_list, **kwargs):
+        if TRENDS_LATENCY > 0:
+            time.sleep(TRENDS_LATENCY * random.lognormvariate(0, TRENDS_SIGMA))
+        if random.random() < TRENDS_ERROR_RATE:
+            raise RuntimeError("Fake Google Trends error (429)")
+        self.kw_list = list(kw_list)
+
+    def related_queries(self):
+        import pandas as pd
+        return {
+            keyword: {
+                "top": pd.DataFrame({"query": [f"{keyword} news", f"best {keyword}", f"{keyword} 2024"],
+                                     "value": [100, 70, 40]}),
+                "rising": None
+            }
+            for keyword in self.kw_list
+        }
+
+def load_fake_trends(self):
+    if self.pytrends is None:
+        self.pytrends = FakeTrendReq()
+
+trends_fetcher.TrendsFetcher.load = load_fake_trends
+
+from main import app
@@ -0,0 +1,278 @@
+"""
+Local stand-ins for the LLM provider APIs, for offline load testing.
+
+Serves OpenAI-compatible (/v1/chat/completions, /v1/models) and
+Anthropic-compatible (/v1/messages) HTTP endpoints, and the Gemini
+GenerativeService/ModelService over gRPC with TLS (the Gemini SDK only
+talks to secure gRPC endpoints; a throwaway self-signed certificate is
+written next to the key file and must be trusted by the client through
+GRPC_DEFAULT_SSL_ROOTS_FILE_PATH). Normal and streaming responses are
+supported, with lognormally distributed latency and a configurable error
+rate.
+
+Usage:
+    python benchmarks/stub_providers.py [--http-port 9100] [--grpc-port 9101] [--latency 0.8] [--sigma 0.3] [--error-rate 0.01]
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import subprocess
+from typing import AsyncIterator, Dict, List, Tuple
+import grpc
+import uvicorn
+import google.ai.generativelanguage_v1beta as glm
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+OPENAI_MODELS = ["gpt-4", "gpt-4o", "gpt-3.5-turbo"]
+GEMINI_MODELS = ["gemini-pro", "gemini-1.5-flash"]
+
+HEADLINES = [
+    {"title": f"Stub headline {index}: what changed this week", "keywords": ["stub", "load"], "reason": "Specific."}
+    for index in range(5)
+]
+
+class StubBehaviour:
+    """Latency and failure model shared by every stub endpoint."""
+
+    def __init__(
+        self,
+        latency: float = 0.8,
+        sigma: float = 0.3,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        chunks: int = 8
+    ):
+        self.latency = latency
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.chunks = chunks
+        self.requests: Dict[str, int] = {"openai": 0, "anthropic": 0, "google": 0}
+        self.errors: Dict[str, int] = {"openai": 0, "anthropic": 0, "google": 0}
+
+    def sample_latency(self) -> float:
+        """Lognormal latency with the configured median."""
+        return self.latency * random.lognormvariate(0, self.sigma) if self.latency > 0 else 0.0
+
+    def should_fail(self, provider: str) -> bool:
+        self.requests[provider] += 1
+        if random.random() < self.error_rate:
+            self.errors[provider] += 1
+            return True
+        return False
+
+    async def chunked(self, text: str) -> AsyncIterator[str]:
+        """Split `text` into chunks: the first after ~30% of the latency, the rest spread over the remainder."""
+        total = self.sample_latency()
+        size = max(1, len(text) // self.chunks)
+        pieces = [text[start:start + size] for start in range(0, len(text), size)]
+        await asyncio.sleep(total * 0.3)
+        for index, piece in enumerate(pieces):
+            if index:
+                await asyncio.sleep(total * 0.7 / max(1, len(pieces) - 1))
+            yield piece
+
+def estimate_tokens(value) -> int:
+    return max(1, len(json.dumps(value)) // 4)
+
+def sse(data: dict, event: str = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+def create_http_app(behaviour: StubBehaviour) -> FastAPI:
+    app = FastAPI()
+
+    def error(provider: str) -> JSONResponse:
+        body = {"error": {"type": "overloaded_error", "message": "Stub provider error"}}
+        if provider == "anthropic":
+            body["type"] = "error"
+        return JSONResponse(body, status_code=behaviour.error_status, headers={"retry-after": "1"})
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [
+            {"id": model, "object": "model", "created": 0, "owned_by": "stub"} for model in OPENAI_MODELS
+        ]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        if behaviour.should_fail("openai"):
+            await asyncio.sleep(behaviour.sample_latency() * 0.1)
+            return error("openai")
+        json_object = (body.get("response_format") or {}).get("type") == "json_object"
+        content = json.dumps({"headlines": HEADLINES} if json_object else HEADLINES)
+        prompt_tokens = estimate_tokens(body.get("messages"))
+        created = int(time.time())
+
+        if body.get("stream"):
+            async def events():
+                async for piece in behaviour.chunked(content):
+                    yield sse({
+                        "id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": created,
+                        "model": body["model"],
+                        "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]
+                    })
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        await asyncio.sleep(behaviour.sample_latency())
+        return {
+            "id": "chatcmpl-stub", "object": "chat.completion", "created": created, "model": body["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": estimate_tokens(content),
+                "total_tokens": prompt_tokens + estimate_tokens(content)
+            }
+        }
+
+    @app.post("/v1/messages")
+    async def messages(request: Request):
+        body = await request.json()
+        if behaviour.should_fail("anthropic"):
+            await asyncio.sleep(behaviour.sample_latency() * 0.1)
+            return error("anthropic")
+        content = json.dumps(HEADLINES)
+        messages = body.get("messages", [])
+        if messages and messages[-1].get("role") == "assistant":
+            # Continue after the prefilled start of the reply
+            content = content[len(messages[-1]["content"]):]
+        usage = {"input_tokens": estimate_tokens([body.get("system"), messages]), "output_tokens": estimate_tokens(content)}
+        message = {
+            "id": "msg_stub", "type": "message", "role": "assistant", "model": body["model"],
+            "content": [{"type": "text", "text": content}],
+            "stop_reason": "end_turn", "stop_sequence": None, "usage": usage
+        }
+
+        if body.get("stream"):
+            async def events():
+                yield sse({"type": "message_start", "message": {
+                    **message, "content": [], "stop_reason": None, "usage": {**usage, "output_tokens": 1}
+                }}, "message_start")
+                yield sse({"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}},
+                          "content_block_start")
+                async for piece in behaviour.chunked(content):
+                    yield sse({"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": piece}},
+                              "content_block_delta")
+                yield sse({"type": "content_block_stop", "index": 0}, "content_block_stop")
+                yield sse({"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                           "usage": {"output_tokens": usage["output_tokens"]}}, "message_delta")
+                yield sse({"type": "message_stop"}, "message_stop")
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        await asyncio.sleep(behaviour.sample_latency())
+        return message
+
+    @app.get("/stub/stats")
+    async def stats():
+        return {"requests": behaviour.requests, "errors": behaviour.errors}
+
+    return app
+
+def gemini_handler(behaviour: StubBehaviour) -> grpc.GenericRpcHandler:
+    """gRPC handlers for the Gemini v1beta generative and model services."""
+
+    def response(text: str, prompt_tokens: int) -> glm.GenerateContentResponse:
+        return glm.GenerateContentResponse(
+            candidates=[glm.Candidate(
+                content=glm.Content(role="model", parts=[glm.Part(text=text)]),
+                finish_reason=glm.Candidate.FinishReason.STOP,
+                index=0
+            )],
+            usage_metadata=glm.GenerateContentResponse.UsageMetadata(
+                prompt_token_count=prompt_tokens,
+                candidates_token_count=estimate_tokens(text),
+                total_token_count=prompt_tokens + estimate_tokens(text)
+            )
+        )
+
+    def prompt_tokens(request: glm.GenerateContentRequest) -> int:
+        return max(1, sum(len(part.text) for content in request.contents for part in content.parts) // 4)
+
+    async def generate_content(request: glm.GenerateContentRequest, context: grpc.aio.ServicerContext):
+        if behaviour.should_fail("google"):
+            await asyncio.sleep(behaviour.sample_latency() * 0.1)
+            await context.abort(grpc.StatusCode.UNAVAILABLE, "Stub provider error")
+        await asyncio.sleep(behaviour.sample_latency())
+        return response(json.dumps(HEADLINES), prompt_tokens(request))
+
+    async def stream_generate_content(request: glm.GenerateContentRequest, context: grpc.aio.ServicerContext):
+        if behaviour.should_fail("google"):
+            await asyncio.sleep(behaviour.sample_latency() * 0.1)
+            await context.abort(grpc.StatusCode.UNAVAILABLE, "Stub provider error")
+        async for piece in behaviour.chunked(json.dumps(HEADLINES)):
+            yield response(piece, prompt_tokens(request))
+
+    async def list_models(request: glm.ListModelsRequest, context: grpc.aio.ServicerContext):
+        return glm.ListModelsResponse(models=[
+            glm.Model(name=f"models/{model}", supported_generation_methods=["generateContent"])
+            for model in GEMINI_MODELS
+        ])
+
+    def unary(method, request_type, response_type):
+        return grpc.unary_unary_rpc_method_handler(
+            method, request_deserializer=request_type.deserialize, response_serializer=response_type.serialize
+        )
+
+    generative = grpc.method_handlers_generic_handler("google.ai.generativelanguage.v1beta.GenerativeService", {
+        "GenerateContent": unary(generate_content, glm.GenerateContentRequest, glm.GenerateContentResponse),
+        "StreamGenerateContent": grpc.unary_stream_rpc_method_handler(
+            stream_generate_content,
+            request_deserializer=glm.GenerateContentRequest.deserialize,
+            response_serializer=glm.GenerateContentResponse.serialize
+        )
+    })
+    models = grpc.method_handlers_generic_handler("google.ai.generativelanguage.v1beta.ModelService", {
+        "ListModels": unary(list_models, glm.ListModelsRequest, glm.ListModelsResponse)
+    })
+    return generative, models
+
+def write_certificate(directory: str) -> Tuple[str, str]:
+    """Self-signed certificate for localhost, generated with the openssl CLI."""
+    cert_path = os.path.join(directory, "stub_cert.pem")
+    key_path = os.path.join(directory, "stub_key.pem")
+    if not os.path.exists(cert_path):
+        subprocess.run([
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "2",
+            "-keyout", key_path, "-out", cert_path, "-subj", "/CN=localhost",
+            "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1"
+        ], check=True, capture_output=True)
+    return cert_path, key_path
+
+async def serve(behaviour: StubBehaviour, http_port: int, grpc_port: int, cert_dir: str):
+    cert_path, key_path = write_certificate(cert_dir)
+    with open(cert_path, "rb") as cert, open(key_path, "rb") as key:
+        credentials = grpc.ssl_server_credentials([(key.read(), cert.read())])
+    grpc_server = grpc.aio.server(handlers=list(gemini_handler(behaviour)))
+    grpc_server.add_secure_port(f"127.0.0.1:{grpc_port}", credentials)
+    await grpc_server.start()
+
+    config = uvicorn.Config(create_http_app(behaviour), host="127.0.0.1", port=http_port, log_level="warning")
+    try:
+        await uvicorn.Server(config).serve()
+    finally:
+        await grpc_server.stop(grace=1)
+
+def main(args: argparse.Namespace):
+    behaviour = StubBehaviour(args.latency, args.sigma, args.error_rate, args.error_status)
+    print(f"Stub providers: HTTP on 127.0.0.1:{args.http_port}, Gemini gRPC on localhost:{args.grpc_port}", flush=True)
+    asyncio.run(serve(behaviour, args.http_port, args.grpc_port, args.cert_dir))
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", type=float, default=0.8, help="median provider latency in seconds")
+    parser.add_argument("--sigma", type=float, default=0.3, help="lognormal shape of the latency distribution")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of provider calls that fail")
+    parser.add_argument("--error-status", type=int, default=503, help="HTTP status of failed calls")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--http-port", type=int, default=9100)
+    parser.add_argument("--grpc-port", type=int, default=9101)
+    parser.add_argument("--cert-dir", default=".")
+    add_arguments(parser)
+    main(parser.parse_args())
@@ -1,25 +1,116 @@
 import os
 import json
+import time
+import asyncio
 import logging
-from typing import List, Dict, Any
-from openai import OpenAI
-from anthropic import Anthropic
-import google.generativeai as genai
-from prompt_builder import PromptContext, build_prompt
+from contextlib import AsyncExitStack
+from typing import List, Dict, Any, AsyncIterator, Awaitable, Callable, Optional, Tuple
+from prompt_builder import (
+    JSON_OBJECT_INSTRUCTION, Prompt, PromptContext, TokenUsage, build_messages, build_repair_messages,
+    compact_context, count_tokens
+)
+from llm_json import IncrementalJSONArrayParser, coerce_headline, parse_headlines
+from headline_scorer import check_headlines, describe_violations, violations
+from latency_tracker import LatencyTracker
+from provider_clients import create_provider_clients
+from rate_limiter import ProviderRateLimitError
+from request_coalescer import RequestCoalescer
+from log_utils import log_payload
+from metrics import (
+    HEADLINE_REPAIRS, HEADLINE_VIOLATIONS, LLM_DURATION, LLM_REQUESTS, REPAIR_TOKENS_SAVED, ROUTED_REQUESTS, stage
+)
+from model_router import RouteAttempt, RoutingDecision, create_model_router
 from trends_fetcher import TrendsFetcher
+from trends_prefetcher import create_trends_prefetcher
+from response_cache import ResponseCache, create_response_cache
+from semantic_cache import create_semantic_cache
+from headline_history import HeadlineHistory, create_headline_history
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+PROVIDER_API_KEY_ENV = {
+    "openai": "OPENAI_API_KEY",
+    "anthropic": "ANTHROPIC_API_KEY",
+    "google": "GOOGLE_API_KEY"
+}
+
+# Completion token limit for every provider call
+MAX_OUTPUT_TOKENS = 1000
+
+# OpenAI models that accept response_format={"type": "json_object"}
+OPENAI_JSON_MODE_PREFIXES = (
+    "gpt-4o", "gpt-4-turbo", "gpt-4-1106", "gpt-4-0125", "gpt-4.1", "gpt-3.5-turbo", "gpt-5", "o1", "o3", "o4"
+)
+# Gemini 1.0 models reject response_mime_type
+GEMINI_NO_JSON_MODE_PREFIXES = ("gemini-pro", "gemini-1.0")
+# Prefilled start of Claude's reply, so it answers with the array and no preamble
+ANTHROPIC_PREFILL = "["
+
+def parse_hedge_candidates(value: str) -> List[Tuple[str, str]]:
+    """Parse "provider:model,provider:model" into an ordered candidate list."""
+    candidates = []
+    for entry in value.split(","):
+        provider, _, model = entry.strip().partition(":")
+        if provider not in PROVIDER_API_KEY_ENV or not model:
+            raise ValueError(f"Invalid hedge candidate: {entry!r}")
+        candidates.append((provider, model))
+    return candidates
+
 class HeadlineGenerator:
     def __init__(self):
         self.trends_fetcher = TrendsFetcher()
-        self.openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        self.anthropic_client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
-        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+        self.trends_prefetcher = create_trends_prefetcher(self.trends_fetcher)
+        self.clients = create_provider_clients()
+        self.response_cache = create_response_cache()
+        # Near-duplicate newsletters reuse cached responses (None unless SEMANTIC_CACHE=true)
+        self.semantic_cache = create_semantic_cache()
+        # Per-tenant history of sent subject lines (None unless HEADLINE_HISTORY=true)
+        self.headline_history = create_headline_history()
+        self.history_prompt_count = int(os.getenv("HEADLINE_HISTORY_PROMPT_COUNT", "10"))
+        # Hedge delays follow the last HEDGE_LATENCY_WINDOW to twice that many seconds of latencies
+        self.latency_tracker = LatencyTracker(window=float(os.getenv("HEDGE_LATENCY_WINDOW", "300")))
+        self.prompt_token_budget = int(os.getenv("PROMPT_TOKEN_BUDGET", "4000"))
+        # Longer input (newsletter plus past headlines, in characters) is compacted in a thread
+        self.prompt_offload_chars = int(os.getenv("PROMPT_OFFLOAD_CHARS", "2000"))
+        self.anthropic_prompt_caching = os.getenv("ANTHROPIC_PROMPT_CACHING", "true").lower() == "true"
+        self.coalescer = RequestCoalescer()
+        self.request_coalescing = os.getenv("REQUEST_COALESCING", "true").lower() == "true"
+
+        # provider="auto": race configured providers, hedging after the primary's p95
+        self.hedge_candidates = parse_hedge_candidates(os.getenv(
+            "HEDGE_CANDIDATES",
+            "openai:gpt-4,anthropic:claude-3-sonnet-20240229,google:gemini-pro"
+        ))
+        self.hedge_default_delay = float(os.getenv("HEDGE_DEFAULT_DELAY", "3.0"))
+        self.hedge_min_delay = float(os.getenv("HEDGE_MIN_DELAY", "0.5"))
+        self.hedge_max_delay = float(os.getenv("HEDGE_MAX_DELAY", "10.0"))
+        self.hedge_min_samples = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+        self.hedge_stats = {"requests": 0, "backups_fired": 0, "backup_wins": 0}
+
+        # provider="route": pick the model per request for a latency SLO and/or cost budget
+        self.route_candidates = parse_hedge_candidates(os.getenv(
+            "ROUTER_CANDIDATES",
+            "openai:gpt-3.5-turbo,openai:gpt-4,anthropic:claude-3-sonnet-20240229,"
+            "anthropic:claude-3-opus-20240229,google:gemini-pro"
+        ))
+        self.route_max_attempts = int(os.getenv("ROUTER_MAX_ATTEMPTS", "3"))
+        self.router = create_model_router(self.clients.prices)
+        # (provider, model) -> whether the model is served; main.py sets the model catalog's check
+        self.model_filter: Optional[Callable[[str, str], bool]] = None
+
+        # Ask for more variants than are returned and keep the best that meet the
+        # constraints; only when too few do is a small repair call made
+        self.headline_count = int(os.getenv("HEADLINE_COUNT", "5"))
+        self.headline_variants = max(int(os.getenv("HEADLINE_VARIANTS", "8")), self.headline_count)
+        self.headline_repair = os.getenv("HEADLINE_REPAIR", "true").lower() == "true"
+        self.repair_stats = {
+            "checked": 0, "with_violations": 0, "repairs_avoided": 0, "repair_calls": 0,
+            "repaired": 0, "unrepaired": 0, "tokens_saved": 0
+        }
 
-    def generate_headlines(
+    async def generate_headlines(
         self,
         newsletter_text: str,
         audience_profile: str,
@@ -28,150 +119,986 @@ class HeadlineGenerator:
         past_headlines: List[str],
         constraints: Dict[str, Any],
         provider: str = "openai",
-        model: str = "gpt-4"
+        model: str = "gpt-4",
+        cache: str = "prefer",
+        input_token_budget: Optional[int] = None,
+        tenant: Optional[str] = None,
+        latency_slo_ms: Optional[float] = None,
+        max_cost_usd: Optional[float] = None
     ) -> Dict[str, Any]:
         """
         Generate headlines using the specified LLM provider and model.
+
+        With cache="prefer" an identical prompt for the same provider/model is
+        served from the response cache; cache="bypass" skips the lookup but
+        still stores the fresh result.
+
+        Long newsletters and past headlines are compacted so the prompt fits
+        `input_token_budget` tokens (default PROMPT_TOKEN_BUDGET).
+
+        With a `tenant` and HEADLINE_HISTORY enabled, the past headlines are
+        added to the tenant's history, the prompt gets the most relevant
+        prior sends, and near-duplicates of prior sends are never returned.
+
+        The provider calls use the async SDK clients and the blocking pytrends
+        request runs in a worker thread, so the event loop is never blocked.
+
+        Concurrent calls with the same (normalised) arguments are coalesced
+        into one upstream computation whose result every caller receives.
+
+        With provider="route" the model is chosen by the router to meet
+        `latency_slo_ms` and/or `max_cost_usd` (see ModelRouter), with
+        fallback to the next candidate on errors; the result carries the
+        decision under "routing".
         """
+        arguments = {
+            "newsletter_text": newsletter_text,
+            "audience_profile": audience_profile,
+            "goal": goal,
+            "tone": tone,
+            "past_headlines": past_headlines,
+            "constraints": constraints,
+            "provider": provider,
+            "model": model,
+            "cache": cache,
+            "input_token_budget": input_token_budget,
+            "tenant": tenant,
+            "latency_slo_ms": latency_slo_ms,
+            "max_cost_usd": max_cost_usd
+        }
+        return await self._coalesced(arguments, lambda: self._generate_headlines(**arguments))
+
+    async def _coalesced(
+        self,
+        arguments: Dict[str, Any],
+        compute: Callable[[], Awaitable[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        """Run `compute` once for all concurrent requests with the same arguments."""
+        if not self.request_coalescing:
+            return await compute()
+        return await self.coalescer.run(RequestCoalescer.make_key(arguments), compute)
+
+    async def _generate_headlines(
+        self,
+        newsletter_text: str,
+        audience_profile: str,
+        goal: str,
+        tone: str,
+        past_headlines: List[str],
+        constraints: Dict[str, Any],
+        provider: str,
+        model: str,
+        cache: str,
+        input_token_budget: Optional[int],
+        tenant: Optional[str] = None,
+        latency_slo_ms: Optional[float] = None,
+        max_cost_usd: Optional[float] = None
+    ) -> Dict[str, Any]:
         try:
+            # Checked before the trends lookup, which a hit makes unnecessary
+            cached = await self._semantic_cached(
+                newsletter_text, audience_profile, goal, tone, past_headlines, constraints,
+                provider, model, cache, input_token_budget, tenant, latency_slo_ms, max_cost_usd
+            )
+            if cached is not None:
+                return cached
+
             # Extract keywords and get trending topics
-            keywords = self.trends_fetcher.extract_keywords_from_text(newsletter_text)
-            trending_topics = self.trends_fetcher.get_trending_topics(keywords)
-
-            # Build context and prompt
-            context = PromptContext(
-                newsletter_text=newsletter_text,
-                audience_profile=audience_profile,
-                goal=goal,
-                tone=tone,
-                past_headlines=past_headlines,
-                constraints=constraints,
-                trending_topics=trending_topics
+            with stage("keywords"):
+                keywords = self.trends_fetcher.extract_keywords_from_text(newsletter_text)
+            with stage("trends"):
+                trending_topics = await self._get_trending_topics(keywords)
+
+            return await self._generate_from_topics(
+                newsletter_text, audience_profile, goal, tone, past_headlines,
+                constraints, provider, model, cache, input_token_budget, trending_topics, tenant,
+                latency_slo_ms, max_cost_usd
             )
-            prompt = build_prompt(context)
-
-            # Generate headlines based on provider
-            if provider == "openai":
-                headlines = self._generate_with_openai(prompt, model)
-            elif provider == "anthropic":
-                headlines = self._generate_with_anthropic(prompt, model)
-            elif provider == "google":
-                headlines = self._generate_with_google(prompt, model)
-            else:
-                raise ValueError(f"Unsupported provider: {provider}")
-
-            return {
-                "headlines": headlines,
-                "trending_topics": trending_topics
-            }
 
         except Exception as e:
             logger.error(f"Error in generate_headlines: {str(e)}")
             raise
 
-    def _generate_with_openai(self, prompt: str, model: str) -> List[Dict[str, Any]]:
+    async def _semantic_cached(
+        self,
+        newsletter_text: str,
+        audience_profile: str,
+        goal: str,
+        tone: str,
+        past_headlines: List[str],
+        constraints: Dict[str, Any],
+        provider: str,
+        model: str,
+        cache: str,
+        input_token_budget: Optional[int],
+        tenant: Optional[str] = None,
+        latency_slo_ms: Optional[float] = None,
+        max_cost_usd: Optional[float] = None
+    ) -> Optional[Dict[str, Any]]:
+        """The response to a near-identical earlier newsletter, if the semantic cache has one."""
+        if self.semantic_cache is None or cache != "prefer":
+            return None
+        with stage("semantic_cache"):
+            cached = await self._semantic_call(
+                self.semantic_cache.get,
+                newsletter_text,
+                self._semantic_context(
+                    audience_profile, goal, tone, past_headlines, constraints,
+                    provider, model, input_token_budget, tenant, latency_slo_ms, max_cost_usd
+                ),
+                self.response_cache.peek
+            )
+        if cached is None:
+            return None
+        if provider == "route":
+            cached = {**cached, "routing": RoutingDecision(
+                reason="Served from the semantic cache; no model was called",
+                latency_slo_ms=latency_slo_ms,
+                max_cost_usd=max_cost_usd,
+                cached=True
+            ).dict()}
+        return self._without_sent(cached, await self._tenant_history(tenant))
+
+    async def _semantic_call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Call a semantic cache method; in a thread when it or the response cache it reads blocks."""
+        if self.semantic_cache.blocking or self.response_cache.backend.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def generate_headlines_batch(
+        self,
+        items: List[Dict[str, Any]],
+        provider_concurrency: int = 8
+    ) -> List[Any]:
+        """
+        Generate headlines for many newsletters at once.
+
+        Keyword lookups are deduplicated across the whole batch and LLM calls
+        run concurrently, at most `provider_concurrency` per provider; an
+        "auto" or "route" item holds a slot on each provider it may call.
+        Items go through the semantic cache and are coalesced with identical
+        items and concurrent requests, like generate_headlines.
+
+        Args:
+            items: Keyword arguments for generate_headlines, one dict per newsletter
+
+        Returns:
+            One result per item, in order; failed items are returned as the
+            exception that caused them instead of failing the whole batch
+        """
+        keyword_lists = [
+            self.trends_fetcher.extract_keywords_from_text(item["newsletter_text"]) for item in items
+        ]
+        if self.trends_prefetcher.running:
+            await self.trends_prefetcher.get_topics(
+                list(dict.fromkeys(k for keywords in keyword_lists for k in keywords))
+            )
+            topics_per_item = [self.trends_fetcher.get_cached_topics(keywords)[0] for keywords in keyword_lists]
+        else:
+            topics_per_item = await asyncio.to_thread(self.trends_fetcher.get_trending_topics_batch, keyword_lists)
+
+        semaphores: Dict[str, asyncio.Semaphore] = {}
+
+        async def generate_item(item: Dict[str, Any], trending_topics: List[str]) -> Dict[str, Any]:
+            arguments = {
+                "newsletter_text": item["newsletter_text"],
+                "audience_profile": item["audience_profile"],
+                "goal": item["goal"],
+                "tone": item["tone"],
+                "past_headlines": item.get("past_headlines", []),
+                "constraints": item.get("constraints", {}),
+                "provider": item.get("provider", "openai"),
+                "model": item.get("model", "gpt-4"),
+                "cache": item.get("cache", "prefer"),
+                "input_token_budget": item.get("input_token_budget"),
+                "tenant": item.get("tenant"),
+                "latency_slo_ms": item.get("latency_slo_ms"),
+                "max_cost_usd": item.get("max_cost_usd")
+            }
+
+            async def compute() -> Dict[str, Any]:
+                cached = await self._semantic_cached(**arguments)
+                if cached is not None:
+                    return cached
+                async with AsyncExitStack() as slots:
+                    # Sorted, so items sharing providers never wait on each other in a cycle
+                    for provider in self.candidate_providers(arguments["provider"]):
+                        if provider not in semaphores:
+                            semaphores[provider] = asyncio.Semaphore(provider_concurrency)
+                        await slots.enter_async_context(semaphores[provider])
+                    return await self._generate_from_topics(trending_topics=trending_topics, **arguments)
+
+            return await self._coalesced(arguments, compute)
+
+        results = await asyncio.gather(
+            *[generate_item(item, topics) for item, topics in zip(items, topics_per_item)],
+            return_exceptions=True
+        )
+        for index, result in enumerate(results):
+            if isinstance(result, Exception):
+                logger.error(f"Error in batch item {index}: {str(result)}")
+        return results
+
+    async def _generate_from_topics(
+        self,
+        newsletter_text: str,
+        audience_profile: str,
+        goal: str,
+        tone: str,
+        past_headlines: List[str],
+        constraints: Dict[str, Any],
+        provider: str,
+        model: str,
+        cache: str,
+        input_token_budget: Optional[int],
+        trending_topics: List[str],
+        tenant: Optional[str] = None,
+        latency_slo_ms: Optional[float] = None,
+        max_cost_usd: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Build the prompt and call the provider, using the response cache."""
+        history = await self._tenant_history(tenant)
+        prompt_headlines = await self._past_headlines(history, newsletter_text, past_headlines)
+        with stage("prompt"):
+            prompt, token_usage = await self._build_prompt(
+                newsletter_text, audience_profile, goal, tone, prompt_headlines, constraints,
+                trending_topics, provider, model, input_token_budget
+            )
+
+        decision = None
+        if provider == "route":
+            with stage("route"):
+                decision = self.route(token_usage.compacted_input_tokens, latency_slo_ms, max_cost_usd)
+            if cache == "prefer":
+                with stage("cache"):
+                    cached = await self._cached_route(prompt, decision)
+                if cached is not None:
+                    return self._without_sent(cached, history)
+        cache_key = ResponseCache.make_key(prompt.text, provider, model)
+        if cache == "prefer" and decision is None:
+            with stage("cache"):
+                cached = await self.response_cache.run(self.response_cache.get, cache_key)
+            if cached is not None:
+                return self._without_sent(cached, history)
+
+        # Generate headlines based on provider
+        if provider == "auto":
+            headlines, used_provider, used_model = await self._generate_hedged(
+                prompt, token_usage.compacted_input_tokens
+            )
+        elif decision is not None:
+            headlines = await self._generate_routed(prompt, decision)
+            used_provider, used_model = decision.provider, decision.model
+            cache_key = ResponseCache.make_key(prompt.text, used_provider, used_model)
+        else:
+            headlines = await self._call_provider(provider, model, prompt, token_usage.compacted_input_tokens)
+            used_provider, used_model = provider, model
+        headlines = await self._enforce_constraints(
+            headlines, constraints, audience_profile, tone, prompt_headlines, used_provider, used_model, prompt,
+            history=history
+        )
+
+        result = {
+            "headlines": headlines,
+            "trending_topics": trending_topics,
+            "token_usage": token_usage.dict()
+        }
+        await self.response_cache.run(self.response_cache.set, cache_key, result)
+        if self.semantic_cache is not None:
+            await self._semantic_call(
+                self.semantic_cache.add,
+                newsletter_text,
+                self._semantic_context(
+                    audience_profile, goal, tone, past_headlines, constraints, provider, model,
+                    input_token_budget, tenant, latency_slo_ms, max_cost_usd
+                ),
+                cache_key
+            )
+        if decision is not None:
+            # Not cached with the result: a later hit reports its own decision
+            result = {**result, "routing": decision.dict()}
+        return result
+
+    @staticmethod
+    def _semantic_context(
+        audience_profile: str,
+        goal: str,
+        tone: str,
+        past_headlines: List[str],
+        constraints: Dict[str, Any],
+        provider: str,
+        model: str,
+        input_token_budget: Optional[int],
+        tenant: Optional[str] = None,
+        latency_slo_ms: Optional[float] = None,
+        max_cost_usd: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Request fields that must match exactly for a semantic cache hit."""
+        context = {
+            "audience_profile": audience_profile.strip(),
+            "goal": goal.strip(),
+            "tone": tone.strip(),
+            "past_headlines": [headline.strip() for headline in past_headlines],
+            "constraints": constraints,
+            "provider": provider,
+            "model": model,
+            "input_token_budget": input_token_budget,
+            "tenant": tenant
+        }
+        # Only routed requests have these; leaving them out keeps existing entries' keys
+        if latency_slo_ms is not None:
+            context["latency_slo_ms"] = latency_slo_ms
+        if max_cost_usd is not None:
+            context["max_cost_usd"] = max_cost_usd
+        return context
+
+    async def _cached_route(self, prompt: Prompt, decision: RoutingDecision) -> Optional[Dict[str, Any]]:
+        """
+        A cached response from any candidate the request could be routed to
+        (ranked first to last, within the budget), with the decision marked
+        as served from the cache by that candidate.
+        """
+        candidates = [candidate for candidate in decision.candidates if candidate.within_budget]
+        keys = [ResponseCache.make_key(prompt.text, candidate.provider, candidate.model) for candidate in candidates]
+        key, cached = await self.response_cache.run(self.response_cache.get_first, keys)
+        if cached is None:
+            return None
+        candidate = candidates[keys.index(key)]
+        decision.provider, decision.model, decision.cached = candidate.provider, candidate.model, True
+        return {**cached, "routing": decision.dict()}
+
+    async def _tenant_history(self, tenant: Optional[str]) -> Optional[HeadlineHistory]:
+        if tenant is None or self.headline_history is None:
+            return None
+        # Opening a tenant's file builds its indexes; keep that off the event loop
+        return await asyncio.to_thread(self.headline_history.get, tenant)
+
+    async def _past_headlines(
+        self,
+        history: Optional[HeadlineHistory],
+        newsletter_text: str,
+        past_headlines: List[str]
+    ) -> List[str]:
+        """
+        Past headlines for the prompt. With a tenant history, the request's
+        past headlines are recorded there and only the prior sends most
+        relevant to this newsletter go into the prompt.
+        """
+        if history is None:
+            return past_headlines
+
+        def lookup() -> List[str]:
+            history.add_many(past_headlines)
+            term_weights = self.trends_fetcher.keyword_extractor.term_weights(newsletter_text)
+            return history.relevant(term_weights, self.history_prompt_count)
+
+        with stage("history"):
+            return await asyncio.to_thread(lookup)
+
+    @staticmethod
+    def _without_sent(result: Dict[str, Any], history: Optional[HeadlineHistory]) -> Dict[str, Any]:
+        """Drop cached headlines that have been sent since the response was cached."""
+        if history is None:
+            return result
+        headlines = [headline for headline in result["headlines"] if history.near_duplicate(headline["title"]) is None]
+        if len(headlines) == len(result["headlines"]):
+            return result
+        return {**result, "headlines": headlines}
+
+    async def stream_headlines(
+        self,
+        newsletter_text: str,
+        audience_profile: str,
+        goal: str,
+        tone: str,
+        past_headlines: List[str],
+        constraints: Dict[str, Any],
+        provider: str = "openai",
+        model: str = "gpt-4",
+        cache: str = "prefer",
+        input_token_budget: Optional[int] = None,
+        tenant: Optional[str] = None,
+        latency_slo_ms: Optional[float] = None,
+        max_cost_usd: Optional[float] = None
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Generate headlines using the provider's streaming API.
+
+        Yields (event, data) pairs: "trending_topics" first, then one
+        "headline" per object as soon as it is complete in the stream, then
+        "done". The complete result is stored in the response cache.
+
+        With provider="route" the stream comes from the router's first
+        choice (a started stream can't fall back) and "done" carries the
+        routing decision.
+        """
+        with stage("keywords"):
+            keywords = self.trends_fetcher.extract_keywords_from_text(newsletter_text)
+        with stage("trends"):
+            trending_topics = await self._get_trending_topics(keywords)
+        yield "trending_topics", trending_topics
+
+        history = await self._tenant_history(tenant)
+        prompt_headlines = await self._past_headlines(history, newsletter_text, past_headlines)
+        with stage("prompt"):
+            prompt, token_usage = await self._build_prompt(
+                newsletter_text, audience_profile, goal, tone, prompt_headlines, constraints,
+                trending_topics, provider, model, input_token_budget
+            )
+        routing = {}
+        cached = None
+        if provider == "route":
+            with stage("route"):
+                decision = self.route(token_usage.compacted_input_tokens, latency_slo_ms, max_cost_usd)
+            if cache == "prefer":
+                with stage("cache"):
+                    cached = await self._cached_route(prompt, decision)
+            provider, model = decision.provider, decision.model
+            routing = {"routing": decision.dict()}
+        cache_key = ResponseCache.make_key(prompt.text, provider, model)
+        if cache == "prefer" and not routing:
+            with stage("cache"):
+                cached = await self.response_cache.run(self.response_cache.get, cache_key)
+        if cached is not None:
+            cached = self._without_sent(cached, history)
+            for headline in cached["headlines"]:
+                yield "headline", headline
+            yield "done", {"count": len(cached["headlines"]), "token_usage": token_usage.dict(), **routing}
+            return
+
+        if provider == "auto":
+            # Streams can't be hedged once started; stream from the preferred candidate
+            candidates = self.available_hedge_candidates()
+            if not candidates:
+                raise ValueError("No providers with API keys configured for provider 'auto'")
+            provider, model = candidates[0]
+
+        if provider == "openai":
+            chunks = self._stream_with_openai(prompt, model)
+        elif provider == "anthropic":
+            chunks = self._stream_with_anthropic(prompt, model)
+        elif provider == "google":
+            chunks = self._stream_with_google(prompt, model)
+        else:
+            raise ValueError(f"Unsupported provider: {provider}")
+
+        parser = IncrementalJSONArrayParser()
+        headlines = []
+        failing = []
+        async for chunk in chunks:
+            for item in parser.feed(chunk):
+                headline = coerce_headline(item)
+                if headline is None:
+                    continue
+                # Lines breaking a constraint are held back; lines beyond the count are dropped
+                if violations(headline["title"], constraints, history.near_duplicate if history else None):
+                    failing.append(headline)
+                elif len(headlines) < self.headline_count:
+                    headlines.append(headline)
+                    yield "headline", headline
+
+        if not headlines and not failing:
+            raise ValueError("Failed to parse LLM response")
+        if len(headlines) < self.headline_count:
+            extra = await self._enforce_constraints(
+                failing, constraints, audience_profile, tone, prompt_headlines, provider, model, prompt,
+                needed=self.headline_count - len(headlines), best_effort=not headlines, history=history,
+                record_quality=False
+            )
+            for headline in extra:
+                headlines.append(headline)
+                yield "headline", headline
+        await self.response_cache.run(self.response_cache.set, cache_key, {
+            "headlines": headlines,
+            "trending_topics": trending_topics,
+            "token_usage": token_usage.dict()
+        })
+        if routing:
+            decision.attempts.append(RouteAttempt(provider=provider, model=model))
+            ROUTED_REQUESTS.inc((provider, model, "first_choice"))
+            routing = {"routing": decision.dict()}
+        yield "done", {"count": len(headlines), "token_usage": token_usage.dict(), **routing}
+
+    async def preload(self):
+        """
+        Import the enabled provider SDKs and create the pytrends session off
+        the event loop, so the first requests don't pay for either.
+        """
+        await self.clients.preload()
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(self.trends_fetcher.load)
+        except Exception as e:
+            # The first fetch retries; the pytrends session asks Google for a cookie
+            logger.warning(f"Trends client preload failed: {str(e)}")
+            return
+        logger.info(f"Loaded trends client in {time.perf_counter() - start:.2f}s")
+
+    def _available(self, candidates: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        return [
+            (provider, model) for provider, model in candidates
+            if self.clients.is_enabled(provider) and os.getenv(PROVIDER_API_KEY_ENV[provider])
+            and (self.model_filter is None or self.model_filter(provider, model))
+        ]
+
+    def available_hedge_candidates(self) -> List[Tuple[str, str]]:
+        """Hedge candidates whose provider is enabled, has an API key and serves the model."""
+        return self._available(self.hedge_candidates)
+
+    def available_route_candidates(self) -> List[Tuple[str, str]]:
+        """Routing candidates whose provider is enabled, has an API key and serves the model."""
+        return self._available(self.route_candidates)
+
+    def candidate_providers(self, provider: str) -> List[str]:
+        """Providers a request for `provider` may call: every candidate's for "auto" and "route"."""
+        if provider == "auto":
+            candidates = self.available_hedge_candidates()
+        elif provider == "route":
+            candidates = self.available_route_candidates()
+        else:
+            return [provider]
+        return sorted({candidate_provider for candidate_provider, _ in candidates})
+
+    def route(
+        self,
+        prompt_tokens: int,
+        latency_slo_ms: Optional[float] = None,
+        max_cost_usd: Optional[float] = None
+    ) -> RoutingDecision:
+        """Rank the available routing candidates for a prompt of `prompt_tokens` tokens."""
+        candidates = self.available_route_candidates()
+        if not candidates:
+            raise ValueError("No providers with API keys configured for provider 'route'")
+        return self.router.route(
+            candidates,
+            prompt_tokens,
+            latency_slo_ms / 1000 if latency_slo_ms is not None else None,
+            max_cost_usd
+        )
+
+    def hedge_delay(self, provider: str, model: str) -> float:
+        """
+        How long to wait for a provider before firing a backup: its observed
+        p95 latency, or the default delay until enough samples are recorded.
+        """
+        p95 = self.latency_tracker.quantile(provider, model, 0.95, min_samples=self.hedge_min_samples)
+        if p95 is None:
+            return self.hedge_default_delay
+        return min(max(p95, self.hedge_min_delay), self.hedge_max_delay)
+
+    async def _generate_with(self, provider: str, model: str, prompt: Prompt) -> List[Dict[str, Any]]:
+        if provider == "openai":
+            return await self._generate_with_openai(prompt, model)
+        if provider == "anthropic":
+            return await self._generate_with_anthropic(prompt, model)
+        if provider == "google":
+            return await self._generate_with_google(prompt, model)
+        raise ValueError(f"Unsupported provider: {provider}")
+
+    async def _call_provider(
+        self,
+        provider: str,
+        model: str,
+        prompt: Prompt,
+        prompt_tokens: int = 0
+    ) -> List[Dict[str, Any]]:
+        """
+        Call a single provider, recording its latency on success and failures
+        for the router. Waiting too long for our own rate limiter is not the
+        model's failure and is not recorded.
+        """
+        start = time.perf_counter()
+        try:
+            with stage("llm", f"{provider}/{model}"):
+                headlines = await self._generate_with(provider, model, prompt)
+        except ProviderRateLimitError:
+            LLM_REQUESTS.inc((provider, model, "rate_limited"))
+            raise
+        except Exception:
+            LLM_REQUESTS.inc((provider, model, "error"))
+            self.router.record_call(provider, model, prompt_tokens, None)
+            raise
+        elapsed = time.perf_counter() - start
+        LLM_REQUESTS.inc((provider, model, "ok"))
+        LLM_DURATION.observe(elapsed, (provider, model))
+        self.latency_tracker.record(provider, model, elapsed)
+        self.router.record_call(provider, model, prompt_tokens, elapsed, count_tokens(json.dumps(headlines), model))
+        return headlines
+
+    async def _generate_routed(self, prompt: Prompt, decision: RoutingDecision) -> List[Dict[str, Any]]:
+        """
+        Call the routed model and, when it fails, the next ranked candidates
+        that fit the budget, up to route_max_attempts calls. Every attempt is
+        recorded on `decision`, whose provider/model becomes the one that answered.
+        """
+        fallbacks = [candidate for candidate in decision.candidates if candidate.within_budget]
+        last_error: Exception = ValueError("No provider returned headlines")
+        for candidate in fallbacks[:self.route_max_attempts]:
+            try:
+                headlines = await self._call_provider(
+                    candidate.provider, candidate.model, prompt, decision.prompt_tokens
+                )
+            except Exception as e:
+                logger.warning(f"Routed request to {candidate.provider}/{candidate.model} failed: {str(e)}")
+                decision.attempts.append(RouteAttempt(provider=candidate.provider, model=candidate.model, error=str(e)))
+                last_error = e
+                continue
+            decision.attempts.append(RouteAttempt(provider=candidate.provider, model=candidate.model))
+            decision.provider, decision.model = candidate.provider, candidate.model
+            ROUTED_REQUESTS.inc((
+                candidate.provider, candidate.model, "first_choice" if len(decision.attempts) == 1 else "fallback"
+            ))
+            return headlines
+        raise last_error
+
+    async def _enforce_constraints(
+        self,
+        headlines: List[Dict[str, Any]],
+        constraints: Dict[str, Any],
+        audience_profile: str,
+        tone: str,
+        past_headlines: List[str],
+        provider: str,
+        model: str,
+        prompt: Prompt,
+        needed: Optional[int] = None,
+        best_effort: bool = True,
+        history: Optional[HeadlineHistory] = None,
+        record_quality: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Return up to `needed` (default headline_count) headlines that meet the
+        constraints, best scoring first. If too few pass, only the failing
+        ones are sent back in a small repair call rather than regenerating
+        the whole set. With `best_effort`, failing headlines are returned when
+        none can be made to pass, except near-duplicates of the tenant's
+        `history`, which are never returned. With `record_quality`, the
+        share that passed is recorded for the router as the model's quality.
+        """
+        needed = self.headline_count if needed is None else needed
+        near_duplicate = history.near_duplicate if history is not None else None
+        with stage("validate"):
+            passing, failing = check_headlines(headlines, constraints, past_headlines, near_duplicate)
+        self.repair_stats["checked"] += 1
+        if record_quality:
+            self.router.record_quality(provider, model, len(passing), len(headlines))
+        for _, broken in failing:
+            for rule in broken:
+                HEADLINE_VIOLATIONS.inc((rule,))
+        if failing:
+            self.repair_stats["with_violations"] += 1
+
+        missing = needed - len(passing)
+        if failing and missing <= 0:
+            self.repair_stats["repairs_avoided"] += 1
+        elif failing and self.headline_repair:
+            passing += await self._repair_headlines(
+                failing[:missing], constraints, audience_profile, tone, past_headlines, provider, model,
+                regenerate_tokens=count_tokens(prompt.text, model) + count_tokens(json.dumps(headlines), model),
+                near_duplicate=near_duplicate
+            )
+
+        if not passing and best_effort:
+            logger.warning(f"No headline meets the constraints {constraints}; returning the best attempts")
+            return [headline for headline, broken in failing if "near_duplicate" not in broken][:needed]
+        return passing[:needed]
+
+    async def _repair_headlines(
+        self,
+        failing: List[Tuple[Dict[str, Any], List[str]]],
+        constraints: Dict[str, Any],
+        audience_profile: str,
+        tone: str,
+        past_headlines: List[str],
+        provider: str,
+        model: str,
+        regenerate_tokens: int,
+        near_duplicate: Optional[Callable[[str], Optional[str]]] = None
+    ) -> List[Dict[str, Any]]:
+        """Ask the model to rewrite just the failing headlines; returns the rewrites that now pass."""
+        prompt = build_repair_messages(
+            [(headline["title"], describe_violations(headline["title"], broken, constraints))
+             for headline, broken in failing],
+            audience_profile, tone, constraints
+        )
+        self.repair_stats["repair_calls"] += 1
+        try:
+            with stage("repair", f"{provider}/{model}"):
+                rewrites = await self._generate_with(provider, model, prompt)
+        except Exception as e:
+            logger.warning(f"Headline repair failed: {str(e)}")
+            HEADLINE_REPAIRS.inc(("error",), len(failing))
+            self.repair_stats["unrepaired"] += len(failing)
+            return []
+
+        fixed, _ = check_headlines(rewrites, constraints, past_headlines, near_duplicate)
+        fixed = fixed[:len(failing)]
+        HEADLINE_REPAIRS.inc(("fixed",), len(fixed))
+        HEADLINE_REPAIRS.inc(("failed",), len(failing) - len(fixed))
+        self.repair_stats["repaired"] += len(fixed)
+        self.repair_stats["unrepaired"] += len(failing) - len(fixed)
+        repair_tokens = count_tokens(prompt.text, model) + count_tokens(json.dumps(rewrites), model)
+        saved = max(regenerate_tokens - repair_tokens, 0)
+        REPAIR_TOKENS_SAVED.inc((), saved)
+        self.repair_stats["tokens_saved"] += saved
+        return fixed
+
+    async def _generate_hedged(self, prompt: Prompt, prompt_tokens: int = 0) -> Tuple[List[Dict[str, Any]], str, str]:
+        """
+        Send the prompt to the first hedge candidate and, if it has not
+        answered within its hedge delay (or fails), to the next one. The first
+        non-empty headline list wins and the other requests are cancelled.
+
+        Returns:
+            (headlines, provider, model) of the winning request
+        """
+        candidates = self.available_hedge_candidates()
+        if not candidates:
+            raise ValueError("No providers with API keys configured for provider 'auto'")
+
+        self.hedge_stats["requests"] += 1
+        tasks: Dict[asyncio.Task, Tuple[str, str]] = {}
+        launched = 0
+        last_error: Exception = ValueError("No provider returned headlines")
+
+        def launch_next():
+            nonlocal launched
+            provider, model = candidates[launched]
+            if launched > 0:
+                self.hedge_stats["backups_fired"] += 1
+            launched += 1
+            tasks[asyncio.create_task(self._call_provider(provider, model, prompt, prompt_tokens))] = (provider, model)
+
+        launch_next()
+        try:
+            while tasks:
+                timeout = None
+                if launched < len(candidates):
+                    timeout = self.hedge_delay(*candidates[launched - 1])
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    logger.info(f"No response within {timeout:.2f}s, hedging with {candidates[launched]}")
+                    launch_next()
+                    continue
+
+                for task in done:
+                    provider, model = tasks.pop(task)
+                    try:
+                        headlines = task.result()
+                    except Exception as e:
+                        logger.warning(f"Hedged request to {provider}/{model} failed: {str(e)}")
+                        last_error = e
+                        continue
+                    if headlines:
+                        if (provider, model) != candidates[0]:
+                            self.hedge_stats["backup_wins"] += 1
+                        return headlines, provider, model
+
+                # A candidate failed; don't wait out the delay before the next one
+                if launched < len(candidates):
+                    launch_next()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        raise last_error
+
+    async def _build_prompt(
+        self,
+        newsletter_text: str,
+        audience_profile: str,
+        goal: str,
+        tone: str,
+        past_headlines: List[str],
+        constraints: Dict[str, Any],
+        trending_topics: List[str],
+        provider: str,
+        model: str,
+        input_token_budget: Optional[int]
+    ) -> Tuple[Prompt, TokenUsage]:
+        """
+        Build the prompt, compacted to the input token budget of the target
+        model. Compacting and counting tokens for long input takes tens of
+        milliseconds, so it runs in a thread past `prompt_offload_chars`.
+        """
+        context = PromptContext(
+            newsletter_text=newsletter_text,
+            audience_profile=audience_profile,
+            goal=goal,
+            tone=tone,
+            past_headlines=past_headlines,
+            constraints=constraints,
+            trending_topics=trending_topics
+        )
+        if provider in ("auto", "route"):
+            # Count for the preferred candidate; the others tokenize similarly
+            candidates = self.available_hedge_candidates() if provider == "auto" else self.available_route_candidates()
+            model = candidates[0][1] if candidates else "gpt-4"
+        arguments = (
+            context, model, input_token_budget or self.prompt_token_budget, self.trends_fetcher.keyword_extractor
+        )
+        if len(newsletter_text) + sum(len(headline) for headline in past_headlines) > self.prompt_offload_chars:
+            context, token_usage = await asyncio.to_thread(compact_context, *arguments)
+        else:
+            context, token_usage = compact_context(*arguments)
+        return build_messages(context, self.headline_variants), token_usage
+
+    async def _get_trending_topics(self, keywords: List[str]) -> List[str]:
+        """
+        Use the prefetcher's warm cache when it is running (bounded by its
+        deadline); otherwise fall back to a blocking fetch in a worker thread.
+        """
+        if self.trends_prefetcher.running:
+            return await self.trends_prefetcher.get_topics(keywords)
+        return await asyncio.to_thread(self.trends_fetcher.get_trending_topics, keywords)
+
+    def _request_tokens(self, prompt: Prompt, model: str) -> int:
+        """Tokens a call may use against the provider's tokens-per-minute quota."""
+        return count_tokens(prompt.text, model) + MAX_OUTPUT_TOKENS
+
+    def _openai_request(self, prompt: Prompt, model: str) -> Dict[str, Any]:
+        """Messages for OpenAI, in JSON mode when the model supports it."""
+        # OpenAI caches the longest previously seen prefix (>= 1024 tokens) automatically
+        messages = [{"role": "system", "content": prompt.system}]
+        request: Dict[str, Any] = {"messages": messages}
+        if model.startswith(OPENAI_JSON_MODE_PREFIXES):
+            # JSON mode only produces objects, so the list is wrapped in one
+            messages.append({"role": "system", "content": JSON_OBJECT_INSTRUCTION})
+            request["response_format"] = {"type": "json_object"}
+        messages.append({"role": "user", "content": prompt.user})
+        return request
+
+    def _gemini_generation_config(self, model: str) -> Dict[str, Any]:
+        config = {"temperature": 0.7, "max_output_tokens": MAX_OUTPUT_TOKENS}
+        if not model.startswith(GEMINI_NO_JSON_MODE_PREFIXES):
+            config["response_mime_type"] = "application/json"
+        return config
+
+    def _anthropic_request(self, prompt: Prompt) -> Dict[str, Any]:
+        """
+        System and messages for Anthropic, with cache breakpoints after the
+        static instructions and after the per-audience context, and the reply
+        prefilled with the opening bracket of the array.
+        """
+        prefill = {"role": "assistant", "content": ANTHROPIC_PREFILL}
+        if not self.anthropic_prompt_caching:
+            return {"system": prompt.system, "messages": [{"role": "user", "content": prompt.user}, prefill]}
+        return {
+            "system": [{"type": "text", "text": prompt.system, "cache_control": {"type": "ephemeral"}}],
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": prompt.context, "cache_control": {"type": "ephemeral"}},
+                        {"type": "text", "text": prompt.content}
+                    ]
+                },
+                prefill
+            ],
+            "extra_headers": {"anthropic-beta": "prompt-caching-2024-07-31"}
+        }
+
+    async def _generate_with_openai(self, prompt: Prompt, model: str) -> List[Dict[str, Any]]:
         """
         Generate headlines using OpenAI's API.
         """
         try:
-            response = self.openai_client.chat.completions.create(
+            response = await self.clients.call("openai", lambda: self.clients.openai.chat.completions.create(
                 model=model,
-                messages=[
-                    {"role": "system", "content": "You are an expert newsletter headline writer."},
-                    {"role": "user", "content": prompt}
-                ],
                 temperature=0.7,
-                max_tokens=1000
-            )
+                max_tokens=MAX_OUTPUT_TOKENS,
+                **self._openai_request(prompt, model)
+            ), model=model, tokens=self._request_tokens(prompt, model))
             
             # Parse the response
+            self.clients.record_usage("openai", response, model)
             content = response.choices[0].message.content
-            try:
-                headlines = json.loads(content)
-                if not isinstance(headlines, list):
-                    raise ValueError("Response is not a list of headlines")
-                return headlines
-            except json.JSONDecodeError:
-                logger.error(f"Failed to parse OpenAI response: {content}")
-                raise ValueError("Failed to parse LLM response")
+            log_payload(logger, "openai_response", model=model, content=content)
+            with stage("parse"):
+                return parse_headlines(content)
 
         except Exception as e:
             logger.error(f"OpenAI API error: {str(e)}")
             raise
 
-    def _generate_with_anthropic(self, prompt: str, model: str = "claude-3-opus-20240229") -> List[Dict[str, Any]]:
+    async def _stream_with_openai(self, prompt: Prompt, model: str) -> AsyncIterator[str]:
+        """Stream completion text from OpenAI's API."""
+        stream = await self.clients.call("openai", lambda: self.clients.openai.chat.completions.create(
+            model=model,
+            temperature=0.7,
+            max_tokens=MAX_OUTPUT_TOKENS,
+            stream=True,
+            **self._openai_request(prompt, model)
+        ), model=model, tokens=self._request_tokens(prompt, model))
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def _generate_with_anthropic(self, prompt: Prompt, model: str = "claude-3-opus-20240229") -> List[Dict[str, Any]]:
         """Generate headlines using Anthropic's Claude model."""
         try:
-            response = self.anthropic_client.messages.create(
+            response = await self.clients.call("anthropic", lambda: self.clients.anthropic.messages.create(
                 model=model,
-                max_tokens=1000,
+                max_tokens=MAX_OUTPUT_TOKENS,
                 temperature=0.7,
-                system="You are a professional headline generator. Generate headlines in JSON format.",
-                messages=[{"role": "user", "content": prompt}]
-            )
-            content = response.content[0].text
-            logger.info(f"Raw Claude response: {content}")
-            
-            # Extract JSON array from response
-            start_idx = content.find('[')
-            end_idx = content.rfind(']') + 1
-            if start_idx == -1 or end_idx == 0:
-                raise ValueError("No JSON array found in response")
-            
-            json_str = content[start_idx:end_idx]
-            headlines = json.loads(json_str)
-            
-            if not isinstance(headlines, list):
-                raise ValueError("Response is not a list")
-            
-            return headlines
+                **self._anthropic_request(prompt)
+            ), model=model, tokens=self._request_tokens(prompt, model))
+            self.clients.record_usage("anthropic", response, model)
+            content = ANTHROPIC_PREFILL + response.content[0].text
+            log_payload(logger, "anthropic_response", model=model, content=content)
+            with stage("parse"):
+                return parse_headlines(content)
         except Exception as e:
             logger.error(f"Anthropic API error: {str(e)}")
             raise 
 
-    def _generate_with_google(self, prompt: str, model: str = "gemini-pro") -> List[Dict[str, Any]]:
+    async def _stream_with_anthropic(self, prompt: Prompt, model: str) -> AsyncIterator[str]:
+        """Stream completion text from Anthropic's Claude model."""
+        stream = await self.clients.call("anthropic", lambda: self.clients.anthropic.messages.create(
+            model=model,
+            max_tokens=MAX_OUTPUT_TOKENS,
+            temperature=0.7,
+            stream=True,
+            **self._anthropic_request(prompt)
+        ), model=model, tokens=self._request_tokens(prompt, model))
+        yield ANTHROPIC_PREFILL
+        async for event in stream:
+            if event.type == "message_start":
+                self.clients.record_usage("anthropic", event.message, model)
+            elif event.type == "message_delta":
+                # Carries the final output token count
+                self.clients.record_usage("anthropic", event, model)
+            elif event.type == "content_block_delta":
+                yield event.delta.text
+
+    async def _generate_with_google(self, prompt: Prompt, model: str = "gemini-pro") -> List[Dict[str, Any]]:
         """Generate headlines using Google's Gemini model."""
         try:
-            logger.info("Listing available models:")
-            for m in genai.list_models():
-                logger.info(f"Model: {m.name}")
-            
-            logger.info(f"Initializing Google Gemini model: {model}")
-            model = genai.GenerativeModel(model)
-            logger.info("Model initialized successfully")
-            
-            logger.info("Generating content with prompt")
-            response = model.generate_content(
-                f"""You are a professional headline generator. Generate headlines in JSON format.
-                {prompt}""",
-                generation_config={
-                    "temperature": 0.7,
-                    "max_output_tokens": 1000,
-                }
-            )
-            logger.info("Content generated successfully")
+            gemini_model = self.clients.gemini_model(model)
+            response = await self.clients.call("google", lambda: gemini_model.generate_content_async(
+                prompt.text,
+                generation_config=self._gemini_generation_config(model),
+                request_options=self.clients.request_options("google")
+            ), model=model, tokens=self._request_tokens(prompt, model))
             
+            self.clients.record_usage("google", response, model)
             content = response.text
-            logger.info(f"Raw Gemini response: {content}")
-            
-            # Extract JSON array from response
-            start_idx = content.find('[')
-            end_idx = content.rfind(']') + 1
-            if start_idx == -1 or end_idx == 0:
-                logger.error("No JSON array found in response")
-                raise ValueError("No JSON array found in response")
-            
-            json_str = content[start_idx:end_idx]
-            logger.info(f"Extracted JSON string: {json_str}")
-            
-            headlines = json.loads(json_str)
-            logger.info(f"Parsed headlines: {headlines}")
-            
-            if not isinstance(headlines, list):
-                logger.error("Response is not a list")
-                raise ValueError("Response is not a list")
-            
-            return headlines
+            log_payload(logger, "gemini_response", model=model, content=content)
+            with stage("parse"):
+                return parse_headlines(content)
         except Exception as e:
             logger.error(f"Google API error: {str(e)}")
-            raise 
\ No newline at end of file
+            raise 
+
+    async def _stream_with_google(self, prompt: Prompt, model: str) -> AsyncIterator[str]:
+        """Stream completion text from Google's Gemini model."""
+        gemini_model = self.clients.gemini_model(model)
+        response = await self.clients.call("google", lambda: gemini_model.generate_content_async(
+            prompt.text,
+            generation_config=self._gemini_generation_config(model),
+            stream=True,
+            request_options=self.clients.request_options("google")
+        ), model=model, tokens=self._request_tokens(prompt, model))
+        async for chunk in response:
+            yield chunk.text
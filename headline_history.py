@@ -0,0 +1,455 @@
+import os
+import re
+import time
+import zlib
+import struct
+import fcntl
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+from keyword_extractor import tokenize
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+HISTORY_MAGIC = b"HLHIST01"
+# magic, capacity, permutations, bands, tokens per entry, title bytes, seed
+HISTORY_HEADER = struct.Struct("<8sQIIIIQ")
+
+# Newsletter terms used to rank past headlines by relevance
+MAX_QUERY_TERMS = 32
+
+def word_hashes(text: str, limit: int) -> np.ndarray:
+    """Sorted distinct crc32 hashes of the words of a subject line, at most `limit` of them."""
+    words = set(tokenize(text))
+    hashes = np.fromiter((zlib.crc32(word.encode("utf-8")) for word in words), dtype=np.uint32, count=len(words))
+    return np.sort(hashes)[:limit]
+
+def tenant_filename(tenant: str) -> str:
+    """File name for a tenant's history: readable, filesystem-safe and collision-free."""
+    readable = re.sub(r"[^A-Za-z0-9_.-]+", "_", tenant)[:64]
+    digest = hashlib.blake2b(tenant.encode("utf-8"), digest_size=4).hexdigest()
+    return f"{readable}-{digest}.hist"
+
+class HeadlineHistory:
+    """
+    Subject lines a sender has already used, indexed for near-duplicate
+    checks and relevance lookups.
+
+    Each entry keeps the hashes of its distinct words, a MinHash signature
+    of that word set, the title and when it was sent, in fixed-size arrays
+    (in memory, or memory-mapped from `path` so the history survives
+    restarts). Near-duplicates are found with banded LSH: the signature is
+    cut into `bands` bands, a band hash selects candidates through one
+    sorted index, and candidates are confirmed by exact Jaccard similarity
+    of the word sets. Relevance lookups go through an inverted index from
+    word hashes to entries. Entries added since the last rebuild are kept
+    in small dict indexes. Once full, the oldest entry is replaced.
+
+    A history file may be shared by several processes (API and job
+    workers): every operation holds an flock on it, and a process rebuilds
+    its indexes when the file's version shows another process wrote to it.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 50000,
+        threshold: float = 0.7,
+        permutations: int = 64,
+        bands: int = 16,
+        max_tokens: int = 24,
+        title_bytes: int = 128,
+        path: Optional[str] = None,
+        seed: int = 0
+    ):
+        if permutations % bands:
+            raise ValueError("MinHash permutations must be a multiple of the LSH bands")
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.permutations = permutations
+        self.bands = bands
+        self.max_tokens = max_tokens
+        self.title_bytes = title_bytes
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+        self._closed = False
+        self._maps: List[np.memmap] = []
+
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hashes h(x) = ((a * x + b) mod 2**64) >> 32 stand in for permutations
+        self._a = rng.integers(1, 1 << 63, permutations, dtype=np.uint64)[:, None] | np.uint64(1)
+        self._b = rng.integers(0, 1 << 63, permutations, dtype=np.uint64)[:, None]
+        # Rows of a band are mixed into one 64-bit key; a per-band salt lets all bands share one index
+        self._row_mix = rng.integers(1, 1 << 63, permutations // bands, dtype=np.uint64) | np.uint64(1)
+        self._band_salt = rng.integers(0, 1 << 63, bands, dtype=np.uint64)
+
+        if path:
+            self._open(path, seed)
+        else:
+            self.signatures = np.zeros((max_entries, permutations), dtype=np.uint32)
+            self.tokens = np.zeros((max_entries, max_tokens), dtype=np.uint32)
+            self.token_counts = np.zeros(max_entries, dtype=np.uint8)
+            self.titles = np.zeros(max_entries, dtype=f"S{title_bytes}")
+            self.sent_at = np.zeros(max_entries, dtype=np.float64)
+            self.meta = np.zeros(2, dtype=np.uint64)
+        # Slots are filled in order; meta holds [slots used, write version].
+        # A file's count and indexes are read by its first operation, under the lock.
+        self.count = 0
+        self._version = -1 if path else 0
+
+        self._band_index: Tuple[np.ndarray, np.ndarray] = (np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.int32))
+        self._word_index: Tuple[np.ndarray, np.ndarray] = (np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.int32))
+        self._pending_bands: Dict[int, List[int]] = {}
+        self._pending_words: Dict[int, List[int]] = {}
+        self._pending = 0
+        self._rebuild()
+
+        self.checks = 0
+        self.duplicates = 0
+        self.evictions = 0
+        self.check_seconds = 0.0
+
+    def _open(self, path: str, seed: int):
+        header = HISTORY_HEADER.pack(
+            HISTORY_MAGIC, self.max_entries, self.permutations, self.bands, self.max_tokens, self.title_bytes, seed
+        )
+        shapes = [
+            ("meta", np.uint64, (2,)),
+            ("signatures", np.uint32, (self.max_entries, self.permutations)),
+            ("tokens", np.uint32, (self.max_entries, self.max_tokens)),
+            ("token_counts", np.uint8, (self.max_entries,)),
+            ("titles", np.dtype(f"S{self.title_bytes}"), (self.max_entries,)),
+            ("sent_at", np.float64, (self.max_entries,))
+        ]
+        offsets = []
+        offset = HISTORY_HEADER.size
+        for _, dtype, shape in shapes:
+            # 8-byte aligned so each array can be viewed in place
+            offset = (offset + 7) // 8 * 8
+            offsets.append(offset)
+            offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+
+        try:
+            # Exclusive create, so a process opening the file concurrently never truncates it
+            with open(path, "xb") as f:
+                f.write(header)
+                f.truncate(offset)
+        except FileExistsError:
+            with open(path, "rb") as f:
+                existing = f.read(HISTORY_HEADER.size)
+            if existing[:8] != HISTORY_MAGIC:
+                raise ValueError(f"{path} is not a headline history")
+            if existing != header:
+                raise ValueError(f"{path} was built with different headline history settings")
+
+        for (name, dtype, shape), array_offset in zip(shapes, offsets):
+            mapped = np.memmap(path, dtype=dtype, mode="r+", offset=array_offset, shape=shape)
+            self._maps.append(mapped)
+            # Plain ndarray views of the mapping; indexing the memmap subclass is about twice as slow
+            setattr(self, name, np.asarray(mapped))
+        self._file = open(path, "rb")
+        self._pid = os.getpid()
+
+    @contextmanager
+    def _locked(self, exclusive: bool = False) -> Iterator[None]:
+        """Hold the thread lock and, for a file, an flock; pick up other processes' writes."""
+        with self._lock:
+            if self._closed:
+                # The arrays may still be mapped, but without the file there is no flock to take
+                raise ValueError("Headline history is closed")
+            if self._file is None:
+                yield
+                return
+            if self._pid != os.getpid():
+                # flocks belong to the open file, which a forked child shares with its parent
+                self._file = open(self.path, "rb")
+                self._pid = os.getpid()
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                if int(self.meta[1]) != self._version:
+                    self.count = int(self.meta[0])
+                    self._version = int(self.meta[1])
+                    self._rebuild()
+                yield
+            finally:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+    def minhash(self, hashes: np.ndarray) -> np.ndarray:
+        """MinHash signature of a set of word hashes."""
+        values = (self._a * hashes.astype(np.uint64) + self._b) >> np.uint64(32)
+        return values.min(axis=1).astype(np.uint32)
+
+    def band_keys(self, signatures: np.ndarray) -> np.ndarray:
+        """
+        Salted 32-bit LSH key of every band of a signature (or each row of a
+        matrix). Key collisions only add candidates, which the exact check
+        discards, and halve the index against 64-bit keys.
+        """
+        rows = signatures.reshape(*signatures.shape[:-1], self.bands, self.permutations // self.bands).astype(np.uint64)
+        mixed = (rows * self._row_mix).sum(axis=-1, dtype=np.uint64) ^ self._band_salt
+        return (mixed >> np.uint64(32)).astype(np.uint32)
+
+    def _rebuild(self):
+        """Re-sort the band and word indexes over all live entries."""
+        live = np.flatnonzero(self.sent_at[:self.count] > 0).astype(np.int32)
+
+        keys = self.band_keys(self.signatures[live]).ravel()
+        owners = np.repeat(live, self.bands)
+        order = np.argsort(keys, kind="stable")
+        self._band_index = (keys[order], owners[order])
+
+        counts = self.token_counts[live].astype(np.int64)
+        words = self.tokens[live][np.arange(self.max_tokens) < counts[:, None]]
+        owners = np.repeat(live, counts)
+        order = np.argsort(words, kind="stable")
+        self._word_index = (words[order], owners[order])
+
+        self._pending_bands = {}
+        self._pending_words = {}
+        self._pending = 0
+
+    @staticmethod
+    def _lookup(index: Tuple[np.ndarray, np.ndarray], pending: Dict[int, List[int]], keys: np.ndarray) -> List[np.ndarray]:
+        sorted_keys, owners = index
+        starts = np.searchsorted(sorted_keys, keys, side="left")
+        ends = np.searchsorted(sorted_keys, keys, side="right")
+        found = [owners[start:end] for start, end in zip(starts, ends) if end > start]
+        found.extend(np.array(pending[key], dtype=np.int32) for key in keys.tolist() if key in pending)
+        return found
+
+    def _similarities(self, hashes: np.ndarray, slots: np.ndarray) -> np.ndarray:
+        """Exact Jaccard similarity between a word set and the stored entries."""
+        counts = self.token_counts[slots].astype(np.int64)
+        # Both sides are sets, so matching pairs count the common words
+        common = (self.tokens[slots][:, :, None] == hashes).sum(axis=(1, 2))
+        if hashes[0] == 0:
+            # Zero-padding after each entry's words matched a word hashing to 0
+            common -= self.max_tokens - counts
+        return common / np.maximum(counts + len(hashes) - common, 1)
+
+    def _best_match(self, hashes: np.ndarray, signature: np.ndarray) -> Tuple[int, float]:
+        # Sorted needles let searchsorted narrow each search from the previous one
+        found = self._lookup(self._band_index, self._pending_bands, np.sort(self.band_keys(signature)))
+        if not found:
+            return -1, 0.0
+        candidates = np.unique(np.concatenate(found))
+        # Index entries of replaced slots may be stale; the exact check uses current contents
+        candidates = candidates[self.sent_at[candidates] > 0]
+        if not len(candidates):
+            return -1, 0.0
+        similarities = self._similarities(hashes, candidates)
+        best = int(np.argmax(similarities))
+        return int(candidates[best]), float(similarities[best])
+
+    def near_duplicate(self, title: str) -> Optional[str]:
+        """The most similar past subject line if its similarity reaches the threshold, else None."""
+        start = time.perf_counter()
+        hashes = word_hashes(title, self.max_tokens)
+        match = None
+        if len(hashes):
+            signature = self.minhash(hashes)
+            with self._locked():
+                slot, similarity = self._best_match(hashes, signature)
+                if slot >= 0 and similarity >= self.threshold:
+                    match = self._title(slot)
+        self.checks += 1
+        if match is not None:
+            self.duplicates += 1
+        self.check_seconds += time.perf_counter() - start
+        return match
+
+    def _title(self, slot: int) -> str:
+        return bytes(self.titles[slot]).decode("utf-8", errors="ignore")
+
+    def add(self, title: str, sent_at: Optional[float] = None) -> bool:
+        """
+        Record a sent subject line (sent now unless `sent_at` is given).
+        Returns False when the history already holds one with the same words;
+        its send time is then only moved forward by a later `sent_at`.
+        """
+        hashes = word_hashes(title, self.max_tokens)
+        if not len(hashes):
+            return False
+        signature = self.minhash(hashes)
+        with self._locked(exclusive=True):
+            slot, similarity = self._best_match(hashes, signature)
+            if slot >= 0 and similarity >= 1.0:
+                if sent_at is not None:
+                    self.sent_at[slot] = max(self.sent_at[slot], sent_at)
+                return False
+
+            if self.count < self.max_entries:
+                slot = self.count
+                self.count += 1
+            else:
+                slot = int(np.argmin(self.sent_at[:self.count]))
+                self.evictions += 1
+            self.signatures[slot] = signature
+            self.tokens[slot, :len(hashes)] = hashes
+            self.tokens[slot, len(hashes):] = 0
+            self.token_counts[slot] = len(hashes)
+            self.titles[slot] = title.strip().encode("utf-8")[:self.title_bytes]
+            self.sent_at[slot] = sent_at or time.time()
+            self._version += 1
+            self.meta[:] = (self.count, self._version)
+
+            for key in self.band_keys(signature).tolist():
+                self._pending_bands.setdefault(key, []).append(slot)
+            for word in hashes.tolist():
+                self._pending_words.setdefault(word, []).append(slot)
+            self._pending += 1
+            if self._pending > max(1024, self.count // 8):
+                self._rebuild()
+        return True
+
+    def add_many(self, titles: Iterable[str], sent_at: Optional[float] = None) -> int:
+        """Record several sent subject lines; returns how many were new."""
+        return sum(self.add(title, sent_at) for title in titles)
+
+    def relevant(self, term_weights: Dict[str, float], top_k: int = 10) -> List[str]:
+        """
+        Past subject lines sharing the most weighted terms with a newsletter
+        (see KeywordExtractor.term_weights), most recent first among equals.
+        """
+        if not term_weights or top_k <= 0:
+            return []
+        terms = sorted(term_weights.items(), key=lambda item: -item[1])[:MAX_QUERY_TERMS]
+        hashes = np.fromiter((zlib.crc32(term.encode("utf-8")) for term, _ in terms), dtype=np.uint32, count=len(terms))
+        weights = np.fromiter((weight for _, weight in terms), dtype=np.float64, count=len(terms))
+
+        with self._locked():
+            sorted_words, owners = self._word_index
+            starts = np.searchsorted(sorted_words, hashes, side="left")
+            ends = np.searchsorted(sorted_words, hashes, side="right")
+            slots = [owners[start:end] for start, end in zip(starts, ends)]
+            for index, word in enumerate(hashes.tolist()):
+                if word in self._pending_words:
+                    slots[index] = np.concatenate([slots[index], np.array(self._pending_words[word], dtype=np.int32)])
+            lengths = [len(found) for found in slots]
+            if not sum(lengths):
+                return []
+            scores = np.bincount(np.concatenate(slots), weights=np.repeat(weights, lengths), minlength=self.count)
+            leaders = min(top_k * 4, len(scores))
+            candidates = np.argpartition(-scores, leaders - 1)[:leaders]
+
+            # Rescore the leaders from their current words, since replaced slots leave stale postings
+            candidates = candidates[(scores[candidates] > 0) & (self.sent_at[candidates] > 0)]
+            counts = self.token_counts[candidates].astype(np.int64)
+            stored = self.tokens[candidates]
+            matches = (stored[:, :, None] == hashes) & (np.arange(self.max_tokens) < counts[:, None])[:, :, None]
+            scores = matches.any(axis=1) @ weights
+            order = np.lexsort((-self.sent_at[candidates], -scores))
+            return [self._title(int(candidates[index])) for index in order[:top_k] if scores[index] > 0]
+
+    def __len__(self) -> int:
+        with self._locked():
+            return int(np.count_nonzero(self.sent_at[:self.count]))
+
+    def flush(self):
+        """Write a memory-mapped history to disk."""
+        if self._file is not None:
+            with self._locked():
+                for mapped in self._maps:
+                    mapped.flush()
+
+    def close(self):
+        """Flush a memory-mapped history and release its file; it can't be used afterwards."""
+        if self._file is not None:
+            self.flush()
+            with self._lock:
+                self._closed = True
+                self._file.close()
+                self._file = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self),
+            "max_entries": self.max_entries,
+            "checks": self.checks,
+            "duplicates": self.duplicates,
+            "evictions": self.evictions,
+            "avg_check_us": self.check_seconds / self.checks * 1e6 if self.checks else 0.0
+        }
+
+class HeadlineHistoryStore:
+    """
+    Headline histories by tenant, opened on first use. With a `directory`
+    each tenant's history is a memory-mapped file there; without one,
+    histories live in memory. At most `max_open` are kept: beyond that the
+    least recently used is flushed and dropped, which loses an in-memory
+    history. A dropped history is not closed, since a request may still be
+    using it; its file and mapping are released with the last reference.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_open: int = 64, **settings: Any):
+        self.directory = directory
+        self.max_open = max_open
+        self.settings = settings
+        self.threshold = settings.get("threshold", 0.7)
+        self._histories: "OrderedDict[str, HeadlineHistory]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted_tenants = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self, tenant: str) -> HeadlineHistory:
+        with self._lock:
+            history = self._histories.get(tenant)
+            if history is not None:
+                self._histories.move_to_end(tenant)
+                return history
+            path = os.path.join(self.directory, tenant_filename(tenant)) if self.directory else None
+            history = HeadlineHistory(path=path, **self.settings)
+            self._histories[tenant] = history
+            evicted = None
+            if len(self._histories) > self.max_open:
+                evicted_tenant, evicted = self._histories.popitem(last=False)
+                self.evicted_tenants += 1
+                if not self.directory:
+                    logger.warning(f"Dropped the in-memory headline history of {evicted_tenant}")
+        if evicted is not None:
+            evicted.flush()
+        return history
+
+    def flush(self):
+        with self._lock:
+            histories = list(self._histories.values())
+        for history in histories:
+            history.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            histories = list(self._histories.values())
+        checks = sum(history.checks for history in histories)
+        return {
+            "open_tenants": len(histories),
+            "max_open": self.max_open,
+            "evicted_tenants": self.evicted_tenants,
+            "entries": sum(len(history) for history in histories),
+            "threshold": self.threshold,
+            "checks": checks,
+            "duplicates": sum(history.duplicates for history in histories),
+            "evictions": sum(history.evictions for history in histories),
+            "avg_check_us": sum(history.check_seconds for history in histories) / checks * 1e6 if checks else 0.0
+        }
+
+def create_headline_history() -> Optional[HeadlineHistoryStore]:
+    """
+    Build the per-tenant headline history when HEADLINE_HISTORY=true, from
+    HEADLINE_HISTORY_DIR (one memory-mapped file per tenant; in memory when
+    unset), HEADLINE_HISTORY_MAX_TENANTS, HEADLINE_HISTORY_MAX_ENTRIES and
+    HEADLINE_HISTORY_THRESHOLD.
+    """
+    if os.getenv("HEADLINE_HISTORY", "false").lower() != "true":
+        return None
+    return HeadlineHistoryStore(
+        directory=os.getenv("HEADLINE_HISTORY_DIR") or None,
+        max_open=int(os.getenv("HEADLINE_HISTORY_MAX_TENANTS", "64")),
+        max_entries=int(os.getenv("HEADLINE_HISTORY_MAX_ENTRIES", "50000")),
+        threshold=float(os.getenv("HEADLINE_HISTORY_THRESHOLD", "0.7"))
+    )
@@ -0,0 +1,119 @@
+import re
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Sequence, Tuple
+from keyword_extractor import tokenize
+
+# Defaults of the request's Constraints model, for callers that pass a partial dict
+DEFAULT_CONSTRAINTS = {"max_length": 60, "avoid_clickbait": True, "require_numbers": False}
+
+# Subject lines around this length read best and are not cut off on mobile
+IDEAL_LENGTH = 45
+
+# Score weights; they sum to 1
+LENGTH_WEIGHT = 0.3
+NUMBER_WEIGHT = 0.15
+CLICKBAIT_WEIGHT = 0.25
+NOVELTY_WEIGHT = 0.3
+
+CLICKBAIT_PHRASES = re.compile(
+    r"\b(?:you won'?t believe|won'?t believe|shocking|this one (?:trick|thing)|what happens next|"
+    r"blow your mind|mind[- ]blowing|jaw[- ]dropping|doctors hate|insane|unbelievable|you need to see|"
+    r"can'?t believe|gone wrong|secret (?:they|nobody)|nobody (?:tells|talks)|will change your life|"
+    r"act now|last chance|click here|must[- ]see|100% free|miracle)\b",
+    re.IGNORECASE
+)
+EXCESSIVE_PUNCTUATION = re.compile(r"[!?]{2,}")
+SHOUTING = re.compile(r"\b[A-Z]{4,}\b")
+DIGIT = re.compile(r"\d")
+
+def clickbait_signals(title: str) -> int:
+    """Count clickbait markers: lexicon phrases, "!!"/"?!" runs and shouting."""
+    # A single all-caps word is usually an acronym (HTML, NASA); two or more is shouting
+    return (
+        len(CLICKBAIT_PHRASES.findall(title))
+        + len(EXCESSIVE_PUNCTUATION.findall(title))
+        + (len(SHOUTING.findall(title)) >= 2)
+    )
+
+def violations(
+    title: str,
+    constraints: Dict[str, Any],
+    near_duplicate: Optional[Callable[[str], Optional[str]]] = None
+) -> List[str]:
+    """
+    Names of the constraints a subject line breaks (max_length,
+    require_numbers, avoid_clickbait, and near_duplicate when a
+    `near_duplicate` lookup finds it among past sends).
+    """
+    constraints = {**DEFAULT_CONSTRAINTS, **constraints}
+    broken = []
+    if len(title) > constraints["max_length"]:
+        broken.append("max_length")
+    if constraints["require_numbers"] and not DIGIT.search(title):
+        broken.append("require_numbers")
+    if constraints["avoid_clickbait"] and clickbait_signals(title):
+        broken.append("avoid_clickbait")
+    if near_duplicate is not None and near_duplicate(title) is not None:
+        broken.append("near_duplicate")
+    return broken
+
+def describe_violations(title: str, broken: Sequence[str], constraints: Dict[str, Any]) -> str:
+    """Human-readable reasons, for the repair prompt."""
+    constraints = {**DEFAULT_CONSTRAINTS, **constraints}
+    reasons = {
+        "max_length": f"{len(title)} characters, over the {constraints['max_length']} character limit",
+        "require_numbers": "contains no number",
+        "avoid_clickbait": "reads as clickbait",
+        "near_duplicate": "repeats a subject line that was already sent"
+    }
+    return "; ".join(reasons[rule] for rule in broken)
+
+def token_set(text: str) -> FrozenSet[str]:
+    return frozenset(tokenize(text))
+
+def max_similarity(tokens: FrozenSet[str], past: Sequence[FrozenSet[str]]) -> float:
+    """Highest Jaccard similarity between a subject line and any past one."""
+    best = 0.0
+    for other in past:
+        union = len(tokens | other)
+        if union:
+            best = max(best, len(tokens & other) / union)
+    return best
+
+def score_headline(title: str, constraints: Dict[str, Any], past: Sequence[FrozenSet[str]] = ()) -> float:
+    """
+    Heuristic quality score in [0, 1]: closeness to the ideal length, a
+    number in the line, absence of clickbait markers and novelty against
+    past subject lines.
+    """
+    max_length = {**DEFAULT_CONSTRAINTS, **constraints}["max_length"]
+    ideal = min(IDEAL_LENGTH, max_length)
+    length_score = max(0.0, 1.0 - abs(len(title) - ideal) / ideal)
+    number_score = 1.0 if DIGIT.search(title) else 0.0
+    clickbait_score = max(0.0, 1.0 - clickbait_signals(title) / 2)
+    novelty = 1.0 - max_similarity(token_set(title), past)
+    return (
+        LENGTH_WEIGHT * length_score
+        + NUMBER_WEIGHT * number_score
+        + CLICKBAIT_WEIGHT * clickbait_score
+        + NOVELTY_WEIGHT * novelty
+    )
+
+def check_headlines(
+    headlines: List[Dict[str, Any]],
+    constraints: Dict[str, Any],
+    past_headlines: Sequence[str] = (),
+    near_duplicate: Optional[Callable[[str], Optional[str]]] = None
+) -> Tuple[List[Dict[str, Any]], List[Tuple[Dict[str, Any], List[str]]]]:
+    """
+    Split headlines into those meeting the constraints, ranked best first,
+    and (headline, broken constraints) pairs, also ranked best first.
+    """
+    past = [token_set(headline) for headline in past_headlines]
+    passing, failing = [], []
+    for headline in headlines:
+        broken = violations(headline["title"], constraints, near_duplicate)
+        entry = (score_headline(headline["title"], constraints, past), headline, broken)
+        (failing if broken else passing).append(entry)
+    passing.sort(key=lambda entry: -entry[0])
+    failing.sort(key=lambda entry: -entry[0])
+    return [headline for _, headline, _ in passing], [(headline, broken) for _, headline, broken in failing]
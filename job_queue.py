@@ -0,0 +1,511 @@
+import os
+import json
+import time
+import uuid
+import random
+import socket
+import asyncio
+import sqlite3
+import ipaddress
+import logging
+import threading
+import multiprocessing
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+import httpx
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PRIORITIES = {"low": 0, "normal": 1, "high": 2}
+
+# Attempts before a job whose worker died is marked failed
+MAX_ATTEMPTS = 3
+
+class QueueFullError(Exception):
+    """Raised by enqueue() when the number of pending jobs is at the limit."""
+
+class WebhookURLError(ValueError):
+    """Raised by check_webhook_url() for a webhook target the API must not call."""
+
+def webhook_allowed_hosts() -> List[str]:
+    """Hosts from WEBHOOK_ALLOWED_HOSTS ("hooks.example.com,.example.org"); empty allows any public host."""
+    return [host.strip().lower() for host in os.getenv("WEBHOOK_ALLOWED_HOSTS", "").split(",") if host.strip()]
+
+def webhook_allowed_ports() -> List[int]:
+    """Ports from WEBHOOK_ALLOWED_PORTS (default "80,443")."""
+    return [int(port) for port in os.getenv("WEBHOOK_ALLOWED_PORTS", "80,443").split(",") if port.strip()]
+
+def check_webhook_url(
+    url: str,
+    allowed_hosts: Optional[List[str]] = None,
+    allowed_ports: Optional[List[int]] = None
+) -> Optional[str]:
+    """
+    Reject webhook URLs that would make the API call into its own network.
+
+    The port must be in the allowed ports (80 and 443 by default). With a
+    host allowlist, the host must match an entry exactly or, for entries
+    starting with ".", be a subdomain of it. Without one, every address the
+    host resolves to must be public: loopback, private, link-local (which
+    includes the 169.254.169.254 metadata service), multicast and reserved
+    addresses are refused. Resolves DNS, so call it off the event loop.
+
+    Returns:
+        The checked address to connect to, so a second DNS lookup can't
+        return another one; None for an allowlisted host
+
+    Raises:
+        WebhookURLError: If the URL must not be called
+    """
+    allowed_hosts = webhook_allowed_hosts() if allowed_hosts is None else allowed_hosts
+    allowed_ports = webhook_allowed_ports() if allowed_ports is None else allowed_ports
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if parts.scheme not in ("http", "https") or not host:
+        raise WebhookURLError("Webhook URL must be an http(s) URL with a host")
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+    except ValueError:
+        raise WebhookURLError("Webhook URL has an invalid port")
+    if port not in allowed_ports:
+        raise WebhookURLError(f"Webhook port {port} is not in WEBHOOK_ALLOWED_PORTS")
+    if allowed_hosts:
+        if not any(host == entry or (entry.startswith(".") and host.endswith(entry)) for entry in allowed_hosts):
+            raise WebhookURLError(f"Webhook host {host} is not in WEBHOOK_ALLOWED_HOSTS")
+        return None
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, UnicodeError):
+        raise WebhookURLError(f"Webhook host {host} does not resolve")
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split("%", 1)[0])
+        if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        if not ip.is_global or ip.is_multicast:
+            raise WebhookURLError(f"Webhook host {host} resolves to a non-public address ({ip})")
+    return sorted(addresses)[0]
+
+def pin_webhook_url(url: str, address: str) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+    """
+    The URL with its host replaced by `address`, plus the Host header and
+    the TLS server name (httpx request extension) of the original host, so
+    the request goes to the checked address and still verifies its certificate.
+    """
+    parts = urlsplit(url)
+    userinfo, _, host_port = parts.netloc.rpartition("@")
+    pinned = f"[{address}]" if ":" in address else address
+    if parts.port:
+        pinned = f"{pinned}:{parts.port}"
+    if userinfo:
+        pinned = f"{userinfo}@{pinned}"
+    extensions = {"sni_hostname": parts.hostname} if parts.scheme == "https" else {}
+    return urlunsplit(parts._replace(netloc=pinned)), {"Host": host_port}, extensions
+
+def parse_provider_caps(value: str) -> Dict[str, int]:
+    """
+    Parse "8" (every provider) or "openai:8,anthropic:4" into caps keyed by
+    provider, with "*" holding the default for unlisted providers.
+    """
+    caps = {"*": 8}
+    for entry in value.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        provider, _, cap = entry.rpartition(":")
+        caps[provider or "*"] = int(cap)
+    return caps
+
+class JobQueue:
+    """
+    Durable job queue in SQLite, shared by the API and the worker processes.
+
+    Jobs are claimed highest priority first, then oldest first, inside an
+    IMMEDIATE transaction, so concurrent workers never claim the same job and
+    per-provider caps on running jobs hold across processes. A job counts
+    against every provider it may call, so "auto" and "route" jobs take a
+    slot under each of their candidates' caps.
+    """
+
+    def __init__(self, path: str = "jobs.sqlite3", max_pending: int = 1000):
+        self.path = path
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._connect()
+
+    def _connect(self):
+        self._pid = os.getpid()
+        self._connection = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                priority INTEGER NOT NULL,
+                provider TEXT NOT NULL,
+                providers TEXT,
+                payload TEXT NOT NULL,
+                webhook_url TEXT,
+                webhook_status TEXT,
+                result TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                worker TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            )"""
+        )
+        if "providers" not in {row[1] for row in self._connection.execute("PRAGMA table_info(jobs)")}:
+            # Queue files from before per-candidate caps; another process may be migrating too
+            try:
+                self._connection.execute("ALTER TABLE jobs ADD COLUMN providers TEXT")
+            except sqlite3.OperationalError as e:
+                if "duplicate column" not in str(e):
+                    raise
+            self._connection.execute("UPDATE jobs SET providers = ',' || provider || ',' WHERE providers IS NULL")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (status, priority DESC, created_at)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS jobs_finished_at ON jobs (finished_at)")
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        if self._pid != os.getpid():
+            # A connection must not be used across fork(); a pre-forked API worker opens its own
+            self._connect()
+        return self._connection
+
+    def enqueue(
+        self,
+        payload: Dict[str, Any],
+        priority: str = "normal",
+        webhook_url: Optional[str] = None,
+        providers: Optional[List[str]] = None
+    ) -> str:
+        """
+        Add a job and return its id.
+
+        Args:
+            payload: Keyword arguments for HeadlineGenerator.generate_headlines
+            providers: Providers the job may call, whose caps it counts against
+                (default: the payload's provider)
+
+        Raises:
+            QueueFullError: If max_pending jobs are already queued
+        """
+        job_id = uuid.uuid4().hex
+        providers = providers or [payload.get("provider", "openai")]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                pending = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+                if pending >= self.max_pending:
+                    raise QueueFullError(f"Job queue is full ({pending} pending)")
+                self._conn.execute(
+                    """INSERT INTO jobs (id, status, priority, provider, providers, payload, webhook_url, created_at)
+                    VALUES (?, 'queued', ?, ?, ?, ?, ?, ?)""",
+                    (job_id, PRIORITIES[priority], payload.get("provider", "openai"),
+                     f",{','.join(providers)},", json.dumps(payload), webhook_url, time.time())
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return job_id
+
+    def claim(self, worker: str, provider_caps: Dict[str, int]) -> Optional[Dict[str, Any]]:
+        """Mark the next runnable job as running and return it, or None if there is none."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                saturated = [
+                    provider for provider, count in self._running_by_provider().items()
+                    if count >= provider_caps.get(provider, provider_caps.get("*", 8))
+                ]
+                # A job is runnable only if none of the providers it may call is saturated
+                blocked = "".join(" AND providers NOT LIKE ?" for _ in saturated)
+                row = self._conn.execute(
+                    f"""SELECT id, provider, payload, webhook_url FROM jobs
+                    WHERE status = 'queued'{blocked}
+                    ORDER BY priority DESC, created_at LIMIT 1""",
+                    [f"%,{provider},%" for provider in saturated]
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        """UPDATE jobs SET status = 'running', started_at = ?, worker = ?,
+                        attempts = attempts + 1 WHERE id = ?""",
+                        (time.time(), worker, row[0])
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return {"id": row[0], "provider": row[1], "payload": json.loads(row[2]), "webhook_url": row[3]}
+
+    def _running_by_provider(self) -> Dict[str, int]:
+        running: Dict[str, int] = {}
+        for providers, count in self._conn.execute(
+            "SELECT providers, COUNT(*) FROM jobs WHERE status = 'running' GROUP BY providers"
+        ):
+            for provider in providers.strip(",").split(","):
+                running[provider] = running.get(provider, 0) + count
+        return running
+
+    def _finish(self, job_id: str, status: str, result: Optional[str], error: Optional[str]):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, result, error, time.time(), job_id)
+            )
+
+    def complete(self, job_id: str, result: Dict[str, Any]):
+        self._finish(job_id, "succeeded", json.dumps(result), None)
+
+    def fail(self, job_id: str, error: str):
+        self._finish(job_id, "failed", None, error)
+
+    def set_webhook_status(self, job_id: str, status: str):
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET webhook_status = ? WHERE id = ?", (status, job_id))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                """SELECT id, status, priority, provider, result, error, webhook_status,
+                created_at, started_at, finished_at FROM jobs WHERE id = ?""",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        priority = next(name for name, value in PRIORITIES.items() if value == row[2])
+        return {
+            "id": row[0],
+            "status": row[1],
+            "priority": priority,
+            "provider": row[3],
+            "result": json.loads(row[4]) if row[4] else None,
+            "error": row[5],
+            "webhook_status": row[6],
+            "created_at": row[7],
+            "started_at": row[8],
+            "finished_at": row[9]
+        }
+
+    def recover(self, timeout: float) -> int:
+        """
+        Requeue jobs that have been running for longer than `timeout` (their
+        worker died), failing those that have used up their attempts.
+        """
+        cutoff = time.time() - timeout
+        with self._lock:
+            self._conn.execute(
+                """UPDATE jobs SET status = 'failed', error = 'Worker lost', finished_at = ?
+                WHERE status = 'running' AND started_at < ? AND attempts >= ?""",
+                (time.time(), cutoff, MAX_ATTEMPTS)
+            )
+            return self._conn.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL WHERE status = 'running' AND started_at < ?",
+                (cutoff,)
+            ).rowcount
+
+    def purge(self, older_than: float) -> int:
+        """Delete finished jobs older than `older_than` seconds."""
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+                (time.time() - older_than,)
+            ).rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            running = self._running_by_provider()
+        return {
+            "max_pending": self.max_pending,
+            "jobs": {status: counts.get(status, 0) for status in ("queued", "running", "succeeded", "failed")},
+            "running_by_provider": running
+        }
+
+async def deliver_webhook(url: str, body: Dict[str, Any], attempts: int = 3, timeout: float = 10.0) -> bool:
+    """
+    POST a job result to its webhook, retrying failures with jittered backoff.
+    The target is checked again before every attempt, since its DNS may have
+    changed since the job was queued, and the request goes to the address
+    that was checked; redirects are not followed.
+    """
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        for attempt in range(attempts):
+            try:
+                address = await asyncio.to_thread(check_webhook_url, url)
+            except WebhookURLError as e:
+                logger.warning(f"Webhook {url} refused: {str(e)}")
+                return False
+            target, headers, extensions = (url, {}, {}) if address is None else pin_webhook_url(url, address)
+            try:
+                response = await client.post(target, json=body, headers=headers, extensions=extensions)
+                if response.status_code < 400:
+                    return True
+                logger.warning(f"Webhook {url} returned {response.status_code}")
+            except httpx.HTTPError as e:
+                logger.warning(f"Webhook {url} failed: {str(e)}")
+            if attempt < attempts - 1:
+                await asyncio.sleep(random.uniform(0, 2 ** attempt))
+    return False
+
+async def run_job(queue: JobQueue, generator: Any, job: Dict[str, Any]):
+    """Run one claimed job, record its outcome and notify its webhook."""
+    try:
+        result = await generator.generate_headlines(**job["payload"])
+        await asyncio.to_thread(queue.complete, job["id"], result)
+        body = {"id": job["id"], "status": "succeeded", "result": result}
+    except Exception as e:
+        logger.error(f"Job {job['id']} failed: {str(e)}")
+        await asyncio.to_thread(queue.fail, job["id"], str(e))
+        body = {"id": job["id"], "status": "failed", "error": str(e)}
+
+    if job["webhook_url"]:
+        delivered = await deliver_webhook(job["webhook_url"], body)
+        await asyncio.to_thread(queue.set_webhook_status, job["id"], "delivered" if delivered else "failed")
+
+async def _work(
+    path: str,
+    worker: str,
+    concurrency: int,
+    provider_caps: Dict[str, int],
+    poll_interval: float,
+    job_timeout: float,
+    result_ttl: float,
+    stop_event: Any
+):
+    from headline_generator import HeadlineGenerator
+
+    queue = JobQueue(path)
+    generator = HeadlineGenerator()
+    running = set()
+    next_maintenance = 0.0
+    try:
+        while not stop_event.is_set():
+            if time.monotonic() >= next_maintenance:
+                await asyncio.to_thread(queue.recover, job_timeout)
+                await asyncio.to_thread(queue.purge, result_ttl)
+                next_maintenance = time.monotonic() + 60
+
+            while len(running) < concurrency:
+                job = await asyncio.to_thread(queue.claim, worker, provider_caps)
+                if job is None:
+                    break
+                running.add(asyncio.create_task(run_job(queue, generator, job)))
+
+            if running:
+                done, running = await asyncio.wait(running, timeout=poll_interval, return_when=asyncio.FIRST_COMPLETED)
+            else:
+                await asyncio.sleep(poll_interval)
+
+        # Drain: finish claimed jobs before exiting
+        if running:
+            await asyncio.wait(running)
+    finally:
+        await generator.clients.aclose()
+
+def run_worker(path: str, worker: str, concurrency: int, provider_caps: Dict[str, int],
+               poll_interval: float, job_timeout: float, result_ttl: float, stop_event: Any):
+    """Entry point of a worker process."""
+    logger.info(f"Job worker {worker} started (pid {os.getpid()})")
+    asyncio.run(_work(path, worker, concurrency, provider_caps, poll_interval, job_timeout, result_ttl, stop_event))
+    logger.info(f"Job worker {worker} stopped")
+
+class JobWorkerPool:
+    """
+    Local pool of worker processes, each running up to `concurrency` jobs at
+    once on its own event loop and HeadlineGenerator.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        processes: int = 2,
+        concurrency: int = 16,
+        provider_caps: Optional[Dict[str, int]] = None,
+        poll_interval: float = 0.2,
+        job_timeout: float = 300,
+        result_ttl: float = 86400
+    ):
+        self.path = path
+        self.processes = processes
+        self.concurrency = concurrency
+        self.provider_caps = provider_caps or {"*": 8}
+        self.poll_interval = poll_interval
+        self.job_timeout = job_timeout
+        self.result_ttl = result_ttl
+        # Spawned workers don't inherit the parent's open SQLite handles or event loop
+        self._context = multiprocessing.get_context("spawn")
+        self._stop_event = self._context.Event()
+        self._workers: List[multiprocessing.Process] = []
+
+    def start(self):
+        self._stop_event.clear()
+        for index in range(self.processes):
+            process = self._context.Process(
+                target=run_worker,
+                args=(self.path, f"worker-{index}", self.concurrency, self.provider_caps,
+                      self.poll_interval, self.job_timeout, self.result_ttl, self._stop_event),
+                name=f"job-worker-{index}",
+                daemon=True
+            )
+            process.start()
+            self._workers.append(process)
+
+    def stop(self, timeout: float = 30):
+        """Ask workers to finish their running jobs and exit, then terminate stragglers."""
+        self._stop_event.set()
+        deadline = time.monotonic() + timeout
+        for process in self._workers:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning(f"{process.name} did not drain in time, terminating")
+                process.terminate()
+                process.join()
+        self._workers = []
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "processes": self.processes,
+            "alive": sum(process.is_alive() for process in self._workers),
+            "concurrency": self.concurrency,
+            "provider_caps": self.provider_caps
+        }
+
+def create_job_queue() -> JobQueue:
+    """Build the job queue from JOB_QUEUE_PATH and JOB_QUEUE_MAX_PENDING."""
+    return JobQueue(
+        path=os.getenv("JOB_QUEUE_PATH", "jobs.sqlite3"),
+        max_pending=int(os.getenv("JOB_QUEUE_MAX_PENDING", "1000"))
+    )
+
+def create_job_worker_pool(queue: JobQueue, default_processes: int = 0) -> JobWorkerPool:
+    """
+    Build the worker pool from JOB_WORKERS (default `default_processes`:
+    none in the API, whose every uvicorn worker would start its own pool),
+    JOB_WORKER_CONCURRENCY, JOB_PROVIDER_CONCURRENCY, JOB_TIMEOUT and
+    JOB_RESULT_TTL.
+    """
+    return JobWorkerPool(
+        queue.path,
+        processes=int(os.getenv("JOB_WORKERS", str(default_processes))),
+        concurrency=int(os.getenv("JOB_WORKER_CONCURRENCY", "16")),
+        provider_caps=parse_provider_caps(os.getenv("JOB_PROVIDER_CONCURRENCY", "8")),
+        job_timeout=float(os.getenv("JOB_TIMEOUT", "300")),
+        result_ttl=float(os.getenv("JOB_RESULT_TTL", "86400"))
+    )
+
+if __name__ == "__main__":
+    # Run the worker pool on its own, next to an API without job workers:
+    #   JOB_WORKERS=4 python job_queue.py
+    pool = create_job_worker_pool(create_job_queue(), default_processes=2)
+    pool.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pool.stop()
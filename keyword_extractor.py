@@ -0,0 +1,189 @@
+import os
+import re
+import sys
+import json
+import math
+import struct
+import hashlib
+import logging
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Words of letters/digits, allowing inner apostrophes and hyphens ("work-life", "founder's")
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:['\-][a-z0-9]+)*")
+
+STOPWORDS = frozenset("""
+a about above across after again against all almost alone along already also although always am
+among an and another any anybody anyone anything anyway anywhere are around as ask asked at away
+back be became because become becomes been before began behind being below best better between
+big both but by came can cannot could did do does doing done down during each either else enough
+even ever every everyone everything everywhere few find first for four from full further get gets
+give given gives go goes going gone got great had has have having he her here hers herself him
+himself his how however i if in inside instead into is it its itself just keep know last later
+least less let like likely long made make makes making many may maybe me might mine more most
+mostly much must my myself near need needs never new next no nobody none nor not nothing now
+nowhere of off often old on once one only onto or other others otherwise our ours ourselves out
+over own part per perhaps put rather really right said same saw say says second see seem seemed
+seems several shall she should show side since so some somebody someone something sometimes
+somewhere still such sure take taken than that the their theirs them themselves then there these
+they thing things think this those though three through thus to today together too took toward
+towards two under until up upon us use used uses using very via want wants was way ways we week
+weeks well went were what whatever when where whether which while who whoever whole whom whose
+why will with within without would yet you your yours yourself yourselves year years edition
+newsletter issue let's we'll we're we've you'll you're you've it's that's there's here's don't
+doesn't didn't isn't aren't wasn't weren't won't can't couldn't shouldn't wouldn't i'm i've
+""".split())
+
+STATS_MAGIC = b"KWSTATS1"
+# magic, term count, default idf, padding to an 8-byte boundary
+STATS_HEADER = struct.Struct("<8sQf4x")
+
+def term_hash(term: str) -> int:
+    """Stable 64-bit hash of a term, used as its key in the corpus statistics."""
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+class CorpusStats:
+    """
+    Inverse document frequencies for a newsletter archive.
+
+    Stored on disk as a header followed by a sorted uint64 array of term
+    hashes and a parallel float32 array of idf values (12 bytes per term),
+    so loading is a memory map and lookups are a vectorised binary search.
+    """
+
+    def __init__(self, hashes: np.ndarray, idf: np.ndarray, default_idf: float):
+        self.hashes = hashes
+        self.idf = idf
+        self.default_idf = default_idf
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    @classmethod
+    def build(cls, documents: Iterable[str], min_df: int = 2) -> "CorpusStats":
+        """
+        Compute smoothed idf, log((1 + N) / (1 + df)) + 1, for every term
+        appearing in at least `min_df` documents.
+        """
+        document_frequency: Counter = Counter()
+        document_count = 0
+        for document in documents:
+            document_count += 1
+            document_frequency.update(set(tokenize(document)))
+
+        terms = [term for term, df in document_frequency.items() if df >= min_df and term not in STOPWORDS]
+        hashes = np.fromiter((term_hash(term) for term in terms), dtype=np.uint64, count=len(terms))
+        df = np.fromiter((document_frequency[term] for term in terms), dtype=np.float32, count=len(terms))
+        idf = (np.log((1 + document_count) / (1 + df)) + 1).astype(np.float32)
+        order = np.argsort(hashes)
+        default_idf = math.log(1 + document_count) + 1
+        return cls(hashes[order], idf[order], default_idf)
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            f.write(STATS_HEADER.pack(STATS_MAGIC, len(self.hashes), self.default_idf))
+            f.write(self.hashes.astype("<u8").tobytes())
+            f.write(self.idf.astype("<f4").tobytes())
+
+    @classmethod
+    def load(cls, path: str) -> "CorpusStats":
+        """Memory-map statistics written by save()."""
+        with open(path, "rb") as f:
+            magic, count, default_idf = STATS_HEADER.unpack(f.read(STATS_HEADER.size))
+        if magic != STATS_MAGIC:
+            raise ValueError(f"{path} is not a keyword statistics file")
+        hashes = np.memmap(path, dtype="<u8", mode="r", offset=STATS_HEADER.size, shape=(count,))
+        idf = np.memmap(path, dtype="<f4", mode="r", offset=STATS_HEADER.size + 8 * count, shape=(count,))
+        return cls(hashes, idf, default_idf)
+
+    def lookup(self, hashes: np.ndarray) -> np.ndarray:
+        """Idf for each term hash; unseen terms get the maximum (default) idf."""
+        if not len(self.hashes):
+            return np.full(len(hashes), self.default_idf, dtype=np.float32)
+        positions = np.searchsorted(self.hashes, hashes)
+        positions[positions == len(self.hashes)] = 0
+        found = self.hashes[positions] == hashes
+        return np.where(found, self.idf[positions], np.float32(self.default_idf))
+
+class KeywordExtractor:
+    """
+    Scores newsletter terms by TF-IDF against corpus statistics (or by term
+    frequency alone when none are loaded) and returns the top-k.
+    """
+
+    def __init__(self, stats: Optional[CorpusStats] = None, min_length: int = 3):
+        self.stats = stats
+        self.min_length = min_length
+
+    def _score_terms(self, text: str) -> Tuple[List[str], np.ndarray]:
+        # Count everything in C first, then filter the (much smaller) set of distinct terms
+        counts = Counter(tokenize(text))
+        terms = [
+            term for term in counts
+            if len(term) >= self.min_length and term not in STOPWORDS and not term.isdigit()
+        ]
+        if not terms:
+            return [], np.zeros(0, dtype=np.float32)
+
+        scores = 1 + np.log(np.fromiter((counts[term] for term in terms), dtype=np.float32, count=len(terms)))
+        if self.stats is not None:
+            hashes = np.fromiter((term_hash(term) for term in terms), dtype=np.uint64, count=len(terms))
+            scores *= self.stats.lookup(hashes)
+        return terms, scores
+
+    def term_weights(self, text: str) -> Dict[str, float]:
+        """TF-IDF weight of every candidate term in the text."""
+        terms, scores = self._score_terms(text)
+        return dict(zip(terms, scores.tolist()))
+
+    def extract(self, text: str, top_k: int = 5) -> List[str]:
+        terms, scores = self._score_terms(text)
+        # Stable sort keeps first-occurrence order between equal scores
+        top = np.argsort(-scores, kind="stable")[:top_k]
+        return [terms[index] for index in top]
+
+def create_keyword_extractor() -> KeywordExtractor:
+    """
+    Build the extractor, memory-mapping corpus statistics from
+    KEYWORD_STATS_PATH when the file exists.
+    """
+    path = os.getenv("KEYWORD_STATS_PATH", "keyword_stats.bin")
+    stats = None
+    if path and os.path.exists(path):
+        try:
+            stats = CorpusStats.load(path)
+            logger.info(f"Loaded keyword statistics for {len(stats)} terms from {path}")
+        except Exception as e:
+            logger.error(f"Failed to load keyword statistics from {path}: {str(e)}")
+    return KeywordExtractor(stats)
+
+def _read_documents(paths: List[str]) -> Iterable[str]:
+    """Yield documents from .txt/.md files (one per file) or .jsonl files ("text" per line)."""
+    for path in paths:
+        if os.path.isdir(path):
+            yield from _read_documents([os.path.join(path, name) for name in sorted(os.listdir(path))])
+        elif path.endswith(".jsonl"):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)["text"]
+        elif path.endswith((".txt", ".md")):
+            with open(path, encoding="utf-8") as f:
+                yield f.read()
+
+if __name__ == "__main__":
+    # Build corpus statistics offline from a newsletter archive:
+    #   python keyword_extractor.py keyword_stats.bin archive/ more_issues.jsonl
+    if len(sys.argv) < 3:
+        print("Usage: python keyword_extractor.py OUTPUT ARCHIVE_PATH [ARCHIVE_PATH ...]")
+        sys.exit(1)
+    corpus_stats = CorpusStats.build(_read_documents(sys.argv[2:]))
+    corpus_stats.save(sys.argv[1])
+    print(f"Wrote statistics for {len(corpus_stats)} terms to {sys.argv[1]}")
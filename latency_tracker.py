@@ -0,0 +1,119 @@
+import time
+import bisect
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Bucket upper bounds in seconds, roughly log-spaced from 50 ms to 2 minutes
+BUCKET_BOUNDS = [
+    0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 4.0, 5.0,
+    7.5, 10.0, 15.0, 20.0, 30.0, 45.0, 60.0, 120.0
+]
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram with approximate quantiles."""
+
+    def __init__(self, bounds: List[float] = BUCKET_BOUNDS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def record(self, seconds: float):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket containing the q-th quantile."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return self.bounds[min(index, len(self.bounds) - 1)]
+        return self.bounds[-1]
+
+class WindowedLatencyHistogram:
+    """
+    Latency histogram over the last one to two windows, so quantiles follow
+    a provider's current latency. Samples go into the current histogram,
+    which replaces the previous one every `window` seconds; quantiles are
+    read over both, so a rotation never leaves too few samples.
+    """
+
+    def __init__(
+        self,
+        window: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+        bounds: List[float] = BUCKET_BOUNDS
+    ):
+        self.window = window
+        self.clock = clock
+        self.bounds = bounds
+        self.current = LatencyHistogram(bounds)
+        self.previous = LatencyHistogram(bounds)
+        self.started = clock()
+
+    def _rotate(self):
+        elapsed = self.clock() - self.started
+        if elapsed < self.window:
+            return
+        # After a whole idle window the current histogram is stale too
+        self.previous = self.current if elapsed < 2 * self.window else LatencyHistogram(self.bounds)
+        self.current = LatencyHistogram(self.bounds)
+        self.started = self.clock()
+
+    def record(self, seconds: float):
+        self._rotate()
+        self.current.record(seconds)
+
+    def snapshot(self) -> LatencyHistogram:
+        """Both windows merged into one histogram."""
+        self._rotate()
+        merged = LatencyHistogram(self.bounds)
+        merged.counts = [current + previous for current, previous in zip(self.current.counts, self.previous.counts)]
+        merged.count = self.current.count + self.previous.count
+        merged.total = self.current.total + self.previous.total
+        return merged
+
+class LatencyTracker:
+    """Latency histograms per (provider, model) over the last `window` to 2 * `window` seconds."""
+
+    def __init__(self, window: float = 300.0, clock: Callable[[], float] = time.monotonic):
+        self.window = window
+        self.clock = clock
+        self._histograms: Dict[Tuple[str, str], WindowedLatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def record(self, provider: str, model: str, seconds: float):
+        with self._lock:
+            key = (provider, model)
+            if key not in self._histograms:
+                self._histograms[key] = WindowedLatencyHistogram(self.window, self.clock)
+            self._histograms[key].record(seconds)
+
+    def histogram(self, provider: str, model: str) -> Optional[LatencyHistogram]:
+        with self._lock:
+            windowed = self._histograms.get((provider, model))
+            return windowed.snapshot() if windowed is not None else None
+
+    def quantile(self, provider: str, model: str, q: float, min_samples: int = 1) -> Optional[float]:
+        histogram = self.histogram(provider, model)
+        if histogram is None or histogram.count < min_samples:
+            return None
+        return histogram.quantile(q)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            histograms = {key: windowed.snapshot() for key, windowed in self._histograms.items()}
+        return {
+            f"{provider}/{model}": {
+                "count": histogram.count,
+                "mean": histogram.total / histogram.count if histogram.count else None,
+                "p50": histogram.quantile(0.5),
+                "p95": histogram.quantile(0.95)
+            }
+            for (provider, model), histogram in histograms.items()
+        }
@@ -0,0 +1,198 @@
+import re
+import ast
+import json
+import logging
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, ValidationError, field_validator
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TRAILING_COMMA = re.compile(r",\s*([}\]])")
+STRUCTURAL = re.compile(r'[\[\]{}"]')
+STRING_SPECIAL = re.compile(r'["\\]')
+NON_BLANK = re.compile(r"\S")
+DECODER = json.JSONDecoder()
+
+class Headline(BaseModel):
+    title: str
+    keywords: List[str]
+    reason: str
+
+    @field_validator("title")
+    @classmethod
+    def title_not_empty(cls, value: str) -> str:
+        value = value.strip()
+        if not value:
+            raise ValueError("title is empty")
+        return value
+
+    @field_validator("keywords", mode="before")
+    @classmethod
+    def split_keyword_string(cls, value: Any) -> Any:
+        # Models sometimes return "ai, tools" instead of ["ai", "tools"]
+        if isinstance(value, str):
+            return [keyword.strip() for keyword in value.split(",") if keyword.strip()]
+        return value
+
+def coerce_headline(value: Any) -> Optional[Dict[str, Any]]:
+    """
+    Validate a parsed element against the Headline schema, filling a missing
+    reason and dropping unknown keys. Returns None for unusable elements.
+    """
+    if not isinstance(value, dict):
+        return None
+    try:
+        fields = {key: item for key, item in value.items() if item is not None}
+        return Headline(**{"keywords": [], "reason": "", **fields}).model_dump()
+    except (ValidationError, TypeError):
+        return None
+
+def _decode_element(text: str) -> Any:
+    """Decode one array element, repairing trailing commas and Python-style literals."""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    repaired = TRAILING_COMMA.sub(r"\1", text)
+    try:
+        return json.loads(repaired)
+    except json.JSONDecodeError:
+        pass
+    try:
+        # Single-quoted dicts; literal_eval only evaluates literals
+        return ast.literal_eval(repaired)
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        return None
+
+class IncrementalJSONArrayParser:
+    """
+    Incrementally parses a JSON array of objects from streamed LLM output.
+
+    Text before the opening '[' (preamble, code fences, a wrapping object
+    such as {"headlines": ...}) is skipped; a '[' only opens the array when
+    the next non-blank character is '{', so brackets in the preamble are
+    ignored. Each top-level object is returned by feed() as soon as its
+    closing brace arrives, so callers can act on it before the rest of the
+    array streams in, and the complete objects of a truncated response are
+    kept.
+    """
+
+    def __init__(self):
+        self._started = False
+        self._opening = False
+        self._finished = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._current: List[str] = []
+        self.skipped = 0
+
+    @property
+    def finished(self) -> bool:
+        return self._finished
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """
+        Consume the next chunk of text.
+
+        Returns:
+            Objects completed by this chunk, in order
+        """
+        completed = []
+        pos = 0
+        # Start of the current element's text within this chunk
+        element_start = 0
+        while pos < len(chunk) and not self._finished:
+            if not self._started:
+                if self._opening:
+                    match = NON_BLANK.search(chunk, pos)
+                    if match is None:
+                        break
+                    pos = match.start()
+                    self._opening = False
+                    if match.group() != '{':
+                        if match.group() == '[':
+                            self._opening = True
+                        pos += 1
+                        continue
+                    self._started = True
+                else:
+                    pos = chunk.find('[', pos)
+                    if pos == -1:
+                        break
+                    self._opening = True
+                    pos += 1
+                    continue
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                    pos += 1
+                    continue
+                # Skip the string's content up to the next quote or escape
+                match = STRING_SPECIAL.search(chunk, pos)
+                if match is None:
+                    break
+                pos = match.end()
+                if match.group() == '\\':
+                    self._escaped = True
+                else:
+                    self._in_string = False
+                continue
+
+            match = STRUCTURAL.search(chunk, pos)
+            if match is None:
+                break
+            char = match.group()
+            pos = match.end()
+            if char == '"':
+                self._in_string = True
+            elif char in '{[':
+                if self._depth == 0 and char == '{':
+                    # Fast path: a well-formed object decodes in one call
+                    try:
+                        value, pos = DECODER.raw_decode(chunk, match.start())
+                        completed.append(value)
+                        continue
+                    except json.JSONDecodeError:
+                        pass
+                if self._depth == 0:
+                    self._current = []
+                    element_start = match.start()
+                self._depth += 1
+            elif self._depth == 0:
+                # Closing bracket of the top-level array
+                self._finished = True
+            else:
+                self._depth -= 1
+                if self._depth == 0:
+                    value = _decode_element("".join(self._current) + chunk[element_start:pos])
+                    self._current = []
+                    if isinstance(value, dict):
+                        completed.append(value)
+                    else:
+                        self.skipped += 1
+                        logger.warning("Skipping malformed array element in LLM response")
+
+        if self._depth > 0:
+            # Element continues in the next chunk
+            self._current.append(chunk[element_start:])
+        return completed
+
+def parse_headlines(text: str) -> List[Dict[str, Any]]:
+    """
+    Extract headlines from a complete LLM response in one pass, tolerating
+    preamble, code fences, trailing text and truncation. Elements that don't
+    match the Headline schema are dropped.
+
+    Raises:
+        ValueError: If no valid headline could be recovered
+    """
+    parser = IncrementalJSONArrayParser()
+    headlines = [headline for headline in map(coerce_headline, parser.feed(text)) if headline is not None]
+    if not headlines:
+        raise ValueError("Failed to parse LLM response")
+    if not parser.finished:
+        logger.warning(f"Recovered {len(headlines)} headlines from a truncated response")
+    return headlines
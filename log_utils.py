@@ -0,0 +1,31 @@
+import os
+import json
+import random
+import logging
+from typing import Any
+
+# Fraction of LLM payloads logged when DEBUG is enabled (0 disables payload logging)
+PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0"))
+
+def _format(event: str, fields: dict) -> str:
+    return json.dumps({"event": event, **fields}, default=str)
+
+def log_event(logger: logging.Logger, event: str, level: int = logging.INFO, **fields: Any):
+    """
+    Log a structured event as a single JSON line. Nothing is serialised
+    unless the logger is enabled for the level.
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, _format(event, fields))
+
+def log_payload(logger: logging.Logger, event: str, **fields: Any):
+    """
+    Log a large payload (prompts, raw responses) at DEBUG for a sampled
+    fraction of calls. The level and sampling checks run before any
+    formatting, so this is free when payload logging is off.
+    """
+    if PAYLOAD_SAMPLE_RATE <= 0 or not logger.isEnabledFor(logging.DEBUG):
+        return
+    if PAYLOAD_SAMPLE_RATE < 1 and random.random() >= PAYLOAD_SAMPLE_RATE:
+        return
+    logger.debug(_format(event, fields))
@@ -1,28 +1,63 @@
-from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi import FastAPI, HTTPException, Depends, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, HttpUrl
 from typing import List, Optional, Literal
+from contextlib import asynccontextmanager
 import os
+import json
+import time
+import asyncio
 from dotenv import load_dotenv
 from headline_generator import HeadlineGenerator
-from prompt_builder import PromptContext
+from prompt_builder import PromptContext, TokenUsage
+from llm_json import Headline
+from model_catalog import ModelCatalog
+from model_router import NoRouteError, RoutingDecision
+from job_queue import QueueFullError, WebhookURLError, check_webhook_url, create_job_queue, create_job_worker_pool
+from rate_limiter import ProviderRateLimitError, client_quota_storage_uri, create_client_quotas
+from metrics import REGISTRY, Family, MetricsMiddleware, server_timing_header, start_request_timings
 import logging
 
 # Load environment variables
 load_dotenv()
 
-# Configure logging
+# Configure logging (LLM payloads are only logged at DEBUG, see LOG_PAYLOAD_SAMPLE_RATE)
 logging.basicConfig(level=logging.INFO)
+logging.getLogger().setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run background services for the lifetime of the app"""
+    if PRELOAD_ON_STARTUP:
+        # The app serves while SDKs load; a request that needs one first waits for its import
+        preload = asyncio.create_task(headline_generator.preload())
+    headline_generator.trends_prefetcher.start()
+    model_catalog.start()
+    if RUN_JOB_WORKERS and job_workers.processes > 0:
+        job_workers.start()
+    yield
+    if RUN_JOB_WORKERS:
+        await asyncio.to_thread(job_workers.stop)
+    if headline_generator.semantic_cache is not None:
+        headline_generator.semantic_cache.flush()
+    if headline_generator.headline_history is not None:
+        headline_generator.headline_history.flush()
+    await model_catalog.stop()
+    await headline_generator.trends_prefetcher.stop()
+    if PRELOAD_ON_STARTUP and not preload.done():
+        preload.cancel()
+    await headline_generator.clients.aclose()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Newsletter Headline Generator API",
     description="Generate optimized newsletter subject lines using AI and trending topics",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -34,8 +69,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize rate limiter
-limiter = Limiter(key_func=get_remote_address)
+# Count and time every HTTP request for /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Initialize rate limiter: per API key (X-API-Key) for known clients, per IP otherwise
+client_quotas = create_client_quotas()
+limiter = Limiter(key_func=client_quotas.key_func, storage_uri=client_quota_storage_uri())
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
@@ -55,6 +94,12 @@ MODEL_CONFIG = {
     }
 }
 
+# Import provider SDKs and the trends client in the background at startup rather than on first use
+PRELOAD_ON_STARTUP = os.getenv("PRELOAD_ON_STARTUP", "true").lower() == "true"
+
+# Maximum concurrent LLM calls per provider within one batch request
+BATCH_PROVIDER_CONCURRENCY = int(os.getenv("BATCH_PROVIDER_CONCURRENCY", "8"))
+
 # Input models
 class Constraints(BaseModel):
     max_length: int = Field(default=60, ge=10, le=100)
@@ -68,13 +113,15 @@ class HeadlineRequest(BaseModel):
     tone: str = Field(..., min_length=1)
     past_headlines: List[str] = Field(default_factory=list)
     constraints: Constraints = Field(default_factory=Constraints)
-    provider: Literal["openai", "anthropic", "google"] = Field(default="openai")
+    provider: Literal["openai", "anthropic", "google", "auto", "route"] = Field(default="openai")
     model: str = Field(default="gpt-4")
-
-class Headline(BaseModel):
-    title: str
-    keywords: List[str]
-    reason: str
+    cache: Literal["prefer", "bypass"] = Field(default="prefer")
+    input_token_budget: Optional[int] = Field(default=None, ge=500, le=200000)
+    # Headline history to check against and draw past headlines from (HEADLINE_HISTORY=true)
+    tenant: Optional[str] = Field(default=None, pattern=r"^[A-Za-z0-9_.-]{1,64}$")
+    # With provider="route": the model is chosen to answer within the SLO and/or cost at most the budget
+    latency_slo_ms: Optional[float] = Field(default=None, gt=0)
+    max_cost_usd: Optional[float] = Field(default=None, gt=0)
 
 class HeadlineResponse(BaseModel):
     headlines: List[Headline]
@@ -83,46 +130,220 @@ class HeadlineResponse(BaseModel):
 class GenerateResponse(BaseModel):
     headlines: List[Headline]
     trending_topics: List[str]
+    token_usage: Optional[TokenUsage] = None
+    routing: Optional[RoutingDecision] = None
+
+class JobRequest(HeadlineRequest):
+    priority: Literal["high", "normal", "low"] = Field(default="normal")
+    webhook_url: Optional[HttpUrl] = None
+
+class JobCreatedResponse(BaseModel):
+    id: str
+    status: str
+
+class JobStatusResponse(BaseModel):
+    id: str
+    status: Literal["queued", "running", "succeeded", "failed"]
+    priority: str
+    provider: str
+    result: Optional[GenerateResponse] = None
+    error: Optional[str] = None
+    webhook_status: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+class BatchHeadlineRequest(BaseModel):
+    items: List[HeadlineRequest] = Field(..., min_length=1, max_length=500)
+
+class BatchItemResult(BaseModel):
+    index: int
+    headlines: Optional[List[Headline]] = None
+    trending_topics: Optional[List[str]] = None
+    token_usage: Optional[TokenUsage] = None
+    routing: Optional[RoutingDecision] = None
+    error: Optional[str] = None
+
+class BatchGenerateResponse(BaseModel):
+    results: List[BatchItemResult]
+
+class HistoryRequest(BaseModel):
+    tenant: str = Field(..., pattern=r"^[A-Za-z0-9_.-]{1,64}$")
+    headlines: List[str] = Field(..., min_length=1, max_length=10000)
+    sent_at: Optional[float] = None
+
+class HistoryResponse(BaseModel):
+    tenant: str
+    added: int
+    entries: int
 
 # Initialize headline generator
 headline_generator = HeadlineGenerator()
 
+# Models actually available to our API keys, discovered at startup and refreshed periodically;
+# the auto and route candidates are configured models too, so discovery checks them as well
+model_catalog = ModelCatalog(
+    headline_generator.clients,
+    {
+        provider: list(dict.fromkeys(config["models"] + [
+            model for candidate_provider, model
+            in headline_generator.hedge_candidates + headline_generator.route_candidates
+            if candidate_provider == provider
+        ]))
+        for provider, config in MODEL_CONFIG.items()
+        if headline_generator.clients.is_enabled(provider)
+    },
+    refresh_interval=float(os.getenv("MODEL_CATALOG_REFRESH_INTERVAL", "3600"))
+)
+# Auto and route only pick models the catalog offers
+headline_generator.model_filter = model_catalog.is_available
+
+# Job mode: requests are queued in SQLite and run by a local pool of worker processes
+job_queue = create_job_queue()
+job_workers = create_job_worker_pool(job_queue)
+# serve.py runs the job workers in its master process instead of in every API worker
+RUN_JOB_WORKERS = True
+
+def collect_metrics() -> List[Family]:
+    """Metrics read at scrape time from the caches, provider clients and job queue."""
+    caches = [
+        ("response", headline_generator.response_cache.hits, headline_generator.response_cache.misses),
+        (
+            "trends",
+            headline_generator.trends_prefetcher.cache_hits,
+            headline_generator.trends_prefetcher.cache_misses
+        )
+    ]
+    if headline_generator.semantic_cache is not None:
+        caches.append(("semantic", headline_generator.semantic_cache.hits, headline_generator.semantic_cache.misses))
+    provider_stats = headline_generator.clients.stats()
+    coalescing = headline_generator.coalescer.stats()
+    jobs = job_queue.stats()["jobs"]
+    return [
+        (
+            "cache_lookups_total", "counter", "Cache lookups by cache and result (hit or miss)",
+            [({"cache": cache, "result": "hit"}, hits) for cache, hits, _ in caches]
+            + [({"cache": cache, "result": "miss"}, misses) for cache, _, misses in caches]
+        ),
+        (
+            "llm_retries_total", "counter", "Provider calls retried after a transient error",
+            [({"provider": provider}, stats["retries"]) for provider, stats in provider_stats.items()]
+        ),
+        (
+            "llm_in_flight", "gauge", "Provider calls currently in flight",
+            [({"provider": provider}, stats["in_flight"]) for provider, stats in provider_stats.items()]
+        ),
+        (
+            "coalesced_requests_total", "counter", "Requests served by joining an identical in-flight request",
+            [({}, coalescing["coalesced"])]
+        ),
+        (
+            "jobs", "gauge", "Jobs in the queue by status",
+            [({"status": status}, count) for status, count in jobs.items()]
+        )
+    ]
+
+REGISTRY.register_collector(collect_metrics)
+
+def validate_model_selection(body: HeadlineRequest):
+    """Raise an HTTPException if the provider/model pair cannot be served."""
+    if body.provider != "route" and (body.latency_slo_ms is not None or body.max_cost_usd is not None):
+        raise HTTPException(status_code=400, detail="latency_slo_ms and max_cost_usd require provider 'route'")
+
+    if body.provider == "auto":
+        # The model is chosen from the configured hedge candidates
+        if not headline_generator.available_hedge_candidates():
+            raise HTTPException(status_code=500, detail="No providers configured for auto mode")
+        return
+
+    if body.provider == "route":
+        # The model is chosen per request from the configured routing candidates
+        if not headline_generator.available_route_candidates():
+            raise HTTPException(status_code=500, detail="No providers configured for routing")
+        return
+
+    if body.provider not in MODEL_CONFIG:
+        raise HTTPException(status_code=400, detail=f"Invalid provider. Choose from: {list(MODEL_CONFIG.keys())}")
+
+    if not headline_generator.clients.is_enabled(body.provider):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Provider {body.provider} is not enabled. Choose from: {sorted(headline_generator.clients.enabled)}"
+        )
+    
+    if not model_catalog.is_available(body.provider, body.model):
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Invalid model for {body.provider}. Choose from: {model_catalog.models(body.provider)}"
+        )
+
+    # Check if API key is available
+    api_key = MODEL_CONFIG[body.provider]["api_key"]
+    if not api_key:
+        raise HTTPException(
+            status_code=500,
+            detail=f"API key not configured for {body.provider}"
+        )
+
+def history_tenant(request: Request, tenant: Optional[str]) -> Optional[str]:
+    """Key of a request's headline history: its tenant, namespaced by the calling API client."""
+    if tenant is None:
+        return None
+    return f"{client_quotas.client_name(request) or 'anonymous'}/{tenant}"
+
 @app.get("/health")
 @limiter.limit("30/minute")
 async def health_check(request: Request):
     """Health check endpoint"""
     return {"status": "healthy"}
 
+@app.get("/stats")
+@limiter.limit("30/minute")
+async def stats(request: Request):
+    """Cache and runtime statistics of the worker process that answers"""
+    return {
+        "pid": os.getpid(),
+        "response_cache": headline_generator.response_cache.stats(),
+        "semantic_cache": headline_generator.semantic_cache.stats() if headline_generator.semantic_cache else None,
+        "headline_history": (
+            headline_generator.headline_history.stats() if headline_generator.headline_history else None
+        ),
+        "trends_prefetcher": headline_generator.trends_prefetcher.stats(),
+        "provider_latency": headline_generator.latency_tracker.stats(),
+        "hedging": headline_generator.hedge_stats,
+        "routing": headline_generator.router.stats(),
+        "headline_repair": headline_generator.repair_stats,
+        "coalescing": headline_generator.coalescer.stats(),
+        "provider_clients": headline_generator.clients.stats(),
+        "model_catalog": model_catalog.stats(),
+        "provider_rate_limits": headline_generator.clients.rate_limiter.stats(),
+        # Under serve.py the job workers belong to the master, which API workers can't inspect
+        "jobs": {**job_queue.stats(), "workers": job_workers.stats() if RUN_JOB_WORKERS else None}
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+@limiter.limit("60/minute")
+async def metrics(request: Request):
+    """Metrics of this worker process in the Prometheus text format"""
+    return PlainTextResponse(await asyncio.to_thread(REGISTRY.render), media_type="text/plain; version=0.0.4")
+
 @app.post("/generate", response_model=GenerateResponse)
-@limiter.limit("10/minute")
-def generate_headlines(request: Request, body: HeadlineRequest):
+@limiter.limit(client_quotas.limit("10/minute"))
+async def generate_headlines(request: Request, response: Response, body: HeadlineRequest):
     """
     Generate optimized newsletter subject lines based on the provided content and context.
+    The Server-Timing header breaks the response time down by stage.
     """
+    start = time.perf_counter()
+    timings = start_request_timings()
     try:
-        # Validate model selection
-        if body.provider not in MODEL_CONFIG:
-            raise HTTPException(status_code=400, detail=f"Invalid provider. Choose from: {list(MODEL_CONFIG.keys())}")
-        
-        if body.model not in MODEL_CONFIG[body.provider]["models"]:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Invalid model for {body.provider}. Choose from: {MODEL_CONFIG[body.provider]['models']}"
-            )
-
-        # Check if API key is available
-        api_key = MODEL_CONFIG[body.provider]["api_key"]
-        if not api_key:
-            raise HTTPException(
-                status_code=500,
-                detail=f"API key not configured for {body.provider}"
-            )
+        validate_model_selection(body)
 
         # Convert constraints to dictionary
         constraints_dict = body.constraints.dict()
 
         # Generate headlines
-        result = headline_generator.generate_headlines(
+        result = await headline_generator.generate_headlines(
             body.newsletter_text,
             body.audience_profile,
             body.goal,
@@ -130,14 +351,148 @@ def generate_headlines(request: Request, body: HeadlineRequest):
             body.past_headlines,
             constraints_dict,
             body.provider,
-            body.model
+            body.model,
+            body.cache,
+            body.input_token_budget,
+            history_tenant(request, body.tenant),
+            body.latency_slo_ms,
+            body.max_cost_usd
         )
-        
+
+        response.headers["Server-Timing"] = server_timing_header(timings, time.perf_counter() - start)
         return result
+    except ProviderRateLimitError as e:
+        logger.warning(f"Provider rate limit reached: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    except NoRouteError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error generating headlines: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/generate/stream")
+@limiter.limit(client_quotas.limit("10/minute"))
+async def generate_headlines_stream(request: Request, body: HeadlineRequest):
+    """
+    Stream subject lines as Server-Sent Events. Emits a `trending_topics`
+    event, one `headline` event per subject line as soon as it is complete,
+    then `done` (or `error`).
+    """
+    validate_model_selection(body)
+
+    async def event_stream():
+        try:
+            async for event, data in headline_generator.stream_headlines(
+                body.newsletter_text,
+                body.audience_profile,
+                body.goal,
+                body.tone,
+                body.past_headlines,
+                body.constraints.dict(),
+                body.provider,
+                body.model,
+                body.cache,
+                body.input_token_budget,
+                history_tenant(request, body.tenant),
+                body.latency_slo_ms,
+                body.max_cost_usd
+            ):
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        except Exception as e:
+            logger.error(f"Error streaming headlines: {str(e)}")
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/generate/batch", response_model=BatchGenerateResponse)
+@limiter.limit(client_quotas.limit("10/minute"))
+async def generate_headlines_batch(request: Request, body: BatchHeadlineRequest):
+    """
+    Generate subject lines for many newsletters in one call. Results are
+    returned in request order; a failing item carries an error instead of
+    failing the whole batch.
+    """
+    results: List[Optional[BatchItemResult]] = [None] * len(body.items)
+    valid_indexes = []
+    for index, item in enumerate(body.items):
+        try:
+            validate_model_selection(item)
+            valid_indexes.append(index)
+        except HTTPException as e:
+            results[index] = BatchItemResult(index=index, error=e.detail)
+
+    generated = await headline_generator.generate_headlines_batch(
+        [
+            {**body.items[index].dict(), "tenant": history_tenant(request, body.items[index].tenant)}
+            for index in valid_indexes
+        ],
+        provider_concurrency=BATCH_PROVIDER_CONCURRENCY
+    )
+    for index, result in zip(valid_indexes, generated):
+        if isinstance(result, Exception):
+            results[index] = BatchItemResult(index=index, error=str(result))
+        else:
+            results[index] = BatchItemResult(index=index, **result)
+
+    return {"results": results}
+
+@app.post("/jobs", response_model=JobCreatedResponse, status_code=202)
+@limiter.limit(client_quotas.limit("10/minute"))
+async def create_job(request: Request, body: JobRequest):
+    """
+    Queue a generation job and return its id immediately. Poll
+    `GET /jobs/{id}` for the result, or pass `webhook_url` to have it POSTed
+    on completion. Responds 503 with Retry-After when the queue is full.
+    """
+    validate_model_selection(body)
+    if body.webhook_url:
+        try:
+            await asyncio.to_thread(check_webhook_url, str(body.webhook_url))
+        except WebhookURLError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    payload = body.dict(exclude={"priority", "webhook_url"})
+    payload["tenant"] = history_tenant(request, body.tenant)
+    try:
+        job_id = await asyncio.to_thread(
+            job_queue.enqueue,
+            payload,
+            body.priority,
+            str(body.webhook_url) if body.webhook_url else None,
+            headline_generator.candidate_providers(body.provider)
+        )
+    except QueueFullError as e:
+        return JSONResponse(status_code=503, content={"detail": str(e)}, headers={"Retry-After": "30"})
+    return {"id": job_id, "status": "queued"}
+
+@app.post("/history", response_model=HistoryResponse)
+@limiter.limit(client_quotas.limit("10/minute"))
+async def record_history(request: Request, body: HistoryRequest):
+    """
+    Record subject lines a tenant has sent. Generation with that `tenant`
+    never returns near-duplicates of them and draws the most relevant ones
+    into the prompt. Requires HEADLINE_HISTORY=true.
+    """
+    if headline_generator.headline_history is None:
+        raise HTTPException(status_code=400, detail="Headline history is disabled (set HEADLINE_HISTORY=true)")
+    history = await asyncio.to_thread(headline_generator.headline_history.get, history_tenant(request, body.tenant))
+    added = await asyncio.to_thread(history.add_many, body.headlines, body.sent_at)
+    return {"tenant": body.tenant, "added": added, "entries": len(history)}
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+@limiter.limit("120/minute")
+async def get_job(request: Request, job_id: str):
+    """Status of a queued job, with its result once it has succeeded."""
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
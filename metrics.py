@@ -0,0 +1,299 @@
+"""
+Prometheus metrics and per-request stage timings.
+
+Counters and histograms live in a process-wide registry and are rendered in
+the Prometheus text exposition format by render(). Values owned by other
+components (cache hit counts, queue depth) are read at scrape time through
+registered collectors, so they cost nothing on the request path.
+
+stage() times one step of a request: it observes the stage histogram,
+appends the timing to the current request's Server-Timing list (see
+start_request_timings()) and, with OTEL_SPANS=true and the opentelemetry
+package installed, wraps the step in an OpenTelemetry span.
+"""
+import os
+import time
+import bisect
+import logging
+import threading
+import importlib.util
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Bucket upper bounds in seconds, from keyword extraction (~1 ms) to slow LLM calls
+STAGE_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+
+# A collected metric family: (name, type, help, [(labels, value), ...])
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonic counter with a fixed set of label names."""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Tuple[str, ...] = (), amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels: Tuple[str, ...] = ()) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}" for labels, value in values]
+
+class Histogram:
+    """Fixed-bucket histogram per label set, rendered with cumulative buckets."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        bounds: List[float] = STAGE_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.bounds = bounds
+        # labels -> [bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, labels: Tuple[str, ...] = ()):
+        index = bisect.bisect_left(self.bounds, seconds)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.bounds) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += seconds
+
+    def count(self, labels: Tuple[str, ...] = ()) -> int:
+        series = self._series.get(labels)
+        return int(sum(series[:-1])) if series else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            snapshot = [(labels, list(series)) for labels, series in self._series.items()]
+        lines = []
+        names = self.labelnames + ("le",)
+        for labels, series in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(self.bounds + [float("inf")], series[:-1]):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(names, labels + (_format_value(bound),))} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    """Holds metrics and scrape-time collectors, and renders them for Prometheus."""
+
+    def __init__(self):
+        self._metrics: List[Any] = []
+        self._collectors: List[Callable[[], List[Family]]] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        counter = Counter(name, documentation, labelnames)
+        self._metrics.append(counter)
+        return counter
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        bounds: List[float] = STAGE_BUCKETS
+    ) -> Histogram:
+        histogram = Histogram(name, documentation, labelnames, bounds)
+        self._metrics.append(histogram)
+        return histogram
+
+    def register_collector(self, collector: Callable[[], List[Family]]):
+        """Add a callable returning metric families, called on every scrape."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                logger.error(f"Metrics collector failed: {str(e)}")
+                continue
+            for name, metric_type, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+STAGE_DURATION = REGISTRY.histogram(
+    "headline_stage_duration_seconds", "Time spent in each stage of headline generation", ("stage",)
+)
+STAGE_ERRORS = REGISTRY.counter(
+    "headline_stage_errors_total", "Stages that raised an exception", ("stage",)
+)
+LLM_REQUESTS = REGISTRY.counter(
+    "llm_requests_total", "LLM calls by provider, model and outcome (ok, error or rate_limited)", ("provider", "model", "outcome")
+)
+LLM_DURATION = REGISTRY.histogram(
+    "llm_request_duration_seconds", "LLM call latency, including retries and parsing", ("provider", "model")
+)
+LLM_TOKENS = REGISTRY.counter(
+    "llm_tokens_total",
+    "Tokens reported by providers (type: input, cached_input, cache_write, output)",
+    ("provider", "model", "type")
+)
+LLM_COST = REGISTRY.counter(
+    "llm_cost_usd_total", "Estimated spend from reported token usage and MODEL_PRICES", ("provider", "model")
+)
+HEADLINE_VIOLATIONS = REGISTRY.counter(
+    "headline_constraint_violations_total", "Generated subject lines breaking a constraint", ("rule",)
+)
+HEADLINE_REPAIRS = REGISTRY.counter(
+    "headline_repairs_total", "Subject lines sent for repair, by outcome (fixed, failed, error)", ("outcome",)
+)
+REPAIR_TOKENS_SAVED = REGISTRY.counter(
+    "headline_repair_tokens_saved_total", "Estimated tokens saved by repair calls versus regenerating every headline"
+)
+ROUTED_REQUESTS = REGISTRY.counter(
+    "routed_requests_total",
+    "Requests with provider=route by the model that answered and whether it was the first choice or a fallback",
+    ("provider", "model", "outcome")
+)
+HTTP_REQUESTS = REGISTRY.counter(
+    "http_requests_total", "HTTP requests by handler, method and status", ("handler", "method", "status")
+)
+HTTP_DURATION = REGISTRY.histogram(
+    "http_request_duration_seconds", "Time until the response headers are sent", ("handler",)
+)
+
+def create_tracer() -> Optional[Any]:
+    """
+    OpenTelemetry tracer for stage spans when OTEL_SPANS=true and the
+    opentelemetry package is installed; exporting is left to the
+    OpenTelemetry SDK configuration (e.g. opentelemetry-instrument).
+    """
+    if os.getenv("OTEL_SPANS", "false").lower() != "true":
+        return None
+    if importlib.util.find_spec("opentelemetry") is None:
+        logger.warning("OTEL_SPANS is set but the 'opentelemetry' package is not installed; spans disabled")
+        return None
+    from opentelemetry import trace
+    return trace.get_tracer("headline_generator")
+
+tracer = create_tracer()
+
+# (stage, seconds, description) entries of the request being served, for Server-Timing
+_request_timings: ContextVar[Optional[List[Tuple[str, float, Optional[str]]]]] = ContextVar(
+    "request_timings", default=None
+)
+
+def start_request_timings() -> List[Tuple[str, float, Optional[str]]]:
+    """
+    Collect the stage timings of the current request. Tasks spawned from
+    here (coalesced computations, hedged calls) share the returned list.
+    """
+    timings: List[Tuple[str, float, Optional[str]]] = []
+    _request_timings.set(timings)
+    return timings
+
+@contextmanager
+def stage(name: str, description: Optional[str] = None) -> Iterator[None]:
+    """Time a stage of the current request; see the module docstring."""
+    span = (
+        tracer.start_as_current_span(f"headline.{name}", attributes={"detail": description} if description else None)
+        if tracer is not None else nullcontext()
+    )
+    start = time.perf_counter()
+    try:
+        with span:
+            yield
+    except Exception:
+        STAGE_ERRORS.inc((name,))
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_DURATION.observe(elapsed, (name,))
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((name, elapsed, description))
+
+def server_timing_header(timings: List[Tuple[str, float, Optional[str]]], total: Optional[float] = None) -> str:
+    """Format stage timings as a Server-Timing header value (durations in ms)."""
+    entries = []
+    for name, seconds, description in timings:
+        entry = f"{name};dur={seconds * 1000:.1f}"
+        if description:
+            entry += f';desc="{_escape(description)}"'
+        entries.append(entry)
+    if total is not None:
+        entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+class MetricsMiddleware:
+    """ASGI middleware counting HTTP requests and timing them per route handler."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                HTTP_DURATION.observe(time.perf_counter() - start, (handler_name(scope),))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUESTS.inc((handler_name(scope), scope["method"], str(status)))
+
+def handler_name(scope: Dict[str, Any]) -> str:
+    # The router stores the matched endpoint in the scope; unmatched paths share one label
+    endpoint = scope.get("endpoint")
+    return getattr(endpoint, "__name__", "unmatched")
@@ -0,0 +1,119 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Set
+from provider_clients import ProviderClientRegistry
+from log_utils import log_event
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class ModelCatalog:
+    """
+    Catalog of the models each provider can serve.
+
+    Models are discovered from the provider APIs once at startup and then
+    periodically, off the request path. A configured model is offered when
+    discovery found it; if discovery for a provider is unsupported or has not
+    succeeded yet, the configured list is used as is.
+    """
+
+    def __init__(
+        self,
+        clients: ProviderClientRegistry,
+        configured_models: Dict[str, List[str]],
+        refresh_interval: float = 3600
+    ):
+        self.clients = clients
+        self.configured_models = configured_models
+        self.refresh_interval = refresh_interval
+        self.discovered: Dict[str, Set[str]] = {}
+        self.last_refresh: Optional[float] = None
+        self.refreshed_at: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def models(self, provider: str) -> List[str]:
+        configured = self.configured_models.get(provider, [])
+        discovered = self.discovered.get(provider)
+        if discovered is None:
+            return list(configured)
+        return [model for model in configured if model in discovered]
+
+    def is_available(self, provider: str, model: str) -> bool:
+        return model in self.models(provider)
+
+    async def _discover_openai(self) -> Set[str]:
+        page = await self.clients.call("openai", lambda: self.clients.openai.models.list())
+        return {model.id for model in page.data}
+
+    async def _discover_google(self) -> Set[str]:
+        self.clients.configure_gemini()
+        genai = self.clients.sdk("google")
+        models = await asyncio.to_thread(lambda: list(genai.list_models()))
+        return {
+            model.name.split("/", 1)[-1] for model in models
+            if "generateContent" in model.supported_generation_methods
+        }
+
+    async def refresh(self, providers: Optional[List[str]] = None):
+        """Rediscover models for `providers` (default: every configured provider) with an API key."""
+        # The Anthropic SDK in use has no model listing endpoint
+        discoverers = {"openai": self._discover_openai, "google": self._discover_google}
+        for provider, discover in discoverers.items():
+            if provider not in self.configured_models or not os.getenv(f"{provider.upper()}_API_KEY"):
+                continue
+            if providers is not None and provider not in providers:
+                continue
+            try:
+                # Import the SDK off the event loop if preloading hasn't yet
+                await asyncio.to_thread(self.clients.sdk, provider)
+                self.discovered[provider] = await discover()
+                self.refreshed_at[provider] = time.time()
+                log_event(logger, "model_catalog_refreshed", provider=provider,
+                          discovered=len(self.discovered[provider]), available=self.models(provider))
+            except Exception as e:
+                logger.warning(f"Model discovery failed for {provider}, keeping previous list: {str(e)}")
+        self.last_refresh = time.time()
+
+    def due(self) -> List[str]:
+        """Configured providers whose models were not discovered within the refresh interval."""
+        now = time.time()
+        return [
+            provider for provider in self.configured_models
+            if now - self.refreshed_at.get(provider, 0.0) >= self.refresh_interval
+        ]
+
+    async def _run(self):
+        while True:
+            await self.refresh(self.due())
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self):
+        """
+        Discover models now and then every refresh_interval seconds. Providers
+        discovered recently (e.g. before a pre-forked worker started) are skipped.
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "last_refresh": self.last_refresh,
+            "providers": {
+                provider: {
+                    "discovered": provider in self.discovered,
+                    "available": self.models(provider)
+                }
+                for provider in self.configured_models
+            }
+        }
@@ -0,0 +1,350 @@
+import os
+import math
+import time
+import logging
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from pydantic import BaseModel
+from provider_clients import model_price
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Output tokens assumed for a call until a model's own responses have been measured
+DEFAULT_OUTPUT_TOKENS = 300
+
+class NoRouteError(ValueError):
+    """Raised when no candidate model can serve a request within its cost budget."""
+
+class RouteCandidate(BaseModel):
+    provider: str
+    model: str
+    predicted_latency_ms: Optional[float] = None
+    estimated_cost_usd: Optional[float] = None
+    error_rate: Optional[float] = None
+    quality: Optional[float] = None
+    samples: int = 0
+    eligible: bool = True
+    within_budget: bool = True
+    reasons: List[str] = []
+
+class RouteAttempt(BaseModel):
+    provider: str
+    model: str
+    error: Optional[str] = None
+
+class RoutingDecision(BaseModel):
+    """Which model served a routed request, and why; returned with the response for auditing."""
+    provider: Optional[str] = None
+    model: Optional[str] = None
+    prompt_tokens: Optional[int] = None
+    latency_slo_ms: Optional[float] = None
+    max_cost_usd: Optional[float] = None
+    reason: str
+    candidates: List[RouteCandidate] = []
+    attempts: List[RouteAttempt] = []
+    cached: bool = False
+
+class ModelStats:
+    """Rolling observations of one provider/model."""
+
+    def __init__(self, max_samples: int):
+        # (time, prompt tokens, seconds or None for a failed call)
+        self.calls: Deque[Tuple[float, int, Optional[float]]] = deque(maxlen=max_samples)
+        self.output_tokens: Deque[int] = deque(maxlen=max_samples)
+        # Share of a response's headlines that met the request's constraints
+        self.quality: Deque[float] = deque(maxlen=max_samples)
+        self.failures = 0
+        # (intercept, slope, margin) of the latency fit, until the calls change
+        self.fit: Optional[Tuple[float, float, float]] = None
+
+    def add_call(self, at: float, prompt_tokens: int, seconds: Optional[float]):
+        if len(self.calls) == self.calls.maxlen:
+            self._drop()
+        self.calls.append((at, prompt_tokens, seconds))
+        self.failures += seconds is None
+        self.fit = None
+
+    def prune(self, cutoff: float):
+        while self.calls and self.calls[0][0] < cutoff:
+            self._drop()
+
+    def _drop(self):
+        self.failures -= self.calls.popleft()[2] is None
+        self.fit = None
+
+class ModelRouter:
+    """
+    Picks the provider/model for a request from its prompt size, a latency
+    SLO and/or a cost budget, using latency, error rate and output quality
+    it observes per model.
+
+    Latency is predicted for the prompt's token count by a least-squares
+    fit of recent call latencies against prompt tokens, plus the
+    `latency_quantile` of the residuals, so the SLO holds for most calls
+    rather than the average one. Cost is estimated from MODEL_PRICES and
+    the model's mean output length. Quality is the share of headlines
+    meeting the request's constraints before any repair.
+
+    Candidates that meet the SLO and budget, with an error rate at most
+    `max_error_rate` and quality at least `min_quality`, are eligible; the
+    cheapest one whose quality is within `quality_tolerance` of the best
+    eligible quality is chosen. Models without enough samples are assumed
+    to meet the SLO and to be of the best quality, so every model is tried.
+    Latency and errors only count for `window` seconds, so a model excluded
+    after an outage is tried again once it ages out; quality is kept for
+    the last `max_samples` responses regardless of age.
+    """
+
+    def __init__(
+        self,
+        prices: Dict[str, Tuple[float, float]],
+        window: float = 300.0,
+        max_samples: int = 200,
+        min_samples: int = 5,
+        latency_quantile: float = 0.9,
+        max_error_rate: float = 0.3,
+        min_quality: float = 0.5,
+        quality_tolerance: float = 0.05,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.prices = prices
+        self.window = window
+        self.max_samples = max_samples
+        self.min_samples = min_samples
+        self.latency_quantile = latency_quantile
+        self.max_error_rate = max_error_rate
+        self.min_quality = min_quality
+        self.quality_tolerance = quality_tolerance
+        self.clock = clock
+        self._stats: Dict[Tuple[str, str], ModelStats] = {}
+
+    def _model_stats(self, provider: str, model: str) -> ModelStats:
+        key = (provider, model)
+        if key not in self._stats:
+            self._stats[key] = ModelStats(self.max_samples)
+        return self._stats[key]
+
+    def record_call(
+        self,
+        provider: str,
+        model: str,
+        prompt_tokens: int,
+        seconds: Optional[float],
+        output_tokens: Optional[int] = None
+    ):
+        """Record a call's latency, or a failed call when `seconds` is None."""
+        stats = self._model_stats(provider, model)
+        stats.add_call(self.clock(), prompt_tokens, seconds)
+        if output_tokens:
+            stats.output_tokens.append(output_tokens)
+
+    def record_quality(self, provider: str, model: str, passed: int, total: int):
+        if total:
+            self._model_stats(provider, model).quality.append(passed / total)
+
+    def predict_latency(self, provider: str, model: str, prompt_tokens: int) -> Optional[float]:
+        """Seconds a call with `prompt_tokens` will take at the latency quantile; None until sampled."""
+        stats = self._stats.get((provider, model))
+        if stats is None:
+            return None
+        stats.prune(self.clock() - self.window)
+        if stats.fit is None:
+            samples = [(tokens, seconds) for _, tokens, seconds in stats.calls if seconds is not None]
+            if len(samples) < self.min_samples:
+                return None
+            mean_tokens = sum(tokens for tokens, _ in samples) / len(samples)
+            mean_seconds = sum(seconds for _, seconds in samples) / len(samples)
+            variance = sum((tokens - mean_tokens) ** 2 for tokens, _ in samples)
+            covariance = sum((tokens - mean_tokens) * (seconds - mean_seconds) for tokens, seconds in samples)
+            # Longer prompts never make a call faster; a negative slope is noise
+            slope = max(covariance / variance, 0.0) if variance else 0.0
+            intercept = mean_seconds - slope * mean_tokens
+            residuals = sorted(seconds - (intercept + slope * tokens) for tokens, seconds in samples)
+            margin = residuals[min(len(residuals) - 1, math.ceil(self.latency_quantile * len(residuals)) - 1)]
+            stats.fit = (intercept, slope, margin)
+        intercept, slope, margin = stats.fit
+        return max(intercept + slope * prompt_tokens + margin, 0.0)
+
+    def error_rate(self, provider: str, model: str) -> Optional[float]:
+        """Share of failed calls within the window; None until sampled."""
+        stats = self._stats.get((provider, model))
+        if stats is None:
+            return None
+        stats.prune(self.clock() - self.window)
+        if len(stats.calls) < self.min_samples:
+            return None
+        return stats.failures / len(stats.calls)
+
+    def quality(self, provider: str, model: str) -> Optional[float]:
+        stats = self._stats.get((provider, model))
+        if stats is None or len(stats.quality) < self.min_samples:
+            return None
+        return sum(stats.quality) / len(stats.quality)
+
+    def estimate_cost(self, provider: str, model: str, prompt_tokens: int) -> Optional[float]:
+        """Estimated USD cost of one call, or None when the model has no price."""
+        price = model_price(self.prices, model)
+        if price is None:
+            return None
+        stats = self._stats.get((provider, model))
+        output_tokens = (
+            sum(stats.output_tokens) / len(stats.output_tokens)
+            if stats is not None and stats.output_tokens else DEFAULT_OUTPUT_TOKENS
+        )
+        return (prompt_tokens * price[0] + output_tokens * price[1]) / 1e6
+
+    def _evaluate(
+        self,
+        provider: str,
+        model: str,
+        prompt_tokens: int,
+        latency_slo: Optional[float],
+        max_cost: Optional[float]
+    ) -> RouteCandidate:
+        latency = self.predict_latency(provider, model, prompt_tokens)
+        cost = self.estimate_cost(provider, model, prompt_tokens)
+        error_rate = self.error_rate(provider, model)
+        quality = self.quality(provider, model)
+        stats = self._stats.get((provider, model))
+        candidate = RouteCandidate(
+            provider=provider,
+            model=model,
+            predicted_latency_ms=round(latency * 1000) if latency is not None else None,
+            estimated_cost_usd=cost,
+            error_rate=error_rate,
+            quality=quality,
+            samples=len(stats.calls) if stats is not None else 0,
+            reasons=[]
+        )
+        if latency_slo is not None:
+            if latency is None:
+                candidate.reasons.append("no latency data yet; assumed to meet the SLO")
+            elif latency > latency_slo:
+                candidate.eligible = False
+                candidate.reasons.append(
+                    f"p{self.latency_quantile * 100:.0f} latency {latency * 1000:.0f} ms for {prompt_tokens} "
+                    f"prompt tokens exceeds the {latency_slo * 1000:.0f} ms SLO"
+                )
+        if max_cost is not None:
+            if cost is None:
+                candidate.eligible = candidate.within_budget = False
+                candidate.reasons.append("no price configured (MODEL_PRICES)")
+            elif cost > max_cost:
+                candidate.eligible = candidate.within_budget = False
+                candidate.reasons.append(f"estimated cost ${cost:.5f} exceeds the ${max_cost:.5f} budget")
+        if error_rate is not None and error_rate > self.max_error_rate:
+            candidate.eligible = False
+            candidate.reasons.append(
+                f"{error_rate:.0%} of recent calls failed (more than {self.max_error_rate:.0%})"
+            )
+        if quality is None:
+            candidate.reasons.append("no quality data yet; assumed to be the best")
+        elif quality < self.min_quality:
+            candidate.eligible = False
+            candidate.reasons.append(
+                f"{quality:.0%} of its headlines met the constraints (less than {self.min_quality:.0%})"
+            )
+        return candidate
+
+    def route(
+        self,
+        candidates: List[Tuple[str, str]],
+        prompt_tokens: int,
+        latency_slo: Optional[float] = None,
+        max_cost: Optional[float] = None
+    ) -> RoutingDecision:
+        """
+        Rank `candidates` for a prompt of `prompt_tokens` tokens, best first;
+        `latency_slo` is in seconds and `max_cost` in USD per call.
+
+        The decision's provider/model is the first choice; the generator
+        falls back along the ranked candidates that fit the budget.
+        """
+        evaluated = [
+            self._evaluate(provider, model, prompt_tokens, latency_slo, max_cost) for provider, model in candidates
+        ]
+        eligible = [candidate for candidate in evaluated if candidate.eligible]
+        requirements = []
+        if latency_slo is not None:
+            requirements.append(f"the {latency_slo * 1000:.0f} ms SLO")
+        if max_cost is not None:
+            requirements.append(f"the ${max_cost:.5f} budget")
+        requirements = " and ".join(requirements) or "the error rate and quality thresholds"
+
+        def cost(candidate: RouteCandidate) -> float:
+            return candidate.estimated_cost_usd if candidate.estimated_cost_usd is not None else math.inf
+
+        def quality(candidate: RouteCandidate) -> float:
+            return candidate.quality if candidate.quality is not None else 1.0
+
+        if eligible:
+            best = max(quality(candidate) for candidate in eligible)
+            ranked = sorted(eligible, key=lambda candidate: (
+                quality(candidate) < best - self.quality_tolerance, cost(candidate), -quality(candidate)
+            ))
+            reason = (
+                f"Cheapest of {len(eligible)} of {len(evaluated)} candidates meeting {requirements}, "
+                f"with quality within {self.quality_tolerance:.0%} of the best"
+            )
+        else:
+            ranked = []
+            if latency_slo is not None:
+                reason = f"No candidate meets {requirements}; chose the fastest predicted"
+            else:
+                reason = f"No candidate meets {requirements}; chose the cheapest"
+        # Ineligible candidates come last, fastest first when there is an SLO, cheapest otherwise
+        ranked += sorted(
+            [candidate for candidate in evaluated if not candidate.eligible],
+            key=lambda candidate: (
+                not candidate.within_budget,
+                (candidate.predicted_latency_ms or 0.0) if latency_slo is not None else cost(candidate),
+                cost(candidate)
+            )
+        )
+        if not ranked:
+            raise NoRouteError("No candidate models to route to")
+        if not ranked[0].within_budget:
+            raise NoRouteError(f"No candidate model fits the ${max_cost:.5f} budget for {prompt_tokens} prompt tokens")
+        if not eligible:
+            logger.info(f"{reason}: {ranked[0].provider}/{ranked[0].model}")
+        return RoutingDecision(
+            provider=ranked[0].provider,
+            model=ranked[0].model,
+            prompt_tokens=prompt_tokens,
+            latency_slo_ms=latency_slo * 1000 if latency_slo is not None else None,
+            max_cost_usd=max_cost,
+            reason=reason,
+            candidates=ranked
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {}
+        for (provider, model), model_stats in list(self._stats.items()):
+            model_stats.prune(self.clock() - self.window)
+            stats[f"{provider}/{model}"] = {
+                "calls": len(model_stats.calls),
+                "error_rate": self.error_rate(provider, model),
+                "quality": self.quality(provider, model),
+                "mean_output_tokens": (
+                    sum(model_stats.output_tokens) / len(model_stats.output_tokens)
+                    if model_stats.output_tokens else None
+                )
+            }
+        return stats
+
+def create_model_router(prices: Dict[str, Tuple[float, float]]) -> ModelRouter:
+    """
+    Model router configured from ROUTER_WINDOW (seconds), ROUTER_MIN_SAMPLES,
+    ROUTER_LATENCY_QUANTILE, ROUTER_MAX_ERROR_RATE, ROUTER_MIN_QUALITY and
+    ROUTER_QUALITY_TOLERANCE.
+    """
+    return ModelRouter(
+        prices,
+        window=float(os.getenv("ROUTER_WINDOW", "300")),
+        min_samples=int(os.getenv("ROUTER_MIN_SAMPLES", "5")),
+        latency_quantile=float(os.getenv("ROUTER_LATENCY_QUANTILE", "0.9")),
+        max_error_rate=float(os.getenv("ROUTER_MAX_ERROR_RATE", "0.3")),
+        min_quality=float(os.getenv("ROUTER_MIN_QUALITY", "0.5")),
+        quality_tolerance=float(os.getenv("ROUTER_QUALITY_TOLERANCE", "0.05"))
+    )
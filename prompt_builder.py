@@ -1,5 +1,24 @@
-from typing import List, Dict
+import re
+import math
+import heapq
+from functools import lru_cache
+from string import Formatter
+from typing import Any, List, Dict, Optional, Tuple
 from pydantic import BaseModel
+from keyword_extractor import KeywordExtractor, tokenize
+
+try:
+    import tiktoken
+except ImportError:  # Optional: exact token counts for OpenAI models
+    tiktoken = None
+
+# Average characters per token by model family, used when no tokenizer is available
+CHARS_PER_TOKEN = {"gpt": 4.0, "claude": 3.5, "gemini": 4.0}
+
+# Share of the input budget that past headlines may use
+PAST_HEADLINES_BUDGET_SHARE = 0.2
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
 
 class PromptContext(BaseModel):
     newsletter_text: str
@@ -10,24 +29,198 @@ class PromptContext(BaseModel):
     constraints: Dict
     trending_topics: List[str]
 
-def build_prompt(context: PromptContext) -> str:
+class TokenUsage(BaseModel):
+    original_input_tokens: int
+    compacted_input_tokens: int
+
+@lru_cache(maxsize=None)
+def _tiktoken_encoding(model: str):
+    return tiktoken.encoding_for_model(model)
+
+def count_tokens(text: str, model: str = "gpt-4") -> int:
     """
-    Builds a comprehensive prompt for the LLM based on the provided context.
+    Count tokens for the target model: exactly with tiktoken for OpenAI
+    models when it is installed, otherwise estimated from characters.
+    """
+    if tiktoken is not None and model.startswith("gpt"):
+        try:
+            return len(_tiktoken_encoding(model).encode(text))
+        except KeyError:
+            pass
+    chars_per_token = next(
+        (ratio for prefix, ratio in CHARS_PER_TOKEN.items() if model.startswith(prefix)), 4.0
+    )
+    return math.ceil(len(text) / chars_per_token)
+
+def _select_past_headlines(
+    past_headlines: List[str],
+    term_weights: Dict[str, float],
+    budget: int,
+    model: str
+) -> List[str]:
+    """Deduplicate past headlines and keep the most relevant ones that fit the budget."""
+    unique = {}
+    for headline in past_headlines:
+        key = " ".join(tokenize(headline))
+        if key and key not in unique:
+            unique[key] = headline
+
+    ranked = sorted(
+        unique.values(),
+        key=lambda headline: -sum(term_weights.get(term, 0.0) for term in set(tokenize(headline)))
+    )
+    selected = set()
+    used = 0
+    for headline in ranked:
+        # Each headline is rendered as "- {headline}\n"
+        cost = count_tokens(headline, model) + 2
+        if used + cost <= budget:
+            selected.add(headline)
+            used += cost
+    return [headline for headline in unique.values() if headline in selected]
+
+def _summarize_newsletter(text: str, term_weights: Dict[str, float], budget: int, model: str) -> str:
+    """
+    Extractive summary: greedily keep the most salient sentences that fit the
+    budget, in their original order. A sentence scores the TF-IDF weight of
+    its distinct terms, normalised by length, with a bonus for the lead.
+    Terms already covered by a selected sentence are down-weighted, so
+    repetitive sentences don't crowd out the rest (SumBasic-style).
+    """
+    sentences = []
+    seen = set()
+    for sentence in SENTENCE_BOUNDARY.split(text):
+        sentence = sentence.strip()
+        key = " ".join(tokenize(sentence))
+        if sentence and key not in seen:
+            seen.add(key)
+            sentences.append(sentence)
+    if not sentences:
+        return ""
+
+    weights = dict(term_weights)
+    sentence_terms = [set(tokenize(sentence)) for sentence in sentences]
+    norms = [math.sqrt(len(tokenize(sentence)) + 1) for sentence in sentences]
+
+    def score(index: int) -> float:
+        value = sum(weights.get(term, 0.0) for term in sentence_terms[index]) / norms[index]
+        return value * 1.5 if index == 0 else value
+
+    # Scores only decrease as terms are covered, so a lazy max-heap stays correct
+    heap = [(-score(index), index) for index in range(len(sentences))]
+    heapq.heapify(heap)
+    selected = []
+    used = 0
+    while heap:
+        _, index = heapq.heappop(heap)
+        current = score(index)
+        if heap and current < -heap[0][0] - 1e-9:
+            heapq.heappush(heap, (-current, index))
+            continue
+        cost = count_tokens(sentences[index], model) + 1
+        if used + cost > budget:
+            continue
+        selected.append(index)
+        used += cost
+        for term in sentence_terms[index]:
+            if term in weights:
+                weights[term] *= 0.5
+
+    if not selected:
+        # Always keep something; trim the lead sentence to the budget
+        return sentences[0][:max(1, int(budget * 3.5))]
+    return " ".join(sentences[index] for index in sorted(selected))
+
+def compact_context(
+    context: PromptContext,
+    model: str,
+    token_budget: int,
+    keyword_extractor: Optional[KeywordExtractor] = None
+) -> Tuple[PromptContext, TokenUsage]:
     """
-    prompt = """You are an expert email copywriter trained on millions of high-performing newsletter subject lines.
+    Shrink the newsletter text and past headlines so the built prompt fits
+    `token_budget` input tokens for `model`. Contexts that already fit are
+    returned unchanged.
+
+    Returns:
+        (compacted context, original vs. compacted token counts)
+    """
+    original_tokens = count_tokens(build_prompt(context), model)
+    if original_tokens <= token_budget:
+        return context, TokenUsage(original_input_tokens=original_tokens, compacted_input_tokens=original_tokens)
+
+    extractor = keyword_extractor or KeywordExtractor()
+    term_weights = extractor.term_weights(context.newsletter_text)
+
+    skeleton = context.model_copy(update={"newsletter_text": "", "past_headlines": []})
+    available = max(token_budget - count_tokens(build_prompt(skeleton), model), 0)
+
+    past_headlines = _select_past_headlines(
+        context.past_headlines, term_weights, int(available * PAST_HEADLINES_BUDGET_SHARE), model
+    )
+    headline_tokens = sum(count_tokens(headline, model) + 2 for headline in past_headlines)
+    newsletter_text = _summarize_newsletter(
+        context.newsletter_text, term_weights, available - headline_tokens, model
+    )
+
+    compacted = context.model_copy(update={"newsletter_text": newsletter_text, "past_headlines": past_headlines})
+    compacted_tokens = count_tokens(build_prompt(compacted), model)
+    return compacted, TokenUsage(original_input_tokens=original_tokens, compacted_input_tokens=compacted_tokens)
+
+class PromptTemplate:
+    """
+    A prompt template parsed once into literal text and field names, so
+    rendering is a single join with no format-string parsing per request.
+    """
+
+    def __init__(self, template: str):
+        self.segments: List[Tuple[str, Optional[str]]] = []
+        for literal, field, spec, conversion in Formatter().parse(template):
+            if spec or conversion:
+                raise ValueError(f"Format specs are not supported in prompt templates: {field}")
+            self.segments.append((literal, field))
+        self.fields = {field for _, field in self.segments if field is not None}
+
+    def render(self, **values: Any) -> str:
+        parts = []
+        for literal, field in self.segments:
+            parts.append(literal)
+            if field is not None:
+                parts.append(str(values[field]))
+        return "".join(parts)
 
-Your task is to generate 5 unique, high-performing subject lines based on the newsletter content below. Each should:
+# Static instructions go first and never vary (for a given variant count),
+# so they form a cacheable prefix for provider-side prompt caching.
+SYSTEM_PROMPT_TEMPLATE = PromptTemplate("""You are an expert email copywriter trained on millions of high-performing newsletter subject lines.
+
+Your task is to generate {variants} unique, high-performing subject lines based on the newsletter content you are given. Each should:
 - Increase open rates
 - Be optimized for emotional hooks, curiosity, or relevance
 - Avoid overused clichés
 - Match the tone and audience provided
-- Be under {max_length} characters unless otherwise stated
+- Stay within the maximum length in the constraints unless otherwise stated
 
 Also return:
 - A list of relevant keywords each subject line targets
 - A short explanation of why each subject line is compelling
 
-## Context:
+Format your response as a JSON list with the following keys:
+- "title"
+- "keywords"
+- "reason\"""")
+
+@lru_cache(maxsize=None)
+def system_prompt(variants: int = 5) -> str:
+    return SYSTEM_PROMPT_TEMPLATE.render(variants=variants)
+
+SYSTEM_PROMPT = system_prompt()
+
+# Added for providers whose JSON mode only returns objects
+JSON_OBJECT_INSTRUCTION = 'Return the list as the value of a "headlines" key in a JSON object.'
+
+# Audience, history and constraints are stable across a sender's requests,
+# so they extend the cacheable prefix.
+CONTEXT_TEMPLATE = PromptTemplate("""## Context:
 Audience: {audience_profile}
 Goal: {goal}
 Tone: {tone}
@@ -37,28 +230,96 @@ Past high-performing headlines:
 Constraints:
 - Maximum length: {max_length} characters
 - Avoid clickbait: {avoid_clickbait}
-- Require numbers: {require_numbers}
+- Require numbers: {require_numbers}""")
 
-Trending Topics:
+# Per-request content comes last
+CONTENT_TEMPLATE = PromptTemplate("""Trending Topics:
 {formatted_trends}
 
 ## Newsletter Content:
-{newsletter_text}
+{newsletter_text}""")
+
+# Targeted follow-up for the subject lines that broke a constraint
+REPAIR_SYSTEM_PROMPT = """You are an expert email copywriter fixing newsletter subject lines that break their constraints.
+
+Rewrite each subject line you are given so that it meets every constraint, keeping its angle, keywords and the requested tone. Return exactly one rewrite per subject line, in the same order.
 
 Format your response as a JSON list with the following keys:
 - "title"
 - "keywords"
-- "reason"
-""".format(
-        max_length=context.constraints.get("max_length", 60),
-        audience_profile=context.audience_profile,
-        goal=context.goal,
-        tone=context.tone,
-        formatted_headlines="\n".join(f"- {headline}" for headline in context.past_headlines),
-        avoid_clickbait=context.constraints.get("avoid_clickbait", True),
-        require_numbers=context.constraints.get("require_numbers", False),
-        formatted_trends="\n".join(f"- {topic}" for topic in context.trending_topics),
-        newsletter_text=context.newsletter_text
+- \"reason\""""
+
+REPAIR_CONTEXT_TEMPLATE = PromptTemplate("""## Context:
+Audience: {audience_profile}
+Tone: {tone}
+
+Constraints:
+- Maximum length: {max_length} characters
+- Avoid clickbait: {avoid_clickbait}
+- Require numbers: {require_numbers}""")
+
+class Prompt(BaseModel):
+    """A prompt split into its static, per-audience and per-request sections."""
+    system: str
+    context: str
+    content: str
+
+    @property
+    def user(self) -> str:
+        return f"{self.context}\n\n{self.content}"
+
+    @property
+    def text(self) -> str:
+        return f"{self.system}\n\n{self.user}"
+
+def build_messages(context: PromptContext, variants: int = 5) -> Prompt:
+    """
+    Builds the prompt for the LLM, ordered from most to least reusable so
+    providers can serve the shared prefix from their prompt cache.
+    """
+    return Prompt(
+        system=system_prompt(variants),
+        context=CONTEXT_TEMPLATE.render(
+            audience_profile=context.audience_profile,
+            goal=context.goal,
+            tone=context.tone,
+            formatted_headlines="\n".join(f"- {headline}" for headline in context.past_headlines),
+            max_length=context.constraints.get("max_length", 60),
+            avoid_clickbait=context.constraints.get("avoid_clickbait", True),
+            require_numbers=context.constraints.get("require_numbers", False)
+        ),
+        content=CONTENT_TEMPLATE.render(
+            formatted_trends="\n".join(f"- {topic}" for topic in context.trending_topics),
+            newsletter_text=context.newsletter_text
+        )
+    )
+
+def build_prompt(context: PromptContext) -> str:
+    """
+    Builds a comprehensive prompt for the LLM based on the provided context.
+    """
+    return build_messages(context).text
+
+def build_repair_messages(
+    failing: List[Tuple[str, str]],
+    audience_profile: str,
+    tone: str,
+    constraints: Dict
+) -> Prompt:
+    """
+    Builds a small prompt asking for rewrites of the given subject lines only.
+
+    Args:
+        failing: (subject line, why it breaks the constraints) pairs
+    """
+    return Prompt(
+        system=REPAIR_SYSTEM_PROMPT,
+        context=REPAIR_CONTEXT_TEMPLATE.render(
+            audience_profile=audience_profile,
+            tone=tone,
+            max_length=constraints.get("max_length", 60),
+            avoid_clickbait=constraints.get("avoid_clickbait", True),
+            require_numbers=constraints.get("require_numbers", False)
+        ),
+        content="## Subject lines to fix:\n" + "\n".join(f'- "{title}" ({reasons})' for title, reasons in failing)
     )
-    
-    return prompt 
\ No newline at end of file
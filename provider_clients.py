@@ -0,0 +1,435 @@
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+import threading
+import importlib
+import importlib.util
+from types import ModuleType
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple, TypeVar
+import httpx
+from rate_limiter import (
+    THROTTLE_STATUS_CODES, ProviderRateLimiter, ProviderRateLimitError, create_provider_rate_limiter, retry_after
+)
+from metrics import LLM_COST, LLM_TOKENS
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+    from anthropic import AsyncAnthropic
+    from google.generativeai import GenerativeModel
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# SDK module per provider; each is imported on first use (they take ~0.5-1s and 25-70 MB each)
+PROVIDER_SDK_MODULES = {"openai": "openai", "anthropic": "anthropic", "google": "google.generativeai"}
+
+# The SDKs share dependencies (pydantic.v1, grpc), and a module another thread is still
+# importing is already in sys.modules, half initialised; so imports are serialised
+_sdk_import_lock = threading.Lock()
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits, overload and 5xx
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+# USD per million (input, output) tokens, matched on the longest model-name prefix
+DEFAULT_MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.6),
+    "gpt-4o": (2.5, 10.0),
+    "gpt-4-turbo": (10.0, 30.0),
+    "gpt-4": (30.0, 60.0),
+    "gpt-3.5-turbo": (0.5, 1.5),
+    "claude-3-opus": (15.0, 75.0),
+    "claude-3-5-sonnet": (3.0, 15.0),
+    "claude-3-sonnet": (3.0, 15.0),
+    "claude-3-haiku": (0.25, 1.25),
+    "gemini-pro": (0.5, 1.5),
+    "gemini-1.0-pro": (0.5, 1.5),
+    "gemini-1.5-flash": (0.075, 0.3),
+    "gemini-1.5-pro": (1.25, 5.0)
+}
+# Price of an input token read from / written to the prompt cache, relative to a regular one
+CACHE_READ_PRICE = {"openai": 0.5, "anthropic": 0.1, "google": 0.25}
+CACHE_WRITE_PRICE = {"openai": 1.0, "anthropic": 1.25, "google": 1.0}
+
+class ProviderDisabledError(Exception):
+    """Raised when a provider that is not in ENABLED_PROVIDERS is used."""
+
+def parse_enabled_providers(value: str) -> Tuple[str, ...]:
+    """Parse "openai,anthropic" into provider names, rejecting unknown ones."""
+    providers = tuple(provider.strip() for provider in value.split(",") if provider.strip())
+    for provider in providers:
+        if provider not in PROVIDER_SDK_MODULES:
+            raise ValueError(f"Unknown provider in ENABLED_PROVIDERS: {provider!r}")
+    return providers
+
+def status_code(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        # google.api_core exceptions carry the HTTP status as `code`
+        status = getattr(error, "code", None)
+    return status if isinstance(status, int) else None
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a provider error is transient and the call should be retried."""
+    status = status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    return isinstance(error, (httpx.TransportError, asyncio.TimeoutError)) or type(error).__name__ in (
+        "APIConnectionError", "APITimeoutError"
+    )
+
+def _field(obj: Any, name: str) -> Any:
+    # SDKs surface newer usage fields either as attributes or as plain dicts
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+def prompt_cache_usage(provider: str, response: Any) -> Tuple[int, int, int]:
+    """
+    Input token counts reported by a provider response.
+
+    Returns:
+        (input tokens, input tokens read from the prompt cache, input tokens written to it)
+    """
+    if provider == "openai":
+        usage = _field(response, "usage")
+        details = _field(usage, "prompt_tokens_details")
+        return _field(usage, "prompt_tokens") or 0, _field(details, "cached_tokens") or 0, 0
+    if provider == "anthropic":
+        usage = _field(response, "usage")
+        cache_read = _field(usage, "cache_read_input_tokens") or 0
+        cache_write = _field(usage, "cache_creation_input_tokens") or 0
+        # Anthropic's input_tokens excludes tokens read from or written to the cache
+        return (_field(usage, "input_tokens") or 0) + cache_read + cache_write, cache_read, cache_write
+    if provider == "google":
+        usage = _field(response, "usage_metadata")
+        return _field(usage, "prompt_token_count") or 0, _field(usage, "cached_content_token_count") or 0, 0
+    raise ValueError(f"Unsupported provider: {provider}")
+
+def output_token_usage(provider: str, response: Any) -> int:
+    """Completion tokens reported by a provider response (or Anthropic message_delta event)."""
+    if provider == "openai":
+        return _field(_field(response, "usage"), "completion_tokens") or 0
+    if provider == "anthropic":
+        return _field(_field(response, "usage"), "output_tokens") or 0
+    if provider == "google":
+        return _field(_field(response, "usage_metadata"), "candidates_token_count") or 0
+    raise ValueError(f"Unsupported provider: {provider}")
+
+def model_price(prices: Dict[str, Tuple[float, float]], model: str) -> Optional[Tuple[float, float]]:
+    """(input, output) USD per million tokens for the longest matching model prefix."""
+    matches = [prefix for prefix in prices if model.startswith(prefix)]
+    return prices[max(matches, key=len)] if matches else None
+
+def usage_cost(
+    provider: str,
+    price: Tuple[float, float],
+    input_tokens: int,
+    cached: int,
+    written: int,
+    output_tokens: int
+) -> float:
+    """Estimated USD cost of one response's token usage."""
+    input_price, output_price = price
+    billed_input = (
+        (input_tokens - cached - written)
+        + cached * CACHE_READ_PRICE.get(provider, 1.0)
+        + written * CACHE_WRITE_PRICE.get(provider, 1.0)
+    )
+    return (billed_input * input_price + output_tokens * output_price) / 1e6
+
+class ProviderClientRegistry:
+    """
+    Owns the provider SDK clients and their HTTP connection pools.
+
+    Provider SDKs are imported on first use, and only for enabled providers;
+    preload() imports them off the event loop ahead of the first request.
+    Clients are created on first use with explicit pool limits, keep-alive
+    and per-provider timeouts, Gemini model handles are cached by name, and
+    calls made through call() are retried with exponential backoff and full
+    jitter. Calls for a model go through the provider rate limiter, which
+    follows the rate-limit headers of every response. record_usage() tallies
+    token counts and estimated cost per provider and model. aclose()
+    releases the pools on shutdown.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        http2: bool = False,
+        timeouts: Optional[Dict[str, float]] = None,
+        max_retries: int = 2,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        rate_limiter: Optional[ProviderRateLimiter] = None,
+        prices: Optional[Dict[str, Tuple[float, float]]] = None,
+        enabled_providers: Optional[Iterable[str]] = None
+    ):
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("HTTP/2 requested but the 'h2' package is not installed; using HTTP/1.1")
+            http2 = False
+        self.http2 = http2
+        self.timeouts = {"openai": 30.0, "anthropic": 30.0, "google": 30.0}
+        self.timeouts.update(timeouts or {})
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_limiter = rate_limiter or ProviderRateLimiter()
+        self.prices = dict(DEFAULT_MODEL_PRICES)
+        self.prices.update(prices or {})
+        self.enabled = (
+            set(enabled_providers) if enabled_providers is not None else set(PROVIDER_SDK_MODULES)
+        )
+
+        self._openai: Optional["AsyncOpenAI"] = None
+        self._anthropic: Optional["AsyncAnthropic"] = None
+        self._http_clients: Dict[str, httpx.AsyncClient] = {}
+        self._gemini_models: Dict[str, "GenerativeModel"] = {}
+        self._gemini_configured = False
+        self._in_flight = {provider: 0 for provider in self.timeouts}
+        self._peak_in_flight = {provider: 0 for provider in self.timeouts}
+        self._calls = {provider: 0 for provider in self.timeouts}
+        self._retries = {provider: 0 for provider in self.timeouts}
+        self._input_tokens = {provider: 0 for provider in self.timeouts}
+        self._cached_input_tokens = {provider: 0 for provider in self.timeouts}
+        self._cache_write_tokens = {provider: 0 for provider in self.timeouts}
+        self._output_tokens = {provider: 0 for provider in self.timeouts}
+        self._cost = {provider: 0.0 for provider in self.timeouts}
+
+    def is_enabled(self, provider: str) -> bool:
+        return provider in self.enabled
+
+    def sdk(self, provider: str) -> ModuleType:
+        """The provider's SDK module, imported on first use."""
+        if provider not in self.enabled:
+            raise ProviderDisabledError(f"Provider {provider} is not enabled (see ENABLED_PROVIDERS)")
+        with _sdk_import_lock:
+            return importlib.import_module(PROVIDER_SDK_MODULES[provider])
+
+    async def preload(self):
+        """Import the enabled providers' SDKs in a worker thread, so no request pays for it."""
+        for provider in sorted(self.enabled):
+            start = time.perf_counter()
+            await asyncio.to_thread(self.sdk, provider)
+            logger.info(f"Loaded {provider} SDK in {time.perf_counter() - start:.2f}s")
+
+    def _http_client(self, provider: str) -> httpx.AsyncClient:
+        if provider not in self._http_clients:
+            self._http_clients[provider] = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                    keepalive_expiry=self.keepalive_expiry
+                ),
+                timeout=httpx.Timeout(self.timeouts[provider], connect=5.0),
+                http2=self.http2,
+                event_hooks={"response": [self._rate_limit_hook(provider)]}
+            )
+        return self._http_clients[provider]
+
+    def _rate_limit_hook(self, provider: str) -> Callable[[httpx.Response], Awaitable[None]]:
+        async def observe(response: httpx.Response):
+            try:
+                model = json.loads(response.request.content).get("model")
+            except (ValueError, AttributeError):
+                return
+            if model:
+                self.rate_limiter.observe_headers(provider, model, response.headers)
+        return observe
+
+    @property
+    def openai(self) -> "AsyncOpenAI":
+        if self._openai is None:
+            # Retries are handled by call() so they get jitter and metrics
+            self._openai = self.sdk("openai").AsyncOpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                http_client=self._http_client("openai"),
+                timeout=self.timeouts["openai"],
+                max_retries=0
+            )
+        return self._openai
+
+    @property
+    def anthropic(self) -> "AsyncAnthropic":
+        if self._anthropic is None:
+            self._anthropic = self.sdk("anthropic").AsyncAnthropic(
+                api_key=os.getenv("ANTHROPIC_API_KEY"),
+                http_client=self._http_client("anthropic"),
+                timeout=self.timeouts["anthropic"],
+                max_retries=0
+            )
+        return self._anthropic
+
+    def configure_gemini(self):
+        if not self._gemini_configured:
+            # GOOGLE_API_ENDPOINT points the SDK at a gateway or local stub; the
+            # OpenAI and Anthropic SDKs read OPENAI_BASE_URL / ANTHROPIC_BASE_URL themselves
+            endpoint = os.getenv("GOOGLE_API_ENDPOINT")
+            self.sdk("google").configure(
+                api_key=os.getenv("GOOGLE_API_KEY"),
+                client_options={"api_endpoint": endpoint} if endpoint else None
+            )
+            self._gemini_configured = True
+
+    def gemini_model(self, model: str) -> "GenerativeModel":
+        """Return a cached Gemini model handle."""
+        if model not in self._gemini_models:
+            self.configure_gemini()
+            self._gemini_models[model] = self.sdk("google").GenerativeModel(model)
+        return self._gemini_models[model]
+
+    def request_options(self, provider: str) -> Dict[str, Any]:
+        """Per-call options for SDKs that take the timeout per request (Gemini)."""
+        return {"timeout": self.timeouts[provider]}
+
+    async def _attempt(self, provider: str, request: Callable[[], Awaitable[T]], model: Optional[str], tokens: int) -> T:
+        if model is None:
+            return await request()
+        async with self.rate_limiter.slot(provider, model, tokens):
+            try:
+                result = await request()
+            except Exception as e:
+                if status_code(e) in THROTTLE_STATUS_CODES:
+                    response = getattr(e, "response", None)
+                    self.rate_limiter.on_throttled(
+                        provider, model, retry_after(response.headers) if response is not None else None
+                    )
+                raise
+        self.rate_limiter.on_success(provider, model)
+        return result
+
+    async def call(
+        self,
+        provider: str,
+        request: Callable[[], Awaitable[T]],
+        model: Optional[str] = None,
+        tokens: int = 0
+    ) -> T:
+        """
+        Run a provider request, retrying transient failures with exponential
+        backoff and full jitter.
+
+        Args:
+            provider: Provider name, used for metrics
+            request: Zero-argument callable returning a fresh awaitable per attempt
+            model: Model the request is for; when given, each attempt waits for
+                a slot from the rate limiter
+            tokens: Tokens the request may use (prompt plus maximum output)
+        """
+        attempt = 0
+        while True:
+            self._calls[provider] += 1
+            self._in_flight[provider] += 1
+            self._peak_in_flight[provider] = max(self._peak_in_flight[provider], self._in_flight[provider])
+            try:
+                return await self._attempt(provider, request, model, tokens)
+            except ProviderRateLimitError:
+                raise
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                logger.warning(f"{provider} request failed ({str(e)}), retrying in {delay:.2f}s")
+                self._retries[provider] += 1
+                attempt += 1
+            finally:
+                self._in_flight[provider] -= 1
+            await asyncio.sleep(delay)
+
+    def record_usage(self, provider: str, response: Any, model: str = "unknown"):
+        """Accumulate the token counts and estimated cost of a response."""
+        try:
+            input_tokens, cached, written = prompt_cache_usage(provider, response)
+            output_tokens = output_token_usage(provider, response)
+        except (TypeError, ValueError):
+            return
+        self._input_tokens[provider] += input_tokens
+        self._cached_input_tokens[provider] += cached
+        self._cache_write_tokens[provider] += written
+        self._output_tokens[provider] += output_tokens
+        for token_type, count in (
+            ("input", input_tokens), ("cached_input", cached), ("cache_write", written), ("output", output_tokens)
+        ):
+            if count:
+                LLM_TOKENS.inc((provider, model, token_type), count)
+        price = model_price(self.prices, model)
+        if price is not None:
+            cost = usage_cost(provider, price, input_tokens, cached, written, output_tokens)
+            self._cost[provider] += cost
+            LLM_COST.inc((provider, model), cost)
+
+    async def aclose(self):
+        """Close every HTTP connection pool."""
+        for client in self._http_clients.values():
+            await client.aclose()
+        self._http_clients.clear()
+        self._openai = None
+        self._anthropic = None
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {}
+        for provider in self.timeouts:
+            provider_stats = {
+                "in_flight": self._in_flight[provider],
+                "peak_in_flight": self._peak_in_flight[provider],
+                "calls": self._calls[provider],
+                "retries": self._retries[provider],
+                "input_tokens": self._input_tokens[provider],
+                "cached_input_tokens": self._cached_input_tokens[provider],
+                "cache_write_tokens": self._cache_write_tokens[provider],
+                "output_tokens": self._output_tokens[provider],
+                "estimated_cost_usd": round(self._cost[provider], 6),
+                "cached_input_ratio": (
+                    self._cached_input_tokens[provider] / self._input_tokens[provider]
+                    if self._input_tokens[provider] else 0.0
+                )
+            }
+            client = self._http_clients.get(provider)
+            if client is not None:
+                try:
+                    connections = client._transport._pool.connections
+                    provider_stats["open_connections"] = len(connections)
+                    provider_stats["pool_utilisation"] = len(connections) / self.max_connections
+                except AttributeError:
+                    pass
+            stats[provider] = provider_stats
+        return stats
+
+def create_provider_clients() -> ProviderClientRegistry:
+    """
+    Build the client registry from environment variables:
+    PROVIDER_MAX_CONNECTIONS, PROVIDER_MAX_KEEPALIVE, PROVIDER_KEEPALIVE_EXPIRY,
+    PROVIDER_HTTP2, {OPENAI,ANTHROPIC,GOOGLE}_TIMEOUT, PROVIDER_MAX_RETRIES,
+    PROVIDER_BACKOFF_BASE, PROVIDER_BACKOFF_MAX, MODEL_PRICES (JSON
+    object of model prefix -> [input, output] USD per million tokens, merged
+    over the defaults) and ENABLED_PROVIDERS (comma-separated), plus the rate limiter settings read by
+    create_provider_rate_limiter().
+    """
+    prices = {
+        prefix: tuple(price) for prefix, price in json.loads(os.getenv("MODEL_PRICES", "{}")).items()
+    }
+    return ProviderClientRegistry(
+        max_connections=int(os.getenv("PROVIDER_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("PROVIDER_MAX_KEEPALIVE", "20")),
+        keepalive_expiry=float(os.getenv("PROVIDER_KEEPALIVE_EXPIRY", "30")),
+        http2=os.getenv("PROVIDER_HTTP2", "false").lower() == "true",
+        timeouts={
+            provider: float(os.getenv(f"{provider.upper()}_TIMEOUT", "30"))
+            for provider in ("openai", "anthropic", "google")
+        },
+        max_retries=int(os.getenv("PROVIDER_MAX_RETRIES", "2")),
+        backoff_base=float(os.getenv("PROVIDER_BACKOFF_BASE", "0.5")),
+        backoff_max=float(os.getenv("PROVIDER_BACKOFF_MAX", "8")),
+        rate_limiter=create_provider_rate_limiter(),
+        prices=prices,
+        enabled_providers=parse_enabled_providers(os.getenv("ENABLED_PROVIDERS", "openai,anthropic,google"))
+    )
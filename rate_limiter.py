@@ -0,0 +1,640 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Mapping, Optional, Tuple
+from fastapi import Request
+from limits.storage import Storage
+from slowapi.util import get_remote_address
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Statuses meaning the provider is throttling us (529 is Anthropic's "overloaded")
+THROTTLE_STATUS_CODES = {429, 529}
+
+class ProviderRateLimitError(Exception):
+    """Raised when a provider call would have to wait longer than the limiter's max_wait."""
+
+def parse_rate_limit_headers(headers: Mapping[str, str]) -> Dict[str, Tuple[float, float]]:
+    """
+    Request and token limits from OpenAI (x-ratelimit-*) or Anthropic
+    (anthropic-ratelimit-*) response headers.
+
+    Returns:
+        {"requests": (limit, remaining), "tokens": (limit, remaining)} for whichever are present
+    """
+    limits = {}
+    for kind in ("requests", "tokens"):
+        for limit_header, remaining_header in (
+            (f"x-ratelimit-limit-{kind}", f"x-ratelimit-remaining-{kind}"),
+            (f"anthropic-ratelimit-{kind}-limit", f"anthropic-ratelimit-{kind}-remaining")
+        ):
+            if limit_header in headers and remaining_header in headers:
+                try:
+                    limits[kind] = (float(headers[limit_header]), float(headers[remaining_header]))
+                except ValueError:
+                    pass
+    return limits
+
+def retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `per_minute` tokens per minute.
+
+    reserve() always takes the tokens, letting the balance go negative, and
+    returns how long the caller must wait before using them. Callers queue
+    in arrival order instead of polling.
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.per_minute = per_minute
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with self._lock:
+            yield
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.per_minute / 60)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        with self._locked():
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= min(amount, self.capacity)
+            return -self.tokens * 60 / self.per_minute if self.tokens < 0 else 0.0
+
+    def refund(self, amount: float):
+        with self._locked():
+            self.tokens = min(self.capacity, self.tokens + min(amount, self.capacity))
+
+    def sync(self, limit: float, remaining: float):
+        """Adopt the limit and remaining balance reported by the provider."""
+        with self._locked():
+            self._refill(time.monotonic())
+            if limit > 0:
+                self.per_minute = self.capacity = limit
+            self.tokens = min(self.tokens, remaining)
+
+    def pause(self, seconds: float):
+        """Owe `seconds` worth of refill, so every caller waits at least that long."""
+        with self._locked():
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, -seconds * self.per_minute / 60)
+
+    def available(self) -> float:
+        with self._locked():
+            self._refill(time.monotonic())
+            return self.tokens
+
+def _log_failure(future: Future):
+    if future.exception() is not None:
+        logger.warning(f"Rate limit store update failed: {str(future.exception())}")
+
+class RateLimitStore:
+    """
+    SQLite file holding token bucket balances and client quota counters, so
+    every process that opens it (pre-forked API workers, job workers)
+    enforces one set of limits for the host.
+
+    Writes take the file's write lock and may wait for other processes, so
+    callers on an event loop hand them to the store's own thread with run()
+    or defer(). Reads use a separate connection; in WAL mode they never wait
+    for writers.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._fork_lock = threading.Lock()
+        self._connect()
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            with self._fork_lock:
+                if self._pid != os.getpid():
+                    # Connections and threads don't survive fork(); a forked worker opens its own
+                    self._connect()
+
+    def _connect(self):
+        self._pid = os.getpid()
+        self._conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Losing the last few updates in a crash is harmless; don't fsync every reservation
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS buckets (
+                name TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL,
+                per_minute REAL NOT NULL,
+                capacity REAL NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS counters (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL,
+                expires_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS counters_expires_at ON counters (expires_at)")
+        self._reader = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rate-limit-store")
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """One IMMEDIATE transaction, so read-modify-write sequences are atomic across processes."""
+        self._check_pid()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def read(self, sql: str, params: Tuple = ()) -> List[Tuple]:
+        """Rows of a query on the read connection; doesn't wait for writers."""
+        self._check_pid()
+        with self._read_lock:
+            return self._reader.execute(sql, params).fetchall()
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Await `fn(*args)` on the store's thread. Calls run one at a time, in submission order."""
+        self._check_pid()
+        return await asyncio.wrap_future(self._executor.submit(fn, *args))
+
+    def defer(self, fn: Callable[..., Any], *args: Any):
+        """Queue `fn(*args)` on the store's thread without waiting for it; failures are logged."""
+        self._check_pid()
+        self._executor.submit(fn, *args).add_done_callback(_log_failure)
+
+    def flush(self):
+        """Wait until every deferred write so far has run."""
+        self._check_pid()
+        self._executor.submit(lambda: None).result()
+
+class SharedTokenBucket(TokenBucket):
+    """
+    TokenBucket whose balance lives in a RateLimitStore, so every process
+    using the store draws from one quota. Each operation loads the balance,
+    applies the change and writes it back in one transaction. Refill uses
+    time.monotonic(), which every process on the host shares.
+
+    Every operation blocks on the file, so async callers go through
+    RateLimitStore.run(); sync() and pause() are deferred to the store's
+    thread and return at once.
+    """
+
+    def __init__(self, store: RateLimitStore, name: str, per_minute: float, capacity: Optional[float] = None):
+        super().__init__(per_minute, capacity)
+        self.store = store
+        self.name = name
+        self._registered = False
+
+    def sync(self, limit: float, remaining: float):
+        self.store.defer(super().sync, limit, remaining)
+
+    def pause(self, seconds: float):
+        self.store.defer(super().pause, seconds)
+
+    def available(self) -> float:
+        # Read-only, so it needn't wait for the write lock
+        rows = self.store.read("SELECT tokens, updated, per_minute, capacity FROM buckets WHERE name = ?", (self.name,))
+        if not rows:
+            return self.tokens
+        tokens, updated, per_minute, capacity = rows[0]
+        return min(capacity, tokens + max(time.monotonic() - updated, 0) * per_minute / 60)
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with self.store.transaction() as conn:
+            if not self._registered:
+                # The configured quota replaces an earlier one; a balance other processes left is kept
+                conn.execute(
+                    """INSERT INTO buckets (name, tokens, updated, per_minute, capacity) VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (name) DO UPDATE SET per_minute = excluded.per_minute, capacity = excluded.capacity""",
+                    (self.name, self.tokens, self.updated, self.per_minute, self.capacity)
+                )
+                self._registered = True
+            row = conn.execute(
+                "SELECT tokens, updated, per_minute, capacity FROM buckets WHERE name = ?", (self.name,)
+            ).fetchone()
+            if row is not None:
+                self.tokens, updated, self.per_minute, self.capacity = row
+                # The monotonic clock restarts with the host; the file may not
+                self.updated = min(updated, time.monotonic())
+            yield
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (name, tokens, updated, per_minute, capacity) VALUES (?, ?, ?, ?, ?)",
+                (self.name, self.tokens, self.updated, self.per_minute, self.capacity)
+            )
+
+class AdaptiveConcurrencyLimit:
+    """
+    AIMD concurrency limit: halved when the provider throttles us, grown by
+    roughly one slot per limit's worth of successful calls, within
+    [min_limit, max_limit]. Waiters are served in arrival order and may be
+    on any event loop.
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self._waiters: deque = deque()
+        self._lock = threading.Lock()
+
+    def _grant(self, future: asyncio.Future):
+        if future.cancelled():
+            # The waiter timed out after being granted a slot; hand it back
+            self.release()
+        else:
+            future.set_result(None)
+
+    def _wake(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            loop, future = self._waiters.popleft()
+            if future.done():
+                continue
+            self.in_flight += 1
+            loop.call_soon_threadsafe(self._grant, future)
+
+    async def acquire(self, timeout: Optional[float] = None):
+        with self._lock:
+            if self.in_flight < int(self.limit) and not self._waiters:
+                self.in_flight += 1
+                return
+            loop = asyncio.get_running_loop()
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter[1], timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+            raise
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+            self._wake()
+
+    def decrease(self):
+        with self._lock:
+            self.limit = max(float(self.min_limit), self.limit / 2)
+
+    def increase(self):
+        with self._lock:
+            self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            self._wake()
+
+class ModelLimits:
+    """Request, token and concurrency limits for one provider/model."""
+
+    def __init__(self, requests: Optional[TokenBucket], tokens: Optional[TokenBucket], max_concurrency: int):
+        self.requests = requests
+        self.tokens = tokens
+        self.concurrency = AdaptiveConcurrencyLimit(max_concurrency)
+        # Set from Retry-After when the provider throttles us
+        self.paused_until = 0.0
+        self.queued = 0
+        self.rejected = 0
+        self.throttled = 0
+
+class ProviderRateLimiter:
+    """
+    Client-side limits per (provider, model), so we slow down before the
+    provider starts returning 429s.
+
+    Requests-per-minute and tokens-per-minute buckets start from configured
+    quotas and follow the limits reported in response headers; concurrency
+    adapts to throttling. A call that would exceed a limit waits for
+    capacity, up to max_wait seconds, instead of failing.
+
+    With a RateLimitStore, the buckets and Retry-After pauses are shared by
+    every process using it; concurrency limits stay per process. Bucket
+    updates then run on the store's thread, never on the event loop, and
+    observe_headers() and on_throttled() only queue them.
+    """
+
+    def __init__(
+        self,
+        quotas: Optional[Dict[str, Dict[str, float]]] = None,
+        max_concurrency: int = 32,
+        max_wait: float = 30.0,
+        store: Optional[RateLimitStore] = None
+    ):
+        self.quotas = quotas or {}
+        self.max_concurrency = max_concurrency
+        self.max_wait = max_wait
+        self.store = store
+        self._limits: Dict[Tuple[str, str], ModelLimits] = {}
+        self._lock = threading.Lock()
+
+    def limits(self, provider: str, model: str) -> ModelLimits:
+        key = (provider, model)
+        if key not in self._limits:
+            with self._lock:
+                if key not in self._limits:
+                    quota = self.quotas.get(f"{provider}/{model}", self.quotas.get(provider, {}))
+                    rpm, tpm = quota.get("rpm"), quota.get("tpm")
+                    self._limits[key] = ModelLimits(
+                        self._bucket(f"{provider}/{model}:requests", rpm) if rpm else None,
+                        self._bucket(f"{provider}/{model}:tokens", tpm) if tpm else None,
+                        int(quota.get("concurrency", self.max_concurrency))
+                    )
+        return self._limits[key]
+
+    def _bucket(self, name: str, per_minute: float) -> TokenBucket:
+        if self.store is not None:
+            return SharedTokenBucket(self.store, name, per_minute)
+        return TokenBucket(per_minute)
+
+    async def _run(self, fn: Callable[..., float], *args: Any) -> float:
+        if self.store is None:
+            return fn(*args)
+        return await self.store.run(fn, *args)
+
+    @asynccontextmanager
+    async def slot(self, provider: str, model: str, tokens: int = 0) -> AsyncIterator[None]:
+        """
+        Hold one request slot for a call expected to use `tokens` tokens
+        (prompt plus maximum output).
+
+        Raises:
+            ProviderRateLimitError: If the wait for capacity would exceed max_wait
+        """
+        limits = self.limits(provider, model)
+        reserved = [(bucket, amount) for bucket, amount in ((limits.requests, 1), (limits.tokens, tokens)) if bucket]
+        wait = max(
+            [await self._run(bucket.reserve, amount) for bucket, amount in reserved]
+            + [limits.paused_until - time.monotonic()]
+        )
+        if wait > self.max_wait:
+            for bucket, amount in reserved:
+                await self._run(bucket.refund, amount)
+            limits.rejected += 1
+            raise ProviderRateLimitError(f"{provider}/{model} rate limit: capacity in {wait:.1f}s")
+
+        start = time.monotonic()
+        if wait > 0 or limits.concurrency.in_flight >= int(limits.concurrency.limit):
+            limits.queued += 1
+        if wait > 0:
+            await asyncio.sleep(wait)
+        try:
+            await limits.concurrency.acquire(timeout=max(0.0, self.max_wait - (time.monotonic() - start)))
+        except asyncio.TimeoutError:
+            limits.rejected += 1
+            raise ProviderRateLimitError(f"{provider}/{model} concurrency limit: no slot within {self.max_wait:.0f}s")
+        try:
+            yield
+        finally:
+            limits.concurrency.release()
+
+    def observe_headers(self, provider: str, model: str, headers: Mapping[str, str]):
+        """Follow the provider's view of our remaining quota."""
+        limits = self.limits(provider, model)
+        for kind, (limit, remaining) in parse_rate_limit_headers(headers).items():
+            bucket = limits.requests if kind == "requests" else limits.tokens
+            if bucket is None:
+                bucket = self._bucket(f"{provider}/{model}:{kind}", limit)
+                if kind == "requests":
+                    limits.requests = bucket
+                else:
+                    limits.tokens = bucket
+            bucket.sync(limit, remaining)
+
+    def on_success(self, provider: str, model: str):
+        self.limits(provider, model).concurrency.increase()
+
+    def on_throttled(self, provider: str, model: str, delay: Optional[float] = None):
+        """Halve concurrency and hold new requests for `delay` seconds (Retry-After)."""
+        limits = self.limits(provider, model)
+        limits.throttled += 1
+        limits.concurrency.decrease()
+        delay = delay if delay is not None else 1.0
+        limits.paused_until = max(limits.paused_until, time.monotonic() + delay)
+        if self.store is not None and limits.requests is not None:
+            # Hold the other processes' requests too
+            limits.requests.pause(delay)
+        logger.warning(
+            f"{provider}/{model} throttled, concurrency limit now {int(limits.concurrency.limit)}"
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        def bucket_stats(bucket: Optional[TokenBucket]) -> Optional[Dict[str, float]]:
+            if bucket is None:
+                return None
+            return {"per_minute": bucket.per_minute, "available": round(bucket.available(), 1)}
+
+        return {
+            f"{provider}/{model}": {
+                "requests": bucket_stats(limits.requests),
+                "tokens": bucket_stats(limits.tokens),
+                "concurrency_limit": int(limits.concurrency.limit),
+                "in_flight": limits.concurrency.in_flight,
+                "queued": limits.queued,
+                "rejected": limits.rejected,
+                "throttled": limits.throttled
+            }
+            for (provider, model), limits in list(self._limits.items())
+        }
+
+def create_provider_rate_limiter() -> ProviderRateLimiter:
+    """
+    Build the limiter from PROVIDER_RATE_LIMITS (JSON quotas keyed by
+    "provider" or "provider/model", e.g. {"openai/gpt-4": {"rpm": 500,
+    "tpm": 30000}}), PROVIDER_MAX_CONCURRENCY, PROVIDER_RATE_LIMIT_MAX_WAIT
+    and RATE_LIMIT_DB.
+    """
+    return ProviderRateLimiter(
+        quotas=json.loads(os.getenv("PROVIDER_RATE_LIMITS", "{}")),
+        max_concurrency=int(os.getenv("PROVIDER_MAX_CONCURRENCY", "32")),
+        max_wait=float(os.getenv("PROVIDER_RATE_LIMIT_MAX_WAIT", "30")),
+        store=create_rate_limit_store()
+    )
+
+def create_rate_limit_store() -> Optional[RateLimitStore]:
+    """Rate limit state shared through RATE_LIMIT_DB (a SQLite file), or None to keep it per process."""
+    path = os.getenv("RATE_LIMIT_DB")
+    return RateLimitStore(path) if path else None
+
+class ClientQuotas:
+    """
+    Per-API-key request quotas for the API's own clients.
+
+    Callers identify themselves with an X-API-Key header and are limited by
+    their key's quota; callers without a known key fall back to per-IP
+    limits.
+    """
+
+    def __init__(self, clients: Optional[Dict[str, Dict[str, str]]] = None):
+        # api key -> {"name": ..., "limit": "600/minute"}
+        self.clients = clients or {}
+
+    def client_name(self, request: Request) -> Optional[str]:
+        """Name of the calling client, or None without a known X-API-Key."""
+        client = self.clients.get(request.headers.get("x-api-key", ""))
+        return client["name"] if client is not None else None
+
+    def key_func(self, request: Request) -> str:
+        name = self.client_name(request)
+        if name is not None:
+            return f"client:{name}"
+        return f"ip:{get_remote_address(request)}"
+
+    def limit(self, default: str) -> Callable[[str], str]:
+        """slowapi limit provider: the client's quota, or `default` for anonymous callers."""
+        def limit_for(key: str) -> str:
+            for client in self.clients.values():
+                if key == f"client:{client['name']}":
+                    return client.get("limit", default)
+            return default
+
+        return limit_for
+
+def create_client_quotas() -> ClientQuotas:
+    """
+    Build client quotas from CLIENT_API_KEYS, JSON mapping each API key to
+    {"name": ..., "limit": "600/minute"}.
+    """
+    return ClientQuotas(json.loads(os.getenv("CLIENT_API_KEYS", "{}")))
+
+class SQLiteLimitsStorage(Storage):
+    """
+    Storage for the `limits` package behind slowapi, keeping fixed-window
+    counters in a RateLimitStore so client quotas hold across worker
+    processes. Registered for "sqlite:///<path>" URIs (four slashes for an
+    absolute path).
+
+    slowapi checks limits synchronously on the event loop, so incr() only
+    counts the hit in memory and queues the write on the store's thread. A
+    count is the stored value, read without waiting for writers, plus this
+    process's hits not yet written.
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, **options: Any):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.store = RateLimitStore(uri[len("sqlite:///"):])
+        # key -> (hits, window length) not yet handed to the store's thread, and hits it is writing
+        self._pending: Dict[str, Tuple[int, float]] = {}
+        self._writing: Dict[str, int] = {}
+        # Odd while a write is committing, so get() can tell it may have counted those hits twice
+        self._version = 0
+        self._lock = threading.Lock()
+
+    @property
+    def base_exceptions(self) -> type:
+        return sqlite3.Error
+
+    def _write_pending(self):
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            for key, (amount, _) in batch.items():
+                self._writing[key] = self._writing.get(key, 0) + amount
+        if not batch:
+            return
+        now = time.time()
+        try:
+            with self.store.transaction() as conn:
+                for key, (amount, expiry) in batch.items():
+                    row = conn.execute("SELECT value, expires_at FROM counters WHERE key = ?", (key,)).fetchone()
+                    if row is None or row[1] <= now:
+                        # A new window; drop the counters of finished ones while we hold the write lock
+                        conn.execute("DELETE FROM counters WHERE expires_at <= ?", (now,))
+                        value, expires_at = amount, now + expiry
+                    else:
+                        value, expires_at = row[0] + amount, row[1]
+                    conn.execute(
+                        "INSERT OR REPLACE INTO counters (key, value, expires_at) VALUES (?, ?, ?)",
+                        (key, value, expires_at)
+                    )
+                with self._lock:
+                    self._version += 1
+        finally:
+            with self._lock:
+                self._version += self._version % 2
+                for key, (amount, _) in batch.items():
+                    self._writing[key] -= amount
+                    if not self._writing[key]:
+                        del self._writing[key]
+
+    def incr(self, key: str, expiry: float, amount: int = 1) -> int:
+        with self._lock:
+            pending, _ = self._pending.get(key, (0, expiry))
+            self._pending[key] = (pending + amount, expiry)
+        self.store.defer(self._write_pending)
+        return self.get(key)
+
+    def get(self, key: str) -> int:
+        for _ in range(5):
+            with self._lock:
+                version = self._version
+                unwritten = self._pending.get(key, (0, 0.0))[0] + self._writing.get(key, 0)
+            rows = self.store.read("SELECT value FROM counters WHERE key = ? AND expires_at > ?", (key, time.time()))
+            with self._lock:
+                if version % 2 == 0 and version == self._version:
+                    break
+            # A write committed meanwhile; its hits may be in both counts. Retry, and
+            # count them twice rather than not at all if writes keep landing
+            time.sleep(0.0002)
+        return (rows[0][0] if rows else 0) + unwritten
+
+    def get_expiry(self, key: str) -> float:
+        now = time.time()
+        rows = self.store.read("SELECT expires_at FROM counters WHERE key = ? AND expires_at > ?", (key, now))
+        return rows[0][0] if rows else now
+
+    def check(self) -> bool:
+        try:
+            self.store.read("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> Optional[int]:
+        with self._lock:
+            self._pending.clear()
+        self.store.flush()
+        with self.store.transaction() as conn:
+            return conn.execute("DELETE FROM counters").rowcount
+
+    def clear(self, key: str) -> None:
+        with self._lock:
+            self._pending.pop(key, None)
+        self.store.flush()
+        with self.store.transaction() as conn:
+            conn.execute("DELETE FROM counters WHERE key = ?", (key,))
+
+def client_quota_storage_uri() -> str:
+    """slowapi storage for client quotas: shared through RATE_LIMIT_DB, or in process memory."""
+    path = os.getenv("RATE_LIMIT_DB")
+    return f"sqlite:///{path}" if path else "memory://"
@@ -0,0 +1,102 @@
+import json
+import asyncio
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+def _normalise(value: Any) -> Any:
+    if isinstance(value, str):
+        return value.replace("\r\n", "\n").strip()
+    if isinstance(value, dict):
+        return {key: _normalise(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalise(item) for item in value]
+    return value
+
+class RequestCoalescer:
+    """
+    Single-flight execution: concurrent calls with the same key share one
+    computation and all receive its result (or its exception).
+
+    Flights are tracked with thread-safe futures, so async callers (run) and
+    threaded callers (run_sync) can lead or join the same flight. Nothing is
+    remembered once a flight completes; that is the response cache's job.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def make_key(payload: Dict[str, Any]) -> str:
+        """Key for a request payload, ignoring key order, line endings and surrounding whitespace."""
+        normalised = json.dumps(_normalise(payload), sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(normalised.encode("utf-8")).hexdigest()
+
+    def _join_or_lead(self, key: str):
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                return flight, False
+            flight = Future()
+            self._flights[key] = flight
+            self.leaders += 1
+            return flight, True
+
+    def _land(self, key: str, flight: Future):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    async def run(self, key: str, compute: Callable[[], Awaitable[T]]) -> T:
+        """
+        Await `compute()`, or the in-flight computation for `key` if there is
+        one. Cancelling one waiter does not cancel the shared computation.
+        """
+        flight, leader = self._join_or_lead(key)
+        if leader:
+            task = asyncio.ensure_future(compute())
+
+            def on_done(task: asyncio.Task):
+                self._land(key, flight)
+                if task.cancelled():
+                    flight.cancel()
+                elif task.exception() is not None:
+                    flight.set_exception(task.exception())
+                else:
+                    flight.set_result(task.result())
+
+            task.add_done_callback(on_done)
+        return await asyncio.shield(asyncio.wrap_future(flight))
+
+    def run_sync(self, key: str, compute: Callable[[], T]) -> T:
+        """Blocking variant of run() for threaded callers."""
+        flight, leader = self._join_or_lead(key)
+        if leader:
+            try:
+                result = compute()
+            except BaseException as e:
+                self._land(key, flight)
+                flight.set_exception(e)
+                raise
+            self._land(key, flight)
+            flight.set_result(result)
+            return result
+        return flight.result()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._flights)
+        }
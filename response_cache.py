@@ -0,0 +1,257 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class CacheBackend:
+    """
+    Storage interface for the response cache.
+    Values are JSON strings; expiry is handled by the backend.
+    """
+
+    # Whether calls do I/O and should run off the event loop
+    blocking = False
+
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+class MemoryCacheBackend(CacheBackend):
+    """In-process LRU cache with a maximum size and per-entry TTL."""
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    On-disk cache backed by SQLite, shared by every uvicorn worker that points
+    at the same file. Least recently used entries are evicted past max_entries,
+    in batches: the table is only counted once this process's estimate of its
+    size passes max_entries, and eviction then frees a tenth of it.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str = "response_cache.sqlite3", max_entries: int = 10000):
+        self.path = path
+        self.max_entries = max_entries
+        self.evict_batch = max_entries // 10
+        self._lock = threading.Lock()
+        self._connect()
+
+    def _connect(self):
+        self._pid = os.getpid()
+        self._connection = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        # A cache can lose its last writes on power loss; don't fsync every hit and write
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )"""
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        # Size at the last count plus this process's writes since; other workers' writes show up at the next count
+        self._estimated_entries = self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        if self._pid != os.getpid():
+            # A connection must not be used across fork(); a pre-forked worker opens its own
+            self._connect()
+        return self._connection
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now)
+            )
+            self._estimated_entries += 1
+            if self._estimated_entries > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if entries > self.max_entries:
+            keep = self.max_entries - self.evict_batch
+            self._conn.execute(
+                """DELETE FROM responses WHERE key IN (
+                    SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )""",
+                (keep,)
+            )
+            entries = keep
+        self._estimated_entries = entries
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._estimated_entries = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+class ResponseCache:
+    """
+    Content-addressed cache for generated headline responses.
+    Keys are a hash of the built prompt plus the provider and model.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float = 3600):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Call `fn` (one of the methods below, or a lookup that reads through
+        them) from the event loop; with a blocking backend it runs in a thread.
+        """
+        if self.backend.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    def _count(self, hit: bool):
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    @staticmethod
+    def make_key(prompt: str, provider: str, model: str) -> str:
+        digest = hashlib.sha256()
+        for part in (provider, model, prompt):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            logger.error(f"Response cache read failed: {str(e)}")
+            value = None
+        self._count(value is not None)
+        return json.loads(value) if value is not None else None
+
+    def peek(self, key: str) -> Optional[Dict[str, Any]]:
+        """Like get(), without counting towards the hit rate (for lookups by another index)."""
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            logger.error(f"Response cache read failed: {str(e)}")
+            return None
+        return json.loads(value) if value is not None else None
+
+    def get_first(self, keys: List[str]) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """The first of `keys` that is cached and its response, counted as a single lookup."""
+        for key in keys:
+            response = self.peek(key)
+            if response is not None:
+                self._count(True)
+                return key, response
+        self._count(False)
+        return None, None
+
+    def set(self, key: str, response: Dict[str, Any]) -> None:
+        try:
+            self.backend.set(key, json.dumps(response), self.ttl)
+        except Exception as e:
+            logger.error(f"Response cache write failed: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+def create_response_cache() -> ResponseCache:
+    """
+    Build the response cache from environment variables:
+    RESPONSE_CACHE_BACKEND (memory|sqlite), RESPONSE_CACHE_TTL (seconds),
+    RESPONSE_CACHE_MAX_ENTRIES and RESPONSE_CACHE_PATH (sqlite only).
+    """
+    backend_name = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+    ttl = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+    max_entries = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+
+    if backend_name == "sqlite":
+        backend = SQLiteCacheBackend(os.getenv("RESPONSE_CACHE_PATH", "response_cache.sqlite3"), max_entries)
+    elif backend_name == "memory":
+        backend = MemoryCacheBackend(max_entries)
+    else:
+        raise ValueError(f"Unsupported response cache backend: {backend_name}")
+
+    return ResponseCache(backend, ttl)
@@ -0,0 +1,373 @@
+import os
+import json
+import time
+import zlib
+import fcntl
+import struct
+import hashlib
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from keyword_extractor import STOPWORDS, tokenize
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INDEX_MAGIC = b"SEMCACH2"
+# magic, capacity, dimensions, tables, bits per table, seed
+INDEX_HEADER = struct.Struct("<8sQIIIQ4x")
+# In-memory indexes up to this many entries are cheap enough to search on the event loop
+BLOCKING_ENTRIES = 4096
+
+@lru_cache(maxsize=256)
+def embed_text(text: str, dim: int = 256) -> np.ndarray:
+    """
+    Hashed bag-of-n-grams embedding: word unigrams (minus stopwords) and
+    bigrams, weighted 1 + log(tf) and signed-hashed into `dim` buckets.
+    Editing a word or two changes only a handful of features, so drafts of
+    the same newsletter stay close in cosine similarity.
+
+    Returns a read-only int8 vector scaled to its largest component.
+    """
+    tokens = tokenize(text)
+    counts = Counter(token for token in tokens if token not in STOPWORDS)
+    counts.update(f"{first} {second}" for first, second in zip(tokens, tokens[1:]))
+    vector = np.zeros(dim, dtype=np.float32)
+    if counts:
+        hashes = np.fromiter((zlib.crc32(feature.encode("utf-8")) for feature in counts), dtype=np.uint32, count=len(counts))
+        weights = 1 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+        signs = np.where(hashes >> 31, np.float32(-1), np.float32(1))
+        vector = np.bincount(hashes % dim, weights=weights * signs, minlength=dim).astype(np.float32)
+    scale = np.abs(vector).max()
+    quantized = np.round(vector * (127 / scale)).astype(np.int8) if scale > 0 else vector.astype(np.int8)
+    quantized.setflags(write=False)
+    return quantized
+
+def context_hash(context: Dict[str, Any]) -> int:
+    """64-bit hash of the request fields that must match exactly for a semantic hit."""
+    encoded = json.dumps(context, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(encoded, digest_size=8).digest(), "little")
+
+class SemanticCache:
+    """
+    Nearest-neighbour index from newsletter embeddings to response cache
+    keys, so near-duplicate drafts reuse earlier headlines.
+
+    Vectors, context hashes and keys live in fixed-size arrays (in memory,
+    or memory-mapped from `path` so the index survives restarts). Lookups
+    use random-hyperplane LSH: each of `tables` signatures of `bits` bits
+    selects a few buckets through a sorted per-table index, and the
+    candidates with the same context are reranked by exact cosine
+    similarity. Entries added since the last index rebuild are scanned
+    directly. Once full, the least recently used entry is replaced.
+
+    An index file may be shared by several worker processes: every
+    operation holds an flock on it. When the file's version shows another
+    process only appended entries, a process scans the new slots like its
+    own pending ones; it rebuilds its bucket indexes when slots were
+    overwritten.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        threshold: float = 0.9,
+        dim: int = 256,
+        tables: int = 16,
+        bits: int = 16,
+        probe_bits: int = 2,
+        path: Optional[str] = None,
+        seed: int = 0
+    ):
+        if bits > 16:
+            raise ValueError("LSH signatures are limited to 16 bits")
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.dim = dim
+        self.tables = tables
+        self.bits = bits
+        self.probe_bits = probe_bits
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+        self._maps: List[np.memmap] = []
+
+        planes = np.random.default_rng(seed).standard_normal((tables * bits, dim))
+        self._planes = planes.astype(np.float32)
+        self._powers = (1 << np.arange(bits, dtype=np.uint32)).astype(np.uint32)
+        # Every subset of the probed bits, as rows of 0/1 flags
+        self._flips = ((np.arange(1 << probe_bits)[:, None] >> np.arange(probe_bits)) & 1).astype(np.uint32)
+
+        if path:
+            self._open(path, seed)
+        else:
+            self.vectors = np.zeros((max_entries, dim), dtype=np.int8)
+            self.contexts = np.zeros(max_entries, dtype=np.uint64)
+            self.keys = np.zeros((max_entries, 32), dtype=np.uint8)
+            self.signatures = np.zeros((max_entries, tables), dtype=np.uint16)
+            self.accessed_at = np.zeros(max_entries, dtype=np.float64)
+            self.meta = np.zeros(2, dtype=np.uint64)
+        # Slots are filled in order and an entry with accessed_at == 0 is free; meta holds
+        # [slots used, write version]. A file's count and indexes are read by its first operation.
+        self.count = 0
+        self._version = -1 if path else 0
+
+        self._sorted_slots: List[np.ndarray] = []
+        self._sorted_signatures: List[np.ndarray] = []
+        self._pending: List[int] = []
+        self._rebuild()
+
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self.lookup_seconds = 0.0
+
+    def _open(self, path: str, seed: int):
+        header = INDEX_HEADER.pack(INDEX_MAGIC, self.max_entries, self.dim, self.tables, self.bits, seed)
+        shapes = [
+            ("meta", np.uint64, (2,)),
+            ("vectors", np.int8, (self.max_entries, self.dim)),
+            ("contexts", np.uint64, (self.max_entries,)),
+            ("keys", np.uint8, (self.max_entries, 32)),
+            ("signatures", np.uint16, (self.max_entries, self.tables)),
+            ("accessed_at", np.float64, (self.max_entries,))
+        ]
+        offsets = []
+        offset = INDEX_HEADER.size
+        for _, dtype, shape in shapes:
+            # 8-byte aligned so each array can be viewed in place
+            offset = (offset + 7) // 8 * 8
+            offsets.append(offset)
+            offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+
+        try:
+            # Exclusive create, so a worker opening the file concurrently never truncates it
+            with open(path, "xb") as f:
+                f.write(header)
+                f.truncate(offset)
+        except FileExistsError:
+            with open(path, "rb") as f:
+                existing = f.read(INDEX_HEADER.size)
+            if existing[:7] != INDEX_MAGIC[:7]:
+                raise ValueError(f"{path} is not a semantic cache index")
+            if existing != header:
+                raise ValueError(f"{path} was built with different semantic cache settings or version")
+
+        for (name, dtype, shape), array_offset in zip(shapes, offsets):
+            mapped = np.memmap(path, dtype=dtype, mode="r+", offset=array_offset, shape=shape)
+            self._maps.append(mapped)
+            setattr(self, name, np.asarray(mapped))
+        self._file = open(path, "rb")
+        self._pid = os.getpid()
+
+    @contextmanager
+    def _locked(self, exclusive: bool = False) -> Iterator[None]:
+        """Hold the thread lock and, for a file, an flock; pick up other processes' writes."""
+        with self._lock:
+            if self._file is None:
+                yield
+                return
+            if self._pid != os.getpid():
+                # flocks belong to the open file, which a forked child shares with its parent
+                self._file = open(self.path, "rb")
+                self._pid = os.getpid()
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                self._sync()
+                yield
+            finally:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+    @property
+    def blocking(self) -> bool:
+        """Whether calls should run off the event loop: the index is file-backed (flock) or large."""
+        return self.path is not None or self.count > BLOCKING_ENTRIES
+
+    def _sync(self):
+        """Pick up entries other processes wrote to the file since this one last looked."""
+        count, version = int(self.meta[0]), int(self.meta[1])
+        if version == self._version:
+            return
+        # Every write bumps the version once; if the count grew as much, every write was an append
+        appended_only = self._version >= 0 and count - self.count == version - self._version
+        self._version = version
+        if appended_only:
+            self._pending.extend(range(self.count, count))
+            self.count = count
+            if len(self._pending) > self._pending_limit():
+                self._rebuild()
+        else:
+            self.count = count
+            self._rebuild()
+
+    def _pending_limit(self) -> int:
+        return max(1024, self.count // 8)
+
+    def signature(self, vectors: np.ndarray) -> np.ndarray:
+        """LSH bucket of a vector (or each row of a matrix) in every table."""
+        projected = vectors.astype(np.float32) @ self._planes.T
+        bits = (projected > 0).reshape(*projected.shape[:-1], self.tables, self.bits).astype(np.uint32)
+        return (bits @ self._powers).astype(np.uint16)
+
+    def _probes(self, vector: np.ndarray) -> np.ndarray:
+        """
+        Buckets to search in each table: the vector's own, plus those reached
+        by flipping the `probe_bits` bits whose hyperplanes it lies closest
+        to (multi-probe LSH), which recovers near neighbours that fell just
+        across a boundary.
+        """
+        projected = (self._planes @ vector.astype(np.float32)).reshape(self.tables, self.bits)
+        signature = (projected > 0).astype(np.uint32) @ self._powers
+        uncertain = np.argsort(np.abs(projected), axis=1)[:, :self.probe_bits]
+        flips = self._flips @ self._powers[uncertain].T
+        return (signature ^ flips).T.astype(np.uint16)
+
+    def _rebuild(self):
+        """Re-sort the per-table bucket indexes over all filled slots."""
+        signatures = np.asarray(self.signatures[:self.count])
+        self._sorted_slots = []
+        self._sorted_signatures = []
+        for table in range(self.tables):
+            order = np.argsort(signatures[:, table], kind="stable").astype(np.int32)
+            self._sorted_slots.append(order)
+            self._sorted_signatures.append(signatures[order, table])
+        self._pending = []
+
+    def _candidates(self, probes: np.ndarray) -> np.ndarray:
+        found = []
+        for table in range(self.tables):
+            sorted_signatures = self._sorted_signatures[table]
+            starts = np.searchsorted(sorted_signatures, probes[table], side="left")
+            ends = np.searchsorted(sorted_signatures, probes[table], side="right")
+            found.extend(self._sorted_slots[table][start:end] for start, end in zip(starts, ends) if end > start)
+        if self._pending:
+            pending = np.array(self._pending, dtype=np.int32)
+            matches = (self.signatures[pending][:, :, None] == probes[None, :, :]).any(axis=(1, 2))
+            found.append(pending[matches])
+        if not found:
+            return np.zeros(0, dtype=np.int32)
+        return np.unique(np.concatenate(found))
+
+    def _best_match(self, vector: np.ndarray, context: int) -> Tuple[int, float]:
+        candidates = self._candidates(self._probes(vector))
+        candidates = candidates[(self.contexts[candidates] == np.uint64(context)) & (self.accessed_at[candidates] > 0)]
+        if not len(candidates):
+            return -1, 0.0
+        stored = self.vectors[candidates].astype(np.float32)
+        query = vector.astype(np.float32)
+        norms = np.linalg.norm(stored, axis=1) * np.linalg.norm(query)
+        similarities = np.divide(stored @ query, norms, out=np.zeros(len(candidates), dtype=np.float32), where=norms > 0)
+        best = int(np.argmax(similarities))
+        return int(candidates[best]), float(similarities[best])
+
+    def search(self, vector: np.ndarray, context: Dict[str, Any]) -> Tuple[int, float]:
+        """Slot and cosine similarity of the nearest entry with the same context, or (-1, 0.0)."""
+        with self._locked():
+            return self._best_match(vector, context_hash(context))
+
+    def get(
+        self,
+        text: str,
+        context: Dict[str, Any],
+        load: Callable[[str], Optional[Dict[str, Any]]]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Response for the most similar cached newsletter with the same
+        context, if its similarity reaches the threshold.
+
+        Args:
+            load: Fetches a response by cache key; None means it has expired
+        """
+        start = time.perf_counter()
+        vector = embed_text(text, self.dim)
+        with self._locked():
+            slot, similarity = self._best_match(vector, context_hash(context))
+            key = bytes(self.keys[slot]).hex() if slot >= 0 and similarity >= self.threshold else None
+        self.lookup_seconds += time.perf_counter() - start
+        if key is None:
+            self.misses += 1
+            return None
+
+        response = load(key)
+        with self._locked(exclusive=True):
+            # Another worker may have reused the slot while we loaded the response
+            same_entry = bytes(self.keys[slot]).hex() == key
+            if response is None:
+                # The response was evicted from the response cache; free the slot first
+                if same_entry:
+                    self.accessed_at[slot] = 0
+                self.stale += 1
+                self.misses += 1
+                return None
+            if same_entry:
+                self.accessed_at[slot] = time.time()
+        self.hits += 1
+        logger.info(f"Semantic cache hit (similarity {similarity:.3f})")
+        return response
+
+    def add(self, text: str, context: Dict[str, Any], key: str):
+        """Index a newsletter under the response cache key of its response."""
+        vector = embed_text(text, self.dim)
+        signature = self.signature(vector)
+        context_value = context_hash(context)
+        with self._locked(exclusive=True):
+            slot, similarity = self._best_match(vector, context_value)
+            if slot < 0 or similarity < 0.9999:
+                if self.count < self.max_entries:
+                    slot = self.count
+                    self.count += 1
+                else:
+                    slot = int(np.argmin(self.accessed_at[:self.count]))
+                    if self.accessed_at[slot] > 0:
+                        self.evictions += 1
+                self.vectors[slot] = vector
+                self.contexts[slot] = context_value
+                self.signatures[slot] = signature
+                self._pending.append(slot)
+                self._version += 1
+                self.meta[:] = (self.count, self._version)
+            self.keys[slot] = np.frombuffer(bytes.fromhex(key), dtype=np.uint8)
+            self.accessed_at[slot] = time.time()
+
+            if len(self._pending) > self._pending_limit():
+                self._rebuild()
+
+    def flush(self):
+        """Write a memory-mapped index to disk."""
+        if self._file is not None:
+            with self._locked():
+                for mapped in self._maps:
+                    mapped.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": int(np.count_nonzero(self.accessed_at[:self.count])),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "stale": self.stale,
+            "evictions": self.evictions,
+            "avg_lookup_ms": self.lookup_seconds / lookups * 1000 if lookups else 0.0
+        }
+
+def create_semantic_cache() -> Optional[SemanticCache]:
+    """
+    Build the semantic cache when SEMANTIC_CACHE=true, from
+    SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_MAX_ENTRIES and
+    SEMANTIC_CACHE_PATH (memory-mapped index file; in memory when unset).
+    """
+    if os.getenv("SEMANTIC_CACHE", "false").lower() != "true":
+        return None
+    return SemanticCache(
+        max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "10000")),
+        threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9")),
+        path=os.getenv("SEMANTIC_CACHE_PATH") or None
+    )
@@ -0,0 +1,306 @@
+"""
+Production entry point: a pre-forking server for the API.
+
+The master imports the app once and warms it up before forking the
+workers, so each worker starts with the provider SDKs imported, the
+OpenAI model list discovered, the pytrends session created and the trends
+cache loaded (shared copy-on-write) instead of rebuilding them. Workers
+accept connections from one shared listening socket.
+
+With more than one worker, state defaults to files every worker shares:
+the response cache and client/provider rate limits in SQLite
+(RESPONSE_CACHE_BACKEND=sqlite, RATE_LIMIT_DB=rate_limits.sqlite3), and the
+semantic cache index and headline histories memory-mapped
+(SEMANTIC_CACHE_PATH=semantic_cache.index, HEADLINE_HISTORY_DIR=headline_history).
+Settings in the environment or .env take precedence. Job workers run once,
+under the master (JOB_WORKERS defaults to 2 here and to none in the app).
+
+Signals to the master:
+    SIGTERM, SIGINT  stop: workers stop accepting, let in-flight requests
+                     (LLM calls and streams included) finish for up to
+                     --graceful-timeout seconds, then exit
+    SIGHUP           reload: workers are replaced one at a time, each new
+                     worker forked from the warm master and serving before
+                     the one it replaces starts draining
+
+The listening socket uses SO_REUSEPORT, so a new version can be deployed by
+starting a second master on the same port and sending SIGTERM to the old one.
+
+Usage:
+    python serve.py [--workers 4] [--host 0.0.0.0] [--port 8000] [--graceful-timeout 30]
+"""
+import gc
+import os
+import sys
+import time
+import select
+import signal
+import socket
+import asyncio
+import logging
+import argparse
+import importlib
+from typing import Dict, List, Optional
+import uvicorn
+from dotenv import load_dotenv
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Their model discovery opens gRPC channels, which must not cross fork(); workers discover these
+DISCOVERED_IN_WORKERS = {"google"}
+
+SHARED_STATE_DEFAULTS = {
+    "RESPONSE_CACHE_BACKEND": "sqlite",
+    "RATE_LIMIT_DB": "rate_limits.sqlite3",
+    "SEMANTIC_CACHE_PATH": "semantic_cache.index",
+    "HEADLINE_HISTORY_DIR": "headline_history"
+}
+
+def configure_shared_state(workers: int):
+    """Default caches and rate limits to state shared by every worker; explicit settings win."""
+    load_dotenv()
+    # The job workers run once, under the master, so serve.py starts them by default
+    os.environ.setdefault("JOB_WORKERS", "2")
+    if workers > 1:
+        for name, value in SHARED_STATE_DEFAULTS.items():
+            os.environ.setdefault(name, value)
+
+async def warm_up(main):
+    """Do once in the master what every worker would otherwise repeat."""
+    start = time.perf_counter()
+    await main.headline_generator.preload()
+    catalog = main.model_catalog
+    await catalog.refresh([provider for provider in catalog.configured_models if provider not in DISCOVERED_IN_WORKERS])
+    # Connection pools must not be shared across fork(); each worker opens its own
+    await main.headline_generator.clients.aclose()
+    logger.info(f"Warmed up in {time.perf_counter() - start:.2f}s")
+
+def listen(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, "SO_REUSEPORT"):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
+
+class WorkerServer(uvicorn.Server):
+    """uvicorn server that tells the master through a pipe once it is serving."""
+
+    def __init__(self, config: uvicorn.Config, ready_fd: int):
+        super().__init__(config)
+        self.ready_fd = ready_fd
+
+    async def startup(self, sockets: Optional[List[socket.socket]] = None) -> None:
+        await super().startup(sockets=sockets)
+        if not self.should_exit:
+            os.write(self.ready_fd, b"1")
+        os.close(self.ready_fd)
+
+def run_worker(app, sock: socket.socket, args: argparse.Namespace, ready_fd: int):
+    """Body of a forked worker; never returns to the master's code."""
+    status = 1
+    try:
+        # uvicorn installs its own SIGINT/SIGTERM handlers once serving
+        for signum in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP, signal.SIGCHLD):
+            signal.signal(signum, signal.SIG_DFL)
+        config = uvicorn.Config(
+            app,
+            lifespan="on",
+            log_level=args.log_level,
+            access_log=args.access_log,
+            timeout_graceful_shutdown=args.graceful_timeout
+        )
+        WorkerServer(config, ready_fd).run(sockets=[sock])
+        status = 0
+    except BaseException:
+        logger.exception(f"Worker {os.getpid()} failed")
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        # Skip atexit handlers: they belong to the master (e.g. multiprocessing terminating its job workers)
+        os._exit(status)
+
+class Master:
+    """Forks, supervises and replaces the API workers."""
+
+    def __init__(self, app, sock: socket.socket, args: argparse.Namespace, job_workers=None):
+        self.app = app
+        self.sock = sock
+        self.args = args
+        self.job_workers = job_workers
+        # pid -> fork time, and pid -> when it was told to drain
+        self.workers: Dict[int, float] = {}
+        self.draining: Dict[int, float] = {}
+        self._stop = False
+        self._reload = False
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_r, False)
+        os.set_blocking(self._wakeup_w, False)
+        self._next_spawn_at = 0.0
+
+    def _on_signal(self, signum, frame):
+        if signum in (signal.SIGTERM, signal.SIGINT):
+            self._stop = True
+        elif signum == signal.SIGHUP:
+            self._reload = True
+        try:
+            os.write(self._wakeup_w, b"\0")
+        except BlockingIOError:
+            pass
+
+    def _sleep(self, timeout: float):
+        """Wait up to `timeout` seconds, returning early when a signal arrives."""
+        readable, _, _ = select.select([self._wakeup_r], [], [], timeout)
+        if readable:
+            try:
+                while os.read(self._wakeup_r, 1024):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def _fork(self) -> Dict[int, int]:
+        ready_r, ready_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_r)
+            os.close(self._wakeup_r)
+            os.close(self._wakeup_w)
+            run_worker(self.app, self.sock, self.args, ready_w)
+        os.close(ready_w)
+        self.workers[pid] = time.monotonic()
+        return {pid: ready_r}
+
+    def _wait_ready(self, pending: Dict[int, int], timeout: float) -> List[int]:
+        """Wait for forked workers to start serving; returns the pids that did."""
+        ready = []
+        deadline = time.monotonic() + timeout
+        try:
+            while pending and not self._stop and time.monotonic() < deadline:
+                readable, _, _ = select.select(list(pending.values()) + [self._wakeup_r], [], [], deadline - time.monotonic())
+                for pid, fd in list(pending.items()):
+                    if fd in readable:
+                        # b"" means the worker exited before it started serving
+                        if os.read(fd, 1) == b"1":
+                            ready.append(pid)
+                        os.close(pending.pop(pid))
+                if self._wakeup_r in readable:
+                    self._sleep(0)
+        finally:
+            for pid, fd in pending.items():
+                os.close(fd)
+                if not self._stop:
+                    # Hung in startup; reap() restarts it
+                    logger.error(f"Worker {pid} did not start serving within {timeout:.0f}s")
+                    os.kill(pid, signal.SIGKILL)
+        return ready
+
+    def spawn(self, count: int) -> List[int]:
+        pending = {}
+        for _ in range(count):
+            pending.update(self._fork())
+        return self._wait_ready(pending, self.args.startup_timeout)
+
+    def drain(self, pid: int):
+        """Ask a worker to finish its in-flight requests and exit."""
+        self.workers.pop(pid, None)
+        self.draining[pid] = time.monotonic()
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def reap(self):
+        now = time.monotonic()
+        for pid in list(self.workers) + list(self.draining):
+            try:
+                done, status = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                done, status = pid, 0
+            if not done:
+                if pid in self.draining and now - self.draining[pid] > self.args.graceful_timeout + 10:
+                    logger.warning(f"Worker {pid} did not drain in time, killing it")
+                    os.kill(pid, signal.SIGKILL)
+                continue
+            if self.draining.pop(pid, None) is None:
+                del self.workers[pid]
+                logger.warning(f"Worker {pid} exited unexpectedly (status {os.waitstatus_to_exitcode(status)})")
+
+    def reload(self):
+        """Replace every worker, one at a time, without dropping requests."""
+        logger.info("Reloading workers")
+        for old in list(self.workers):
+            if self._stop:
+                return
+            if not self.spawn(1):
+                logger.error("Replacement worker failed to start; keeping the remaining workers")
+                return
+            self.drain(old)
+
+    def run(self):
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGCHLD):
+            signal.signal(signum, self._on_signal)
+        host, port = self.sock.getsockname()[:2]
+        started = self.spawn(self.args.workers)
+        logger.info(f"Master {os.getpid()} serving on {host}:{port} with {len(started)} of {self.args.workers} workers")
+        if self.job_workers is not None and self.job_workers.processes > 0:
+            self.job_workers.start()
+
+        while not self._stop:
+            if self._reload:
+                self._reload = False
+                self.reload()
+            self.reap()
+            missing = self.args.workers - len(self.workers)
+            # At most one round of restarts per second, so a worker that crashes on startup can't spin the master
+            if missing > 0 and time.monotonic() >= self._next_spawn_at:
+                self._next_spawn_at = time.monotonic() + 1.0
+                self.spawn(missing)
+            self._sleep(1.0)
+        self.shutdown()
+
+    def shutdown(self):
+        logger.info(f"Shutting down, draining {len(self.workers)} workers")
+        for pid in list(self.workers):
+            self.drain(pid)
+        if self.job_workers is not None:
+            self.job_workers.stop(timeout=self.args.graceful_timeout)
+        deadline = time.monotonic() + self.args.graceful_timeout + 5
+        while self.draining and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in self.draining:
+            logger.warning(f"Worker {pid} did not drain in time, killing it")
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self.sock.close()
+
+def main(args: argparse.Namespace):
+    configure_shared_state(args.workers)
+    if args.app_dir:
+        sys.path.insert(0, args.app_dir)
+    module_name, _, attribute = args.app.partition(":")
+    app = getattr(importlib.import_module(module_name), attribute or "app")
+    import main as app_module
+
+    asyncio.run(warm_up(app_module))
+    # Keep the warm objects out of the collector, so its passes don't write to (and un-share) their pages
+    gc.freeze()
+    # Job workers run once, under the master, rather than in every API worker
+    app_module.RUN_JOB_WORKERS = False
+    Master(app, listen(args.host, args.port), args, app_module.job_workers).run()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default="main:app", help="ASGI app as module:attribute")
+    parser.add_argument("--app-dir", help="directory to import the app from")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1))))
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--graceful-timeout", type=float, default=30,
+                        help="seconds a stopping worker waits for in-flight requests")
+    parser.add_argument("--startup-timeout", type=float, default=60, help="seconds a new worker has to start serving")
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--no-access-log", dest="access_log", action="store_false")
+    main(parser.parse_args())
@@ -0,0 +1,447 @@
+import asyncio
+import json
+import time
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+from headline_generator import HeadlineGenerator
+from latency_tracker import LatencyTracker
+from rate_limiter import ProviderRateLimitError
+from prompt_builder import PromptContext, build_messages
+
+HEADLINES = [
+    {"title": "Mocked Headline", "keywords": ["mock"], "reason": "Because."}
+]
+
+@pytest.fixture
+def generator(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+    monkeypatch.setenv("GOOGLE_API_KEY", "test")
+    monkeypatch.setenv("TRENDS_CACHE_PATH", "")
+    with patch("pytrends.request.TrendReq"):
+        yield HeadlineGenerator()
+
+def _openai_response(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+def test_generate_headlines_openai(generator):
+    generator.trends_fetcher.get_trending_topics = lambda keywords: ["ai tools"]
+    generator.clients.openai.chat.completions.create = AsyncMock(
+        return_value=_openai_response(json.dumps(HEADLINES))
+    )
+    result = asyncio.run(generator.generate_headlines(
+        "A newsletter about productivity tools", "Founders", "Opens", "Friendly",
+        [], {"max_length": 60}, "openai", "gpt-4"
+    ))
+    assert result["headlines"] == HEADLINES
+    assert result["trending_topics"] == ["ai tools"]
+    assert result["token_usage"]["original_input_tokens"] == result["token_usage"]["compacted_input_tokens"]
+
+def test_generate_headlines_runs_concurrently(generator):
+    # Blocking trends calls run off-loop and provider calls are awaited, so
+    # concurrent requests overlap instead of queueing behind each other.
+    def slow_trends(keywords):
+        time.sleep(0.2)
+        return []
+
+    async def slow_openai(prompt, model):
+        await asyncio.sleep(0.2)
+        return HEADLINES
+
+    generator.trends_fetcher.get_trending_topics = slow_trends
+    generator._generate_with_openai = slow_openai
+
+    async def run_many():
+        return await asyncio.gather(*[
+            generator.generate_headlines("Text", "A", "G", "T", [], {}, "openai", "gpt-4")
+            for _ in range(5)
+        ])
+
+    start = time.perf_counter()
+    results = asyncio.run(run_many())
+    assert len(results) == 5
+    assert time.perf_counter() - start < 1.0
+
+def test_generate_headlines_compacts_long_prompts(generator):
+    import threading
+    import headline_generator
+    generator.trends_fetcher.get_trending_topics = lambda keywords: []
+    generator._generate_with_openai = AsyncMock(return_value=HEADLINES)
+    newsletter = " ".join(f"Sentence {index} covers topic{index} in depth." for index in range(2000))
+    threads = []
+    compact_context = headline_generator.compact_context
+
+    def compact(*args):
+        threads.append(threading.current_thread())
+        return compact_context(*args)
+
+    with patch("headline_generator.compact_context", compact):
+        result = asyncio.run(generator.generate_headlines(
+            newsletter, "A", "G", "T", [], {}, "openai", "gpt-4", input_token_budget=1000
+        ))
+    prompt = generator._generate_with_openai.await_args.args[0]
+    assert result["token_usage"]["original_input_tokens"] > 1000
+    assert result["token_usage"]["compacted_input_tokens"] <= 1000
+    assert len(prompt.text) < len(newsletter)
+    # Long input is compacted off the event loop
+    assert threads[0] is not threading.main_thread()
+
+def test_generate_headlines_uses_response_cache(generator):
+    generator.trends_fetcher.get_trending_topics = lambda keywords: []
+    generator._generate_with_openai = AsyncMock(return_value=HEADLINES)
+    args = ("Text", "A", "G", "T", [], {}, "openai", "gpt-4")
+
+    first = asyncio.run(generator.generate_headlines(*args))
+    second = asyncio.run(generator.generate_headlines(*args))
+    assert first == second
+    assert generator._generate_with_openai.await_count == 1
+
+    asyncio.run(generator.generate_headlines(*args, cache="bypass"))
+    assert generator._generate_with_openai.await_count == 2
+
+def test_generate_headlines_batch_isolates_failures(generator):
+    generator.trends_fetcher.get_trending_topics_batch = lambda keyword_lists: [[] for _ in keyword_lists]
+
+    async def fake_openai(prompt, model):
+        if "Broken" in prompt.content:
+            raise ValueError("Failed to parse LLM response")
+        return HEADLINES
+
+    generator._generate_with_openai = fake_openai
+    item = {"newsletter_text": "Text", "audience_profile": "A", "goal": "G", "tone": "T"}
+    results = asyncio.run(generator.generate_headlines_batch(
+        [item, dict(item, newsletter_text="Broken"), dict(item, goal="Other")]
+    ))
+    assert results[0]["headlines"] == HEADLINES
+    assert isinstance(results[1], ValueError)
+    assert results[2]["headlines"] == HEADLINES
+
+def test_batch_caps_auto_items_under_their_candidates_providers(generator):
+    generator.trends_fetcher.get_trending_topics_batch = lambda keyword_lists: [[] for _ in keyword_lists]
+    generator.hedge_candidates = [("openai", "gpt-4")]
+    running, peak = 0, 0
+
+    async def slow_openai(prompt, model):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return HEADLINES
+
+    generator._generate_with_openai = slow_openai
+    items = [
+        {"newsletter_text": f"Text {index}", "audience_profile": "A", "goal": "G", "tone": "T",
+         "provider": "auto" if index % 2 else "openai"}
+        for index in range(8)
+    ]
+    # Identical items share one generation
+    items.append(dict(items[0]))
+    results = asyncio.run(generator.generate_headlines_batch(items, provider_concurrency=2))
+    assert all(result["headlines"] == HEADLINES for result in results)
+    assert peak == 2
+    assert generator.coalescer.stats()["coalesced"] == 1
+
+def test_stream_headlines_yields_headlines_incrementally(generator):
+    generator.trends_fetcher.get_trending_topics = lambda keywords: ["ai tools"]
+    text = json.dumps(HEADLINES * 2)
+
+    async def fake_stream(prompt, model):
+        for i in range(0, len(text), 4):
+            yield text[i:i + 4]
+
+    generator._stream_with_openai = fake_stream
+
+    async def collect():
+        return [event async for event in generator.stream_headlines(
+            "Text", "A", "G", "T", [], {}, "openai", "gpt-4"
+        )]
+
+    events = asyncio.run(collect())
+    assert events[:3] == [
+        ("trending_topics", ["ai tools"]),
+        ("headline", HEADLINES[0]),
+        ("headline", HEADLINES[0])
+    ]
+    assert events[3][0] == "done" and events[3][1]["count"] == 2
+    # A repeat request is served from the response cache
+    generator._stream_with_openai = None
+    assert asyncio.run(collect()) == events
+
+def test_auto_provider_hedges_slow_primary(generator):
+    generator.trends_fetcher.get_trending_topics = lambda keywords: []
+    generator.hedge_candidates = [("openai", "gpt-4"), ("anthropic", "claude-3-sonnet-20240229")]
+    generator.hedge_default_delay = 0.05
+    cancelled = []
+
+    async def slow_openai(prompt, model):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(model)
+            raise
+        return HEADLINES
+
+    generator._generate_with_openai = slow_openai
+    generator._generate_with_anthropic = AsyncMock(return_value=HEADLINES)
+
+    async def run():
+        result = await generator.generate_headlines("Text", "A", "G", "T", [], {}, "auto", "")
+        await asyncio.sleep(0)
+        return result
+
+    start = time.perf_counter()
+    result = asyncio.run(run())
+    assert result["headlines"] == HEADLINES
+    assert time.perf_counter() - start < 1.0
+    assert cancelled == ["gpt-4"]
+    assert generator.hedge_stats == {"requests": 1, "backups_fired": 1, "backup_wins": 1}
+
+def test_auto_provider_falls_back_immediately_on_error(generator):
+    generator.hedge_candidates = [("openai", "gpt-4"), ("google", "gemini-pro")]
+    generator.hedge_default_delay = 10
+    generator._generate_with_openai = AsyncMock(side_effect=ValueError("Failed to parse LLM response"))
+    generator._generate_with_google = AsyncMock(return_value=HEADLINES)
+
+    headlines, provider, model = asyncio.run(generator._generate_hedged("prompt"))
+    assert (headlines, provider, model) == (HEADLINES, "google", "gemini-pro")
+
+def test_hedge_delay_follows_observed_p95(generator):
+    generator.hedge_min_samples = 5
+    assert generator.hedge_delay("openai", "gpt-4") == generator.hedge_default_delay
+    for _ in range(5):
+        generator.latency_tracker.record("openai", "gpt-4", 1.8)
+    assert generator.hedge_delay("openai", "gpt-4") == 2.0
+
+def test_hedge_delay_adapts_when_latency_shifts(generator):
+    now = [0.0]
+    generator.latency_tracker = LatencyTracker(window=60, clock=lambda: now[0])
+    generator.hedge_min_samples = 5
+    for _ in range(20):
+        generator.latency_tracker.record("openai", "gpt-4", 1.8)
+    assert generator.hedge_delay("openai", "gpt-4") == 2.0
+
+    # The provider recovers; within two windows the delay drops with it
+    for now[0] in (70, 140):
+        for _ in range(20):
+            generator.latency_tracker.record("openai", "gpt-4", 0.8)
+    assert generator.hedge_delay("openai", "gpt-4") == 1.0
+
+def test_anthropic_request_marks_cacheable_prefix(generator):
+    prompt = build_messages(PromptContext(
+        newsletter_text="Text", audience_profile="A", goal="G", tone="T",
+        past_headlines=[], constraints={}, trending_topics=[]
+    ))
+    request = generator._anthropic_request(prompt)
+    assert request["system"][0]["cache_control"] == {"type": "ephemeral"}
+    context_block, content_block = request["messages"][0]["content"]
+    assert context_block == {"type": "text", "text": prompt.context, "cache_control": {"type": "ephemeral"}}
+    assert content_block == {"type": "text", "text": prompt.content}
+    assert request["messages"][-1] == {"role": "assistant", "content": "["}
+
+    generator.anthropic_prompt_caching = False
+    assert generator._anthropic_request(prompt)["messages"][0] == {"role": "user", "content": prompt.user}
+
+def test_identical_concurrent_requests_are_coalesced(generator):
+    generator.trends_fetcher.get_trending_topics = lambda keywords: []
+
+    async def slow_openai(prompt, model):
+        await asyncio.sleep(0.05)
+        return HEADLINES
+
+    generator._generate_with_openai = AsyncMock(side_effect=slow_openai)
+
+    async def run_all():
+        return await asyncio.gather(
+            *(generator.generate_headlines("Text", "A", "G", "T", [], {}, cache="bypass") for _ in range(5)),
+            generator.generate_headlines("Other text", "A", "G", "T", [], {}, cache="bypass")
+        )
+
+    results = asyncio.run(run_all())
+    assert all(result["headlines"] == HEADLINES for result in results)
+    assert generator._generate_with_openai.await_count == 2
+    assert generator.coalescer.stats()["coalesced"] == 4
+
+def test_provider_json_modes(generator):
+    prompt = build_messages(PromptContext(
+        newsletter_text="Text", audience_profile="A", goal="G", tone="T",
+        past_headlines=[], constraints={}, trending_topics=[]
+    ))
+    assert "response_format" not in generator._openai_request(prompt, "gpt-4")
+    request = generator._openai_request(prompt, "gpt-4o-mini")
+    assert request["response_format"] == {"type": "json_object"}
+    assert request["messages"][0]["content"] == prompt.system
+    assert "response_mime_type" not in generator._gemini_generation_config("gemini-pro")
+    assert generator._gemini_generation_config("gemini-1.5-flash")["response_mime_type"] == "application/json"
+
+def test_anthropic_response_is_parsed_after_the_prefill(generator):
+    text = json.dumps(HEADLINES)[1:] + "\n\nLet me know if you want more [options]."
+    response = SimpleNamespace(content=[SimpleNamespace(text=text)], usage=SimpleNamespace(input_tokens=10))
+    generator.clients._anthropic = SimpleNamespace(messages=SimpleNamespace(create=AsyncMock(return_value=response)))
+    prompt = build_messages(PromptContext(
+        newsletter_text="Text", audience_profile="A", goal="G", tone="T",
+        past_headlines=[], constraints={}, trending_topics=[]
+    ))
+    assert asyncio.run(generator._generate_with_anthropic(prompt, "claude-3-sonnet-20240229")) == HEADLINES
+
+def test_semantic_cache_serves_edited_drafts(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("TRENDS_CACHE_PATH", "")
+    monkeypatch.setenv("SEMANTIC_CACHE", "true")
+    with patch("pytrends.request.TrendReq"):
+        generator = HeadlineGenerator()
+    generator.trends_fetcher.get_trending_topics = lambda keywords: []
+    generator._generate_with_openai = AsyncMock(return_value=HEADLINES)
+    draft = (
+        "Small teams are adopting AI coding assistants. Three founders share what changed "
+        "in their review process and where the tools introduced subtle bugs."
+    )
+    edited = draft.replace("subtle", "hidden")
+
+    first = asyncio.run(generator.generate_headlines(draft, "A", "G", "T", [], {}, "openai", "gpt-4"))
+    second = asyncio.run(generator.generate_headlines(edited, "A", "G", "T", [], {}, "openai", "gpt-4"))
+    assert second == first
+    assert generator._generate_with_openai.await_count == 1
+
+    asyncio.run(generator.generate_headlines(edited, "A", "G", "Formal", [], {}, "openai", "gpt-4"))
+    assert generator._generate_with_openai.await_count == 2
+    assert generator.semantic_cache.stats()["hits"] == 1
+
+def test_file_backed_semantic_cache_runs_off_the_event_loop(monkeypatch, tmp_path):
+    import threading
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("TRENDS_CACHE_PATH", "")
+    monkeypatch.setenv("SEMANTIC_CACHE", "true")
+    monkeypatch.setenv("SEMANTIC_CACHE_PATH", str(tmp_path / "semantic.idx"))
+    with patch("pytrends.request.TrendReq"):
+        generator = HeadlineGenerator()
+    generator.trends_fetcher.get_trending_topics = lambda keywords: []
+    generator._generate_with_openai = AsyncMock(return_value=HEADLINES)
+    threads = []
+    for name in ("get", "add"):
+        method = getattr(generator.semantic_cache, name)
+        monkeypatch.setattr(generator.semantic_cache, name, lambda *args, method=method: (
+            threads.append(threading.current_thread()), method(*args)
+        )[1])
+
+    asyncio.run(generator.generate_headlines("A newsletter", "A", "G", "T", [], {}, "openai", "gpt-4"))
+    assert len(threads) == 2
+    assert threading.main_thread() not in threads
+
+def test_only_failing_headlines_are_sent_for_repair(generator):
+    generator.trends_fetcher.get_trending_topics = lambda keywords: []
+    generated = [
+        {"title": "3 habits of calm founders", "keywords": [], "reason": "r"},
+        {"title": "You won't believe what these founders did with their mornings", "keywords": [], "reason": "r"},
+        {"title": "Why 2 minutes of planning saves your week", "keywords": [], "reason": "r"}
+    ]
+    repaired = [{"title": "What 4 founders do before 9am", "keywords": [], "reason": "r"}]
+    generator._generate_with_openai = AsyncMock(side_effect=[generated, repaired])
+
+    result = asyncio.run(generator.generate_headlines(
+        "A newsletter about morning routines", "Founders", "Opens", "Friendly",
+        [], {"max_length": 50}, "openai", "gpt-4"
+    ))
+    titles = [headline["title"] for headline in result["headlines"]]
+    assert sorted(titles) == sorted(["3 habits of calm founders", "Why 2 minutes of planning saves your week",
+                                     "What 4 founders do before 9am"])
+    repair_prompt = generator._generate_with_openai.await_args_list[1].args[0]
+    assert "You won't believe" in repair_prompt.content
+    assert "3 habits" not in repair_prompt.content
+    assert generator.repair_stats["repair_calls"] == 1
+    assert generator.repair_stats["repaired"] == 1
+    assert generator.repair_stats["tokens_saved"] > 0
+
+def test_extra_variants_avoid_repair_calls(generator):
+    generator.trends_fetcher.get_trending_topics = lambda keywords: []
+    generator.headline_count = 2
+    generator._generate_with_openai = AsyncMock(return_value=[
+        {"title": "SHOCKING!!", "keywords": [], "reason": "r"},
+        {"title": "3 habits of calm founders", "keywords": [], "reason": "r"},
+        {"title": "Why 2 minutes of planning saves your week", "keywords": [], "reason": "r"}
+    ])
+    result = asyncio.run(generator.generate_headlines("Text", "A", "G", "T", [], {}, "openai", "gpt-4"))
+    assert len(result["headlines"]) == 2
+    assert "SHOCKING!!" not in [headline["title"] for headline in result["headlines"]]
+    assert generator._generate_with_openai.await_count == 1
+    assert generator.repair_stats["repairs_avoided"] == 1
+
+def test_disabled_providers_are_not_offered_for_hedging(generator):
+    generator.clients.enabled = {"anthropic"}
+    assert generator.available_hedge_candidates() == [("anthropic", "claude-3-sonnet-20240229")]
+
+def test_headline_history_rejects_past_sends_and_feeds_the_prompt(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("TRENDS_CACHE_PATH", "")
+    monkeypatch.setenv("HEADLINE_HISTORY", "true")
+    with patch("pytrends.request.TrendReq"):
+        generator = HeadlineGenerator()
+    generator.trends_fetcher.get_trending_topics = lambda keywords: []
+    generator.headline_count = 2
+    history = generator.headline_history.get("acme/weekly")
+    history.add_many(["5 morning habits of calm founders", "Our garden issue: garlic and dahlias"])
+    generator._generate_with_openai = AsyncMock(return_value=[
+        {"title": "5 morning habits of calm founders!", "keywords": [], "reason": "r"},
+        {"title": "Why 2 minutes of planning saves your week", "keywords": [], "reason": "r"},
+        {"title": "What founders do before 9am", "keywords": [], "reason": "r"}
+    ])
+
+    result = asyncio.run(generator.generate_headlines(
+        "A newsletter about morning routines of founders", "Founders", "Opens", "Friendly",
+        ["Founders share their planning rituals"], {}, "openai", "gpt-4", tenant="acme/weekly"
+    ))
+    titles = [headline["title"] for headline in result["headlines"]]
+    assert "5 morning habits of calm founders!" not in titles
+    assert len(titles) == 2
+
+    prompt = generator._generate_with_openai.await_args.args[0]
+    assert "5 morning habits of calm founders" in prompt.context
+    assert "Founders share their planning rituals" in prompt.context
+    assert "garlic" not in prompt.context
+    assert len(history) == 3
+
+def test_route_provider_falls_back_and_reports_the_decision(generator):
+    generator.trends_fetcher.get_trending_topics = lambda keywords: []
+    generator.route_candidates = [("openai", "gpt-3.5-turbo"), ("anthropic", "claude-3-sonnet-20240229")]
+    generator._generate_with_openai = AsyncMock(side_effect=ValueError("upstream error"))
+    generator._generate_with_anthropic = AsyncMock(return_value=HEADLINES)
+
+    result = asyncio.run(generator.generate_headlines(
+        "Short text", "A", "G", "T", [], {}, "route", "", latency_slo_ms=3000
+    ))
+    routing = result["routing"]
+    assert result["headlines"] == HEADLINES
+    assert (routing["provider"], routing["model"]) == ("anthropic", "claude-3-sonnet-20240229")
+    assert [attempt["error"] for attempt in routing["attempts"]] == ["upstream error", None]
+    assert routing["prompt_tokens"] == result["token_usage"]["compacted_input_tokens"]
+    assert generator.router.quality("anthropic", "claude-3-sonnet-20240229") is None
+    assert len(generator.router._stats[("anthropic", "claude-3-sonnet-20240229")].quality) == 1
+
+    cached = asyncio.run(generator.generate_headlines(
+        "Short text", "A", "G", "T", [], {}, "route", "", latency_slo_ms=3000
+    ))
+    assert cached["routing"]["cached"] is True
+    assert cached["routing"]["model"] == "claude-3-sonnet-20240229"
+    assert generator._generate_with_anthropic.await_count == 1
+
+def test_route_skips_models_the_catalog_does_not_offer_and_local_throttling(generator):
+    generator.trends_fetcher.get_trending_topics = lambda keywords: []
+    generator.route_candidates = [
+        ("openai", "gpt-3.5-turbo"), ("openai", "gpt-4"), ("anthropic", "claude-3-sonnet-20240229")
+    ]
+    generator.model_filter = lambda provider, model: model != "gpt-4"
+    assert ("openai", "gpt-4") not in generator.available_route_candidates()
+    assert {candidate.model for candidate in generator.route(500).candidates} == {
+        "gpt-3.5-turbo", "claude-3-sonnet-20240229"
+    }
+
+    # Timing out on our own rate limiter is not an error of the model
+    generator._generate_with_openai = AsyncMock(side_effect=ProviderRateLimitError("no slot"))
+    generator._generate_with_anthropic = AsyncMock(return_value=HEADLINES)
+    result = asyncio.run(generator.generate_headlines(
+        "Short text", "A", "G", "T", [], {}, "route", "", latency_slo_ms=3000
+    ))
+    assert result["routing"]["model"] == "claude-3-sonnet-20240229"
+    stats = generator.router._stats.get(("openai", "gpt-3.5-turbo"))
+    assert stats is None or not stats.calls
@@ -0,0 +1,77 @@
+import pytest
+from headline_history import HeadlineHistory, HeadlineHistoryStore, tenant_filename
+
+def test_near_duplicates_of_past_sends_are_found():
+    history = HeadlineHistory(max_entries=100)
+    assert history.add("5 ways to save money this summer")
+    assert not history.add("5 Ways to Save Money This Summer!")
+
+    assert history.near_duplicate("5 ways to save money this winter") == "5 ways to save money this summer"
+    assert history.near_duplicate("Why remote teams ship faster") is None
+    assert len(history) == 1
+    assert history.stats()["duplicates"] == 1
+
+def test_relevant_headlines_rank_by_newsletter_terms_then_recency():
+    history = HeadlineHistory(max_entries=100)
+    history.add("Remote teams ship faster with async reviews", sent_at=100)
+    history.add("Async standups for remote teams", sent_at=200)
+    history.add("The garden issue: garlic and dahlias", sent_at=300)
+
+    weights = {"remote": 2.0, "teams": 1.0, "async": 1.0, "garlic": 0.5}
+    assert history.relevant(weights, 2) == [
+        "Async standups for remote teams", "Remote teams ship faster with async reviews"
+    ]
+    assert history.relevant({"kubernetes": 1.0}) == []
+
+def test_indexes_stay_correct_across_rebuilds_and_evictions():
+    history = HeadlineHistory(max_entries=1500)
+    for index in range(1600):
+        history.add(f"issue {index} roundup of topic{index} news", sent_at=index + 1)
+    assert len(history) == 1500
+    assert history.stats()["evictions"] == 100
+    # The oldest sends were replaced
+    assert history.near_duplicate("issue 5 roundup of topic5 news") is None
+    assert history.near_duplicate("issue 1200 roundup of topic1200 news!") == "issue 1200 roundup of topic1200 news"
+    assert history.relevant({"topic1599": 1.0}, 1) == ["issue 1599 roundup of topic1599 news"]
+
+def test_history_file_is_shared_and_persisted(tmp_path):
+    path = str(tmp_path / "tenant.hist")
+    writer = HeadlineHistory(max_entries=100, path=path)
+    reader = HeadlineHistory(max_entries=100, path=path)
+    writer.add("Remote teams ship faster with async reviews")
+    # A second process (or instance) sees writes through the file
+    assert reader.near_duplicate("Remote teams ship faster with async review") is not None
+    writer.close()
+
+    reopened = HeadlineHistory(max_entries=100, path=path)
+    assert len(reopened) == 1
+    with pytest.raises(ValueError):
+        HeadlineHistory(max_entries=200, path=path)
+
+def test_store_keeps_tenants_apart(tmp_path):
+    store = HeadlineHistoryStore(str(tmp_path), max_open=1, max_entries=100)
+    store.get("acme/weekly").add("Remote teams ship faster with async reviews")
+    assert store.get("globex/daily").near_duplicate("Remote teams ship faster with async reviews") is None
+    # Dropped when the second tenant was opened, and reopened from its file
+    assert store.get("acme/weekly").near_duplicate("Remote teams ship faster with async reviews") is not None
+    assert tenant_filename("acme/weekly") != tenant_filename("acme_weekly")
+
+def test_evicted_history_stays_usable_by_requests_holding_it(tmp_path):
+    store = HeadlineHistoryStore(str(tmp_path), max_open=1, max_entries=100)
+    held = store.get("acme/weekly")
+    store.get("globex/daily")
+    # An in-flight request still holds the evicted history; its writes stay locked and shared
+    assert held.add("Remote teams ship faster with async reviews")
+    assert store.get("acme/weekly").near_duplicate("Remote teams ship faster with async reviews") is not None
+    assert store.stats()["evicted_tenants"] == 2
+
+    held.close()
+    with pytest.raises(ValueError):
+        held.add("Five habits of calm founders")
+
+def test_in_memory_tenants_are_capped():
+    store = HeadlineHistoryStore(max_open=2, max_entries=100)
+    for index in range(5):
+        store.get(f"anonymous/tenant-{index}").add("Remote teams ship faster with async reviews")
+    assert store.stats()["open_tenants"] == 2
+    assert store.stats()["evicted_tenants"] == 3
@@ -0,0 +1,38 @@
+from headline_scorer import check_headlines, clickbait_signals, describe_violations, score_headline, token_set, violations
+
+def headline(title):
+    return {"title": title, "keywords": [], "reason": ""}
+
+def test_violations_follow_the_constraints():
+    assert violations("Five tools our founders use daily", {"max_length": 60}) == []
+    assert violations("a" * 61, {}) == ["max_length"]
+    assert violations("Tools our founders use daily", {"require_numbers": True}) == ["require_numbers"]
+    assert violations("You won't believe these 5 tools!!", {}) == ["avoid_clickbait"]
+    assert violations("You won't believe these 5 tools!!", {"avoid_clickbait": False}) == []
+
+def test_clickbait_signals():
+    assert clickbait_signals("The 3 metrics that matter this quarter") == 0
+    assert clickbait_signals("New HTML features in 2024") == 0
+    assert clickbait_signals("SHOCKING RESULTS?!") == 3
+
+def test_describe_violations():
+    title = "A" * 70
+    assert describe_violations(title, ["max_length"], {"max_length": 60}) == (
+        "70 characters, over the 60 character limit"
+    )
+
+def test_scores_prefer_fresh_well_sized_lines():
+    past = [token_set("5 AI tools founders love")]
+    fresh = score_headline("What 3 founders learned shipping AI agents", {}, past)
+    repeated = score_headline("5 AI tools founders love", {}, past)
+    rambling = score_headline("An extremely long and meandering subject line about many things", {"max_length": 100})
+    assert fresh > repeated
+    assert fresh > rambling
+
+def test_check_headlines_ranks_and_splits():
+    passing, failing = check_headlines(
+        [headline("Ideas"), headline("What 3 founders learned shipping AI agents"), headline("b" * 80)],
+        {"max_length": 60}
+    )
+    assert [item["title"] for item in passing] == ["What 3 founders learned shipping AI agents", "Ideas"]
+    assert [(item["title"], broken) for item, broken in failing] == [("b" * 80, ["max_length"])]
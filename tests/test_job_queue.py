@@ -0,0 +1,145 @@
+import time
+import asyncio
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+from job_queue import (
+    JobQueue, QueueFullError, WebhookURLError, check_webhook_url, deliver_webhook, parse_provider_caps, run_job
+)
+
+def payload(provider="openai", text="Text"):
+    return {"newsletter_text": text, "audience_profile": "A", "goal": "G", "tone": "T", "provider": provider}
+
+def test_jobs_are_claimed_by_priority_then_age(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    low = queue.enqueue(payload(), "low")
+    first = queue.enqueue(payload())
+    high = queue.enqueue(payload(), "high")
+    second = queue.enqueue(payload())
+
+    caps = {"*": 10}
+    assert [queue.claim("w", caps)["id"] for _ in range(4)] == [high, first, second, low]
+    assert queue.claim("w", caps) is None
+    assert queue.get(high)["status"] == "running"
+
+def test_provider_caps_limit_running_jobs(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    for _ in range(3):
+        queue.enqueue(payload("anthropic"))
+    google_job = queue.enqueue(payload("google"))
+
+    caps = parse_provider_caps("4,anthropic:2")
+    assert caps == {"*": 4, "anthropic": 2}
+    claimed = [queue.claim("w", caps) for _ in range(4)]
+    assert [job["provider"] for job in claimed[:3]] == ["anthropic", "anthropic", "google"]
+    assert claimed[2]["id"] == google_job
+    assert claimed[3] is None
+
+    queue.complete(claimed[0]["id"], {"headlines": []})
+    assert queue.claim("w", caps)["provider"] == "anthropic"
+
+def test_auto_jobs_count_against_every_candidate_provider(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    caps = {"*": 8, "openai": 1}
+    openai_job = queue.enqueue(payload("openai"))
+    auto_job = queue.enqueue(payload("auto"), providers=["anthropic", "openai"])
+    anthropic_job = queue.enqueue(payload("anthropic"))
+
+    assert queue.claim("w", caps)["id"] == openai_job
+    # openai is at its cap, so the auto job, which may call openai, waits
+    assert queue.claim("w", caps)["id"] == anthropic_job
+    assert queue.claim("w", caps) is None
+
+    queue.complete(openai_job, {"headlines": []})
+    assert queue.claim("w", caps)["id"] == auto_job
+    assert queue.stats()["running_by_provider"] == {"anthropic": 2, "openai": 1}
+    assert queue.get(auto_job)["provider"] == "auto"
+
+def test_enqueue_applies_backpressure(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), max_pending=2)
+    queue.enqueue(payload())
+    queue.enqueue(payload())
+    with pytest.raises(QueueFullError):
+        queue.enqueue(payload())
+    queue.claim("w", {"*": 8})
+    queue.enqueue(payload())
+    assert queue.stats()["jobs"]["queued"] == 2
+
+def test_jobs_of_lost_workers_are_requeued(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    job_id = queue.enqueue(payload())
+    queue.claim("w", {"*": 8})
+    time.sleep(0.02)
+
+    assert queue.recover(timeout=0.01) == 1
+    assert queue.get(job_id)["status"] == "queued"
+    assert queue.claim("w", {"*": 8})["id"] == job_id
+
+def test_run_job_stores_result_and_calls_webhook(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    result = {"headlines": [{"title": "T", "keywords": [], "reason": "R"}], "trending_topics": []}
+    ok_id = queue.enqueue(payload(), webhook_url="http://hooks.test/done")
+    failing_id = queue.enqueue(payload(text="Broken"))
+
+    generator = AsyncMock()
+    generator.generate_headlines.side_effect = lambda **kwargs: (
+        _raise(ValueError("Failed to parse LLM response")) if kwargs["newsletter_text"] == "Broken" else result
+    )
+    with patch("job_queue.deliver_webhook", new=AsyncMock(return_value=True)) as deliver:
+        for _ in range(2):
+            asyncio.run(run_job(queue, generator, queue.claim("w", {"*": 8})))
+
+    job = queue.get(ok_id)
+    assert job["status"] == "succeeded"
+    assert job["result"] == result
+    assert job["webhook_status"] == "delivered"
+    deliver.assert_awaited_once_with("http://hooks.test/done", {"id": ok_id, "status": "succeeded", "result": result})
+    assert queue.get(failing_id)["status"] == "failed"
+    assert queue.get(failing_id)["error"] == "Failed to parse LLM response"
+
+def _raise(error):
+    raise error
+
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1:8000/hook",
+    "http://169.254.169.254/latest/meta-data/",
+    "http://10.0.0.5/hook",
+    "http://[::1]/hook",
+    "http://[::ffff:192.168.1.1]/hook",
+    "http://localhost/hook",
+    "ftp://93.184.216.34/hook"
+])
+def test_webhooks_to_internal_addresses_are_refused(url):
+    with pytest.raises(WebhookURLError):
+        check_webhook_url(url, allowed_hosts=[])
+
+def test_webhook_allowlist():
+    check_webhook_url("https://93.184.216.34/hook", allowed_hosts=[])
+    check_webhook_url("https://hooks.example.com/done", allowed_hosts=["hooks.example.com"])
+    check_webhook_url("https://a.example.org/done", allowed_hosts=[".example.org"])
+    with pytest.raises(WebhookURLError):
+        check_webhook_url("https://example.com.evil.test/done", allowed_hosts=["example.com", ".example.com"])
+
+def test_webhook_ports_are_restricted():
+    check_webhook_url("https://93.184.216.34:443/hook", allowed_hosts=[])
+    with pytest.raises(WebhookURLError):
+        check_webhook_url("http://93.184.216.34:6379/hook", allowed_hosts=[])
+    with pytest.raises(WebhookURLError):
+        check_webhook_url("https://hooks.example.com:8443/done", allowed_hosts=["hooks.example.com"])
+    check_webhook_url("https://hooks.example.com:8443/done", allowed_hosts=["hooks.example.com"], allowed_ports=[8443])
+
+def test_delivery_connects_to_the_checked_address(monkeypatch):
+    monkeypatch.setenv("WEBHOOK_ALLOWED_HOSTS", "")
+    # The check sees a public address; a second lookup by the HTTP client would never happen
+    monkeypatch.setattr("socket.getaddrinfo", lambda *args, **kwargs: [(None, None, None, "", ("93.184.216.34", 443))])
+    with patch("httpx.AsyncClient.post", new=AsyncMock(return_value=SimpleNamespace(status_code=200))) as post:
+        assert asyncio.run(deliver_webhook("https://user:pw@hooks.rebind.test/done?x=1", {"id": "x"})) is True
+    assert post.await_args.args[0] == "https://user:pw@93.184.216.34/done?x=1"
+    assert post.await_args.kwargs["headers"] == {"Host": "hooks.rebind.test"}
+    assert post.await_args.kwargs["extensions"] == {"sni_hostname": "hooks.rebind.test"}
+
+def test_delivery_rechecks_the_target(monkeypatch):
+    monkeypatch.setenv("WEBHOOK_ALLOWED_HOSTS", "")
+    with patch("httpx.AsyncClient.post", new=AsyncMock()) as post:
+        assert asyncio.run(deliver_webhook("http://169.254.169.254/hook", {"id": "x"})) is False
+    post.assert_not_awaited()
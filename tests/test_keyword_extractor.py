@@ -0,0 +1,35 @@
+import numpy as np
+from keyword_extractor import CorpusStats, KeywordExtractor, tokenize, term_hash
+
+ARCHIVE = [
+    "This week in productivity: remote work tools and productivity tips.",
+    "Productivity for founders: hiring, remote teams and funding.",
+    "Funding news and productivity hacks for remote founders.",
+    "Security basics for startups and remote teams."
+]
+
+def test_tokenizer_strips_punctuation():
+    assert tokenize("AI tools. Work-life balance, GPT-4's rise!") == [
+        "ai", "tools", "work-life", "balance", "gpt-4's", "rise"
+    ]
+
+def test_ranks_by_frequency_without_stats():
+    text = "Automation tools. Automation everywhere, and tools that would help automation."
+    assert KeywordExtractor().extract(text, top_k=2) == ["automation", "tools"]
+
+def test_idf_demotes_terms_common_in_the_archive():
+    text = "Productivity productivity productivity and a quantum computing primer on quantum."
+    extractor = KeywordExtractor(CorpusStats.build(ARCHIVE))
+    assert extractor.extract(text, top_k=2) == ["quantum", "computing"]
+
+def test_stats_round_trip_through_memory_map(tmp_path):
+    stats = CorpusStats.build(ARCHIVE)
+    path = str(tmp_path / "stats.bin")
+    stats.save(path)
+    loaded = CorpusStats.load(path)
+
+    assert isinstance(loaded.hashes, np.memmap)
+    assert len(loaded) == len(stats)
+    hashes = np.array([term_hash("productivity"), term_hash("unseen")], dtype=np.uint64)
+    assert np.allclose(loaded.lookup(hashes), stats.lookup(hashes))
+    assert loaded.lookup(hashes)[1] == np.float32(stats.default_idf)
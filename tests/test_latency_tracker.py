@@ -0,0 +1,43 @@
+from latency_tracker import LatencyHistogram, LatencyTracker
+
+def test_histogram_quantiles_use_bucket_upper_bounds():
+    histogram = LatencyHistogram()
+    for _ in range(90):
+        histogram.record(0.4)
+    for _ in range(10):
+        histogram.record(4.0)
+    assert histogram.quantile(0.5) == 0.5
+    assert histogram.quantile(0.95) == 4.0
+    assert LatencyHistogram().quantile(0.95) is None
+
+def test_tracker_requires_minimum_samples():
+    tracker = LatencyTracker()
+    tracker.record("openai", "gpt-4", 1.2)
+    assert tracker.quantile("openai", "gpt-4", 0.95, min_samples=2) is None
+    tracker.record("openai", "gpt-4", 1.2)
+    assert tracker.quantile("openai", "gpt-4", 0.95, min_samples=2) == 1.5
+    assert tracker.stats()["openai/gpt-4"]["count"] == 2
+
+def test_quantiles_follow_a_latency_shift():
+    now = [0.0]
+    tracker = LatencyTracker(window=60, clock=lambda: now[0])
+    for _ in range(50):
+        tracker.record("openai", "gpt-4", 0.4)
+    assert tracker.quantile("openai", "gpt-4", 0.95) == 0.5
+
+    # The provider slows down: within a window its slow calls dominate the tail...
+    now[0] = 70
+    for _ in range(50):
+        tracker.record("openai", "gpt-4", 4.0)
+    assert tracker.quantile("openai", "gpt-4", 0.95) == 4.0
+    assert tracker.quantile("openai", "gpt-4", 0.25) == 0.5
+
+    # ...and after another, the fast calls have rotated out entirely
+    now[0] = 140
+    tracker.record("openai", "gpt-4", 4.0)
+    assert tracker.quantile("openai", "gpt-4", 0.25) == 4.0
+
+    # Nothing recorded for two windows: no stale estimate is left
+    now[0] = 400
+    assert tracker.quantile("openai", "gpt-4", 0.95) is None
+    assert tracker.stats()["openai/gpt-4"]["count"] == 0
@@ -0,0 +1,64 @@
+import os
+import json
+import random
+import pytest
+from llm_json import IncrementalJSONArrayParser, parse_headlines
+
+HEADLINES = [
+    {"title": "5 AI tools [tested]", "keywords": ["ai", "tools"], "reason": "Uses \"brackets\" } and quotes."},
+    {"title": "Remote work, reimagined", "keywords": [], "reason": "Curiosity."}
+]
+
+def feed_all(parser, text, chunk_size):
+    completed = []
+    for i in range(0, len(text), chunk_size):
+        completed.extend(parser.feed(text[i:i + chunk_size]))
+    return completed
+
+def test_emits_each_object_as_soon_as_it_completes():
+    text = json.dumps(HEADLINES)
+    parser = IncrementalJSONArrayParser()
+    first_end = text.index('}, {') + 1
+    assert parser.feed(text[:first_end - 1]) == []
+    assert parser.feed(text[first_end - 1:first_end]) == [HEADLINES[0]]
+    assert parser.feed(text[first_end:]) == [HEADLINES[1]]
+    assert parser.finished
+
+def test_handles_preamble_code_fences_and_any_chunking():
+    text = "Here you go:\n```json\n" + json.dumps(HEADLINES, indent=2) + "\n```\nEnjoy [!]"
+    for chunk_size in (1, 3, 7, len(text)):
+        assert feed_all(IncrementalJSONArrayParser(), text, chunk_size) == HEADLINES
+
+def test_skips_malformed_elements():
+    text = '[{"title": "Good", "keywords": [], "reason": "ok"}, {"title": bad}, {"title": "Also good", "keywords": [], "reason": "ok"}]'
+    titles = [item["title"] for item in IncrementalJSONArrayParser().feed(text)]
+    assert titles == ["Good", "Also good"]
+
+def load_corpus():
+    with open(os.path.join(os.path.dirname(__file__), "data", "llm_outputs.jsonl"), encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+@pytest.mark.parametrize("case", load_corpus(), ids=lambda case: case["name"])
+def test_parse_headlines_corpus(case):
+    if case["titles"] is None:
+        with pytest.raises(ValueError):
+            parse_headlines(case["text"])
+    else:
+        headlines = parse_headlines(case["text"])
+        assert [headline["title"] for headline in headlines] == case["titles"]
+        assert all(set(headline) == {"title", "keywords", "reason"} for headline in headlines)
+
+def test_fuzzed_truncation_and_chunking_salvage_complete_objects():
+    rng = random.Random(7)
+    text = "Sure! ```json\n" + json.dumps(HEADLINES * 3, indent=1) + "\n```"
+    for _ in range(300):
+        cut = rng.randrange(len(text) + 1)
+        truncated = text[:cut]
+        chunk_size = rng.randint(1, 40)
+        streamed = feed_all(IncrementalJSONArrayParser(), truncated, chunk_size)
+        assert streamed == (HEADLINES * 3)[:len(streamed)]
+        try:
+            parsed = parse_headlines(truncated)
+        except ValueError:
+            parsed = []
+        assert len(parsed) == len(streamed)
@@ -0,0 +1,24 @@
+import json
+import logging
+from unittest.mock import patch
+import log_utils
+
+class Unserialisable:
+    def __str__(self):
+        raise AssertionError("payload should not be formatted")
+
+def test_log_payload_is_free_when_disabled(caplog):
+    logger = logging.getLogger("test_log_utils")
+    with patch.object(log_utils, "PAYLOAD_SAMPLE_RATE", 0.0), caplog.at_level(logging.DEBUG):
+        log_utils.log_payload(logger, "raw_response", content=Unserialisable())
+    with patch.object(log_utils, "PAYLOAD_SAMPLE_RATE", 1.0), caplog.at_level(logging.INFO):
+        log_utils.log_payload(logger, "raw_response", content=Unserialisable())
+    assert caplog.records == []
+
+def test_log_payload_writes_structured_json_when_sampled(caplog):
+    logger = logging.getLogger("test_log_utils")
+    with patch.object(log_utils, "PAYLOAD_SAMPLE_RATE", 1.0), caplog.at_level(logging.DEBUG):
+        log_utils.log_payload(logger, "raw_response", model="gpt-4", content="[]")
+    assert json.loads(caplog.records[0].getMessage()) == {
+        "event": "raw_response", "model": "gpt-4", "content": "[]"
+    }
@@ -1,10 +1,17 @@
 import pytest
 from fastapi.testclient import TestClient
 from unittest.mock import patch
-from main import app
+from main import app, MODEL_CONFIG
 
 client = TestClient(app)
 
+@pytest.fixture(autouse=True)
+def api_keys(monkeypatch):
+    # MODEL_CONFIG read the keys at import; the provider calls themselves are mocked
+    for provider, config in MODEL_CONFIG.items():
+        monkeypatch.setenv(f"{provider.upper()}_API_KEY", "test")
+        monkeypatch.setitem(config, "api_key", "test")
+
 def test_health_check():
     response = client.get("/health")
     assert response.status_code == 200
@@ -97,4 +104,170 @@ def test_generate_headlines_trends_error():
             response = client.post("/generate", json=test_request)
             assert response.status_code == 200
             data = response.json()
-            assert data["headlines"][0]["title"] == "Fallback Headline" 
\ No newline at end of file
+            assert data["headlines"][0]["title"] == "Fallback Headline" 
+
+
+def test_generate_headlines_batch_reports_per_item_errors():
+    item = {
+        "newsletter_text": "This is a test newsletter about productivity and mindset.",
+        "audience_profile": "Startup founders",
+        "goal": "Increase open rates",
+        "tone": "Professional but friendly"
+    }
+    batch = {"items": [item, dict(item, model="not-a-model"), dict(item, newsletter_text="Fails")]}
+
+    async def fake_batch(items, provider_concurrency=8):
+        return [
+            ValueError("Provider error") if entry["newsletter_text"] == "Fails" else {
+                "headlines": [{"title": "Batch Headline", "keywords": ["batch"], "reason": "Mocked."}],
+                "trending_topics": []
+            }
+            for entry in items
+        ]
+
+    with patch("headline_generator.HeadlineGenerator.generate_headlines_batch", side_effect=fake_batch):
+        response = client.post("/generate/batch", json=batch)
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["index"] for result in results] == [0, 1, 2]
+    assert results[0]["headlines"][0]["title"] == "Batch Headline"
+    assert "Invalid model" in results[1]["error"]
+    assert results[2]["error"] == "Provider error"
+
+def test_generate_headlines_stream_emits_sse_events():
+    test_request = {
+        "newsletter_text": "This is a test newsletter about productivity and mindset.",
+        "audience_profile": "Startup founders",
+        "goal": "Increase open rates",
+        "tone": "Professional but friendly"
+    }
+
+    async def fake_stream(*args, **kwargs):
+        yield "trending_topics", ["mock trending"]
+        yield "headline", {"title": "Streamed Headline", "keywords": ["stream"], "reason": "Mocked."}
+        yield "done", {"count": 1}
+
+    with patch("headline_generator.HeadlineGenerator.stream_headlines", side_effect=fake_stream):
+        response = client.post("/generate/stream", json=test_request)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [block.split("\n") for block in response.text.strip().split("\n\n")]
+    assert [lines[0] for lines in events] == ["event: trending_topics", "event: headline", "event: done"]
+    assert '"Streamed Headline"' in events[1][1]
+
+def test_jobs_are_queued_and_reported(tmp_path, monkeypatch):
+    import main
+    from job_queue import JobQueue
+
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), max_pending=1)
+    monkeypatch.setattr(main, "job_queue", queue)
+    test_request = {
+        "newsletter_text": "This is a test newsletter about productivity and mindset.",
+        "audience_profile": "Startup founders",
+        "goal": "Increase open rates",
+        "tone": "Professional but friendly",
+        "priority": "high"
+    }
+
+    response = client.post("/jobs", json=test_request)
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+    assert client.get(f"/jobs/{job_id}").json()["status"] == "queued"
+
+    full = client.post("/jobs", json=test_request)
+    assert full.status_code == 503
+    assert full.headers["Retry-After"] == "30"
+
+    queue.claim("worker-0", {"*": 8})
+    queue.complete(job_id, {
+        "headlines": [{"title": "Mocked Headline", "keywords": ["mock"], "reason": "Because."}],
+        "trending_topics": []
+    })
+    job = client.get(f"/jobs/{job_id}").json()
+    assert job["status"] == "succeeded"
+    assert job["priority"] == "high"
+    assert job["result"]["headlines"][0]["title"] == "Mocked Headline"
+    assert client.get("/jobs/unknown").status_code == 404
+
+    refused = client.post("/jobs", json={**test_request, "webhook_url": "http://169.254.169.254/latest/meta-data/"})
+    assert refused.status_code == 400
+
+def test_generate_reports_stage_timings_and_metrics():
+    from metrics import stage
+
+    async def generate(*args, **kwargs):
+        with stage("trends"):
+            pass
+        with stage("llm", "openai/gpt-4"):
+            pass
+        return {"headlines": [{"title": "Timed", "keywords": [], "reason": "r"}], "trending_topics": []}
+
+    test_request = {
+        "newsletter_text": "This is a test newsletter about productivity and mindset.",
+        "audience_profile": "Startup founders",
+        "goal": "Increase open rates",
+        "tone": "Professional but friendly"
+    }
+    with patch("headline_generator.HeadlineGenerator.generate_headlines", side_effect=generate):
+        response = client.post("/generate", json=test_request)
+    assert response.status_code == 200
+    server_timing = response.headers["Server-Timing"]
+    assert server_timing.startswith("trends;dur=")
+    assert 'llm;dur=' in server_timing and 'desc="openai/gpt-4"' in server_timing
+    assert ", total;dur=" in server_timing
+
+    metrics = client.get("/metrics")
+    assert metrics.status_code == 200
+    assert metrics.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'headline_stage_duration_seconds_count{stage="llm"}' in metrics.text
+    assert 'http_requests_total{handler="generate_headlines",method="POST",status="200"}' in metrics.text
+    assert 'cache_lookups_total{cache="response",result="hit"}' in metrics.text
+
+def test_history_is_recorded_per_client_and_tenant(monkeypatch):
+    import main
+    from headline_history import HeadlineHistoryStore
+    body = {"tenant": "weekly", "headlines": ["5 morning habits of calm founders", "Garlic and dahlias"]}
+    monkeypatch.setattr(main.headline_generator, "headline_history", None)
+    assert client.post("/history", json=body).status_code == 400
+
+    store = HeadlineHistoryStore(max_entries=100)
+    monkeypatch.setattr(main.headline_generator, "headline_history", store)
+    response = client.post("/history", json=body)
+    assert response.status_code == 200
+    assert response.json() == {"tenant": "weekly", "added": 2, "entries": 2}
+    assert store.get("anonymous/weekly").near_duplicate("5 morning habits of calm founders!") is not None
+    assert client.post("/history", json={**body, "tenant": "../etc"}).status_code == 422
+
+def test_generate_with_routing_returns_the_decision():
+    import main
+    test_request = {
+        "newsletter_text": "A short note about remote hiring.",
+        "audience_profile": "Startup founders",
+        "goal": "Increase open rates",
+        "tone": "Friendly",
+        "provider": "route",
+        "latency_slo_ms": 2000
+    }
+    routing = {
+        "provider": "openai", "model": "gpt-3.5-turbo", "prompt_tokens": 420, "latency_slo_ms": 2000,
+        "reason": "Cheapest of 2 of 2 candidates meeting the 2000 ms SLO",
+        "attempts": [{"provider": "openai", "model": "gpt-3.5-turbo"}]
+    }
+    with patch("headline_generator.HeadlineGenerator.generate_headlines") as mock_generate:
+        mock_generate.return_value = {
+            "headlines": [{"title": "Routed", "keywords": [], "reason": "r"}],
+            "trending_topics": [],
+            "routing": routing
+        }
+        response = client.post("/generate", json=test_request)
+        assert response.status_code == 200
+        assert response.json()["routing"]["model"] == "gpt-3.5-turbo"
+        assert mock_generate.call_args.args[-2:] == (2000, None)
+
+        response = client.post("/generate", json={**test_request, "provider": "openai"})
+        assert response.status_code == 400
+
+    # Route only picks models the catalog offers
+    with patch.object(main.headline_generator, "model_filter", lambda provider, model: False):
+        response = client.post("/generate", json=test_request)
+        assert response.status_code == 500
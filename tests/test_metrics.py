@@ -0,0 +1,74 @@
+import asyncio
+import pytest
+from metrics import (
+    Counter, Histogram, MetricsRegistry, STAGE_DURATION, STAGE_ERRORS, server_timing_header, stage,
+    start_request_timings
+)
+
+def test_registry_renders_prometheus_text_format():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests", ("provider",))
+    latency = registry.histogram("latency_seconds", "Latency", bounds=[0.1, 1.0])
+    requests.inc(("openai",))
+    requests.inc(("openai",), 2)
+    requests.inc(('say "hi"',))
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(5.0)
+    registry.register_collector(lambda: [("queue_depth", "gauge", "Queued jobs", [({"status": "queued"}, 3)])])
+
+    lines = registry.render().splitlines()
+    assert "# TYPE requests_total counter" in lines
+    assert 'requests_total{provider="openai"} 3.0' in lines
+    assert 'requests_total{provider="say \\"hi\\""} 1.0' in lines
+    assert "# TYPE latency_seconds histogram" in lines
+    assert 'latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{le="1.0"} 2' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in lines
+    assert "latency_seconds_sum 5.55" in lines
+    assert "latency_seconds_count 3" in lines
+    assert 'queue_depth{status="queued"} 3' in lines
+
+def test_failing_collector_does_not_break_the_scrape():
+    registry = MetricsRegistry()
+    registry.counter("ok_total", "Still rendered").inc()
+
+    def broken():
+        raise RuntimeError("backend down")
+
+    registry.register_collector(broken)
+    assert "ok_total 1.0" in registry.render()
+
+def test_stage_records_histogram_timings_and_errors():
+    async def request():
+        timings = start_request_timings()
+        with stage("test_keywords"):
+            pass
+        with pytest.raises(ValueError):
+            with stage("test_llm", "openai/gpt-4"):
+                raise ValueError("boom")
+        return timings
+
+    timings = asyncio.run(request())
+    assert [(name, description) for name, _, description in timings] == [
+        ("test_keywords", None), ("test_llm", "openai/gpt-4")
+    ]
+    assert STAGE_DURATION.count(("test_llm",)) == 1
+    assert STAGE_ERRORS.value(("test_llm",)) == 1
+    assert STAGE_ERRORS.value(("test_keywords",)) == 0
+
+def test_stage_timings_are_shared_with_spawned_tasks():
+    async def child():
+        with stage("test_child"):
+            await asyncio.sleep(0)
+
+    async def request():
+        timings = start_request_timings()
+        await asyncio.gather(asyncio.create_task(child()), asyncio.create_task(child()))
+        return timings
+
+    assert [name for name, _, _ in asyncio.run(request())] == ["test_child", "test_child"]
+
+def test_server_timing_header():
+    header = server_timing_header([("trends", 0.2, None), ("llm", 0.81234, "openai/gpt-4")], total=1.05)
+    assert header == 'trends;dur=200.0, llm;dur=812.3;desc="openai/gpt-4", total;dur=1050.0'
@@ -0,0 +1,46 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+from model_catalog import ModelCatalog
+from provider_clients import ProviderClientRegistry
+
+CONFIGURED = {
+    "openai": ["gpt-4", "gpt-3.5-turbo"],
+    "anthropic": ["claude-3-opus-20240229"],
+    "google": ["gemini-pro"]
+}
+
+def test_uses_configured_models_until_discovered():
+    catalog = ModelCatalog(ProviderClientRegistry(), CONFIGURED)
+    assert catalog.is_available("openai", "gpt-4")
+    assert not catalog.is_available("openai", "gpt-5")
+
+def test_refresh_filters_to_discovered_models(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("GOOGLE_API_KEY", "test")
+    clients = ProviderClientRegistry()
+    clients.openai.models.list = AsyncMock(return_value=SimpleNamespace(
+        data=[SimpleNamespace(id="gpt-3.5-turbo"), SimpleNamespace(id="whisper-1")]
+    ))
+    google_models = [
+        SimpleNamespace(name="models/gemini-pro", supported_generation_methods=["generateContent"]),
+        SimpleNamespace(name="models/embedding-001", supported_generation_methods=["embedContent"])
+    ]
+    catalog = ModelCatalog(clients, CONFIGURED)
+
+    with patch("google.generativeai.list_models", return_value=google_models) as list_models:
+        asyncio.run(catalog.refresh())
+        assert list_models.call_count == 1
+
+    assert catalog.models("openai") == ["gpt-3.5-turbo"]
+    assert catalog.models("google") == ["gemini-pro"]
+    # No discovery for Anthropic, so the configured list stands
+    assert catalog.models("anthropic") == ["claude-3-opus-20240229"]
+
+def test_failed_discovery_keeps_previous_list(monkeypatch):
+    monkeypatch.setenv("GOOGLE_API_KEY", "test")
+    catalog = ModelCatalog(ProviderClientRegistry(), {"google": ["gemini-pro"]})
+    catalog.discovered["google"] = {"gemini-pro"}
+    with patch("google.generativeai.list_models", side_effect=RuntimeError("unavailable")):
+        asyncio.run(catalog.refresh())
+    assert catalog.models("google") == ["gemini-pro"]
@@ -0,0 +1,66 @@
+import pytest
+from model_router import ModelRouter, NoRouteError
+from provider_clients import DEFAULT_MODEL_PRICES
+
+CANDIDATES = [("openai", "gpt-4"), ("openai", "gpt-3.5-turbo")]
+
+def make_router(**kwargs):
+    return ModelRouter(dict(DEFAULT_MODEL_PRICES), **kwargs)
+
+def test_unmeasured_models_route_to_the_cheapest():
+    decision = make_router().route(CANDIDATES, prompt_tokens=800, latency_slo=2.0)
+    assert (decision.provider, decision.model) == ("openai", "gpt-3.5-turbo")
+    assert [candidate.model for candidate in decision.candidates] == ["gpt-3.5-turbo", "gpt-4"]
+    assert decision.candidates[0].estimated_cost_usd < decision.candidates[1].estimated_cost_usd
+    assert "no latency data yet" in decision.candidates[0].reasons[0]
+
+def test_latency_prediction_grows_with_prompt_tokens():
+    router = make_router()
+    for tokens in (500, 1000, 2000, 4000, 8000):
+        router.record_call("openai", "gpt-3.5-turbo", tokens, 0.5 + tokens / 2000)
+        router.record_call("openai", "gpt-4", tokens, 1.5)
+    assert router.predict_latency("openai", "gpt-3.5-turbo", 1000) == pytest.approx(1.0)
+
+    small = router.route(CANDIDATES, prompt_tokens=500, latency_slo=2.0)
+    assert small.model == "gpt-3.5-turbo"
+    large = router.route(CANDIDATES, prompt_tokens=6000, latency_slo=2.0)
+    assert large.model == "gpt-4"
+    assert "exceeds the 2000 ms SLO" in large.candidates[1].reasons[0]
+
+def test_failing_and_low_quality_models_are_avoided():
+    router = make_router()
+    for _ in range(5):
+        router.record_call("openai", "gpt-3.5-turbo", 500, None)
+    assert router.route(CANDIDATES, prompt_tokens=500).model == "gpt-4"
+
+    router = make_router()
+    for _ in range(5):
+        router.record_quality("openai", "gpt-3.5-turbo", 2, 8)
+        router.record_quality("openai", "gpt-4", 8, 8)
+    decision = router.route(CANDIDATES, prompt_tokens=500)
+    assert decision.model == "gpt-4"
+    assert not decision.candidates[1].eligible
+
+def test_quality_within_tolerance_prefers_the_cheaper_model():
+    router = make_router(quality_tolerance=0.15)
+    for _ in range(5):
+        router.record_quality("openai", "gpt-3.5-turbo", 7, 8)
+        router.record_quality("openai", "gpt-4", 8, 8)
+    assert router.route(CANDIDATES, prompt_tokens=500).model == "gpt-3.5-turbo"
+    router.quality_tolerance = 0.05
+    assert router.route(CANDIDATES, prompt_tokens=500).model == "gpt-4"
+
+def test_cost_budget_excludes_expensive_models():
+    router = make_router()
+    decision = router.route(CANDIDATES, prompt_tokens=2000, max_cost=0.01)
+    assert decision.model == "gpt-3.5-turbo"
+    assert not decision.candidates[1].within_budget
+    with pytest.raises(NoRouteError):
+        router.route(CANDIDATES, prompt_tokens=2000, max_cost=0.0001)
+
+def test_errors_age_out_of_the_window():
+    router = make_router(window=0.0)
+    for _ in range(5):
+        router.record_call("openai", "gpt-3.5-turbo", 500, None)
+    assert router.error_rate("openai", "gpt-3.5-turbo") is None
+    assert router.route(CANDIDATES, prompt_tokens=500).model == "gpt-3.5-turbo"
@@ -0,0 +1,58 @@
+import pytest
+from prompt_builder import PromptContext, PromptTemplate, build_messages, build_prompt, compact_context, count_tokens
+
+FILLER = "Our team also shared a few scheduling updates and housekeeping notes for the month. "
+
+def make_context(newsletter_text, past_headlines=None):
+    return PromptContext(
+        newsletter_text=newsletter_text,
+        audience_profile="Startup founders",
+        goal="Increase open rates",
+        tone="Friendly",
+        past_headlines=past_headlines or [],
+        constraints={"max_length": 60},
+        trending_topics=["ai agents"]
+    )
+
+def test_short_context_is_unchanged():
+    context = make_context("A short note about AI agents.", ["Past headline"])
+    compacted, usage = compact_context(context, "gpt-4", 4000)
+    assert compacted == context
+    assert usage.original_input_tokens == usage.compacted_input_tokens == count_tokens(build_prompt(context))
+
+def test_long_newsletter_is_compacted_to_budget():
+    salient = "Quantum startups raised record funding for quantum hardware this quarter."
+    newsletter = FILLER * 200 + salient + " " + FILLER * 200
+    context = make_context(newsletter)
+
+    compacted, usage = compact_context(context, "gpt-4", 600)
+    assert usage.original_input_tokens > 600
+    assert usage.compacted_input_tokens <= 600
+    assert usage.compacted_input_tokens == count_tokens(build_prompt(compacted))
+    assert salient in compacted.newsletter_text
+
+def test_past_headlines_are_deduplicated_and_ranked_by_relevance():
+    newsletter = ("Quantum computing funding is booming. " * 50) + FILLER * 100
+    past = ["Quantum Computing: Funding Boom", "quantum computing - funding boom!"] + [
+        f"Office snacks roundup {index}" for index in range(200)
+    ]
+    compacted, _ = compact_context(make_context(newsletter, past), "claude-3-sonnet-20240229", 800)
+    assert compacted.past_headlines[0] == "Quantum Computing: Funding Boom"
+    assert "quantum computing - funding boom!" not in compacted.past_headlines
+    assert len(compacted.past_headlines) < len(past)
+
+def test_prompt_template_renders_like_str_format():
+    template = "Audience: {audience}\nGoal: {goal}\n{audience} again"
+    compiled = PromptTemplate(template)
+    assert compiled.fields == {"audience", "goal"}
+    assert compiled.render(audience="Founders", goal="Opens") == template.format(audience="Founders", goal="Opens")
+    with pytest.raises(ValueError):
+        PromptTemplate("{max_length:>5}")
+
+def test_request_content_comes_after_the_reusable_prefix():
+    first = build_messages(make_context("First newsletter about AI agents."))
+    second = build_messages(make_context("Second newsletter about remote work."))
+    assert first.system == second.system
+    assert first.context == second.context
+    assert first.text.startswith(first.system + "\n\n" + first.context)
+    assert first.text.endswith("First newsletter about AI agents.")
@@ -0,0 +1,132 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+from types import SimpleNamespace
+from provider_clients import (
+    ProviderClientRegistry, ProviderDisabledError, is_retryable, parse_enabled_providers, prompt_cache_usage
+)
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+def test_is_retryable():
+    assert is_retryable(StatusError(429))
+    assert is_retryable(StatusError(529))
+    assert not is_retryable(StatusError(400))
+    assert is_retryable(asyncio.TimeoutError())
+    assert not is_retryable(ValueError("Failed to parse LLM response"))
+
+def test_call_retries_transient_errors_with_backoff():
+    registry = ProviderClientRegistry(max_retries=2, backoff_base=1.0)
+    request = AsyncMock(side_effect=[StatusError(503), StatusError(429), "ok"])
+
+    with patch("provider_clients.asyncio.sleep", new=AsyncMock()) as sleep:
+        assert asyncio.run(registry.call("openai", request)) == "ok"
+    delays = [call.args[0] for call in sleep.await_args_list]
+    assert len(delays) == 2
+    assert 0 <= delays[0] <= 1.0 and 0 <= delays[1] <= 2.0
+    assert registry.stats()["openai"]["retries"] == 2
+    assert registry.stats()["openai"]["in_flight"] == 0
+
+def test_call_does_not_retry_client_errors():
+    registry = ProviderClientRegistry(max_retries=3)
+    request = AsyncMock(side_effect=StatusError(400))
+    with pytest.raises(StatusError):
+        asyncio.run(registry.call("anthropic", request))
+    assert request.await_count == 1
+
+def test_clients_share_a_configured_pool(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("GOOGLE_API_KEY", "test")
+    registry = ProviderClientRegistry(max_connections=7, timeouts={"openai": 12.0})
+    assert registry.openai is registry.openai
+    assert registry.openai.max_retries == 0
+    assert registry._http_clients["openai"].timeout.read == 12.0
+    assert registry.gemini_model("gemini-pro") is registry.gemini_model("gemini-pro")
+
+    asyncio.run(registry.aclose())
+    assert registry._http_clients == {}
+
+def test_gemini_endpoint_can_be_overridden(monkeypatch):
+    monkeypatch.setenv("GOOGLE_API_KEY", "test")
+    monkeypatch.setenv("GOOGLE_API_ENDPOINT", "localhost:9101")
+    with patch("google.generativeai.configure") as configure:
+        ProviderClientRegistry().configure_gemini()
+    assert configure.call_args.kwargs["client_options"] == {"api_endpoint": "localhost:9101"}
+
+def test_prompt_cache_usage_is_read_from_each_provider():
+    openai_response = SimpleNamespace(usage=SimpleNamespace(
+        prompt_tokens=2000, prompt_tokens_details={"cached_tokens": 1536}
+    ))
+    anthropic_response = SimpleNamespace(usage=SimpleNamespace(
+        input_tokens=300, cache_read_input_tokens=1500, cache_creation_input_tokens=0
+    ))
+    google_response = SimpleNamespace(usage_metadata=SimpleNamespace(
+        prompt_token_count=1800, cached_content_token_count=0
+    ))
+    assert prompt_cache_usage("openai", openai_response) == (2000, 1536, 0)
+    assert prompt_cache_usage("anthropic", anthropic_response) == (1800, 1500, 0)
+    assert prompt_cache_usage("google", google_response) == (1800, 0, 0)
+
+    registry = ProviderClientRegistry()
+    registry.record_usage("anthropic", anthropic_response)
+    registry.record_usage("anthropic", SimpleNamespace(usage=SimpleNamespace(input_tokens=100)))
+    stats = registry.stats()["anthropic"]
+    assert stats["input_tokens"] == 1900
+    assert stats["cached_input_tokens"] == 1500
+    assert stats["cached_input_ratio"] == pytest.approx(1500 / 1900)
+
+def test_throttled_calls_shrink_the_model_concurrency_limit():
+    registry = ProviderClientRegistry(max_retries=1, backoff_base=0.01)
+    request = AsyncMock(side_effect=[StatusError(429), "ok"])
+
+    with patch("provider_clients.asyncio.sleep", new=AsyncMock()), patch("rate_limiter.asyncio.sleep", new=AsyncMock()):
+        assert asyncio.run(registry.call("openai", request, model="gpt-4", tokens=1200)) == "ok"
+    stats = registry.rate_limiter.stats()["openai/gpt-4"]
+    assert stats["throttled"] == 1
+    assert stats["concurrency_limit"] == 16
+    assert stats["in_flight"] == 0
+
+def test_response_headers_update_rate_limits():
+    import httpx
+    registry = ProviderClientRegistry()
+    response = httpx.Response(
+        200,
+        headers={"x-ratelimit-limit-requests": "500", "x-ratelimit-remaining-requests": "42"},
+        request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions", json={"model": "gpt-4"})
+    )
+    asyncio.run(registry._rate_limit_hook("openai")(response))
+    assert registry.rate_limiter.stats()["openai/gpt-4"]["requests"]["per_minute"] == 500
+
+def test_record_usage_counts_output_tokens_and_cost():
+    registry = ProviderClientRegistry(prices={"my-model": (2.0, 10.0)})
+    registry.record_usage("openai", SimpleNamespace(usage=SimpleNamespace(
+        prompt_tokens=2000, completion_tokens=100, prompt_tokens_details={"cached_tokens": 1000}
+    )), "gpt-4")
+    registry.record_usage("anthropic", SimpleNamespace(usage=SimpleNamespace(
+        input_tokens=1000, output_tokens=500, cache_read_input_tokens=0, cache_creation_input_tokens=0
+    )), "my-model-2024")
+    stats = registry.stats()
+    assert stats["openai"]["output_tokens"] == 100
+    # 1000 full-price and 1000 half-price cached input tokens at $30/M, 100 output tokens at $60/M
+    assert stats["openai"]["estimated_cost_usd"] == pytest.approx((1000 * 30 + 1000 * 15 + 100 * 60) / 1e6)
+    assert stats["anthropic"]["estimated_cost_usd"] == pytest.approx((1000 * 2 + 500 * 10) / 1e6)
+
+def test_provider_sdks_load_on_first_use_and_only_when_enabled(monkeypatch):
+    import subprocess, sys
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    code = (
+        "import sys, main; "
+        "print(sorted(m for m in ('openai', 'anthropic', 'google.generativeai') if m in sys.modules))"
+    )
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert output.strip().splitlines()[-1] == "[]"
+
+    registry = ProviderClientRegistry(enabled_providers=["openai"])
+    assert registry.openai is not None
+    with pytest.raises(ProviderDisabledError):
+        registry.anthropic
+    with pytest.raises(ValueError):
+        parse_enabled_providers("openai,mistral")
@@ -0,0 +1,152 @@
+import time
+import sqlite3
+import asyncio
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+from limits import RateLimitItemPerMinute
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter
+from rate_limiter import (
+    ClientQuotas, ProviderRateLimiter, ProviderRateLimitError, RateLimitStore, SharedTokenBucket,
+    TokenBucket, parse_rate_limit_headers
+)
+
+def test_token_bucket_queues_callers_in_order():
+    bucket = TokenBucket(per_minute=60)
+    assert bucket.reserve(60) == 0
+    assert bucket.reserve(1) == pytest.approx(1.0, abs=0.05)
+    assert bucket.reserve(1) == pytest.approx(2.0, abs=0.05)
+    bucket.refund(2)
+    assert bucket.reserve(1) == pytest.approx(1.0, abs=0.05)
+
+def test_slot_waits_for_capacity_instead_of_failing():
+    limiter = ProviderRateLimiter({"openai/gpt-4": {"rpm": 60, "tpm": 6000}}, max_wait=5)
+    limiter.limits("openai", "gpt-4").tokens.reserve(6000)
+
+    async def use_slot():
+        async with limiter.slot("openai", "gpt-4", tokens=100):
+            pass
+
+    with patch("rate_limiter.asyncio.sleep", new=AsyncMock()) as sleep:
+        asyncio.run(use_slot())
+    assert sleep.await_args.args[0] == pytest.approx(1.0, abs=0.05)
+    assert limiter.stats()["openai/gpt-4"]["queued"] == 1
+
+def test_slot_rejects_waits_beyond_max_wait():
+    limiter = ProviderRateLimiter({"openai": {"tpm": 6000}}, max_wait=5)
+    tokens = limiter.limits("openai", "gpt-4").tokens
+    tokens.reserve(6000)
+
+    async def use_slot():
+        async with limiter.slot("openai", "gpt-4", tokens=3000):
+            pass
+
+    with pytest.raises(ProviderRateLimitError):
+        asyncio.run(use_slot())
+    assert tokens.available() == pytest.approx(0, abs=5)
+    assert limiter.stats()["openai/gpt-4"]["rejected"] == 1
+
+def test_limits_follow_response_headers():
+    assert parse_rate_limit_headers({
+        "x-ratelimit-limit-requests": "500", "x-ratelimit-remaining-requests": "499",
+        "x-ratelimit-limit-tokens": "30000", "x-ratelimit-remaining-tokens": "0"
+    }) == {"requests": (500.0, 499.0), "tokens": (30000.0, 0.0)}
+
+    limiter = ProviderRateLimiter()
+    limiter.observe_headers("anthropic", "claude-3-sonnet-20240229", {
+        "anthropic-ratelimit-requests-limit": "50", "anthropic-ratelimit-requests-remaining": "10"
+    })
+    stats = limiter.stats()["anthropic/claude-3-sonnet-20240229"]
+    assert stats["requests"]["per_minute"] == 50
+    assert stats["requests"]["available"] == pytest.approx(10, abs=1)
+    assert stats["tokens"] is None
+
+def test_concurrency_shrinks_on_throttling_and_recovers():
+    limiter = ProviderRateLimiter(max_concurrency=8)
+    limiter.on_throttled("openai", "gpt-4", delay=0)
+    limiter.on_throttled("openai", "gpt-4", delay=0)
+    assert limiter.stats()["openai/gpt-4"]["concurrency_limit"] == 2
+    for _ in range(10):
+        limiter.on_success("openai", "gpt-4")
+    assert limiter.stats()["openai/gpt-4"]["concurrency_limit"] == 4
+
+    limiter = ProviderRateLimiter(max_concurrency=2)
+    peak = 0
+
+    async def call():
+        nonlocal peak
+        async with limiter.slot("openai", "gpt-4"):
+            peak = max(peak, limiter.limits("openai", "gpt-4").concurrency.in_flight)
+            await asyncio.sleep(0.01)
+
+    async def run_all():
+        await asyncio.gather(*(call() for _ in range(6)))
+
+    asyncio.run(run_all())
+    assert peak == 2
+    assert limiter.limits("openai", "gpt-4").concurrency.in_flight == 0
+
+def test_client_quotas_are_keyed_by_api_key():
+    quotas = ClientQuotas({"secret": {"name": "newsroom", "limit": "600/minute"}})
+    known = SimpleNamespace(headers={"x-api-key": "secret"}, client=SimpleNamespace(host="10.0.0.1"))
+    anonymous = SimpleNamespace(headers={}, client=SimpleNamespace(host="10.0.0.2"))
+
+    assert quotas.key_func(known) == "client:newsroom"
+    assert quotas.key_func(anonymous) == "ip:10.0.0.2"
+    limit = quotas.limit("10/minute")
+    assert limit("client:newsroom") == "600/minute"
+    assert limit("ip:10.0.0.2") == "10/minute"
+
+def test_shared_bucket_is_drawn_down_by_every_process(tmp_path):
+    path = str(tmp_path / "limits.sqlite3")
+    first = SharedTokenBucket(RateLimitStore(path), "openai/gpt-4:requests", per_minute=60)
+    second_store = RateLimitStore(path)
+    second = SharedTokenBucket(second_store, "openai/gpt-4:requests", per_minute=60)
+    assert first.reserve(60) == 0
+    assert second.reserve(1) == pytest.approx(1.0, abs=0.05)
+    # A forked worker reconnects instead of reusing its parent's connection
+    second_store._pid = -1
+    assert second.reserve(1) == pytest.approx(2.0, abs=0.05)
+
+def test_throttling_pauses_the_shared_bucket(tmp_path):
+    store = RateLimitStore(str(tmp_path / "limits.sqlite3"))
+    limiter = ProviderRateLimiter({"openai": {"rpm": 600}}, store=store)
+    other = ProviderRateLimiter({"openai": {"rpm": 600}}, store=store)
+    limiter.on_throttled("openai", "gpt-4", delay=2.0)
+    store.flush()
+    assert other.limits("openai", "gpt-4").requests.reserve(1) == pytest.approx(2.0, abs=0.1)
+
+def test_client_quota_counters_are_shared(tmp_path):
+    uri = f"sqlite:///{tmp_path / 'quotas.sqlite3'}"
+    first = FixedWindowRateLimiter(storage_from_string(uri))
+    second = FixedWindowRateLimiter(storage_from_string(uri))
+    limit = RateLimitItemPerMinute(3)
+
+    def hit(limiter, key):
+        # Hits reach the file on the store's thread, a moment after the check
+        allowed = limiter.hit(limit, key)
+        limiter.storage.store.flush()
+        return allowed
+
+    assert hit(first, "client") and hit(second, "client") and hit(first, "client")
+    assert not hit(second, "client")
+    assert hit(first, "other")
+
+def test_event_loop_paths_do_not_wait_for_the_write_lock(tmp_path):
+    path = str(tmp_path / "limits.sqlite3")
+    limiter = ProviderRateLimiter({"openai": {"rpm": 600}}, store=RateLimitStore(path))
+    quotas = FixedWindowRateLimiter(storage_from_string(f"sqlite:///{path}"))
+    # Another process in the middle of a write transaction
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+
+    start = time.monotonic()
+    limiter.observe_headers("openai", "gpt-4", {"x-ratelimit-limit-requests": "600", "x-ratelimit-remaining-requests": "0"})
+    limiter.on_throttled("openai", "gpt-4", delay=1.0)
+    assert quotas.hit(RateLimitItemPerMinute(3), "client")
+    assert time.monotonic() - start < 0.5
+
+    other.execute("ROLLBACK")
+    limiter.store.flush()
+    assert limiter.limits("openai", "gpt-4").requests.available() <= 0
@@ -0,0 +1,105 @@
+import time
+import asyncio
+import threading
+import pytest
+from request_coalescer import RequestCoalescer
+
+def test_concurrent_async_calls_share_one_computation():
+    coalescer = RequestCoalescer()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"headlines": ["shared"]}
+
+    async def run_all():
+        return await asyncio.gather(*(coalescer.run("key", compute) for _ in range(10)))
+
+    results = asyncio.run(run_all())
+    assert len(calls) == 1
+    assert all(result == {"headlines": ["shared"]} for result in results)
+    assert coalescer.stats() == {"leaders": 1, "coalesced": 9, "in_flight": 0}
+
+def test_errors_reach_every_waiter_and_are_not_remembered():
+    coalescer = RequestCoalescer()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("Failed to parse LLM response")
+
+    async def run_all():
+        return await asyncio.gather(*(coalescer.run("key", fail) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in asyncio.run(run_all()))
+    assert coalescer.stats()["in_flight"] == 0
+
+    async def succeed():
+        return "ok"
+
+    assert asyncio.run(coalescer.run("key", succeed)) == "ok"
+    assert coalescer.stats()["leaders"] == 2
+
+def test_cancelled_waiter_does_not_cancel_the_flight():
+    coalescer = RequestCoalescer()
+
+    async def compute():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def scenario():
+        first = asyncio.create_task(coalescer.run("key", compute))
+        second = asyncio.create_task(coalescer.run("key", compute))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(scenario()) == "done"
+
+def test_threaded_callers_join_an_async_flight():
+    coalescer = RequestCoalescer()
+    results = []
+
+    async def compute():
+        await asyncio.sleep(0.1)
+        return "from loop"
+
+    def threaded_caller():
+        results.append(coalescer.run_sync("key", lambda: "from thread"))
+
+    async def scenario():
+        leader = asyncio.create_task(coalescer.run("key", compute))
+        await asyncio.sleep(0.01)
+        threads = [threading.Thread(target=threaded_caller) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        result = await leader
+        await asyncio.to_thread(lambda: [thread.join() for thread in threads])
+        return result
+
+    assert asyncio.run(scenario()) == "from loop"
+    assert results == ["from loop"] * 4
+    assert coalescer.stats()["coalesced"] == 4
+
+def test_run_sync_coalesces_threads():
+    coalescer = RequestCoalescer()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.1)
+        return 42
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(coalescer.run_sync("key", compute))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [42] * 5
+    assert len(calls) == 1
+
+def test_make_key_normalises_payload():
+    key = RequestCoalescer.make_key({"newsletter_text": "Text\r\n", "constraints": {"a": 1, "b": 2}})
+    assert key == RequestCoalescer.make_key({"constraints": {"b": 2, "a": 1}, "newsletter_text": " Text\n"})
+    assert key != RequestCoalescer.make_key({"newsletter_text": "Other", "constraints": {"a": 1, "b": 2}})
@@ -0,0 +1,66 @@
+import time
+from response_cache import MemoryCacheBackend, SQLiteCacheBackend, ResponseCache
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryCacheBackend(max_entries=2)
+    backend.set("a", "1", ttl=60)
+    backend.set("b", "2", ttl=60)
+    assert backend.get("a") == "1"
+    backend.set("c", "3", ttl=60)
+    assert backend.get("b") is None
+    assert backend.get("a") == "1"
+    assert backend.get("c") == "3"
+
+def test_memory_backend_expires_entries():
+    backend = MemoryCacheBackend()
+    backend.set("a", "1", ttl=0.01)
+    time.sleep(0.02)
+    assert backend.get("a") is None
+    assert len(backend) == 0
+
+def test_sqlite_backend_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    writer = SQLiteCacheBackend(path, max_entries=2)
+    reader = SQLiteCacheBackend(path, max_entries=2)
+    writer.set("a", "1", ttl=60)
+    writer.set("b", "2", ttl=60)
+    assert reader.get("a") == "1"
+    writer.set("c", "3", ttl=60)
+    assert reader.get("b") is None
+    assert len(reader) == 2
+
+def test_response_cache_counts_hits_and_misses():
+    cache = ResponseCache(MemoryCacheBackend())
+    key = ResponseCache.make_key("prompt", "openai", "gpt-4")
+    assert key != ResponseCache.make_key("prompt", "openai", "gpt-3.5-turbo")
+    assert cache.get(key) is None
+    cache.set(key, {"headlines": [], "trending_topics": []})
+    assert cache.get(key) == {"headlines": [], "trending_topics": []}
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+def test_sqlite_backend_evicts_in_batches(tmp_path):
+    backend = SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"), max_entries=20)
+    for index in range(21):
+        backend.set(str(index), "v", ttl=60)
+    # Past the cap a tenth is freed at once, so the next writes don't evict
+    assert len(backend) == 18
+    assert backend.get("0") is None and backend.get("20") == "v"
+    backend.set("21", "v", ttl=60)
+    backend.set("22", "v", ttl=60)
+    assert len(backend) == 20
+
+    # A second worker starts from the table's count, so its writes evict too
+    other = SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"), max_entries=20)
+    other.set("23", "v", ttl=60)
+    assert len(backend) == 18
+
+def test_response_cache_runs_blocking_backends_in_a_thread(tmp_path):
+    import asyncio
+    import threading
+    cache = ResponseCache(SQLiteCacheBackend(str(tmp_path / "cache.sqlite3")))
+    threads = []
+    cache.backend.get = lambda key: threads.append(threading.current_thread()) or None
+    assert asyncio.run(cache.run(cache.get, "key")) is None
+    assert threads[0] is not threading.main_thread()
+    assert cache.stats()["misses"] == 1
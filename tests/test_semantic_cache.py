@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+from semantic_cache import SemanticCache, embed_text
+
+DRAFT = (
+    "This week we look at how small teams are adopting AI coding assistants. "
+    "Three founders share what changed in their review process, where the tools "
+    "saved hours and where they introduced subtle bugs. We also cover the new "
+    "pricing tiers from the major vendors and what they mean for bootstrapped startups."
+)
+EDITED = DRAFT.replace("subtle bugs", "hidden bugs").replace("Three", "Four")
+UNRELATED = (
+    "Our garden issue: planting garlic in autumn, choosing mulch for clay soil and "
+    "a reader's guide to overwintering dahlias in a cold frame."
+)
+CONTEXT = {"audience_profile": "Founders", "goal": "Opens", "tone": "Friendly"}
+
+def _load(responses):
+    return lambda key: responses.get(key)
+
+def test_embedding_keeps_edited_drafts_close():
+    def similarity(a, b):
+        a, b = embed_text(a).astype(np.float32), embed_text(b).astype(np.float32)
+        return float(a @ b / np.linalg.norm(a) / np.linalg.norm(b))
+
+    assert similarity(DRAFT, EDITED) > 0.9
+    assert similarity(DRAFT, UNRELATED) < 0.5
+
+def test_near_duplicate_with_same_context_hits():
+    cache = SemanticCache(max_entries=10, threshold=0.9)
+    responses = {"ab" * 32: {"headlines": ["cached"]}}
+    cache.add(DRAFT, CONTEXT, "ab" * 32)
+
+    assert cache.get(EDITED, CONTEXT, _load(responses)) == {"headlines": ["cached"]}
+    assert cache.get(UNRELATED, CONTEXT, _load(responses)) is None
+    assert cache.get(EDITED, {**CONTEXT, "tone": "Formal"}, _load(responses)) is None
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 2
+
+def test_expired_response_frees_the_entry():
+    cache = SemanticCache(max_entries=10)
+    cache.add(DRAFT, CONTEXT, "ab" * 32)
+    assert cache.get(DRAFT, CONTEXT, _load({})) is None
+    assert cache.stats()["stale"] == 1
+    assert cache.stats()["entries"] == 0
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticCache(max_entries=2)
+    responses = {"01" * 32: {"n": 1}, "02" * 32: {"n": 2}, "03" * 32: {"n": 3}}
+    cache.add(DRAFT, CONTEXT, "01" * 32)
+    cache.add(UNRELATED, CONTEXT, "02" * 32)
+    assert cache.get(DRAFT, CONTEXT, _load(responses)) == {"n": 1}
+
+    cache.add("Quarterly market outlook for semiconductor supply chains.", CONTEXT, "03" * 32)
+    assert cache.stats()["evictions"] == 1
+    assert cache.get(DRAFT, CONTEXT, _load(responses)) == {"n": 1}
+    assert cache.get(UNRELATED, CONTEXT, _load(responses)) is None
+
+def test_index_finds_neighbours_among_many_entries():
+    cache = SemanticCache(max_entries=5000)
+    rng = np.random.default_rng(0)
+    words = [f"word{index}" for index in range(2000)]
+    texts = [" ".join(rng.choice(words, 60)) for _ in range(3000)]
+    for index, text in enumerate(texts):
+        cache.add(text, CONTEXT, f"{index:064x}")
+
+    responses = {f"{index:064x}": index for index in range(len(texts))}
+    found = 0
+    for index in range(0, 3000, 30):
+        tokens = texts[index].split()
+        tokens[5] = "edited"
+        found += cache.get(" ".join(tokens), CONTEXT, _load(responses)) == index
+    assert found >= 95
+
+def test_memory_mapped_index_survives_reopening(tmp_path):
+    path = str(tmp_path / "semantic.idx")
+    cache = SemanticCache(max_entries=10, path=path)
+    cache.add(DRAFT, CONTEXT, "ab" * 32)
+    cache.flush()
+
+    reopened = SemanticCache(max_entries=10, path=path)
+    assert reopened.get(EDITED, CONTEXT, _load({"ab" * 32: {"ok": True}})) == {"ok": True}
+    with pytest.raises(ValueError):
+        SemanticCache(max_entries=20, path=path)
+
+def test_instances_on_one_index_see_each_others_entries(tmp_path):
+    path = str(tmp_path / "semantic.idx")
+    first = SemanticCache(max_entries=10, path=path)
+    second = SemanticCache(max_entries=10, path=path)
+    assert second.get(EDITED, CONTEXT, _load({})) is None
+    first.add(DRAFT, CONTEXT, "ab" * 32)
+    assert second.get(EDITED, CONTEXT, _load({"ab" * 32: {"ok": True}})) == {"ok": True}
+    second.add(UNRELATED, CONTEXT, "cd" * 32)
+    assert first.get(UNRELATED, CONTEXT, _load({"cd" * 32: {"ok": 2}})) == {"ok": 2}
+
+def test_other_processes_appends_are_merged_without_a_rebuild(tmp_path, monkeypatch):
+    path = str(tmp_path / "semantic.idx")
+    first = SemanticCache(max_entries=2, path=path)
+    second = SemanticCache(max_entries=2, path=path)
+    assert second.get(EDITED, CONTEXT, _load({})) is None
+    rebuilds = []
+    rebuild = second._rebuild
+    monkeypatch.setattr(second, "_rebuild", lambda: rebuilds.append(second.count) or rebuild())
+
+    first.add(DRAFT, CONTEXT, "ab" * 32)
+    assert second.get(EDITED, CONTEXT, _load({"ab" * 32: {"ok": True}})) == {"ok": True}
+    assert rebuilds == [] and second._pending == [0]
+
+    # Once full, a write replaces a slot, so the other instance re-sorts its indexes
+    first.add(UNRELATED, CONTEXT, "cd" * 32)
+    first.add(UNRELATED.replace("garlic", "onions and leeks and chard"), {**CONTEXT, "tone": "Dry"}, "ef" * 32)
+    assert second.get(UNRELATED, CONTEXT, _load({"cd" * 32: {"ok": 2}})) == {"ok": 2}
+    assert rebuilds == [2]
@@ -0,0 +1,74 @@
+import os
+import sys
+import time
+import signal
+import socket
+import subprocess
+import httpx
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def get_stats(base_url: str) -> httpx.Response:
+    # A new connection each time, so any worker may accept it
+    return httpx.get(f"{base_url}/stats", headers={"Connection": "close"})
+
+def worker_pids(base_url: str, attempts: int) -> set:
+    return {get_stats(base_url).json()["pid"] for _ in range(attempts)}
+
+@pytest.fixture
+def server(tmp_path):
+    port = free_port()
+    env = {
+        **os.environ,
+        "ENABLED_PROVIDERS": "anthropic",
+        # Nothing listens there: discovery fails fast and keeps the configured models
+        "ANTHROPIC_BASE_URL": "http://127.0.0.1:9"
+    }
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "serve.py"), "--workers", "2", "--app-dir", ROOT,
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning", "--graceful-timeout", "5"],
+        env=env, cwd=str(tmp_path)
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/health").status_code == 200:
+                break
+        except httpx.TransportError:
+            time.sleep(0.2)
+    yield process, base_url
+    if process.poll() is None:
+        process.kill()
+        process.wait()
+
+def test_workers_share_state_reload_and_stop_cleanly(server):
+    process, base_url = server
+    time.sleep(1)
+    first = worker_pids(base_url, attempts=10)
+    assert len(first) == 2
+    calls = 10
+
+    process.send_signal(signal.SIGHUP)
+    current = first
+    deadline = time.monotonic() + 30
+    while current & first and time.monotonic() < deadline:
+        time.sleep(1)
+        current = worker_pids(base_url, attempts=4)
+        calls += 4
+    assert not current & first
+
+    # /stats allows 30 calls a minute per client, counted across all workers and reloads
+    while calls < 30:
+        assert get_stats(base_url).status_code == 200
+        calls += 1
+    assert get_stats(base_url).status_code == 429
+
+    process.send_signal(signal.SIGTERM)
+    assert process.wait(timeout=30) == 0
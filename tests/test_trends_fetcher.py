@@ -0,0 +1,124 @@
+import time
+import threading
+import pandas as pd
+import pytest
+from unittest.mock import patch
+from trends_cache import TrendsCache
+from trends_fetcher import TrendsFetcher
+
+class FakeTrendReq:
+    """Stands in for pytrends, returning one related query per keyword."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.payloads = []
+
+    def build_payload(self, kw_list, **kwargs):
+        self.payloads.append(list(kw_list))
+        self._kw_list = list(kw_list)
+
+    def related_queries(self):
+        time.sleep(self.delay)
+        return {
+            keyword: {"top": pd.DataFrame({"query": [f"{keyword} trend"]}), "rising": None}
+            for keyword in self._kw_list
+        }
+
+def make_fetcher(cache, delay=0.0):
+    with patch("pytrends.request.TrendReq"):
+        fetcher = TrendsFetcher(cache=cache)
+    fetcher.pytrends = FakeTrendReq(delay)
+    return fetcher
+
+def test_caches_results_per_keyword():
+    fetcher = make_fetcher(TrendsCache())
+    assert fetcher.get_trending_topics(["alpha", "beta"]) == ["alpha trend", "beta trend"]
+    assert fetcher.get_trending_topics(["beta", "gamma"]) == ["beta trend", "gamma trend"]
+    assert fetcher.pytrends.payloads == [["alpha", "beta"], ["gamma"]]
+
+def test_serves_stale_entries_while_refreshing():
+    cache = TrendsCache(ttl=0)
+    cache.set(TrendsCache.make_key("alpha", "now 7-d"), ["old alpha"])
+    fetcher = make_fetcher(cache)
+
+    assert fetcher.get_trending_topics(["alpha"]) == ["old alpha"]
+    for _ in range(100):
+        if cache.get(TrendsCache.make_key("alpha", "now 7-d"))[0] == ["alpha trend"]:
+            break
+        time.sleep(0.01)
+    assert fetcher.pytrends.payloads == [["alpha"]]
+    assert fetcher.get_trending_topics(["alpha"]) == ["alpha trend"]
+
+def test_concurrent_requests_share_one_fetch():
+    fetcher = make_fetcher(TrendsCache(), delay=0.1)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(fetcher.get_trending_topics(["alpha"])))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [["alpha trend"]] * 5
+    assert fetcher.pytrends.payloads == [["alpha"]]
+
+def test_cache_persists_across_restarts(tmp_path):
+    path = str(tmp_path / "trends.sqlite3")
+    make_fetcher(TrendsCache(path)).get_trending_topics(["alpha"])
+
+    fetcher = make_fetcher(TrendsCache(path))
+    assert fetcher.get_trending_topics(["alpha"]) == ["alpha trend"]
+    assert fetcher.pytrends.payloads == []
+
+def test_batch_fetches_each_keyword_once():
+    fetcher = make_fetcher(TrendsCache())
+    topics = fetcher.get_trending_topics_batch([["alpha", "beta"], ["beta", "gamma"], ["alpha"]])
+    assert topics == [["alpha trend", "beta trend"], ["beta trend", "gamma trend"], ["alpha trend"]]
+    assert fetcher.pytrends.payloads == [["alpha", "beta", "gamma"]]
+
+def test_picks_up_entries_other_workers_fetched(tmp_path):
+    path = str(tmp_path / "trends.sqlite3")
+    first, second = TrendsCache(path), TrendsCache(path)
+    make_fetcher(first).get_trending_topics(["alpha"])
+
+    fetcher = make_fetcher(second)
+    assert fetcher.get_trending_topics(["alpha"]) == ["alpha trend"]
+    assert fetcher.pytrends.payloads == []
+
+def test_failed_keywords_back_off_instead_of_refetching():
+    fetcher = make_fetcher(TrendsCache())
+    fetcher.pytrends.related_queries = lambda: (_ for _ in ()).throw(RuntimeError("429 from Google"))
+    for _ in range(3):
+        assert fetcher.get_trending_topics(["alpha"]) == []
+    assert fetcher.pytrends.payloads == [["alpha"]]
+
+    # Retried once the backoff has passed, and the backoff doubles on another failure
+    key = TrendsCache.make_key("alpha", "now 7-d")
+    fetcher._failures[key] = (0.0, 1)
+    fetcher.get_trending_topics(["alpha"])
+    assert len(fetcher.pytrends.payloads) == 2
+    assert fetcher._failures[key][1] == 2
+    assert fetcher._failures[key][0] - time.monotonic() == pytest.approx(2 * fetcher.failure_backoff, abs=1)
+
+    del fetcher.pytrends.related_queries
+    fetcher._failures[key] = (0.0, 2)
+    assert fetcher.get_trending_topics(["alpha"]) == ["alpha trend"]
+    assert key not in fetcher._failures
+
+def test_cache_is_bounded_and_rechecks_disk_sparingly(tmp_path):
+    path = str(tmp_path / "trends.sqlite3")
+    cache = TrendsCache(max_entries=2, max_stale=60)
+    for keyword in ("alpha", "beta", "gamma"):
+        cache.set(keyword, [keyword])
+    assert cache.get("alpha") is None and len(cache) == 2
+    cache._entries["beta"] = (time.time() - 120, ["beta"])
+    assert cache.get("beta") is None and len(cache) == 1
+
+    first, second = TrendsCache(path), TrendsCache(path, recheck_interval=60)
+    assert second.get("alpha") is None
+    first.set("alpha", ["alpha trend"])
+    # A miss is not looked up on disk again until the recheck interval passes
+    assert second.get("alpha") is None
+    second._checked["alpha"] = 0.0
+    assert second.get("alpha") == (["alpha trend"], True)
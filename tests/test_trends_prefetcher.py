@@ -0,0 +1,92 @@
+import asyncio
+from trends_cache import TrendsCache
+from trends_prefetcher import TrendsPrefetcher
+from test_trends_fetcher import make_fetcher
+
+def test_cold_keywords_are_fetched_within_deadline():
+    fetcher = make_fetcher(TrendsCache())
+    prefetcher = TrendsPrefetcher(fetcher, deadline=1.0, requests_per_minute=600)
+
+    async def run():
+        prefetcher.start()
+        try:
+            return await prefetcher.get_topics(["alpha", "beta"])
+        finally:
+            await prefetcher.stop()
+
+    assert asyncio.run(run()) == ["alpha trend", "beta trend"]
+    assert prefetcher.upstream_requests == 1
+
+def test_slow_fetch_returns_warm_topics_at_deadline():
+    cache = TrendsCache()
+    cache.set(TrendsCache.make_key("alpha", "now 7-d"), ["alpha trend"])
+    fetcher = make_fetcher(cache, delay=0.5)
+    prefetcher = TrendsPrefetcher(fetcher, deadline=0.05)
+
+    async def run():
+        prefetcher.start()
+        try:
+            return await prefetcher.get_topics(["alpha", "beta"])
+        finally:
+            await prefetcher.stop()
+
+    assert asyncio.run(run()) == ["alpha trend"]
+    assert prefetcher.deadline_misses == 1
+
+def test_hot_stale_keywords_are_scheduled_for_refresh():
+    cache = TrendsCache(ttl=0)
+    cache.set(TrendsCache.make_key("alpha", "now 7-d"), ["old alpha"])
+    prefetcher = TrendsPrefetcher(make_fetcher(cache), top_n=1)
+    prefetcher.record(["alpha", "alpha", "beta"])
+
+    prefetcher._schedule_refresh()
+    assert prefetcher._next_batch() == ["alpha"]
+    assert prefetcher.keyword_counts["alpha"] == 1
+
+def test_shared_budget_is_reserved_off_the_event_loop(tmp_path):
+    import threading
+    from rate_limiter import RateLimitStore
+    prefetcher = TrendsPrefetcher(
+        make_fetcher(TrendsCache()), requests_per_minute=600, store=RateLimitStore(str(tmp_path / "limits.sqlite3"))
+    )
+    threads = []
+    reserve = prefetcher._budget.reserve
+    prefetcher._budget.reserve = lambda amount: threads.append(threading.current_thread()) or reserve(amount)
+
+    asyncio.run(prefetcher._respect_rate_budget())
+    assert threads and threads[0] is not threading.main_thread()
+
+def test_cold_keywords_beyond_the_queue_cap_are_not_waited_on():
+    prefetcher = TrendsPrefetcher(make_fetcher(TrendsCache()), deadline=0.05, max_urgent=1)
+
+    async def run():
+        # Not started: nothing drains the queue, so the first keyword times out
+        prefetcher._wakeup = asyncio.Event()
+        await prefetcher.get_topics(["alpha", "beta"])
+
+    asyncio.run(run())
+    assert list(prefetcher._urgent) == ["alpha"]
+    assert prefetcher._waiters == {"alpha": []}
+    assert prefetcher.dropped_keywords == 1 and prefetcher.deadline_misses == 1
+
+def test_backed_off_keywords_spend_no_budget():
+    fetcher = make_fetcher(TrendsCache())
+    fetcher._back_off(["alpha"], "now 7-d")
+    prefetcher = TrendsPrefetcher(fetcher, deadline=1.0, requests_per_minute=600)
+
+    async def run():
+        prefetcher.start()
+        try:
+            topics = await prefetcher.get_topics(["alpha"])
+            prefetcher._urgent.append("alpha")
+            prefetcher._wakeup.set()
+            await asyncio.sleep(0.05)
+            return topics
+        finally:
+            await prefetcher.stop()
+
+    assert asyncio.run(run()) == []
+    assert prefetcher.upstream_requests == 0
+    assert prefetcher._budget.available() == 1
+    assert fetcher.pytrends.payloads == []
+    assert not prefetcher._urgent
@@ -0,0 +1,159 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class TrendsCache:
+    """
+    Per-keyword cache of Google Trends related queries.
+
+    Entries are kept in memory and written through to SQLite so they survive
+    restarts and are shared by every worker using the same file. An entry is
+    fresh for `ttl` seconds and may be served stale (while a refresh runs)
+    until it is `max_stale` seconds old. At most `max_entries` are kept in
+    memory, least recently used first out.
+
+    A key that is missing or stale in memory is looked up on disk, where
+    another worker may have fetched it, at most once per `recheck_interval`
+    seconds.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl: float = 3600,
+        max_stale: float = 86400,
+        max_entries: int = 10000,
+        recheck_interval: float = 5.0
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.max_entries = max_entries
+        self.recheck_interval = recheck_interval
+        self._entries: "OrderedDict[str, Tuple[float, List[str]]]" = OrderedDict()
+        # key -> when it was last looked up on disk
+        self._checked: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        if path:
+            self._connect()
+            self._load()
+
+    def _connect(self):
+        self._pid = os.getpid()
+        self._connection = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """CREATE TABLE IF NOT EXISTS related_queries (
+                key TEXT PRIMARY KEY,
+                topics TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            )"""
+        )
+
+    @property
+    def _conn(self) -> Optional[sqlite3.Connection]:
+        if self._connection is not None and self._pid != os.getpid():
+            # A connection must not be used across fork(); a pre-forked worker opens its own
+            self._connect()
+        return self._connection
+
+    @staticmethod
+    def make_key(keyword: str, timeframe: str) -> str:
+        return f"{timeframe}|{keyword}"
+
+    def _load(self):
+        """Load the most recent non-expired entries from disk into memory."""
+        cutoff = time.time() - self.max_stale
+        rows = self._conn.execute(
+            "SELECT key, topics, fetched_at FROM related_queries WHERE fetched_at > ? "
+            "ORDER BY fetched_at DESC LIMIT ?",
+            (cutoff, self.max_entries)
+        ).fetchall()
+        for key, topics, fetched_at in reversed(rows):
+            self._entries[key] = (fetched_at, json.loads(topics))
+        logger.info(f"Loaded {len(rows)} cached trend entries from {self.path}")
+
+    def get(self, key: str) -> Optional[Tuple[List[str], bool]]:
+        """
+        Look up an entry.
+
+        Returns:
+            (topics, is_fresh), or None if there is no usable entry
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] > self.max_stale:
+                del self._entries[key]
+                entry = None
+            if self._conn is not None and (entry is None or now - entry[0] > self.ttl) and self._recheck(key, now):
+                # Another worker may have fetched or refreshed it since we loaded
+                row = self._conn.execute(
+                    "SELECT topics, fetched_at FROM related_queries WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and now - row[1] <= self.max_stale and (entry is None or row[1] > entry[0]):
+                    entry = (row[1], json.loads(row[0]))
+                    self._store(key, entry)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+        fetched_at, topics = entry
+        return topics, now - fetched_at <= self.ttl
+
+    def _recheck(self, key: str, now: float) -> bool:
+        """Whether the key is due for a disk lookup, recording it as looked up if so."""
+        checked_at = self._checked.get(key)
+        if checked_at is not None and now - checked_at < self.recheck_interval:
+            return False
+        self._checked[key] = now
+        self._checked.move_to_end(key)
+        while len(self._checked) > self.max_entries:
+            self._checked.popitem(last=False)
+        return True
+
+    def _store(self, key: str, entry: Tuple[float, List[str]]):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def set(self, key: str, topics: List[str]):
+        fetched_at = time.time()
+        with self._lock:
+            self._store(key, (fetched_at, topics))
+            if self._conn is not None:
+                try:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO related_queries (key, topics, fetched_at) VALUES (?, ?, ?)",
+                        (key, json.dumps(topics), fetched_at)
+                    )
+                except sqlite3.Error as e:
+                    logger.error(f"Failed to persist trends cache entry: {str(e)}")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+def create_trends_cache() -> TrendsCache:
+    """
+    Build the trends cache from environment variables:
+    TRENDS_CACHE_PATH (empty for memory only; a relative path is resolved
+    against the working directory), TRENDS_CACHE_TTL and
+    TRENDS_CACHE_MAX_STALE (seconds), TRENDS_CACHE_MAX_ENTRIES (kept in
+    memory) and TRENDS_CACHE_RECHECK_INTERVAL (seconds).
+    """
+    return TrendsCache(
+        path=os.getenv("TRENDS_CACHE_PATH", "trends_cache.sqlite3") or None,
+        ttl=float(os.getenv("TRENDS_CACHE_TTL", "3600")),
+        max_stale=float(os.getenv("TRENDS_CACHE_MAX_STALE", "86400")),
+        max_entries=int(os.getenv("TRENDS_CACHE_MAX_ENTRIES", "10000")),
+        recheck_interval=float(os.getenv("TRENDS_CACHE_RECHECK_INTERVAL", "5"))
+    )
@@ -1,17 +1,36 @@
-from pytrends.request import TrendReq
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+import os
+import time
 import logging
+import threading
+from trends_cache import TrendsCache, create_trends_cache
+from keyword_extractor import KeywordExtractor, create_keyword_extractor
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class TrendsFetcher:
-    def __init__(self):
-        self.pytrends = TrendReq(hl='en-US', tz=360)
+    def __init__(self, cache: Optional[TrendsCache] = None, keyword_extractor: Optional[KeywordExtractor] = None):
+        # Created on the first fetch: pytrends pulls in pandas and its session calls Google
+        self.pytrends: Optional[Any] = None
+        self.cache = cache if cache is not None else create_trends_cache()
+        self.keyword_extractor = keyword_extractor if keyword_extractor is not None else create_keyword_extractor()
+        self._fetch_lock = threading.Lock()
+        self._inflight: Dict[str, threading.Event] = {}
+        self._inflight_lock = threading.Lock()
+        # Keywords whose last fetch failed are not retried before their backoff ends, so an
+        # outage or a block by Google doesn't send every request straight back to it
+        self.failure_backoff = float(os.getenv("TRENDS_FAILURE_BACKOFF", "60"))
+        self.max_failure_backoff = float(os.getenv("TRENDS_MAX_FAILURE_BACKOFF", "900"))
+        self._failures: Dict[str, Tuple[float, int]] = {}  # key -> (retry after, consecutive failures)
         
     def get_trending_topics(self, keywords: List[str], timeframe: str = 'now 7-d') -> List[str]:
         """
         Fetch trending topics related to the given keywords using Google Trends.
+
+        Results are cached per keyword. Stale entries are served immediately
+        while a background refresh runs, and concurrent requests for the same
+        keyword share a single upstream fetch.
         
         Args:
             keywords: List of keywords to search for related trends
@@ -21,37 +40,186 @@ class TrendsFetcher:
             List of trending topics
         """
         try:
-            # Build payload
-            self.pytrends.build_payload(
-                kw_list=keywords,
-                cat=0,
-                timeframe=timeframe,
-                geo='',
-                gprop=''
-            )
-            
-            # Get related queries
-            related_queries = self.pytrends.related_queries()
-            
+            topics_by_keyword: Dict[str, List[str]] = {}
+            missing = []
+            stale = []
+            for keyword in keywords:
+                cached = self.cache.get(TrendsCache.make_key(keyword, timeframe))
+                if cached is None:
+                    missing.append(keyword)
+                    continue
+                topics_by_keyword[keyword], is_fresh = cached
+                if not is_fresh:
+                    stale.append(keyword)
+
+            if stale:
+                self._refresh_in_background(stale, timeframe)
+            if missing:
+                self.refresh(missing, timeframe)
+                for keyword in missing:
+                    cached = self.cache.get(TrendsCache.make_key(keyword, timeframe))
+                    if cached is not None:
+                        topics_by_keyword[keyword] = cached[0]
+
             trending_topics = []
-            
-            # Extract top rising queries for each keyword
             for keyword in keywords:
-                if keyword in related_queries and related_queries[keyword]['top'] is not None:
-                    top_queries = related_queries[keyword]['top']
-                    if not top_queries.empty:
-                        trending_topics.extend(top_queries['query'].head(3).tolist())
-            
-            return list(set(trending_topics))  # Remove duplicates
+                trending_topics.extend(topics_by_keyword.get(keyword, []))
+
+            return list(dict.fromkeys(trending_topics))  # Remove duplicates
             
         except Exception as e:
             logger.error(f"Error fetching trending topics: {str(e)}")
             return []  # Return empty list on error
+
+    def get_trending_topics_batch(self, keyword_lists: List[List[str]], timeframe: str = 'now 7-d') -> List[List[str]]:
+        """
+        Fetch trending topics for several keyword lists, looking up each
+        distinct keyword only once across the whole batch.
+
+        Args:
+            keyword_lists: One list of keywords per newsletter
+            timeframe: Time period for trends (default: last 7 days)
+
+        Returns:
+            List of trending topics for each keyword list, in order
+        """
+        all_keywords = list(dict.fromkeys(keyword for keywords in keyword_lists for keyword in keywords))
+        self.get_trending_topics(all_keywords, timeframe)
+        return [self.get_cached_topics(keywords, timeframe)[0] for keywords in keyword_lists]
+
+    def load(self):
+        """Create the pytrends session (imports pytrends and pandas)."""
+        if self.pytrends is None:
+            from pytrends.request import TrendReq
+            self.pytrends = TrendReq(hl='en-US', tz=360)
+
+    def get_cached_topics(self, keywords: List[str], timeframe: str = 'now 7-d') -> Tuple[List[str], List[str]]:
+        """
+        Return whatever trend data is already cached, without touching Google.
+
+        Args:
+            keywords: List of keywords to look up
+            timeframe: Time period for trends (default: last 7 days)
+
+        Returns:
+            (trending topics from cached keywords, keywords with no cached data)
+        """
+        trending_topics = []
+        cold = []
+        for keyword in keywords:
+            cached = self.cache.get(TrendsCache.make_key(keyword, timeframe))
+            if cached is None:
+                cold.append(keyword)
+            else:
+                trending_topics.extend(cached[0])
+        return list(dict.fromkeys(trending_topics)), cold
+
+    def is_fresh(self, keyword: str, timeframe: str = 'now 7-d') -> bool:
+        cached = self.cache.get(TrendsCache.make_key(keyword, timeframe))
+        return cached is not None and cached[1]
+
+    def backed_off(self, keyword: str, timeframe: str = 'now 7-d') -> bool:
+        """Whether the keyword's last fetch failed and its backoff has not passed yet."""
+        with self._inflight_lock:
+            entry = self._failures.get(TrendsCache.make_key(keyword, timeframe))
+        return entry is not None and entry[0] > time.monotonic()
+
+    def refresh(self, keywords: List[str], timeframe: str = 'now 7-d'):
+        """
+        Fetch keywords from Google, waiting on any fetch already in flight for
+        the same keyword instead of issuing a duplicate request. Keywords
+        whose last fetch failed are skipped until their backoff has passed.
+        """
+        to_fetch = []
+        to_wait = []
+        now = time.monotonic()
+        with self._inflight_lock:
+            for keyword in keywords:
+                key = TrendsCache.make_key(keyword, timeframe)
+                if key in self._inflight:
+                    to_wait.append(self._inflight[key])
+                elif self._failures.get(key, (0.0, 0))[0] > now:
+                    continue
+                else:
+                    self._inflight[key] = threading.Event()
+                    to_fetch.append(keyword)
+
+        try:
+            if to_fetch:
+                self._fetch_from_google(to_fetch, timeframe)
+        finally:
+            with self._inflight_lock:
+                for keyword in to_fetch:
+                    self._inflight.pop(TrendsCache.make_key(keyword, timeframe)).set()
+
+        for event in to_wait:
+            event.wait()
+
+    def _refresh_in_background(self, keywords: List[str], timeframe: str):
+        with self._inflight_lock:
+            keywords = [
+                keyword for keyword in keywords
+                if TrendsCache.make_key(keyword, timeframe) not in self._inflight
+            ]
+        if keywords:
+            threading.Thread(
+                target=self.refresh, args=(keywords, timeframe), daemon=True
+            ).start()
+
+    def _fetch_from_google(self, keywords: List[str], timeframe: str):
+        """Fetch related queries from Google Trends and store them per keyword."""
+        # pytrends accepts at most 5 keywords per payload and its session is not thread-safe
+        for i in range(0, len(keywords), 5):
+            chunk = keywords[i:i + 5]
+            try:
+                with self._fetch_lock:
+                    if self.pytrends is None:
+                        self.load()
+                    # Build payload
+                    self.pytrends.build_payload(
+                        kw_list=chunk,
+                        cat=0,
+                        timeframe=timeframe,
+                        geo='',
+                        gprop=''
+                    )
+
+                    # Get related queries
+                    related_queries = self.pytrends.related_queries()
+            except Exception as e:
+                logger.error(f"Error fetching trending topics for {chunk}: {str(e)}")
+                self._back_off(chunk, timeframe)
+                continue
+
+            with self._inflight_lock:
+                for keyword in chunk:
+                    self._failures.pop(TrendsCache.make_key(keyword, timeframe), None)
+
+            # Extract top queries for each keyword
+            for keyword in chunk:
+                topics = []
+                if keyword in related_queries and related_queries[keyword]['top'] is not None:
+                    top_queries = related_queries[keyword]['top']
+                    if not top_queries.empty:
+                        topics = top_queries['query'].head(3).tolist()
+                self.cache.set(TrendsCache.make_key(keyword, timeframe), topics)
             
+    def _back_off(self, keywords: List[str], timeframe: str):
+        """Hold off retrying failed keywords, doubling the wait with each consecutive failure."""
+        now = time.monotonic()
+        with self._inflight_lock:
+            if len(self._failures) > 10000:
+                self._failures = {key: entry for key, entry in self._failures.items() if entry[0] > now}
+            for keyword in keywords:
+                key = TrendsCache.make_key(keyword, timeframe)
+                failures = self._failures.get(key, (0.0, 0))[1] + 1
+                delay = min(self.failure_backoff * 2 ** (failures - 1), self.max_failure_backoff)
+                self._failures[key] = (now + delay, failures)
+
     def extract_keywords_from_text(self, text: str) -> List[str]:
         """
-        Extract potential keywords from the newsletter text.
-        This is a simple implementation that can be enhanced with NLP.
+        Extract the most important keywords from the newsletter text, scored
+        by TF-IDF against corpus statistics when they are available.
         
         Args:
             text: Newsletter text to extract keywords from
@@ -59,12 +227,4 @@ class TrendsFetcher:
         Returns:
             List of potential keywords
         """
-        # Simple implementation - split by spaces and take words longer than 4 chars
-        words = text.lower().split()
-        keywords = [word for word in words if len(word) > 4]
-        
-        # Remove common words (can be expanded)
-        common_words = {'about', 'their', 'there', 'would', 'could', 'should', 'which', 'where', 'when'}
-        keywords = [word for word in keywords if word not in common_words]
-        
-        return keywords[:5]  # Return top 5 keywords 
\ No newline at end of file
+        return self.keyword_extractor.extract(text, top_k=5)  # Return top 5 keywords
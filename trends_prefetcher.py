@@ -0,0 +1,235 @@
+import os
+import time
+import asyncio
+import logging
+from collections import Counter, deque
+from typing import Any, Dict, List, Optional
+from trends_fetcher import TrendsFetcher
+from rate_limiter import RateLimitStore, SharedTokenBucket, TokenBucket, create_rate_limit_store
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class TrendsPrefetcher:
+    """
+    Keeps Google Trends data warm off the request path.
+
+    Keywords seen by /generate are counted; a background task refreshes the
+    most frequent ones on a schedule and fetches newly seen keywords first,
+    never exceeding `requests_per_minute` upstream calls. Requests only read
+    the cache, waiting at most `deadline` seconds for cold keywords. At most
+    `max_urgent` cold keywords are queued; beyond that, and while a keyword
+    is in the fetcher's failure backoff, requests go without its topics.
+
+    With a RateLimitStore, the upstream budget is shared by every worker
+    process using it.
+    """
+
+    def __init__(
+        self,
+        trends_fetcher: TrendsFetcher,
+        deadline: float = 0.2,
+        interval: float = 300,
+        top_n: int = 50,
+        requests_per_minute: float = 10,
+        timeframe: str = 'now 7-d',
+        store: Optional[RateLimitStore] = None,
+        max_urgent: int = 1000
+    ):
+        self.trends_fetcher = trends_fetcher
+        self.deadline = deadline
+        self.interval = interval
+        self.top_n = top_n
+        self.requests_per_minute = requests_per_minute
+        self.timeframe = timeframe
+        self.store = store
+        self.max_urgent = max_urgent
+        self.keyword_counts: Counter = Counter()
+        self.upstream_requests = 0
+        self.deadline_misses = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.dropped_keywords = 0
+        self._urgent: deque = deque()
+        self._scheduled: deque = deque()
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # One token, refilled every 60 / requests_per_minute seconds, spaces upstream calls evenly
+        if store is not None:
+            self._budget: TokenBucket = SharedTokenBucket(store, "trends", requests_per_minute, capacity=1)
+        else:
+            self._budget = TokenBucket(requests_per_minute, capacity=1)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Start the background refresh loop on the running event loop."""
+        if not self.running:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def record(self, keywords: List[str]):
+        """Count keywords extracted from a request."""
+        self.keyword_counts.update(keywords)
+
+    def hot_keywords(self) -> List[str]:
+        return [keyword for keyword, _ in self.keyword_counts.most_common(self.top_n)]
+
+    async def get_topics(self, keywords: List[str]) -> List[str]:
+        """
+        Return cached trending topics for the keywords. Cold keywords are
+        queued for an urgent fetch and waited on for at most `deadline`.
+        """
+        self.record(keywords)
+        topics, cold = self.trends_fetcher.get_cached_topics(keywords, self.timeframe)
+        if not cold:
+            self.cache_hits += 1
+            return topics
+        self.cache_misses += 1
+
+        loop = asyncio.get_running_loop()
+        waiters = []
+        queued = []
+        for keyword in cold:
+            if self.trends_fetcher.backed_off(keyword, self.timeframe):
+                continue
+            if keyword not in self._waiters:
+                if len(self._urgent) >= self.max_urgent:
+                    self.dropped_keywords += 1
+                    continue
+                self._waiters[keyword] = []
+                self._urgent.append(keyword)
+            waiter = loop.create_future()
+            waiters.append(waiter)
+            queued.append(keyword)
+            self._waiters[keyword].append(waiter)
+        if not waiters:
+            return topics
+        self._wakeup.set()
+
+        _, pending = await asyncio.wait(waiters, timeout=self.deadline)
+        if pending:
+            self.deadline_misses += 1
+            for waiter in pending:
+                waiter.cancel()
+            # The keywords stay queued to warm the cache; only this request's waiters go
+            for keyword in queued:
+                if keyword in self._waiters:
+                    self._waiters[keyword] = [waiter for waiter in self._waiters[keyword] if not waiter.done()]
+        topics, _ = self.trends_fetcher.get_cached_topics(keywords, self.timeframe)
+        return topics
+
+    def _next_batch(self) -> List[str]:
+        batch = []
+        for queue in (self._urgent, self._scheduled):
+            while queue and len(batch) < 5:
+                keyword = queue.popleft()
+                if keyword not in batch:
+                    batch.append(keyword)
+        return batch
+
+    def _schedule_refresh(self):
+        """Queue hot keywords whose cache entries are no longer fresh."""
+        queued = set(self._scheduled)
+        for keyword in self.hot_keywords():
+            if keyword not in queued and not self.trends_fetcher.is_fresh(keyword, self.timeframe):
+                self._scheduled.append(keyword)
+
+        # Decay counts so the hot set follows current traffic
+        for keyword in list(self.keyword_counts):
+            self.keyword_counts[keyword] //= 2
+            if not self.keyword_counts[keyword]:
+                del self.keyword_counts[keyword]
+
+    def _to_fetch(self, keywords: List[str]) -> List[str]:
+        """Keywords whose cache entry is not fresh and whose fetch is not in failure backoff."""
+        return [
+            keyword for keyword in keywords
+            if not self.trends_fetcher.is_fresh(keyword, self.timeframe)
+            and not self.trends_fetcher.backed_off(keyword, self.timeframe)
+        ]
+
+    async def _respect_rate_budget(self):
+        if self.store is not None:
+            # A shared bucket is a SQLite transaction; run it on the store's thread
+            wait = await self.store.run(self._budget.reserve, 1)
+        else:
+            wait = self._budget.reserve(1)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def _run(self):
+        next_schedule = time.monotonic()
+        while True:
+            try:
+                if time.monotonic() >= next_schedule:
+                    self._schedule_refresh()
+                    next_schedule = time.monotonic() + self.interval
+
+                batch = self._next_batch()
+                if not batch:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), next_schedule - time.monotonic())
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                try:
+                    stale = self._to_fetch(batch)
+                    if stale:
+                        await self._respect_rate_budget()
+                        # Another worker sharing the cache may have refreshed some while we waited
+                        stale = self._to_fetch(stale)
+                    if stale:
+                        self.upstream_requests += 1
+                        await asyncio.to_thread(self.trends_fetcher.refresh, stale, self.timeframe)
+                finally:
+                    for keyword in batch:
+                        for waiter in self._waiters.pop(keyword, []):
+                            if not waiter.done():
+                                waiter.set_result(None)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Trends prefetch failed: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "tracked_keywords": len(self.keyword_counts),
+            "queued_keywords": len(self._urgent) + len(self._scheduled),
+            "dropped_keywords": self.dropped_keywords,
+            "upstream_requests": self.upstream_requests,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "deadline_misses": self.deadline_misses
+        }
+
+def create_trends_prefetcher(trends_fetcher: TrendsFetcher) -> TrendsPrefetcher:
+    """
+    Build the prefetcher from environment variables: TRENDS_DEADLINE_MS,
+    TRENDS_PREFETCH_INTERVAL (seconds), TRENDS_PREFETCH_TOP_N,
+    TRENDS_REQUESTS_PER_MINUTE, TRENDS_PREFETCH_MAX_QUEUED and RATE_LIMIT_DB.
+    """
+    return TrendsPrefetcher(
+        trends_fetcher,
+        deadline=float(os.getenv("TRENDS_DEADLINE_MS", "200")) / 1000,
+        interval=float(os.getenv("TRENDS_PREFETCH_INTERVAL", "300")),
+        top_n=int(os.getenv("TRENDS_PREFETCH_TOP_N", "50")),
+        requests_per_minute=float(os.getenv("TRENDS_REQUESTS_PER_MINUTE", "10")),
+        store=create_rate_limit_store(),
+        max_urgent=int(os.getenv("TRENDS_PREFETCH_MAX_QUEUED", "1000"))
+    )